@@ -0,0 +1,129 @@
+# coding=utf-8
+"""
+Cornetto
+
+Copyright (C) 2018–2020 ANSSI
+Contributors:
+2018–2020 Bureau Applicatif tech-sdn-app@ssi.gouv.fr
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+"""
+# Measure the number of HTML pages per second and per core the MirroringSpider can search for links, with the
+# previous XPath implementation and with the LinkEngine. Run it from the back directory :
+#   python benchmarks/bench_links.py [number of pages] [number of links per page]
+
+import re
+import sys
+import time
+from urllib import parse
+
+from lxml import etree, html
+
+from scrapy_parser.links import LinkEngine
+from scrapy_parser.rewrite import UrlRewriter
+
+ALLOWED_DOMAINS = ['web.com', 'static.com']
+URL_REGEX = 'https?://web.com'
+URL_REPLACEMENT = 'http://static.com'
+
+XPATH_LINKS = '//a/@href | //applet/@code | //area/@href | //bgsound/@src | //body/@background | //embed/@src | ' \
+              '//fig/@src | //form/@action | //frame/@src | //iframe/@src | //img/@src | //input/@src | ' \
+              '//layer/@src | //link/@href | //object/@data | //overlay/@src | //script/@src | //table/@background | ' \
+              '//td/@background | //tr/@background | //video/@src | //video/@poster | //audio/@src | ' \
+              '//source/@src | //div/@style | //section/@style | //article/@style | //a/@style'
+
+
+def generate_page(i_page, i_links):
+    """
+    Generate an HTML page with internal, external and relative links
+    @param i_page: the number of the page
+    @param i_links: the number of links in the page
+    @return the body of the page
+    """
+    a_lines = ['<html><head><title>Page %i</title><link href="/css/style.css" rel="stylesheet">'
+               '<script src="http://web.com/js/app.js"></script></head><body>' % i_page]
+    for i in range(i_links):
+        if i % 4 == 0:
+            a_lines.append('<p>Some text about <a href="http://web.com/page%i.html">page %i</a></p>' % (i, i))
+        elif i % 4 == 1:
+            a_lines.append('<div><a href="../section/page%i.html">relative %i</a></div>' % (i, i))
+        elif i % 4 == 2:
+            a_lines.append('<img src="/img/%i.png" alt="image %i">' % (i % 20, i))
+        else:
+            a_lines.append('<a href="http://other%i.com/">external</a>' % (i % 10))
+    a_lines.append('</body></html>')
+    return '\n'.join(a_lines).encode('utf-8')
+
+
+def xpath_links(body, url, url_regex, url_replacement):
+    """
+    The previous implementation : replace the urls in the whole body, then search the links with an XPath union
+    @return the number of links found
+    """
+    body = url_regex.sub(url_replacement, body)
+    root = etree.fromstring(body, parser=html.HTMLParser(encoding="utf-8", remove_comments=False),
+                            base_url=url).getroottree()
+    i_links = 0
+    a_out_urls = set()
+    for link in root.xpath(XPATH_LINKS):
+        link = parse.urljoin(url, link)
+        if not re.match('^https?:|data:', link):
+            continue
+        if (parse.urlparse(link).netloc not in ALLOWED_DOMAINS) and (link not in a_out_urls):
+            a_out_urls.add(link)
+        i_links += 1
+    return i_links
+
+
+def engine_links(body, url, engine, parser):
+    """
+    The LinkEngine : parse the body and search, rewrite and classify the links in a single walk of the tree
+    @return the number of links found
+    """
+    root = etree.fromstring(body, parser=parser, base_url=url).getroottree()
+    a_out_urls = set()
+    a_links = engine.extract_html_links(root, url)
+    for link, b_external in a_links:
+        if b_external and link not in a_out_urls:
+            a_out_urls.add(link)
+    return len(a_links)
+
+
+def measure(s_name, function, a_pages):
+    """
+    Run the function on every page and print the number of pages per second
+    @param s_name: the name of the implementation
+    @param function: the function that search the links of a page
+    @param a_pages: the bodies of the pages
+    """
+    i_links = 0
+    f_start = time.process_time()
+    for i, body in enumerate(a_pages):
+        i_links += function(body, 'http://web.com/dir/page%i.html' % i)
+    f_duration = time.process_time() - f_start
+    print('%-10s %8.0f pages/s per core (%i links)' % (s_name, len(a_pages) / f_duration, i_links))
+
+
+def main():
+    i_pages = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    i_links = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    a_pages = [generate_page(i, i_links) for i in range(i_pages)]
+
+    url_regex = re.compile(URL_REGEX.encode('utf-8'), re.I)
+    url_replacement = URL_REPLACEMENT.encode('utf-8')
+    engine = LinkEngine(ALLOWED_DOMAINS, UrlRewriter.from_url_regex(URL_REGEX, URL_REPLACEMENT))
+    parser = html.HTMLParser(encoding="utf-8", remove_comments=False)
+
+    measure('xpath', lambda body, url: xpath_links(body, url, url_regex, url_replacement), a_pages)
+    measure('engine', lambda body, url: engine_links(body, url, engine, parser), a_pages)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+# coding=utf-8
+"""
+Cornetto
+
+Copyright (C) 2018–2020 ANSSI
+Contributors:
+2018–2020 Bureau Applicatif tech-sdn-app@ssi.gouv.fr
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+"""
+# Measure the number of HTML pages per second parsed, rewritten and saved by the content workers for different
+# numbers of workers, 0 is the crawler process alone. Run it from the back directory :
+#   python benchmarks/bench_offload.py [number of pages] [numbers of workers separated by comma]
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import wait
+
+from scrapy.statscollectors import MemoryStatsCollector
+from scrapy.utils.test import get_crawler
+
+from scrapy_parser.links import LinkEngine
+from scrapy_parser.offload import ContentOffloader, create_html_parser, process_content, run_content, CONTENT_HTML
+from scrapy_parser.rewrite import UrlRewriter
+
+sys.path.insert(0, os.path.dirname(__file__))
+from bench_links import ALLOWED_DOMAINS, URL_REGEX, URL_REPLACEMENT, generate_page
+
+
+def measure(i_workers, a_pages, s_output):
+    """
+    Process the pages and print the number of pages per second
+    @param i_workers: the number of content workers, 0 to process the pages in this process
+    @param a_pages: the bodies of the pages
+    @param s_output: the directory where the pages are saved
+    """
+    a_filenames = [s_output + '/page%i/index.html' % i for i in range(len(a_pages))]
+
+    if i_workers == 0:
+        engine = LinkEngine(ALLOWED_DOMAINS, UrlRewriter.from_url_regex(URL_REGEX, URL_REPLACEMENT))
+        html_parser = create_html_parser()
+        f_start = time.time()
+        for i, body in enumerate(a_pages):
+            item, a_links, a_unknown_links = process_content(engine, html_parser, CONTENT_HTML, body,
+                                                             'http://web.com/page%i.html' % i, a_filenames[i], None)
+            item.store()
+    else:
+        offloader = ContentOffloader(i_workers, MemoryStatsCollector(get_crawler()), ALLOWED_DOMAINS, URL_REGEX,
+                                     URL_REPLACEMENT)
+        # the workers are started before the measure
+        wait([offloader.executor.submit(time.sleep, 0.1) for i in range(i_workers)])
+        f_start = time.time()
+        wait([offloader.executor.submit(run_content, CONTENT_HTML, body, 'http://web.com/page%i.html' % i,
+                                        a_filenames[i], None) for i, body in enumerate(a_pages)])
+        offloader.close()
+
+    f_duration = time.time() - f_start
+    print('%2i workers %8.0f pages/s' % (i_workers, len(a_pages) / f_duration))
+
+
+def main():
+    i_pages = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    a_workers = [int(s_workers) for s_workers in sys.argv[2].split(',')] if len(sys.argv) > 2 else \
+        sorted(set([0, 1, 2, 4, os.cpu_count() or 1]))
+    a_pages = [generate_page(i, 200) for i in range(i_pages)]
+
+    for i_workers in a_workers:
+        s_output = tempfile.mkdtemp()
+        try:
+            measure(i_workers, a_pages, s_output)
+        finally:
+            shutil.rmtree(s_output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+# coding=utf-8
+"""
+Cornetto
+
+Copyright (C) 2018–2020 ANSSI
+Contributors:
+2018–2020 Bureau Applicatif tech-sdn-app@ssi.gouv.fr
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+"""
+# Measure the throughput of the url rewriting on representative bodies (HTML page, CSS, minified JS bundle) with a
+# dozen host aliases and path migrations, written as one giant alternation for re.sub and as a table of rules for
+# the UrlRewriter. Run it from the back directory :
+#   python benchmarks/bench_rewrite.py [number of repetitions]
+
+import random
+import re
+import sys
+import time
+
+from scrapy_parser import rewrite
+from scrapy_parser.rewrite import UrlRewriter
+
+HOSTS = ['web.your-private-domain.com', 'www.web.com', 'web.com', 'cdn.web.com', 'static.web.com', 'old.web.com',
+         'intranet.web.com', 'assets.web.com', 'media.web.com', 'blog.web.com', 'news.web.com', 'shop.web.com']
+PATHS = [('/old-news/', '/news/'), ('/files/2019/', '/archives/2019/'), ('/en/old/', '/en/')]
+
+
+def get_rules():
+    """
+    @return the table of rules : a literal for each host alias and a regex for each path migration
+    """
+    a_rules = [{'literal': s_scheme + s_host, 'replacement': ''}
+               for s_host in HOSTS for s_scheme in ('http://', 'https://', '//')]
+    a_rules += [{'regex': '(https?:)?//web\\.com' + re.escape(s_old) + '([a-z0-9-]+)',
+                 'replacement': s_new + '\\2'} for s_old, s_new in PATHS]
+    return a_rules
+
+
+def get_alternation():
+    """
+    @return the single URL_REGEX that was used to replace the same urls, one alternative per alias and migration in
+            the style of the default URL_REGEX
+    """
+    a_alternatives = ['(https?:)?//' + re.escape(s_host) for s_host in HOSTS]
+    a_alternatives = ['(https?:)?//web\\.com' + re.escape(s_old) + '[a-z0-9-]+' for s_old, s_new in PATHS] + \
+        a_alternatives
+    return '|'.join(a_alternatives)
+
+
+def generate_bodies():
+    """
+    @return the representative bodies to rewrite
+    """
+    generator = random.Random(42)
+    a_html = []
+    for i in range(2000):
+        s_host = generator.choice(HOSTS + ['other.com'] * 4)
+        a_html.append('<p>Some text with a <a href="https://%s/page%i.html">link</a> and //comments</p>' % (s_host, i))
+    a_css = ['.c%i { background: url(//cdn.web.com/img/%i.png) }' % (i, i) for i in range(3000)]
+    # a minified bundle has long lines of code with many slashes and few urls
+    a_js = []
+    for i in range(20000):
+        a_js.append('function f%i(a,b){return a/b+"//"+a.split("/").join("/")}' % i)
+        if i % 50 == 0:
+            a_js.append('var u%i="https://static.web.com/js/chunk%i.js";' % (i, i))
+    return [('html', '\n'.join(a_html).encode('utf-8')), ('css', '\n'.join(a_css).encode('utf-8')),
+            ('js', ''.join(a_js).encode('utf-8'))]
+
+
+def measure(s_name, function, body, i_repetitions):
+    """
+    Run the function on a body and print its throughput
+    @param s_name: the name of the implementation
+    @param function: the function that rewrite a body
+    @param body: the body
+    @param i_repetitions: the number of times the body is rewritten
+    @return the rewritten body
+    """
+    f_start = time.process_time()
+    for i in range(i_repetitions):
+        result = function(body)
+    f_duration = time.process_time() - f_start
+    print('  %-20s %8.1f MB/s' % (s_name, len(body) * i_repetitions / f_duration / 1000000))
+    return result
+
+
+def main():
+    i_repetitions = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    alternation = re.compile(get_alternation().encode('utf-8'), re.I)
+    a_rewriters = [('rules (regex)', UrlRewriter(get_rules(), b_automaton=False))]
+    if rewrite.ahocorasick is not None:
+        a_rewriters.append(('rules (automaton)', UrlRewriter(get_rules())))
+
+    for s_type, body in generate_bodies():
+        print('%s body of %i bytes' % (s_type, len(body)))
+        measure('giant alternation', lambda data: alternation.sub(b'', data), body, i_repetitions)
+        a_results = [measure(s_name, rewriter.sub, body, i_repetitions) for s_name, rewriter in a_rewriters]
+        # both implementations of the rules replace the same urls
+        assert all(result == a_results[0] for result in a_results)
+
+
+if __name__ == '__main__':
+    main()
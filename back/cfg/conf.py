@@ -34,14 +34,28 @@ PROJECT_DIRECTORY = '/opt/cornetto/'
 # define the logfile used for the current statification
 LOGFILE = '/opt/cornetto/log/statif.log'
 
+# define the file where the crawler writes the events of the current statification (errors, external links,
+# forbidden MIME types and stats) as JSON lines, it is read to fill the database during the statification
+CRAWL_EVENTS_FILE = '/opt/cornetto/log/statif.events.jsonl'
+# define the number of seconds between two registrations of the crawl events in the database
+CRAWL_EVENTS_INTERVAL = 5
+
+# define the directory where the crawler persists its state (requests to crawl, requests seen, urls found) so the
+# statification can be paused and resumed with /api/statification/pause and /api/statification/resume,
+# leave it empty to disable the pause
+JOB_DIRECTORY = '/opt/cornetto/job/'
+
+# define the number of seconds between two computations of the status pushed to the clients of the events route
+STATUS_EVENTS_INTERVAL = 2
+
 # define the file used to store the pid of the statification process
 PIDFILE = '/opt/cornetto/.pid.data'
 
 # define the lock file use to block operation
 LOCKFILE = '/opt/cornetto/.lock_access'
 
-# define the file that will contain the number of crawled file
-# it is updated during the statification process
+# define the file where the crawler publish the progress of the crawl (pages crawled, bytes downloaded,
+# queue depth, errors and throughput), it is updated during the statification process
 # BEWARE modify scrapy_parser/spiders/MirroringSpider.py too if you change the path
 CRAWLER_PROGRESS_COUNTER_FILE = '/opt/cornetto/.crawlerProgressCounterFile.txt'
 
@@ -49,7 +63,13 @@ CRAWLER_PROGRESS_COUNTER_FILE = '/opt/cornetto/.crawlerProgressCounterFile.txt'
 STATUS_BACKGROUND = '/opt/cornetto/statusBackground.json'
 
 # The path to the script that will be called to upload the statification to a production server
+# it is called with the sha of the statification, the path to a .tar.gz archive that contain the files added and
+# changed since the statification in production, and the path to a file that list the removed files (one per line)
 PUSH_TO_PROD_SCRIPT='/opt/cornetto/push_to_prod.sh'
+# The path to a local directory where to push the statification instead of calling the script,
+# only the files added, changed and removed since the statification in production are modified, the sha of the
+# statification it holds is written in its .cornetto.sha file, if it differs all its content is replaced
+PUSH_TO_PROD_DIRECTORY = ''
 
 
 # DATABASE
@@ -67,8 +87,24 @@ DATABASE_URI = 'sqlite:////opt/cornetto/cornetto.db'
 STATIC_REPOSITORY = '/opt/cornetto/static/'
 # define the directory where the statification to visualize should be deployed
 VISUALIZE_REPOSITORY = '/opt/cornetto/visualize/'
+# define the file that contain the sha of the statification served by the visualize application (visualize_wsgi.py),
+# when the statification is stored in the snapshot store or in an uncompressed archive (ARCHIVE_CODEC = 'none')
+# its files are served from the archive directory and it is not extracted in the visualize directory
+# leave it empty if the visualize directory is served by the web server
+VISUALIZE_POINTER_FILE = ''
 # define the directory where the archives of statifications should be stored
 ARCHIVE_REPOSITORY = '/opt/cornetto/archive/'
+# define how the statifications are stored in the archive directory :
+# tar to create a compressed archive for each statification,
+# cas to store each file content once and a manifest for each statification, only the modified files are stored
+ARCHIVE_BACKEND = 'tar'
+# define the compression of the archives : gzip, xz, zstd (needs the zstandard module) or none,
+# the uncompressed archives are indexed so they can be visualized without extraction
+ARCHIVE_CODEC = 'gzip'
+# define the level of compression of the archives (1-9 for gzip and xz, 1-22 for zstd)
+ARCHIVE_COMPRESSION_LEVEL = 6
+# define the number of threads used to compress the archives with zstd (0 to disable, -1 for all the cpus)
+ARCHIVE_THREADS = 0
 
 
 # CRAWLER CONF
@@ -79,6 +115,34 @@ URLS = 'http://web.your-private-domain.com'
 DOMAINS = 'web.your-private-domain.com,www.web.com'
 URL_REGEX = '(https?://)?web(.your-private-domain.com/?)?'
 URL_REPLACEMENT = ''
+# define other rules to replace the urls (host aliases, moved paths...), they are applied with URL_REGEX in a
+# single scan of each content. Each rule has either a 'literal' or a 'regex' (case insensitive) and a 'replacement',
+# the replacement of a regex can reference its groups, e.g. :
+# [{'literal': 'http://www.web.com', 'replacement': ''},
+#  {'regex': 'https?://old.web.com/news/([0-9]+)', 'replacement': '/archives/\\1'}]
+URL_REWRITE_RULES = []
+
+# INCREMENTAL STATIFICATION
+
+# if True, the crawler sends conditional requests (If-None-Match/If-Modified-Since) built from the ETag and
+# Last-Modified headers recorded during the last saved statification, the files that have not been modified
+# are linked from that statification instead of being downloaded again
+INCREMENTAL_STATIFICATION = False
+# define the directory where the last saved statification is extracted during an incremental statification
+# it should be on the same file system than STATIC_REPOSITORY so files can be hard linked
+PREVIOUS_REPOSITORY = '/opt/cornetto/previous/'
+# define the file where the crawler stores the ETag and Last-Modified headers of each url,
+# it is moved next to the log of the statification when the statification is saved
+VALIDATORS_FILE = '/opt/cornetto/log/validators.json'
+# define the file where the crawler stores the sha256 of the PDF files it has sanitized, it is moved next to the log
+# of the statification when the statification is saved, the next incremental statification reuses these files
+SANITIZED_FILE = '/opt/cornetto/log/sanitized.json'
+# define the directory where the crawler caches the processed contents (rewritten pages, cleaned images...), the
+# contents that have already been processed by a previous statification are not processed again,
+# leave it empty to disable the cache
+PROCESSED_CACHE_DIRECTORY = '/opt/cornetto/cache/'
+# define the maximum size of the cache in bytes, the least recently used contents are removed after each statification
+PROCESSED_CACHE_MAX_SIZE = 1024 * 1024 * 1024
 
 # define the files to be deleted at the end of the process of statification
 DELETE_FILES = ''
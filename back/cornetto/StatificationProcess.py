@@ -16,31 +16,42 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 """
 import fcntl
+import json
 import logging
 import os
-import re
+import shutil
 import signal
+import threading
 from datetime import datetime
+from typing import Dict, List
 
 import sh
 from sqlalchemy.orm import Session
 from sqlalchemy.orm.exc import NoResultFound
 
-from cornetto.models.ErrorTypeMIME import ErrorTypeMIME
-from cornetto.models.ExternalLink import ExternalLink
-from cornetto.models.HtmlError import HtmlError
+from cornetto.archive_utils import extract_archive_to_directory
+from cornetto.crawl_events import CrawlEventsFollower, follow_crawl_events, reset_crawl_events
 from cornetto.models.ScannedFile import ScannedFile
-from cornetto.models.ScrapyError import ScrapyError
 from cornetto.models.StatificationHistoric import StatificationHistoric, Actions
 from cornetto.models.Statification import Statification, Status
 from cornetto.models import open_session_db
+from cornetto.service_utils import service_do_clean_directory
+
+# the name of the file that mark that the crawl is paused, in the job directory
+PAUSE_MARKER = 'paused'
+# the name of the file where the spider persists its state when it's closed, in the job directory
+SPIDER_STATE_FILE = 'mirroring.state.json'
 
 
 class StatificationProcess:
     def __init__(self, s_logger: str, s_repository_path: str, s_python_path: str, s_urls: str, s_domains: str, s_log_file: str,
                  s_project_directory: str, s_database_uri: str, s_pid_file: str, s_lock_file: str,
                  s_crawler_progress_counter_file: str, s_delete_files: str = '', s_delete_directories: str = '',
-                 s_url_regex: str = '', s_url_replacement: str = ''):
+                 s_url_regex: str = '', s_url_replacement: str = '', b_incremental: bool = False,
+                 s_archive_repository: str = '', s_previous_repository: str = '', s_log_dir: str = '',
+                 s_validators_file: str = '', s_events_file: str = '', i_events_interval: int = 5,
+                 s_job_directory: str = '', a_url_rewrite_rules: List[Dict[str, str]] = None,
+                 s_sanitized_file: str = '', s_cache_directory: str = '', i_cache_max_size: int = 0):
         """
         Initialize a StatificationProcess thread with the specified settings
         @param s_logger: the id of the logger
@@ -58,6 +69,21 @@ class StatificationProcess:
         @param s_delete_directories: the list of directories to be deleted at the end of the statification process
         @param s_url_regex: the regex to identify url to be replaced by s_url_replacement
         @param s_url_replacement: the new url to set to replace the match made by s_url_regex
+        @param b_incremental: if True the files not modified since the last saved statification are not downloaded
+        @param s_archive_repository: the path to the directory that contain the archives of statifications
+        @param s_previous_repository: the path to the directory where the last saved statification is extracted
+        @param s_log_dir: the path to the log directory, where the validators of saved statifications are stored
+        @param s_validators_file: the path to the file where the crawler store the validators (ETag, Last-Modified)
+        @param s_events_file: the path to the file where the crawler write the events (errors, external links...)
+        @param i_events_interval: the number of seconds between two registrations of the events during the crawl
+        @param s_job_directory: the path to the directory where the crawler persists its state (requests to crawl,
+                                requests seen...) so the crawl can be paused and resumed, empty to disable the pause
+        @param a_url_rewrite_rules: the other rules used to replace the urls, each rule is a dict with a 'literal' or
+                                    a 'regex' and a 'replacement'
+        @param s_sanitized_file: the path to the file where the crawler store the sha256 of the PDF files sanitized
+        @param s_cache_directory: the path to the directory where the crawler cache the processed contents between
+                                  the statifications, empty to disable the cache
+        @param i_cache_max_size: the maximum size in bytes of the cache, 0 for the default size of the crawler
         """
         self.logger = logging.getLogger(s_logger)
         self.s_repository_path = s_repository_path
@@ -69,6 +95,7 @@ class StatificationProcess:
         self.s_log_file = s_log_file
         self.s_url_regex = s_url_regex
         self.s_url_replacement = s_url_replacement
+        self.a_url_rewrite_rules = a_url_rewrite_rules or []
 
         self.s_database_uri = s_database_uri
         self.s_project_directory = s_project_directory
@@ -76,11 +103,30 @@ class StatificationProcess:
         self.s_lockfile = s_lock_file
         self.s_crawler_progress_counter_file = s_crawler_progress_counter_file
 
+        self.b_incremental = b_incremental
+        self.s_archive_repository = s_archive_repository
+        self.s_previous_repository = s_previous_repository
+        self.s_log_dir = s_log_dir
+        self.s_validators_file = s_validators_file
+        self.s_sanitized_file = s_sanitized_file
+        self.s_events_file = s_events_file
+        self.i_events_interval = i_events_interval
+        # the thread that register the events in the database during the crawl
+        self.events_follower = None
+        # the thread that extract the previous statification before launching the crawler
+        self.preparation = None
+        self.s_job_directory = s_job_directory
+        self.s_cache_directory = s_cache_directory
+        self.i_cache_max_size = i_cache_max_size
+
     def is_running(self) -> bool:
         """
         Check if the statification process is running
         @return True if the process is currently running, false otherwise
         """
+        # the crawler is launched once the previous statification has been extracted
+        if self.is_preparing():
+            return True
         # open the pid file in read mode
         try:
             f_pid_file = open(self.s_pid_file)
@@ -95,6 +141,45 @@ class StatificationProcess:
         # if there was a pid then the process is running
         return True
 
+    def is_preparing(self) -> bool:
+        """
+        Check if the previous statification is being extracted before launching the crawler
+        @return True if the crawler has not been launched yet, false otherwise
+        """
+        return self.preparation is not None and self.preparation.is_alive()
+
+    def is_paused(self) -> bool:
+        """
+        Check if the statification process has been paused
+        @return True if the crawl has been paused and can be resumed, false otherwise
+        """
+        return bool(self.s_job_directory) and os.path.isfile(os.path.join(self.s_job_directory, PAUSE_MARKER))
+
+    def mark_paused(self) -> None:
+        """
+        Mark the crawl as paused, the statification will be kept when the process is done
+        """
+        os.makedirs(self.s_job_directory, exist_ok=True)
+        open(os.path.join(self.s_job_directory, PAUSE_MARKER), 'w').close()
+
+    def is_state_persisted(self, exit_code: int) -> bool:
+        """
+        Check if the crawler has persisted its state in the job directory since it has been paused
+        @param exit_code: the exit code of the crawler
+        @return True if the crawler has been closed gracefully after the pause, false otherwise
+        """
+        s_state_file = os.path.join(self.s_job_directory, SPIDER_STATE_FILE)
+        # the state of the spider is written after the requests to crawl, when the spider is closed
+        return exit_code == 0 and os.path.isfile(s_state_file) and \
+            os.path.getmtime(s_state_file) >= os.path.getmtime(os.path.join(self.s_job_directory, PAUSE_MARKER))
+
+    def clear_job_directory(self) -> None:
+        """
+        Erase the state of the crawl, a new crawl will start from the beginning
+        """
+        if self.s_job_directory:
+            shutil.rmtree(self.s_job_directory, ignore_errors=True)
+
     def stop(self, session: Session, success: bool = False):
         """
         Stop the statification process
@@ -151,6 +236,10 @@ class StatificationProcess:
             f_pid_file = open(self.s_pid_file, 'w')
             f_pid_file.close()
 
+        if not success:
+            # the crawl can't be resumed without its statification
+            self.clear_job_directory()
+
     def done(self, cmd: str, success: bool, exit_code: int):
         """
         That method is called after the statification process has finish
@@ -160,25 +249,44 @@ class StatificationProcess:
         """
         self.logger.info("the process has finished with exit code : " + str(exit_code))
 
+        # stop the registration of the events during the crawl, the remaining events are registered below
+        if self.events_follower:
+            self.events_follower.stop()
+            self.events_follower = None
+
         # create a session for this specific code , because it's executed after the flask instance has been killed
         session = open_session_db(self.s_database_uri)
 
+        if self.is_paused() and not self.is_state_persisted(exit_code):
+            # scrapy only persists the requests to crawl when the spider is closed gracefully, but the requests seen
+            # are persisted while crawling : a resumed crawl would ignore all the urls it finds
+            self.logger.error('The crawler stopped unexpectedly while pausing, the statification can\'t be resumed')
+            os.remove(os.path.join(self.s_job_directory, PAUSE_MARKER))
+
+        if self.is_paused():
+            self.logger.info('The statification has been paused, it can be resumed')
+            try:
+                # register the events written before the pause, the statification is kept for the resume
+                follow_crawl_events(session, Statification.get_statification(session, ''), self.s_events_file)
+            except (NoResultFound, FileNotFoundError):
+                self.logger.info('There is no current statification or events, no event has been registered')
+            success = True
+
         # if the process finished with exit code 0 (success)
-        if exit_code == 0:
+        elif exit_code == 0:
             try:
                 # fill the database with the log
                 self.register_error_in_database(session)
             except (NoResultFound, IndexError):
                 self.logger.info('There is no current statification, no error will be registered in the database')
 
+            # the crawl is finished, its state is not needed anymore
+            self.clear_job_directory()
+
         # delete the pid in the file and clear the statification if not a success
         self.stop(session, success)
 
-        # open the file if it exist, create it if it doesn't exist
-        f_lock_file = open(self.s_lockfile, "w+")
-        # release the lock
-        fcntl.flock(f_lock_file, fcntl.LOCK_UN)
-        f_lock_file.close()
+        self.release_lock()
 
         # terminate the session
         session.close()
@@ -186,6 +294,16 @@ class StatificationProcess:
         file_progress_counter = open(self.s_crawler_progress_counter_file, 'w')
         file_progress_counter.close()
 
+    def release_lock(self) -> None:
+        """
+        Release the lock taken by the route that started the statification process
+        """
+        # open the file if it exist, create it if it doesn't exist
+        f_lock_file = open(self.s_lockfile, "w+")
+        # release the lock
+        fcntl.flock(f_lock_file, fcntl.LOCK_UN)
+        f_lock_file.close()
+
     def start(self, session: Session, s_designation: str, s_description: str, s_user: str):
         """
         Start a statification process with scrapy.
@@ -224,36 +342,214 @@ class StatificationProcess:
             f_log_file = open(self.s_log_file, "w")
             f_log_file.close()
 
-            try:
-                # create a new environnement to call subprocess
-                new_env = os.environ.copy()
-                new_env["PYTHONPATH"] = self.s_python_path
-
-                # create a subprocess that will run scrapy in background
-                process = sh.python3('scrapy_cmd.py', 'crawl', '--loglevel=INFO',
-                                     '--logfile=' + self.s_log_file,
-                                     '-a', 'output=' + self.s_repository_path,
-                                     '-a', 'urls="' + self.s_urls + '"',
-                                     '-a', 'domains="' + self.s_domains + '"',
-                                     '-a', 'url_regex="' + self.s_url_regex + '"',
-                                     '-a', 'url_replacement="' + self.s_url_replacement + '"',
-                                     '-a', 'crawler_count_file=' + self.s_crawler_progress_counter_file,
-                                     'mirroring',
-                                     _cwd=self.s_project_directory, _env=new_env, _bg=True,
-                                     _tty_out=False, _done=self.done)
-
-                # create the pid file if it doesn't exist, erase the file if it exist
-                f_pid_file = open(self.s_pid_file, "w")
-                # write the new process pid in the file
-                f_pid_file.write(str(process.pid))
-                f_pid_file.close()
-
-            except sh.ErrorReturnCode_1 as e:
-                self.logger.info(str(e))
+            # erase the events of the precedent statification
+            if self.s_events_file:
+                reset_crawl_events(self.s_events_file)
+
+            # the crawl start from the beginning
+            self.clear_job_directory()
+
+            s_previous_sha = self.get_previous_statification_sha(session)
+            if s_previous_sha:
+                # the extraction of the previous statification can be long, it's done in background so the request
+                # that start the statification is not blocked
+                self.preparation = threading.Thread(target=self.extract_and_launch_crawler, args=(s_previous_sha,),
+                                                    daemon=True)
+                self.preparation.start()
+            else:
+                self.launch_crawler([])
 
         else:
             raise ValueError("Verify your parameter it seems that one is empty or that one file doesn't exist")
 
+    def pause(self) -> None:
+        """
+        Pause the statification process : the crawler is stopped gracefully so it persists its state in the job
+        directory, the statification is kept and the crawl can be resumed later without crawling again the urls
+        already crawled.
+        @raise ValueError if the crawl can't be paused
+        """
+        if not self.s_job_directory:
+            raise ValueError("The job directory is not configured, the statification can't be paused")
+        if self.is_preparing():
+            raise ValueError("The crawler has not been launched yet, the statification can't be paused")
+        if not self.is_running() or self.is_paused():
+            raise ValueError("There is no running statification to pause")
+
+        # the marker is read when the process is done to keep the statification
+        self.mark_paused()
+
+        with open(self.s_pid_file) as f_pid_file:
+            i_pid = int(f_pid_file.read())
+        try:
+            # a single SIGINT make scrapy finish the current requests and persist its state before stopping,
+            # the end of the process is handled by done()
+            os.kill(i_pid, signal.SIGINT)
+            self.logger.info('The statification process is pausing')
+        except ProcessLookupError:
+            self.logger.debug('The process was already stopped')
+
+    def resume(self, session: Session) -> None:
+        """
+        Resume a paused statification process, the crawler continue where it stopped
+        @param session: the database session
+        @raise ValueError if there is no paused statification
+        @raise NoResultFound if the paused statification has been deleted
+        """
+        if not self.is_paused() or self.is_running():
+            raise ValueError("There is no paused statification to resume")
+
+        Statification.get_statification(session, '')
+
+        os.remove(os.path.join(self.s_job_directory, PAUSE_MARKER))
+
+        # the events written before the pause have been registered, the crawler write the new ones from the start
+        if self.s_events_file:
+            reset_crawl_events(self.s_events_file)
+
+        self.logger.info("Resume Statification")
+
+        # the previous statification has already been extracted if the statification is incremental
+        self.launch_crawler(self.get_incremental_args(self.get_previous_statification_sha(session)))
+
+    def launch_crawler(self, a_extra_args: List[str]) -> None:
+        """
+        Launch scrapy in background, its events are registered in the database while it's running
+        @param a_extra_args: the other arguments to give to the crawler
+        """
+        # the state of the crawl is persisted so it can be paused
+        a_job_args = ['-s', 'JOBDIR=' + self.s_job_directory] if self.s_job_directory else []
+        # the rewrite rules are given to the spider as JSON
+        a_rewrite_args = ['-a', 'url_rewrite_rules=' + json.dumps(self.a_url_rewrite_rules)] \
+            if self.a_url_rewrite_rules else []
+        # the processed contents are cached between the statifications
+        a_cache_args = ['-s', 'PROCESSED_CACHE_DIRECTORY=' + self.s_cache_directory] if self.s_cache_directory else []
+        if self.s_cache_directory and self.i_cache_max_size:
+            a_cache_args += ['-s', 'PROCESSED_CACHE_MAX_SIZE=' + str(self.i_cache_max_size)]
+
+        try:
+            # create a new environnement to call subprocess
+            new_env = os.environ.copy()
+            new_env["PYTHONPATH"] = self.s_python_path
+
+            # create a subprocess that will run scrapy in background
+            process = sh.python3('scrapy_cmd.py', 'crawl', '--loglevel=INFO',
+                                 '--logfile=' + self.s_log_file,
+                                 '-a', 'output=' + self.s_repository_path,
+                                 '-a', 'urls="' + self.s_urls + '"',
+                                 '-a', 'domains="' + self.s_domains + '"',
+                                 '-a', 'url_regex="' + self.s_url_regex + '"',
+                                 '-a', 'url_replacement="' + self.s_url_replacement + '"',
+                                 '-a', 'crawler_count_file=' + self.s_crawler_progress_counter_file,
+                                 '-a', 'validators_file=' + self.s_validators_file,
+                                 '-a', 'sanitized_file=' + self.s_sanitized_file,
+                                 '-a', 'events_file=' + self.s_events_file,
+                                 *a_job_args,
+                                 *a_rewrite_args,
+                                 *a_cache_args,
+                                 *a_extra_args,
+                                 'mirroring',
+                                 _cwd=self.s_project_directory, _env=new_env, _bg=True,
+                                 _tty_out=False, _done=self.done)
+
+            # create the pid file if it doesn't exist, erase the file if it exist
+            f_pid_file = open(self.s_pid_file, "w")
+            # write the new process pid in the file
+            f_pid_file.write(str(process.pid))
+            f_pid_file.close()
+
+            # register the events in the database while the crawler is running
+            if self.s_events_file:
+                self.events_follower = CrawlEventsFollower(self.logger.name, self.s_database_uri,
+                                                           self.s_events_file, self.i_events_interval)
+                self.events_follower.start()
+
+        except sh.ErrorReturnCode_1 as e:
+            self.logger.info(str(e))
+
+    def get_previous_statification_sha(self, session: Session) -> str:
+        """
+        Get the statification that the new statification can reuse the files of if it's incremental : the last
+        saved statification, with the validators of its files
+        @param session: the database session
+        @return the sha of the previous statification, empty if the statification can't be incremental
+        """
+        if not (self.b_incremental and self.s_previous_repository and self.s_validators_file):
+            return ''
+
+        try:
+            # get the last statification that has been archived
+            previous_statification = Statification.get_last_statification_with_status(
+                session, [Status.SAVED, Status.PRODUCTION, Status.VISUALIZED])
+        except NoResultFound:
+            self.logger.info('There is no saved statification, the statification will not be incremental')
+            return ''
+
+        # the validators of the previous statification are stored next to its log
+        if not os.path.isfile(os.path.join(self.s_log_dir, previous_statification.sha + '.validators.json')):
+            self.logger.info('There is no validators for the statification ' + previous_statification.sha +
+                             ', the statification will not be incremental')
+            return ''
+
+        return previous_statification.sha
+
+    def get_incremental_args(self, s_previous_sha: str) -> List[str]:
+        """
+        Get the arguments of the crawler needed to do an incremental statification, the previous statification must
+        have been extracted in the previous repository so the crawler can reuse the files that has not been modified
+        @param s_previous_sha: the sha of the previous statification, empty if the statification is not incremental
+        @return the list of arguments to give to the crawler
+        """
+        if not s_previous_sha:
+            return []
+
+        a_args = ['-a', 'previous_output=' + self.s_previous_repository,
+                  '-a', 'previous_validators=' + os.path.join(self.s_log_dir, s_previous_sha + '.validators.json')]
+
+        # the PDF files already sanitized by the previous statification are reused even if their url has changed
+        s_previous_sanitized = os.path.join(self.s_log_dir, s_previous_sha + '.sanitized.json')
+        if os.path.isfile(s_previous_sanitized):
+            a_args += ['-a', 'previous_sanitized=' + s_previous_sanitized]
+        return a_args
+
+    def extract_and_launch_crawler(self, s_previous_sha: str) -> None:
+        """
+        Extract the previous statification then launch the crawler of an incremental statification, it's executed
+        in the preparation thread
+        @param s_previous_sha: the sha of the previous statification
+        """
+        # the thread need its own session
+        session = open_session_db(self.s_database_uri)
+        try:
+            self.logger.info('> Extract the statification ' + s_previous_sha + ' for incremental crawl')
+            try:
+                # extract the previous statification, its files will be linked to the new one if they are not modified
+                service_do_clean_directory(self.s_previous_repository)
+                extract_archive_to_directory(s_previous_sha, self.s_archive_repository, self.s_previous_repository)
+                a_args = self.get_incremental_args(s_previous_sha)
+            except Exception as e:
+                self.logger.error('The statification ' + s_previous_sha + ' could not be extracted, the statification '
+                                  'will not be incremental : ' + str(e))
+                a_args = []
+
+            try:
+                # the statification may have been stopped during the extraction
+                Statification.get_statification(session, '')
+            except NoResultFound:
+                self.logger.info('The statification has been stopped before the crawler was launched')
+                self.release_lock()
+                return
+
+            try:
+                self.launch_crawler(a_args)
+            except Exception as e:
+                # there is no crawler to release the lock when it's done
+                self.logger.error('The crawler could not be launched : ' + str(e))
+                self.stop(session)
+                self.release_lock()
+        finally:
+            session.close()
+
     def delete_files(self):
         """
         Delete the list of files passed in parameter
@@ -299,8 +595,8 @@ class StatificationProcess:
 
     def register_error_in_database(self, session: Session):
         """
-        This methode create database object associated to the statification with the result of the log
-        that scrapy has generated.
+        This methode create database object associated to the statification with the events
+        that the crawler has written.
         @param session
         @raise NoResultFound if there is no statification with empty sha
         """
@@ -313,114 +609,12 @@ class StatificationProcess:
         # get the statification with empty sha
         statification = Statification.get_statification(session, '')
 
-        # open the log file that contain scrapy errors
-        f_file = open(self.s_log_file)
-
-        expecting_other_line_for_error_message = False
-        s_error_message = ''
-
-        # for each line will look for information that will be used to fill object of the database
-        for line in f_file:
-
-            # check if the line contain a warning or a info
-            if re.match('(.*)WARNING(.*)', line) or re.match('(.*)INFO(.*)', line) or re.match('(.*) ERROR:(.*)', line):
-                expecting_other_line_for_error_message = False
-
-            if expecting_other_line_for_error_message:
-                s_error_message += line
-
-            if (not expecting_other_line_for_error_message) and s_error_message != '':
-                statification.add_object_to_statification(ScrapyError, session, s_error_message)
-                s_error_message = ''
-
-            # in the case the line match an External link
-            if re.match('(.*) INFO: External link detected(.*)', line):
-                # we get the second part of the line there are also [] in the first part
-                s_trunked_line = line[line.index('INFO: External link detected'):len(line)]
-
-                # we get the position of begining of the URL
-                i_start_url = s_trunked_line.index('[')
-                # we ge the position of the end of the URL
-                i_end_url = s_trunked_line.index(']')
-                # we get the position of the begining of the source url
-                i_start_source = s_trunked_line.index(' in ') + 4
-
-                try:
-                    # we create and add a new ExtenalLink to our statification
-                    statification.add_object_to_statification(
-                        ExternalLink,
-                        session,
-                        s_trunked_line[i_start_source: len(s_trunked_line)],
-                        s_trunked_line[i_start_url + 1:i_end_url]
-                    )
-                except ValueError as e:
-                    self.logger.info(e)
-            # in the case the line match a Scrapy Error
-            elif re.match('(.*) ERROR:(.*)', line):
-                expecting_other_line_for_error_message = True
-                # retrieve the Scrapy Error
-                s_trunked_line = line[line.index('ERROR: ') + 7: len(line)]
-                s_error_message += s_trunked_line
-
-            # in the case the line match an error for type MIME
-            elif re.match('(.*) WARNING: Forbidden content (.*)', line):
-
-                # we get the second part of the line where begin the information that interest us
-                s_trunked_line = line[line.index('WARNING: Forbidden content '):len(line)]
-
-                # get the starting position of the Error type MIME
-                i_start_error_mime = s_trunked_line.index('[')
-                # get the end position of the error type MIME
-                i_end_error_mime = s_trunked_line.index(']')
-                # get the error type MIME
-                s_error_mime = s_trunked_line[i_start_error_mime + 1: i_end_error_mime]
-                # get the source of the error
-                s_source_link = s_trunked_line[s_trunked_line.index('detected in') + 12: len(s_trunked_line)]
-
-                try:
-                    # create an ErrorTypeMIME associated to the statification
-                    statification.add_object_to_statification(ErrorTypeMIME, session, s_error_mime, s_source_link)
-                except ValueError as e:
-                    self.logger.info(e)
-            # in the case the line match an HTTP error
-            elif re.match('(.*) WARNING: HTTP error (.*)', line):
-
-                # we get the second part of the line where begin the information that interest us
-                s_trunked_line = line[line.index('WARNING: HTTP error '):len(line)]
-
-                # we get the starting position of the Error Code
-                i_start_error_code = s_trunked_line.index('[')
-                # we get the end position of the Error Code
-                i_end_error_code = s_trunked_line.index(']')
-                # we get the start position of the url source of the error
-                i_start_url = s_trunked_line.index(' for ')
-                # we get the end position of the url source of the error
-                i_end_url = s_trunked_line.index(' from ')
-
-                # we retrieve the error code
-                s_error_code = s_trunked_line[i_start_error_code + 1: i_end_error_code]
-
-                # we retrieve the url that cause the error
-                s_url = s_trunked_line[i_start_url + 5: i_end_url]
-
-                # we retrieve the url of the source where was found the url that caused the error
-                s_url_source = s_trunked_line[i_end_url + 6: len(s_trunked_line) - 1]
-
-                try:
-                    # we create a new HtmlError associated to the statification
-                    statification.add_object_to_statification(HtmlError, session, s_error_code, s_url, s_url_source)
-                except ValueError as e:
-                    self.logger.info(e)
-            elif re.match('(.*)response_received_count(.*)', line):
-
-                # we get the second part of the line where begin the information that interest us
-                s_value_item_scraped_count = line[line.index(': ') + 2:line.index(',')]
+        try:
+            # fill the database with the events written by the crawler that have not been registered yet
+            follow_crawl_events(session, statification, self.s_events_file)
+        except FileNotFoundError:
+            self.logger.info('There is no crawl events file')
 
-                try:
-                    # set the number of crawled item into the statification object
-                    statification.upd_nb_item(session, statification.sha, int(s_value_item_scraped_count))
-                except ValueError as e:
-                    self.logger.info(e)
         try:
             # retrieve the list of type file with number of file for each type
             s_result_type_files = sh.uniq(
@@ -432,28 +626,19 @@ class StatificationProcess:
             # here we get a table made of each line returned, we remove all space
             a_table_result_type_files = s_result_type_files.replace(' ', '').split('\n')
 
+            a_scanned_files = []
             # browse the line of result
             for row in a_table_result_type_files:
                 if row:
                     # a line is composed of a number followed by a type like "42.png",
                     # we separate the number and the type
                     s_type_file = row.split('.')
+                    a_scanned_files.append((s_type_file[1], int(s_type_file[0])))
 
-                    try:
-                        # create a new ScannedFile associated to the statificaiton
-                        statification.add_object_to_statification(
-                            ScannedFile,
-                            session,
-                            s_type_file[1],
-                            int(s_type_file[0])
-                        )
-                    except ValueError as e:
-                        self.logger.info(e)
+            # create the new ScannedFile associated to the statification
+            statification.add_list_of_objects_to_statification(ScannedFile, session, a_scanned_files)
         except sh.ErrorReturnCode_1:
             self.logger.info('There is no folder in the static repository')
-        finally:
-            # in all case we need to close the file
-            f_file.close()
 
         # change the status of the statification (NEED TO BE DONE AT THE END !!)
         statification.upd_status(session, '', Status.STATIFIED)
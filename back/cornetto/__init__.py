@@ -26,6 +26,7 @@ from flask import Flask
 from typing import Dict, Any
 
 from cornetto import StatificationProcess
+from cornetto.status_events import StatusBroadcaster
 from cornetto.views import bp as cornetto
 from cornetto.models import db
 
@@ -101,6 +102,12 @@ def verify_directories_exist(app: Flask):
     if not os.path.isdir(app.config['PROJECT_DIRECTORY']):
         raise NotADirectoryError('Directory '+ app.config['PROJECT_DIRECTORY'] + ' does not exist.')
 
+    if app.config.get('INCREMENTAL_STATIFICATION') and not os.path.isdir(app.config['PREVIOUS_REPOSITORY']):
+        raise NotADirectoryError('Directory ' + app.config['PREVIOUS_REPOSITORY'] + ' does not exist.')
+
+    if app.config.get('PUSH_TO_PROD_DIRECTORY') and not os.path.isdir(app.config['PUSH_TO_PROD_DIRECTORY']):
+        raise NotADirectoryError('Directory ' + app.config['PUSH_TO_PROD_DIRECTORY'] + ' does not exist.')
+
     if not os.path.isfile(app.config['PUSH_TO_PROD_SCRIPT']):
         raise FileNotFoundError('THe file ' + app.config['PUSH_TO_PROD_SCRIPT'] + ' does not exist.')
 
@@ -151,9 +158,24 @@ def create_app(config_file_path: str = None, config_dict: Dict[str, Any] = None)
         s_delete_directories=app.config['DELETE_DIRECTORIES'],
         s_url_regex=app.config['URL_REGEX'],
         s_url_replacement=app.config['URL_REPLACEMENT'],
-        s_database_uri=app.config['DATABASE_URI']
+        s_database_uri=app.config['DATABASE_URI'],
+        b_incremental=app.config.get('INCREMENTAL_STATIFICATION', False),
+        s_archive_repository=app.config['ARCHIVE_REPOSITORY'],
+        s_previous_repository=app.config.get('PREVIOUS_REPOSITORY', ''),
+        s_log_dir=app.config['LOGDIR'],
+        s_validators_file=app.config.get('VALIDATORS_FILE', ''),
+        s_events_file=app.config.get('CRAWL_EVENTS_FILE', ''),
+        i_events_interval=app.config.get('CRAWL_EVENTS_INTERVAL', 5),
+        s_job_directory=app.config.get('JOB_DIRECTORY', ''),
+        a_url_rewrite_rules=app.config.get('URL_REWRITE_RULES', []),
+        s_sanitized_file=app.config.get('SANITIZED_FILE', ''),
+        s_cache_directory=app.config.get('PROCESSED_CACHE_DIRECTORY', ''),
+        i_cache_max_size=app.config.get('PROCESSED_CACHE_MAX_SIZE', 0)
     )
 
+    # a single thread compute the status pushed to the clients connected to /api/statification/events
+    app.statusBroadcaster = StatusBroadcaster(app, app.config.get('STATUS_EVENTS_INTERVAL', 2))
+
     app.register_blueprint(cornetto)
     db.create_all(app=app)
 
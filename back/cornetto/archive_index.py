@@ -0,0 +1,146 @@
+# coding=utf-8
+"""
+Cornetto
+
+Copyright (C) 2018–2020 ANSSI
+Contributors:
+2018–2020 Bureau Applicatif tech-sdn-app@ssi.gouv.fr
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+"""
+# The index of a statification give for each of its files where the content can be read without extracting the
+# statification : the path of a file, the offset of the content in that file and its size.
+# The statifications stored in the snapshot store are indexed by their manifest, the uncompressed archives by a
+# <sha>.index file written at the same time as the archive : {"index.html": [offset, size], ...}
+# The compressed archives can't be read at random so they are not indexed.
+
+import functools
+import json
+import os
+import tarfile
+from typing import BinaryIO, Dict, Iterator, Optional, Tuple
+
+from cornetto.snapshot_store import is_snapshot, read_manifest, get_object_path
+
+INDEX_EXTENSION = '.index'
+
+# the size of the blocks read from the archive
+BLOCK_SIZE = 64 * 1024
+
+# ====================
+# Archive index Utilities
+# ====================
+
+
+def get_index_path(s_archive_sha: str, s_archive_repository: str) -> str:
+    """
+    Get the path to the index of an archive
+    @param s_archive_sha: the sha of the archive
+    @param s_archive_repository: the path to the archive directory
+    @return the path to the index
+    """
+    return os.path.join(s_archive_repository, s_archive_sha + INDEX_EXTENSION)
+
+
+def build_archive_index(s_archive_sha: str, s_archive_path: str, s_archive_repository: str) -> None:
+    """
+    Write the index of an uncompressed archive, only the headers of the archive are read
+    @param s_archive_sha: the sha of the archive
+    @param s_archive_path: the path to the archive
+    @param s_archive_repository: the path to the archive directory
+    """
+    index = {}
+    with tarfile.open(s_archive_path, 'r:') as f_tar:
+        for member in f_tar:
+            # the first directory of the archive is removed, like when the archive is extracted
+            a_parts = member.name.split('/', 1)
+            if member.isfile() and len(a_parts) == 2:
+                index[a_parts[1]] = [member.offset_data, member.size]
+
+    s_index_path = get_index_path(s_archive_sha, s_archive_repository)
+    with open(s_index_path + '.tmp', 'w', encoding='utf-8') as f_index:
+        json.dump(index, f_index)
+    os.replace(s_index_path + '.tmp', s_index_path)
+
+
+def is_indexed(s_archive_sha: str, s_archive_repository: str) -> bool:
+    """
+    Check if the files of a statification can be read without extracting it
+    @param s_archive_sha: the sha of the statification
+    @param s_archive_repository: the path to the archive directory
+    @return True if the statification is in the snapshot store or if its archive is indexed
+    """
+    return is_snapshot(s_archive_sha, s_archive_repository) or os.path.isfile(
+        get_index_path(s_archive_sha, s_archive_repository))
+
+
+@functools.lru_cache(maxsize=8)
+def load_index(s_archive_sha: str, s_archive_repository: str) -> Optional[Dict[str, Tuple[str, int, int]]]:
+    """
+    Load the index of a statification, the statifications never change so the last indexes are kept in memory
+    @param s_archive_sha: the sha of the statification
+    @param s_archive_repository: the path to the archive directory
+    @return a dict indexed by the path of the files, the values are the path of the file that contain the content,
+            the offset of the content and its size. None if the statification isn't indexed
+    """
+    if is_snapshot(s_archive_sha, s_archive_repository):
+        return {entry['path']: (get_object_path(entry['hash'], s_archive_repository), 0, entry['size'])
+                for entry in read_manifest(s_archive_sha, s_archive_repository)}
+
+    try:
+        with open(get_index_path(s_archive_sha, s_archive_repository), encoding='utf-8') as f_index:
+            index = json.load(f_index)
+    except FileNotFoundError:
+        return None
+
+    # the archive is uncompressed, its name is the sha followed by .tar
+    s_archive_path = os.path.join(s_archive_repository, s_archive_sha + '.tar')
+    return {s_path: (s_archive_path, i_offset, i_size) for s_path, (i_offset, i_size) in index.items()}
+
+
+class ContentReader:
+    """
+    File object that read a content indexed in a file
+    """
+
+    def __init__(self, f_file: BinaryIO, i_offset: int, i_size: int) -> None:
+        """
+        @param f_file: the file that contain the content
+        @param i_offset: the offset of the content
+        @param i_size: the size of the content
+        """
+        f_file.seek(i_offset)
+        self.f_file = f_file
+        self.i_remaining = i_size
+
+    def read(self, i_size: int = -1) -> bytes:
+        if i_size < 0 or i_size > self.i_remaining:
+            i_size = self.i_remaining
+        data = self.f_file.read(i_size)
+        self.i_remaining -= len(data)
+        return data
+
+
+def read_content(s_file: str, i_offset: int, i_size: int) -> Iterator[bytes]:
+    """
+    Read a content indexed in a file
+    @param s_file: the path to the file
+    @param i_offset: the offset of the content
+    @param i_size: the size of the content
+    @return an iterator on the blocks of the content
+    """
+    with open(s_file, 'rb') as f_file:
+        f_file.seek(i_offset)
+        while i_size > 0:
+            block = f_file.read(min(BLOCK_SIZE, i_size))
+            if not block:
+                break
+            i_size -= len(block)
+            yield block
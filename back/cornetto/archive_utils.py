@@ -15,68 +15,315 @@ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
 GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 """
+import gzip
+import hashlib
+import lzma
 import os
-from sh import tar, shasum, rm, scp, bash
+import tarfile
+import tempfile
+from typing import Any, BinaryIO, Dict, Iterator, List, Set, Tuple
+
+from sh import tar, bash
 import logging
 
+from cornetto.archive_index import build_archive_index, load_index, ContentReader
+from cornetto.snapshot_store import is_snapshot, list_snapshot_shas, extract_snapshot_to_directory, write_manifest
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
 logger = logging.getLogger('cornetto')
 
+# the extension of the archives for each codec, the first one is the default codec
+ARCHIVE_EXTENSIONS = {
+    'gzip': '.tar.gz',
+    'xz': '.tar.xz',
+    'zstd': '.tar.zst',
+    'none': '.tar'
+}
+
+# the extension of the manifest of the files of an archive
+FILES_MANIFEST_EXTENSION = '.files'
+
+# the magic number of the zstd frames
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+# the size of the blocks written in the archive
+BLOCK_SIZE = 1024 * 1024
+
 # =================
 # Archive Utilities
 # =================
 
 
-def create_archive_and_rename_to_sha(s_static_repository: str,
-                                     s_archive_repository: str) -> str:
+class HashingWriter:
+    """
+    File object that compute the sha of the data while writing it in a file
+    """
+
+    def __init__(self, f_file: BinaryIO) -> None:
+        """
+        @param f_file: the file where the data is written
+        """
+        self.f_file = f_file
+        self.sha = hashlib.sha1()
+
+    def write(self, data: bytes) -> int:
+        self.sha.update(data)
+        return self.f_file.write(data)
+
+    def flush(self) -> None:
+        self.f_file.flush()
+
+    def hexdigest(self) -> str:
+        return self.sha.hexdigest()
+
+
+class HashingReader:
+    """
+    File object that compute the sha256 of the data while reading it from a file
+    """
+
+    def __init__(self, f_file: BinaryIO) -> None:
+        """
+        @param f_file: the file where the data is read
+        """
+        self.f_file = f_file
+        self.sha = hashlib.sha256()
+
+    def read(self, i_size: int = -1) -> bytes:
+        data = self.f_file.read(i_size)
+        self.sha.update(data)
+        return data
+
+    def hexdigest(self) -> str:
+        return self.sha.hexdigest()
+
+
+def add_directory_to_tar(f_tar: tarfile.TarFile, s_directory: str, s_arcname: str) -> List[Dict[str, Any]]:
+    """
+    Add a directory to an archive, the files are hashed while they are written in the archive
+    @param f_tar: the archive
+    @param s_directory: the path to the directory
+    @param s_arcname: the name of the directory in the archive
+    @return the entries of the manifest of the files of the directory
+    """
+    a_entries = []
+    for s_root, a_directories, a_files in os.walk(s_directory):
+        s_relative_root = os.path.relpath(s_root, s_directory)
+        f_tar.add(s_root, arcname=os.path.normpath(os.path.join(s_arcname, s_relative_root)), recursive=False)
+
+        # the links to a directory are added as links
+        a_links = [s_name for s_name in a_directories if os.path.islink(os.path.join(s_root, s_name))]
+        a_directories[:] = sorted(set(a_directories) - set(a_links))
+
+        for s_name in sorted(a_files + a_links):
+            s_path = os.path.join(s_root, s_name)
+            s_relative_path = os.path.normpath(os.path.join(s_relative_root, s_name))
+            tarinfo = f_tar.gettarinfo(s_path, arcname=os.path.join(s_arcname, s_relative_path))
+            if not tarinfo.isreg():
+                f_tar.addfile(tarinfo)
+                continue
+            with open(s_path, 'rb') as f_file:
+                f_hashing = HashingReader(f_file)
+                f_tar.addfile(tarinfo, f_hashing)
+            a_entries.append({'path': s_relative_path, 'hash': f_hashing.hexdigest(), 'size': tarinfo.size,
+                              'mode': tarinfo.mode & 0o777})
+    return a_entries
+
+
+def open_compressor(f_file: HashingWriter, s_codec: str, i_level: int, i_threads: int) -> BinaryIO:
+    """
+    Open a stream that compress the data written in it with the given codec
+    @param f_file: the file where the compressed data is written
+    @param s_codec: the codec, one of ARCHIVE_EXTENSIONS
+    @param i_level: the level of compression
+    @param i_threads: the number of threads used to compress, only used by zstd
+    @return the stream, it should be closed to flush the compressed data
+    """
+    if s_codec == 'gzip':
+        # the mtime is fixed so the same content give the same sha
+        return gzip.GzipFile(fileobj=f_file, mode='wb', compresslevel=i_level, mtime=0)
+    if s_codec == 'xz':
+        return lzma.LZMAFile(f_file, 'wb', preset=i_level)
+    if s_codec == 'zstd':
+        return zstandard.ZstdCompressor(level=i_level, threads=i_threads).stream_writer(f_file, closefd=False)
+    # no compression, the tar is written in the file directly
+    return f_file
+
+
+def get_archive_codec(s_codec: str) -> str:
+    """
+    Get the codec that will be used to create an archive
+    @param s_codec: the wanted codec
+    @return the codec, gzip if the wanted codec is not available
+    """
+    if s_codec not in ARCHIVE_EXTENSIONS:
+        logger.warning('Unknown archive codec ' + s_codec + ', gzip will be used')
+        return 'gzip'
+    if s_codec == 'zstd' and zstandard is None:
+        logger.warning('The zstandard module is not installed, gzip will be used')
+        return 'gzip'
+    return s_codec
+
+
+def create_archive_and_rename_to_sha(s_static_repository: str, s_archive_repository: str, s_codec: str = 'gzip',
+                                     i_level: int = 6, i_threads: int = 0) -> str:
     """
-    Create a new .tar.gz archive from the given s_static_repository.
+    Create a new compressed tar archive from the given s_static_repository, the sha of the archive is computed
+    while it is written.
 
     The archive is renamed with the sha and is moved to the s_archive_repository
     @param s_static_repository: the path to the directory of the statification
     @param s_archive_repository: the path to the directory that contain all the archive
+    @param s_codec: the compression of the archive : gzip, xz, zstd or none
+    @param i_level: the level of compression
+    @param i_threads: the number of threads used to compress, only used by zstd (0 to disable, -1 for all cpus)
     @return: the sha of the created archive
     """
-    logger.info('> Create the statification archive')
-
-    for log in tar(
-            '-cf',
-            'archive.tar.gz',
-            '-C',
-            # get the parent directory of s_static_repository
-            os.path.abspath(os.path.join(s_static_repository, os.pardir)),
-            # get the last directory of the path s_static_repository
-            os.path.basename(os.path.normpath(s_static_repository)),
-            _cwd='/tmp/',
-            _tty_out=False,
-            _iter='err'):
-        # if there are error logs
-        logger.error(log)
+    s_codec = get_archive_codec(s_codec)
+
+    logger.info('> Create the statification archive and its sha')
 
-    logger.info('> Create the statification archive sha')
+    # the archive is written in a unique temporary file of the archive directory,
+    # so two archives can be created at the same time and the final rename is atomic
+    i_fd, s_tmp_archive = tempfile.mkstemp(prefix='.archive-', suffix='.tmp', dir=s_archive_repository)
+    try:
+        with os.fdopen(i_fd, 'wb') as f_archive:
+            f_hashing = HashingWriter(f_archive)
+            f_compressor = open_compressor(f_hashing, s_codec, i_level, i_threads)
+            try:
+                with tarfile.open(fileobj=f_compressor, mode='w|', bufsize=BLOCK_SIZE) as f_tar:
+                    # the archive contain the last directory of the path s_static_repository
+                    a_entries = add_directory_to_tar(f_tar, s_static_repository,
+                                                     os.path.basename(os.path.normpath(s_static_repository)))
+            finally:
+                if f_compressor is not f_hashing:
+                    f_compressor.close()
 
-    if not os.path.isfile('/tmp/archive.tar.gz'):
-        raise RuntimeError('The archive.tar.gz file does\'nt exist')
+        s_archive_sha = f_hashing.hexdigest()
 
-    s_archive_sha = ''
-    for resultShasum in shasum('archive.tar.gz', _cwd='/tmp/', _tty_out=False, _iter='out'):
-        s_archive_sha = resultShasum.split(' ')[0]
+        logger.info('> Rename the archive and move it to the archive directory')
+        s_archive_path = os.path.join(s_archive_repository, s_archive_sha + ARCHIVE_EXTENSIONS[s_codec])
+        os.replace(s_tmp_archive, s_archive_path)
 
-    if s_archive_sha is None:
-        raise RuntimeError('The sha is empty')
+        # the manifest of the files is used to push only the modified files to production
+        write_manifest(a_entries, get_files_manifest_path(s_archive_sha, s_archive_repository))
 
-    logger.info('> Rename the archive and move it to the archive directory')
-    os.rename('/tmp/archive.tar.gz', s_archive_repository + "/" + s_archive_sha + ".tar.gz")
+        # an uncompressed archive can be read at random, its files can be visualized without extracting it
+        if s_codec == 'none':
+            build_archive_index(s_archive_sha, s_archive_path, s_archive_repository)
+    except OSError as e:
+        if os.path.isfile(s_tmp_archive):
+            os.remove(s_tmp_archive)
+        raise RuntimeError('The archive could not be created : ' + str(e))
 
     return s_archive_sha
 
 
-def execute_the_push_to_prod_script(s_archive_sha, s_path_to_the_push_to_prod_script: str):
+def list_archive_shas(s_archive_repository: str) -> List[str]:
+    """
+    Get the sha of all the archives and snapshots of the archive directory
+    @param s_archive_repository: the path to the directory that contain all the archive
+    @return the list of sha
+    """
+    a_list_sha = list_snapshot_shas(s_archive_repository)
+    for s_filename in os.listdir(s_archive_repository):
+        if os.path.isfile(os.path.join(s_archive_repository, s_filename)):
+            for s_extension in ARCHIVE_EXTENSIONS.values():
+                # remove the extension in the filename and add it to the list
+                if s_filename.endswith(s_extension):
+                    a_list_sha.append(s_filename[:-len(s_extension)])
+                    break
+    return a_list_sha
+
+
+def get_archive_path(s_archive_sha: str, s_archive_repository: str) -> str:
+    """
+    Get the path to the archive that have the given sha, whatever its codec
+    @param s_archive_sha: the sha of the archive
+    @param s_archive_repository: the path to the directory that contain all the archive
+    @return the path to the archive
+    @raise FileNotFoundError if there is no archive with this sha
+    """
+    for s_extension in ARCHIVE_EXTENSIONS.values():
+        s_archive_path = os.path.join(s_archive_repository, s_archive_sha + s_extension)
+        if os.path.isfile(s_archive_path):
+            return s_archive_path
+    raise FileNotFoundError('There is no archive for the sha ' + s_archive_sha)
+
+
+def get_files_manifest_path(s_archive_sha: str, s_archive_repository: str) -> str:
+    """
+    Get the path to the manifest of the files of an archive
+    @param s_archive_sha: the sha of the archive
+    @param s_archive_repository: the path to the directory that contain all the archive
+    @return the path to the manifest
+    """
+    return os.path.join(s_archive_repository, s_archive_sha + FILES_MANIFEST_EXTENSION)
+
+
+def iter_archive_members(s_archive_path: str) -> Iterator[Tuple[str, tarfile.TarInfo, tarfile.TarFile]]:
+    """
+    Read all the members of an archive in one pass, whatever its codec
+    @param s_archive_path: the path to the archive
+    @return an iterator on the path of the members without the first directory, the members and the archive
+            to extract them
+    """
+    with open(s_archive_path, 'rb') as f_archive:
+        if f_archive.read(4) == ZSTD_MAGIC:
+            if zstandard is None:
+                raise RuntimeError('The zstandard module is needed to read the archive ' + s_archive_path)
+            f_archive.seek(0)
+            f_stream = zstandard.ZstdDecompressor().stream_reader(f_archive)
+            s_mode = 'r|'
+        else:
+            f_archive.seek(0)
+            f_stream = f_archive
+            # tarfile detect gzip, xz or no compression
+            s_mode = 'r|*'
+        with tarfile.open(fileobj=f_stream, mode=s_mode, bufsize=BLOCK_SIZE) as f_tar:
+            for member in f_tar:
+                a_parts = member.name.split('/', 1)
+                if len(a_parts) == 2:
+                    yield a_parts[1], member, f_tar
+
+
+def iter_statification_files(s_archive_sha: str, s_archive_repository: str,
+                             a_paths: Set[str]) -> Iterator[Tuple[str, BinaryIO]]:
+    """
+    Read some files of a statification, the statification is read only once
+    @param s_archive_sha: the sha of the statification
+    @param s_archive_repository: the path to the directory that contain all the archive
+    @param a_paths: the path of the wanted files
+    @return an iterator on the path and the content of the files
+    """
+    index = load_index(s_archive_sha, s_archive_repository)
+    if index is not None:
+        # the statification can be read at random
+        for s_path in sorted(a_paths):
+            if s_path in index:
+                s_file, i_offset, i_size = index[s_path]
+                with open(s_file, 'rb') as f_file:
+                    yield s_path, ContentReader(f_file, i_offset, i_size)
+        return
+
+    for s_path, member, f_tar in iter_archive_members(get_archive_path(s_archive_sha, s_archive_repository)):
+        if member.isfile() and s_path in a_paths:
+            yield s_path, f_tar.extractfile(member)
+
+
+def execute_the_push_to_prod_script(s_archive_sha, s_path_to_the_push_to_prod_script: str, *a_delta_files: str):
     """
     This method will execute the script that will push the wanted statification archive to the production server
     @param s_archive_sha:
     @param s_path_to_the_push_to_prod_script
+    @param a_delta_files: the path to the archive of the added and changed files, and the path to the file that list
+                          the removed files, they are given to the script after the sha
     """
-    for log in bash(s_path_to_the_push_to_prod_script, s_archive_sha,  _tty_out=False, _iter=True):
+    for log in bash(s_path_to_the_push_to_prod_script, s_archive_sha, *a_delta_files, _tty_out=False, _iter=True):
         logger.info(log)
 
 
@@ -87,7 +334,13 @@ def extract_archive_to_directory(s_archive_sha, s_path_to_archive_directory, s_p
     @param s_path_to_archive_directory: the path to archive directory
     @param s_path_to_destination_directory: the path to the directory where to extract the archive
     """
-    s_archive_path = os.path.join(s_path_to_archive_directory, s_archive_sha+'.tar.gz')
+    # the statification has been saved in the snapshot store
+    if is_snapshot(s_archive_sha, s_path_to_archive_directory):
+        extract_snapshot_to_directory(s_archive_sha, s_path_to_archive_directory, s_path_to_destination_directory)
+        return
+
+    s_archive_path = get_archive_path(s_archive_sha, s_path_to_archive_directory)
+    # tar detect the compression of the archive
     for log in tar('-xf', s_archive_path, '-C', s_path_to_destination_directory, '--strip-components=1', _cwd=s_path_to_archive_directory,
                    _tty_out=False, _iter='err'):
         logger.error(log)
@@ -17,16 +17,24 @@ You should have received a copy of the GNU General Public License
 """
 import logging
 import os
+import tempfile
 
 from datetime import datetime
 
+from sqlalchemy.orm import Session
 from sqlalchemy.orm.exc import NoResultFound
+from typing import Any, Dict, List, Tuple
 
 from cornetto.models import StatificationHistoric, Actions, open_session_db
 from cornetto.models.Statification import Statification, Status
 from cornetto.models.StatificationHistoric import StatificationHistoric
 from cornetto.archive_utils import extract_archive_to_directory, execute_the_push_to_prod_script, \
     create_archive_and_rename_to_sha
+from cornetto.archive_index import is_indexed
+from cornetto.manifest_utils import get_file_manifest, compute_delta, write_delta, apply_delta_to_directory, \
+    compute_directory_delta, read_directory_sha, write_directory_sha
+from cornetto.snapshot_store import create_snapshot
+from cornetto.visualize import write_visualize_pointer
 from cornetto.service_utils import write_status_background, unlock_access, service_do_clean_directory
 
 logger = logging.getLogger('cornetto')
@@ -39,7 +47,9 @@ logger = logging.getLogger('cornetto')
 
 def bg_save_to_archive(s_user: str, s_archive_repository: str,
                        s_static_repository: str, s_log_file: str, s_log_dir: str, s_lock_file: str,
-                       s_file_status_background: str, s_database_uri: str):
+                       s_file_status_background: str, s_database_uri: str, s_validators_file: str = '',
+                       s_events_file: str = '', s_archive_codec: str = 'gzip', i_archive_level: int = 6,
+                       i_archive_threads: int = 0, s_archive_backend: str = 'tar', s_sanitized_file: str = ''):
     """
     This method create a new archive with the content of the statification directory.
     @param s_user: the name of the user doing the operation
@@ -50,18 +60,49 @@ def bg_save_to_archive(s_user: str, s_archive_repository: str,
     @param s_lock_file: the path to the lock file
     @param s_file_status_background: the path to the file that contain the background process status
     @param s_database_uri: the uri of the database
+    @param s_validators_file: the path to the file containing the validators (ETag, Last-Modified) of the crawl
+    @param s_events_file: the path to the file containing the events of the crawl
+    @param s_archive_codec: the compression of the archive : gzip, xz, zstd or none
+    @param i_archive_level: the level of compression of the archive
+    @param i_archive_threads: the number of threads used to compress the archive, only used by zstd
+    @param s_archive_backend: tar to create an archive, cas to store the files in the snapshot store
+    @param s_sanitized_file: the path to the file containing the sha256 of the PDF files sanitized by the crawl
     """
     try:
         # create a session for this specific code , because it's executed after the flask instance has been killed
         session = open_session_db(s_database_uri)
 
-        s_archive_sha = create_archive_and_rename_to_sha(s_static_repository, s_archive_repository)
+        if s_archive_backend == 'cas':
+            try:
+                # only the files modified since the last save are stored
+                s_archive_sha = create_snapshot(s_static_repository, s_archive_repository)
+            except OSError as e:
+                raise RuntimeError('The snapshot could not be created : ' + str(e))
+        else:
+            s_archive_sha = create_archive_and_rename_to_sha(s_static_repository, s_archive_repository,
+                                                             s_archive_codec, i_archive_level, i_archive_threads)
+
+        # the files of another statification must not be overwritten, the sha is unique in the database
+        if session.query(Statification).filter(Statification.sha == s_archive_sha).count():
+            raise RuntimeError('A statification with the sha ' + s_archive_sha + ' already exists')
 
         logger.info('> Rename log file with the archive sha')
 
         # rename the logfile of the statification by the archive SHA
         os.rename(s_log_file, s_log_dir + "/" + s_archive_sha + ".log")
 
+        # keep the validators of the statification next to its log, they are used by the next incremental crawl
+        if s_validators_file and os.path.isfile(s_validators_file):
+            os.rename(s_validators_file, s_log_dir + "/" + s_archive_sha + ".validators.json")
+
+        # keep the sha256 of the sanitized PDF files next to its log, they are reused by the next incremental crawl
+        if s_sanitized_file and os.path.isfile(s_sanitized_file):
+            os.rename(s_sanitized_file, s_log_dir + "/" + s_archive_sha + ".sanitized.json")
+
+        # keep the events of the crawl next to its log
+        if s_events_file and os.path.isfile(s_events_file):
+            os.rename(s_events_file, s_log_dir + "/" + s_archive_sha + ".events.jsonl")
+
         logger.info('> Register the Sha into the database')
 
         # update the current statification with no sha with the new sha
@@ -128,11 +169,50 @@ def bg_save_to_archive(s_user: str, s_archive_repository: str,
         unlock_access(s_lock_file)
 
 
+def get_delta_with_production(session: Session, s_archive_sha: str, s_archive_repository: str,
+                              s_push_to_prod_directory: str = '') \
+        -> Tuple[Dict[str, List[str]], Dict[str, Dict[str, Any]]]:
+    """
+    Compute the delta between a statification and the statification currently in production
+    @param session: the database session
+    @param s_archive_sha: the sha of the statification to push to production
+    @param s_archive_repository: the path to the archive directory
+    @param s_push_to_prod_directory: the path to the local directory where the statification is pushed, if the
+                                     directory doesn't hold the statification in production the delta replace all
+                                     its content
+    @return the delta and the manifest of the statification
+    """
+    manifest = get_file_manifest(s_archive_sha, s_archive_repository)
+
+    s_production_sha = ''
+    production_manifest = {}
+    try:
+        s_production_sha = Statification.get_last_statification_with_status(session, [Status.PRODUCTION]).sha
+        production_manifest = get_file_manifest(s_production_sha, s_archive_repository)
+    except NoResultFound:
+        logger.info('There is no statification in production, all the files are pushed')
+    except FileNotFoundError:
+        s_production_sha = ''
+        logger.info('The statification in production is not archived anymore, all the files are pushed')
+
+    if s_push_to_prod_directory and (not s_production_sha
+                                     or read_directory_sha(s_push_to_prod_directory) != s_production_sha):
+        # the directory may contain anything, its files are all replaced and the files that are not in the
+        # statification are removed
+        logger.info('The directory ' + s_push_to_prod_directory +
+                    ' doesn\'t hold the statification in production, all its content is replaced')
+        return compute_directory_delta(manifest, s_push_to_prod_directory), manifest
+
+    return compute_delta(manifest, production_manifest), manifest
+
+
 def bg_extract_archive_to_prod(s_archive_sha: str, s_user: str, s_path_to_the_push_to_prod_script: str,
                                s_file_status_background: str, s_lock_file: str,
-                               s_database_uri: str):
+                               s_database_uri: str, s_archive_repository: str = '',
+                               s_push_to_prod_directory: str = ''):
     """
     This method will execute the script to push to production an archive of a statification.
+    Only the files added, changed and removed since the statification currently in production are pushed.
     @param s_archive_sha: the sha of the archive to push to production
     @param s_user: the name of the user doing the operation
     @param s_path_to_the_push_to_prod_script: the path to the script that will manage the deployment
@@ -140,14 +220,40 @@ def bg_extract_archive_to_prod(s_archive_sha: str, s_user: str, s_path_to_the_pu
     @param s_file_status_background: the path to the file that contain the background process status
     @param s_lock_file: the path to the lock file
     @param s_database_uri: the path to the database uri
+    @param s_archive_repository: the path to the archive directory
+    @param s_push_to_prod_directory: the path to a local directory where to push the statification instead of
+                                     executing the script
     """
     try:
         # create a session for this specific code , because it's executed after the flask instance has been killed
         session = open_session_db(s_database_uri)
 
+        logger.info('> Compute the delta with the statification in production')
+
+        try:
+            delta, manifest = get_delta_with_production(session, s_archive_sha, s_archive_repository,
+                                                        s_push_to_prod_directory)
+        except OSError as e:
+            raise RuntimeError('The delta could not be computed : ' + str(e))
+
+        logger.info('> %i files added, %i files changed, %i files removed' % (
+            len(delta['added']), len(delta['changed']), len(delta['removed'])))
+
         logger.info('> Push the statification to production server(s)')
 
-        execute_the_push_to_prod_script(s_archive_sha, s_path_to_the_push_to_prod_script)
+        try:
+            if s_push_to_prod_directory:
+                apply_delta_to_directory(s_archive_sha, s_archive_repository, delta, s_push_to_prod_directory)
+                # the next delta is computed against this statification only if the directory still hold it
+                write_directory_sha(s_push_to_prod_directory, s_archive_sha)
+            else:
+                with tempfile.TemporaryDirectory() as s_delta_directory:
+                    # the script receive the sha, the archive of the added and changed files and the removed files
+                    execute_the_push_to_prod_script(
+                        s_archive_sha, s_path_to_the_push_to_prod_script,
+                        *write_delta(s_archive_sha, s_archive_repository, manifest, delta, s_delta_directory))
+        except OSError as e:
+            raise RuntimeError('The delta could not be pushed : ' + str(e))
 
         logger.info('> Change status of the last statification push to prod to saved')
 
@@ -211,9 +317,11 @@ def bg_extract_archive_to_prod(s_archive_sha: str, s_user: str, s_path_to_the_pu
 
 def bg_open_archive_to_visualize(s_archive_sha: str, s_user: str, s_archive_repository: str,
                                  s_visualize_repository: str,
-                                 s_file_status_background: str, s_lock_file: str, s_database_uri: str):
+                                 s_file_status_background: str, s_lock_file: str, s_database_uri: str,
+                                 s_visualize_pointer_file: str = ''):
     """
-    This method will open a previous statification archive and extract it to the visualize directory
+    This method will open a previous statification archive and extract it to the visualize directory.
+    If the statification is indexed it isn't extracted, the visualize application is pointed to it.
     @param s_archive_sha: the sha of the archive
     @param s_user: the name of the user doing the operation
     @param s_archive_repository: the path to the archive directory
@@ -221,22 +329,34 @@ def bg_open_archive_to_visualize(s_archive_sha: str, s_user: str, s_archive_repo
     @param s_file_status_background: the path to the file that contain the background process status
     @param s_lock_file: the path to the lock file
     @param s_database_uri: the database uri
+    @param s_visualize_pointer_file: the path to the file that contain the sha of the statification served by the
+                                     visualize application, empty if it isn't used
     """
     try:
         # create a session for this specific code , because it's executed after the flask instance has been killed
         session = open_session_db(s_database_uri)
 
-        # clean the repository
-        service_do_clean_directory(s_visualize_repository)
+        if s_visualize_pointer_file and is_indexed(s_archive_sha, s_archive_repository):
+            logger.info('> Serve the statification from the archive directory')
 
-        logger.info('> Extract the archive')
+            # the files are read from the archive directory by the visualize application
+            write_visualize_pointer(s_visualize_pointer_file, s_archive_sha)
+        else:
+            # clean the repository
+            service_do_clean_directory(s_visualize_repository)
 
-        # extract the wanted statification archive to the visualize directory
-        extract_archive_to_directory(
-            s_archive_sha,
-            s_archive_repository,
-            s_visualize_repository
-        )
+            logger.info('> Extract the archive')
+
+            # extract the wanted statification archive to the visualize directory
+            extract_archive_to_directory(
+                s_archive_sha,
+                s_archive_repository,
+                s_visualize_repository
+            )
+
+            # the visualize application serve the visualize directory
+            if s_visualize_pointer_file:
+                write_visualize_pointer(s_visualize_pointer_file, '')
 
         logger.info('> Change status for last visualized statification to saved')
 
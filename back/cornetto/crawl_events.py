@@ -0,0 +1,293 @@
+# coding=utf-8
+"""
+Cornetto
+
+Copyright (C) 2018–2020 ANSSI
+Contributors:
+2018–2020 Bureau Applicatif tech-sdn-app@ssi.gouv.fr
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+"""
+import itertools
+import json
+import logging
+import os
+import threading
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Tuple, Type
+
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import NoResultFound
+
+from cornetto.models.ErrorTypeMIME import ErrorTypeMIME
+from cornetto.models.ExternalLink import ExternalLink
+from cornetto.models.HtmlError import HtmlError
+from cornetto.models import open_session_db
+from cornetto.models.ScrapyError import ScrapyError
+from cornetto.models.Statification import Statification
+from cornetto.models.StatificationLinkedObject import StatificationLinkedObject
+from cornetto.models.StatificationTiming import StatificationTiming
+from scrapy_parser.events import EVENT_EXTERNAL_LINK, EVENT_HTTP_ERROR, EVENT_FORBIDDEN_MIME, EVENT_EXCEPTION, \
+    EVENT_STATS
+from scrapy_parser.timing import parse_timing_stats
+
+logger = logging.getLogger('cornetto')
+
+# the class of the database object created for each type of event
+EVENT_CLASSES = {
+    EVENT_EXTERNAL_LINK: ExternalLink,
+    EVENT_HTTP_ERROR: HtmlError,
+    EVENT_FORBIDDEN_MIME: ErrorTypeMIME,
+    EVENT_EXCEPTION: ScrapyError
+}
+
+# the suffix of the file that store the offset of the events already registered in the database
+OFFSET_SUFFIX = '.offset'
+
+# ======================
+# Crawl events Utilities
+# ======================
+
+
+def read_crawl_events(s_events_file: str) -> Iterator[Dict[str, Any]]:
+    """
+    Read the events written by the crawler in the events file
+    @param s_events_file: the path to the events file
+    @return an iterator on the events, each event is a python dict that contain at least a 'type'
+    """
+    with open(s_events_file, encoding='utf-8') as f_events_file:
+        for line in f_events_file:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # the last line can be incomplete if the crawler has been killed
+                logger.info('Invalid crawl event ignored : ' + line)
+
+
+def read_new_crawl_events(f_events_file: BinaryIO) -> Iterator[Dict[str, Any]]:
+    """
+    Read the complete events written by the crawler from the current position of the events file,
+    when the iteration is finished the position of the file is just after the last complete event
+    @param f_events_file: the events file opened in binary mode
+    @return an iterator on the events
+    """
+    while True:
+        i_position = f_events_file.tell()
+        line = f_events_file.readline()
+        if not line.endswith(b'\n'):
+            # the line is being written by the crawler, it will be read next time
+            f_events_file.seek(i_position)
+            return
+        try:
+            yield json.loads(line.decode('utf-8'))
+        except ValueError:
+            logger.info('Invalid crawl event ignored : ' + repr(line))
+
+
+def get_events_offset(s_events_file: str) -> int:
+    """
+    Get the offset of the events already registered in the database
+    @param s_events_file: the path to the events file
+    @return the offset in bytes, 0 if no event has been registered
+    """
+    try:
+        with open(s_events_file + OFFSET_SUFFIX) as f_offset_file:
+            return int(f_offset_file.read() or 0)
+    except (FileNotFoundError, ValueError):
+        return 0
+
+
+def set_events_offset(s_events_file: str, i_offset: int) -> None:
+    """
+    Persist the offset of the events already registered in the database
+    @param s_events_file: the path to the events file
+    @param i_offset: the offset in bytes
+    """
+    s_offset_file = s_events_file + OFFSET_SUFFIX
+    # write in a temporary file and rename it so the offset is never partially written
+    with open(s_offset_file + '.tmp', 'w') as f_offset_file:
+        f_offset_file.write(str(i_offset))
+    os.replace(s_offset_file + '.tmp', s_offset_file)
+
+
+def reset_crawl_events(s_events_file: str) -> None:
+    """
+    Erase the events file and its offset before a new statification
+    @param s_events_file: the path to the events file
+    """
+    open(s_events_file, 'w').close()
+    set_events_offset(s_events_file, 0)
+
+
+def follow_crawl_events(session: Session, statification: Statification, s_events_file: str,
+                        i_batch_size: int = 1000) -> int:
+    """
+    Register in the database the events written by the crawler since the last call, the events are registered by
+    batch of i_batch_size events in one transaction and the offset of the registered events is persisted next to the
+    events file after each transaction, so a batch that failed is registered again without duplicating the others.
+    @param session: the database session
+    @param statification: the statification that is being crawled
+    @param s_events_file: the path to the events file
+    @param i_batch_size: the maximum number of objects inserted in one transaction
+    @return the number of bytes of events that have been read
+    """
+    i_offset = get_events_offset(s_events_file)
+
+    with open(s_events_file, 'rb') as f_events_file:
+        # the events file has been erased since the offset was persisted
+        if os.fstat(f_events_file.fileno()).st_size < i_offset:
+            i_offset = 0
+        f_events_file.seek(i_offset)
+
+        i_new_offset = i_offset
+        events = read_new_crawl_events(f_events_file)
+        while True:
+            a_events = list(itertools.islice(events, i_batch_size))
+            if not a_events:
+                break
+            register_crawl_events(session, statification, a_events, i_batch_size)
+            # the file is positioned just after the last event of the batch
+            i_new_offset = f_events_file.tell()
+            set_events_offset(s_events_file, i_new_offset)
+
+    return i_new_offset - i_offset
+
+
+def register_crawl_events(session: Session, statification: Statification, events: Iterable[Dict[str, Any]],
+                          i_batch_size: int = 1000) -> None:
+    """
+    Create the database objects associated to the statification corresponding to the crawl events,
+    the objects are inserted by batch of i_batch_size objects of the same type, the transaction is committed once
+    all the objects have been inserted and rolled back if one of the insertions fails.
+    @param session: the database session
+    @param statification: the statification that is being crawled
+    @param events: the crawl events
+    @param i_batch_size: the maximum number of objects inserted in one transaction
+    """
+    # the records waiting to be inserted for each type of object
+    records = {c_class: [] for c_class in EVENT_CLASSES.values()}
+
+    try:
+        for event in events:
+            try:
+                if event['type'] == EVENT_EXTERNAL_LINK:
+                    records[ExternalLink].append((event['source'], event['url']))
+                elif event['type'] == EVENT_HTTP_ERROR:
+                    records[HtmlError].append((str(event['code']), event['url'], event['source']))
+                elif event['type'] == EVENT_FORBIDDEN_MIME:
+                    records[ErrorTypeMIME].append((event['mime'], event['url']))
+                elif event['type'] == EVENT_EXCEPTION:
+                    records[ScrapyError].append((event['message'],))
+                elif event['type'] == EVENT_STATS:
+                    # set the number of crawled item into the statification object
+                    statification.upd_nb_item(session, statification.sha,
+                                              event['stats'].get('response_received_count', 0))
+                    register_timings(session, statification, event['stats'], i_batch_size)
+            except (ValueError, KeyError) as e:
+                logger.info('The crawl event ' + str(event) + ' was not registered : ' + str(e))
+                continue
+
+            c_class = EVENT_CLASSES.get(event['type'])
+            if c_class and len(records[c_class]) >= i_batch_size:
+                register_records(session, statification, c_class, records[c_class], i_batch_size, b_commit=False)
+                records[c_class] = []
+
+        # insert the remaining records
+        for c_class, a_records in records.items():
+            register_records(session, statification, c_class, a_records, i_batch_size, b_commit=False)
+        session.commit()
+    except Exception:
+        # none of the records is inserted, the events are registered again next time
+        session.rollback()
+        raise
+
+
+def register_records(session: Session, statification: Statification, c_class: Type[StatificationLinkedObject],
+                     a_records: List[Tuple], i_batch_size: int, b_commit: bool = True) -> None:
+    """
+    Insert the records of objects of the given class into the database
+    @param session: the database session
+    @param statification: the statification that is being crawled
+    @param c_class: the class of the objects
+    @param a_records: the parameters of each object
+    @param i_batch_size: the maximum number of objects inserted in one transaction
+    @param b_commit: False to insert the objects in the current transaction, the caller commits it
+    """
+    i_nb_added = statification.add_list_of_objects_to_statification(c_class, session, a_records, i_batch_size,
+                                                                    b_commit)
+    if i_nb_added != len(a_records):
+        logger.info(str(len(a_records) - i_nb_added) + ' ' + c_class.__name__ +
+                    ' were not registered, a value is empty')
+
+
+def register_timings(session: Session, statification: Statification, stats: Dict[str, Any],
+                     i_batch_size: int) -> None:
+    """
+    Replace the timings of the statification by the timing stats of the crawl, the stats of a resumed crawl include
+    the stats of the previous runs
+    @param session: the database session
+    @param statification: the statification that has been crawled
+    @param stats: the stats of the crawler
+    @param i_batch_size: the maximum number of objects inserted in one transaction
+    """
+    timings = parse_timing_stats(stats)
+    if not timings:
+        return
+    StatificationTiming.delete_from_statification(session, statification)
+    a_records = [(s_mime, s_stage, timing['count'], timing['seconds'], timing['histogram'])
+                 for (s_mime, s_stage), timing in sorted(timings.items())]
+    register_records(session, statification, StatificationTiming, a_records, i_batch_size)
+
+
+class CrawlEventsFollower(threading.Thread):
+    """
+    Thread that register the events of the crawl in the database while the crawler is running
+    """
+
+    def __init__(self, s_logger: str, s_database_uri: str, s_events_file: str, i_interval: int = 5) -> None:
+        """
+        @param s_logger: the id of the logger
+        @param s_database_uri: the uri of the database
+        @param s_events_file: the path to the events file
+        @param i_interval: the number of seconds between two reading of the events file
+        """
+        super().__init__(daemon=True)
+        self.logger = logging.getLogger(s_logger)
+        self.s_database_uri = s_database_uri
+        self.s_events_file = s_events_file
+        self.i_interval = i_interval
+        self.stop_event = threading.Event()
+
+    def run(self) -> None:
+        # the thread need its own session
+        session = open_session_db(self.s_database_uri)
+        try:
+            while not self.stop_event.wait(self.i_interval):
+                try:
+                    # get the statification with empty sha
+                    statification = Statification.get_statification(session, '')
+                    follow_crawl_events(session, statification, self.s_events_file)
+                except NoResultFound:
+                    self.logger.info('There is no current statification, the crawl events are not registered')
+                except FileNotFoundError:
+                    self.logger.debug('The crawl events file has not been created yet')
+                except Exception as e:
+                    # the follower should not die, the remaining events will be registered at the end
+                    session.rollback()
+                    self.logger.error('Error while registering the crawl events : ' + str(e))
+        finally:
+            session.close()
+
+    def stop(self) -> None:
+        """
+        Stop the follower and wait for the end of the events being registered
+        """
+        self.stop_event.set()
+        if self.is_alive():
+            self.join()
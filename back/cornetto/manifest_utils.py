@@ -0,0 +1,216 @@
+# coding=utf-8
+"""
+Cornetto
+
+Copyright (C) 2018–2020 ANSSI
+Contributors:
+2018–2020 Bureau Applicatif tech-sdn-app@ssi.gouv.fr
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+"""
+# The manifest of a statification list its files with the sha256 of their content, it is written when the
+# statification is saved : the manifest of the snapshot, or the <sha>.files of the archive.
+# The delta between two statifications is the list of the files added, changed and removed, it is used to push
+# to production only the files that have been modified since the statification currently in production.
+
+import json
+import logging
+import os
+import shutil
+import tarfile
+from typing import Any, Dict, List, Tuple
+
+from cornetto.archive_utils import get_files_manifest_path, get_archive_path, iter_archive_members, \
+    iter_statification_files, HashingReader
+from cornetto.snapshot_store import is_snapshot, read_manifest, write_manifest
+
+logger = logging.getLogger('cornetto')
+
+# the name of the file that list the removed files in the delta given to the push to prod script
+REMOVED_FILES_NAME = 'removed.txt'
+# the name of the archive that contain the added and changed files in the delta given to the push to prod script
+DELTA_ARCHIVE_NAME = 'delta.tar.gz'
+# the name of the file that contain the sha of the statification held by the push to prod directory
+DIRECTORY_SHA_NAME = '.cornetto.sha'
+
+# ==================
+# Manifest Utilities
+# ==================
+
+
+def get_file_manifest(s_archive_sha: str, s_archive_repository: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Get the manifest of the files of a statification, if the archive has been created without manifest
+    it is read once to create it
+    @param s_archive_sha: the sha of the statification
+    @param s_archive_repository: the path to the archive directory
+    @return a dict indexed by the path of the files, the values are the entries of the manifest
+    """
+    if is_snapshot(s_archive_sha, s_archive_repository):
+        return {entry['path']: entry for entry in read_manifest(s_archive_sha, s_archive_repository)}
+
+    s_manifest_path = get_files_manifest_path(s_archive_sha, s_archive_repository)
+    if not os.path.isfile(s_manifest_path):
+        logger.info('> Create the manifest of the archive ' + s_archive_sha)
+        a_entries = []
+        for s_path, member, f_tar in iter_archive_members(get_archive_path(s_archive_sha, s_archive_repository)):
+            if member.isfile():
+                f_hashing = HashingReader(f_tar.extractfile(member))
+                while f_hashing.read(1024 * 1024):
+                    pass
+                a_entries.append({'path': s_path, 'hash': f_hashing.hexdigest(), 'size': member.size,
+                                  'mode': member.mode & 0o777})
+        write_manifest(a_entries, s_manifest_path)
+
+    with open(s_manifest_path, encoding='utf-8') as f_manifest:
+        return {entry['path']: entry for entry in map(json.loads, f_manifest)}
+
+
+def compute_delta(new_manifest: Dict[str, Dict[str, Any]],
+                  old_manifest: Dict[str, Dict[str, Any]]) -> Dict[str, List[str]]:
+    """
+    Compute the files that have been added, changed and removed between two statifications
+    @param new_manifest: the manifest of the new statification
+    @param old_manifest: the manifest of the old statification, empty if there is none
+    @return a dict with the sorted list of the path of the 'added', 'changed' and 'removed' files
+    """
+    return {
+        'added': sorted(s_path for s_path in new_manifest if s_path not in old_manifest),
+        'changed': sorted(s_path for s_path, entry in new_manifest.items()
+                          if s_path in old_manifest and old_manifest[s_path]['hash'] != entry['hash']),
+        'removed': sorted(s_path for s_path in old_manifest if s_path not in new_manifest)
+    }
+
+
+def compute_directory_delta(manifest: Dict[str, Dict[str, Any]], s_directory: str) -> Dict[str, List[str]]:
+    """
+    Compute the delta that replace all the content of a directory by a statification, it is used when the directory
+    doesn't hold the statification the delta would have been computed against
+    @param manifest: the manifest of the statification
+    @param s_directory: the path to the directory
+    @return a dict with the sorted list of the path of the 'added', 'changed' and 'removed' files
+    """
+    a_directory_files = set()
+    for s_root, _, a_files in os.walk(s_directory):
+        for s_name in a_files:
+            a_directory_files.add(os.path.relpath(os.path.join(s_root, s_name), s_directory))
+    # the file that contain the sha of the directory is not part of the statification
+    a_directory_files.discard(DIRECTORY_SHA_NAME)
+
+    return {
+        'added': sorted(s_path for s_path in manifest if s_path not in a_directory_files),
+        # the content of the files already in the directory is unknown, they are all rewritten
+        'changed': sorted(s_path for s_path in manifest if s_path in a_directory_files),
+        'removed': sorted(s_path for s_path in a_directory_files if s_path not in manifest)
+    }
+
+
+def read_directory_sha(s_directory: str) -> str:
+    """
+    Read the sha of the statification held by a directory
+    @param s_directory: the path to the directory
+    @return the sha of the statification, or an empty string if it is unknown
+    """
+    try:
+        with open(os.path.join(s_directory, DIRECTORY_SHA_NAME), encoding='utf-8') as f_sha:
+            return f_sha.read().strip()
+    except FileNotFoundError:
+        return ''
+
+
+def write_directory_sha(s_directory: str, s_archive_sha: str) -> None:
+    """
+    Write the sha of the statification held by a directory, once the statification has been pushed in it
+    @param s_directory: the path to the directory
+    @param s_archive_sha: the sha of the statification
+    """
+    s_sha_file = os.path.join(s_directory, DIRECTORY_SHA_NAME)
+    with open(s_sha_file + '.cornetto.tmp', 'w', encoding='utf-8') as f_sha:
+        f_sha.write(s_archive_sha + '\n')
+    os.replace(s_sha_file + '.cornetto.tmp', s_sha_file)
+
+
+def write_delta(s_archive_sha: str, s_archive_repository: str, manifest: Dict[str, Dict[str, Any]],
+                delta: Dict[str, List[str]], s_delta_directory: str) -> Tuple[str, str]:
+    """
+    Write the delta of a statification in a directory : an archive with the added and changed files,
+    and a file with the path of the removed files, one per line
+    @param s_archive_sha: the sha of the statification
+    @param s_archive_repository: the path to the archive directory
+    @param manifest: the manifest of the statification
+    @param delta: the delta returned by compute_delta
+    @param s_delta_directory: the directory where to write the delta
+    @return the path to the archive and the path to the file of the removed files
+    """
+    s_delta_archive = os.path.join(s_delta_directory, DELTA_ARCHIVE_NAME)
+    with tarfile.open(s_delta_archive, 'w:gz') as f_tar:
+        for s_path, f_content in iter_statification_files(s_archive_sha, s_archive_repository,
+                                                          set(delta['added'] + delta['changed'])):
+            tarinfo = tarfile.TarInfo(s_path)
+            tarinfo.size = manifest[s_path]['size']
+            tarinfo.mode = manifest[s_path]['mode']
+            f_tar.addfile(tarinfo, f_content)
+
+    s_removed_files = os.path.join(s_delta_directory, REMOVED_FILES_NAME)
+    with open(s_removed_files, 'w', encoding='utf-8') as f_removed_files:
+        f_removed_files.write(''.join(s_path + '\n' for s_path in delta['removed']))
+
+    return s_delta_archive, s_removed_files
+
+
+def make_parent_directories(s_destination: str, s_destination_repository: str) -> None:
+    """
+    Create the parent directories of a file in a directory, the files of the previous statification that have
+    the name of one of the parent directories are removed
+    @param s_destination: the path to the file
+    @param s_destination_repository: the path to the directory
+    """
+    s_directory = s_destination_repository
+    for s_name in os.path.relpath(os.path.dirname(s_destination), s_destination_repository).split(os.sep):
+        if s_name in ('', '.'):
+            continue
+        s_directory = os.path.join(s_directory, s_name)
+        if os.path.lexists(s_directory) and not os.path.isdir(s_directory):
+            os.remove(s_directory)
+    os.makedirs(os.path.dirname(s_destination), exist_ok=True)
+
+
+def apply_delta_to_directory(s_archive_sha: str, s_archive_repository: str, delta: Dict[str, List[str]],
+                             s_destination_repository: str) -> None:
+    """
+    Apply the delta of a statification to a directory that contain the statification currently in production
+    @param s_archive_sha: the sha of the statification
+    @param s_archive_repository: the path to the archive directory
+    @param delta: the delta returned by compute_delta
+    @param s_destination_repository: the path to the directory
+    """
+    # the removed files are removed first, a file can be replaced by a directory of the same name and the reverse
+    for s_path in delta['removed']:
+        s_destination = os.path.join(s_destination_repository, s_path)
+        if os.path.isfile(s_destination):
+            os.remove(s_destination)
+            # remove the directories that are now empty, up to the destination directory
+            s_directory = os.path.dirname(s_destination)
+            while os.path.normpath(s_directory) != os.path.normpath(s_destination_repository) \
+                    and not os.listdir(s_directory):
+                os.rmdir(s_directory)
+                s_directory = os.path.dirname(s_directory)
+
+    for s_path, f_content in iter_statification_files(s_archive_sha, s_archive_repository,
+                                                      set(delta['added'] + delta['changed'])):
+        s_destination = os.path.join(s_destination_repository, s_path)
+        make_parent_directories(s_destination, s_destination_repository)
+        # the file is replaced at once, it is never served partially written
+        with open(s_destination + '.cornetto.tmp', 'wb') as f_destination:
+            shutil.copyfileobj(f_content, f_destination)
+        if os.path.isdir(s_destination) and not os.path.islink(s_destination):
+            # a directory of the previous statification has the name of the file
+            shutil.rmtree(s_destination)
+        os.replace(s_destination + '.cornetto.tmp', s_destination)
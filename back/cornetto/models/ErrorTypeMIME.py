@@ -61,6 +61,21 @@ class ErrorTypeMIME(Base, StatificationLinkedObject):
         else:
             raise ValueError("Passing value is None")
 
+    @staticmethod
+    def get_mapping(statification, s_type_mime: str, s_url: str) -> Dict[str, Any]:
+        """
+        Get the mapping of the columns of a new ErrorTypeMIME linked to the statification, used for bulk insertion
+        :implement
+        @param statification: the statification that contain that object
+        @param s_type_mime: the MIME type that causes the error
+        @param s_url: the url that causes the error
+        @return a python dict containing the value of each column
+        """
+        if statification and s_type_mime and s_url:
+            return {'type_mime': s_type_mime, 'url': s_url, 'statification_id': statification.id}
+        else:
+            raise ValueError("Passing value is None")
+
     def get_dict(self) -> Dict[str, Any]:
         """
         Create a python dict from the source object
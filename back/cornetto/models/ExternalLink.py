@@ -63,6 +63,21 @@ class ExternalLink(Base, StatificationLinkedObject):
         else:
             raise ValueError("Passing value is None")
 
+    @staticmethod
+    def get_mapping(statification, s_source: str, s_url: str) -> Dict[str, Any]:
+        """
+        Get the mapping of the columns of a new ExternalLink linked to the statification, used for bulk insertion
+        :implement
+        @param statification: the statification that contain that object
+        @param s_source: the url of the source that contain the external url
+        @param s_url: the url that point to an external website
+        @return a python dict containing the value of each column
+        """
+        if statification and s_source and s_url:
+            return {'source': s_source, 'url': s_url, 'statification_id': statification.id}
+        else:
+            raise ValueError("Passing value is None")
+
     def get_dict(self) -> Dict[str, Any]:
         """
         Create a python dict from the source object
@@ -69,6 +69,22 @@ class HtmlError(Base, StatificationLinkedObject):
         else:
             raise ValueError("Passing value is None")
 
+    @staticmethod
+    def get_mapping(statification, s_code_error: str, s_url: str, s_source: str) -> Dict[str, Any]:
+        """
+        Get the mapping of the columns of a new HtmlError linked to the statification, used for bulk insertion
+        :implement
+        @param statification: the statification that contain that object
+        @param s_code_error: the HTTP error code
+        @param s_url: The url that caused the error
+        @param s_source: the source url that contained the faulty url
+        @return a python dict containing the value of each column
+        """
+        if statification and s_code_error and s_url and s_source:
+            return {'error_code': s_code_error, 'url': s_url, 'source': s_source, 'statification_id': statification.id}
+        else:
+            raise ValueError("Passing value is None")
+
     def get_dict(self) -> Dict[str, Any]:
         """
         Create a python dict from the source object
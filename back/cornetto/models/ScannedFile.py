@@ -63,6 +63,21 @@ class ScannedFile(Base, StatificationLinkedObject):
         else:
             raise ValueError("Passing value is None")
 
+    @staticmethod
+    def get_mapping(statification, s_type_file: str, i_nb: int) -> Dict[str, Any]:
+        """
+        Get the mapping of the columns of a new ScannedFile linked to the statification, used for bulk insertion
+        :implement
+        @param statification: the statification that contain that object
+        @param s_type_file: type MIME of the file
+        @param i_nb: the number of file for the given type
+        @return a python dict containing the value of each column
+        """
+        if statification and s_type_file and i_nb:
+            return {'type_file': s_type_file, 'nb': i_nb, 'statification_id': statification.id}
+        else:
+            raise ValueError("Passing value is None")
+
     def get_dict(self) -> Dict[str, Any]:
         """
         Create a python dict from the source object
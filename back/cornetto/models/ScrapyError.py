@@ -60,6 +60,20 @@ class ScrapyError(Base, StatificationLinkedObject):
         else:
             raise ValueError("Passing value is None")
 
+    @staticmethod
+    def get_mapping(statification, s_scrapy_error: str) -> Dict[str, Any]:
+        """
+        Get the mapping of the columns of a new ScrapyError linked to the statification, used for bulk insertion
+        :implement
+        @param statification: the statification that contain that object
+        @param s_scrapy_error: The error code correspond to the error message returned by scrapy.
+        @return a python dict containing the value of each column
+        """
+        if statification and s_scrapy_error:
+            return {'error_code': s_scrapy_error, 'statification_id': statification.id}
+        else:
+            raise ValueError("Passing value is None")
+
     def get_dict(self) -> Dict[str, Any]:
         """
         Create a python dict from the source object
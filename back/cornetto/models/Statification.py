@@ -17,7 +17,7 @@ You should have received a copy of the GNU General Public License
 """
 
 from datetime import datetime
-from typing import Dict, Any, List, Type
+from typing import Dict, Any, Iterable, List, Tuple, Type
 
 from sqlalchemy import Column, Integer, String, DateTime, Enum
 from sqlalchemy.orm.exc import NoResultFound
@@ -204,6 +204,20 @@ class Statification(Base, CornettoObject):
         """
         c_class.add_to_statification(session, self, *args)
 
+    def add_list_of_objects_to_statification(self, c_class: Type[StatificationLinkedObject], session: Session,
+                                             a_records: Iterable[Tuple], i_batch_size: int = 1000,
+                                             b_commit: bool = True) -> int:
+        """
+        Add a list of objects to the statification with bulk inserts
+        @param c_class: the class of the objects to create and add
+        @param session: the database session
+        @param a_records: the parameters to set each new object
+        @param i_batch_size: the maximum number of objects inserted in one transaction
+        @param b_commit: False to insert the objects in the current transaction, the caller commits it
+        @return the number of objects added, the records with a parameter not set are ignored
+        """
+        return c_class.add_list_to_statification(session, self, a_records, i_batch_size, b_commit)
+
     @staticmethod
     def static_add_object_to_statification(c_class: Type[StatificationLinkedObject],
                                            session: Session, s_archive_sha: str, *args) -> None:
@@ -233,6 +247,21 @@ class Statification(Base, CornettoObject):
         except NoResultFound:
             raise NoResultFound("Statification wasn't found for the given sha : " + s_archive_sha)
 
+    @staticmethod
+    def get_last_statification_with_status(session: Session, a_status: List[Status]) -> 'Statification':
+        """
+        Get the last created statification that have one of the given status
+        @param session: the database session
+        @param a_status: the list of the wanted status
+        @return the last statification that have one of the status
+        @raise NoResultFound if no statification has one of the status
+        """
+        statification = session.query(Statification).filter(Statification.status.in_(a_status)).order_by(
+            desc(Statification.id)).first()
+        if statification is None:
+            raise NoResultFound("No statification has one of the Status " + repr(a_status))
+        return statification
+
     @staticmethod
     def get_from_statification_id(session: Session, i_statification_id: int) -> 'Statification':
         """
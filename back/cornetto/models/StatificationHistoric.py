@@ -71,6 +71,23 @@ class StatificationHistoric(Base, StatificationLinkedObject):
         else:
             raise ValueError("Passing value is None")
 
+    @staticmethod
+    def get_mapping(statification, date: DateTime, s_user: str, e_action: Actions) -> Dict[str, Any]:
+        """
+        Get the mapping of the columns of a new StatificationHistoric linked to the statification,
+        used for bulk insertion
+        :implement
+        @param statification: The statification on which the user did the action
+        @param date: Date of the realisation of the action
+        @param s_user: The name of the user that did the action
+        @param e_action: The action that the user did
+        @return a python dict containing the value of each column
+        """
+        if statification and date and s_user and e_action:
+            return {'date': date, 'user': s_user, 'action': e_action, 'statification_id': statification.id}
+        else:
+            raise ValueError("Passing value is None")
+
     def get_dict(self) -> Dict[str, Any]:
         """
         Create a python dict from the source object
@@ -17,7 +17,7 @@ You should have received a copy of the GNU General Public License
 """
 
 import abc
-from typing import Any
+from typing import Any, Dict, Iterable, Tuple
 
 from sqlalchemy import Column
 from sqlalchemy.orm.session import Session
@@ -50,3 +50,51 @@ class StatificationLinkedObject(CornettoObject):
         Create and add a new object to the statification filled with the given parameters
         """
         raise NotImplementedError()
+
+    @staticmethod
+    @abc.abstractmethod
+    def get_mapping(statification, *args) -> Dict[str, Any]:
+        """
+        Get the mapping of the columns of a new object linked to the statification, used for bulk insertion
+        @param statification: the statification that contain the object
+        @param args: the parameters to set the new object, the same as add_to_statification
+        @return a python dict containing the value of each column
+        @raise ValueError if one of the parameters is not set
+        """
+        raise NotImplementedError()
+
+    @classmethod
+    def add_list_to_statification(cls, session: Session, statification, a_records: Iterable[Tuple],
+                                  i_batch_size: int = 1000, b_commit: bool = True) -> int:
+        """
+        Create and add a list of new objects to the statification, they are inserted with bulk inserts in
+        transactions of at most i_batch_size objects. The records with a parameter not set are ignored.
+        @param session: the database session
+        @param statification: the statification that contain the objects
+        @param a_records: the parameters of each object to add, the same as add_to_statification
+        @param i_batch_size: the maximum number of objects inserted in one transaction
+        @param b_commit: False to insert the objects in the current transaction, the caller commits it
+        @return the number of objects added to the statification
+        """
+        i_nb_added = 0
+        a_mappings = []
+        for record in a_records:
+            try:
+                a_mappings.append(cls.get_mapping(statification, *record))
+            except ValueError:
+                continue
+
+            if len(a_mappings) >= i_batch_size:
+                session.bulk_insert_mappings(cls, a_mappings)
+                if b_commit:
+                    session.commit()
+                i_nb_added += len(a_mappings)
+                a_mappings = []
+
+        if a_mappings:
+            session.bulk_insert_mappings(cls, a_mappings)
+            if b_commit:
+                session.commit()
+            i_nb_added += len(a_mappings)
+
+        return i_nb_added
@@ -0,0 +1,141 @@
+# coding=utf-8
+"""
+Cornetto
+
+Copyright (C) 2018–2020 ANSSI
+Contributors:
+2018–2020 Bureau Applicatif tech-sdn-app@ssi.gouv.fr
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+"""
+import json
+from typing import Dict, Any
+
+from sqlalchemy import Column, Integer, String, Float, ForeignKey
+from sqlalchemy.orm import relationship, backref
+from sqlalchemy.orm.exc import NoResultFound
+from sqlalchemy.orm.session import Session
+
+from cornetto.models.StatificationLinkedObject import StatificationLinkedObject
+from cornetto.models import Base
+
+
+class StatificationTiming(Base, StatificationLinkedObject):
+    """
+    The time spent by the crawl of a statification in one stage (download, parse, write...) for the contents of one
+    MIME type handler (html, css, img...), with the histogram of the durations
+    """
+    __tablename__ = 'statification_timings'
+    id = Column(Integer, primary_key=True, nullable=False)
+    mime = Column(String, nullable=False)
+    stage = Column(String, nullable=False)
+    count = Column(Integer, nullable=False)
+    seconds = Column(Float, nullable=False)
+    # the number of durations in each bucket of the histogram, as a JSON object
+    histogram = Column(String, nullable=False)
+    statification_id = Column(Integer, ForeignKey('statifications.id'), nullable=False)
+    statification = relationship("Statification",
+                                 backref=backref("statification_timings", cascade="all, delete-orphan"))
+
+    def __init__(self, statification, s_mime: str, s_stage: str, i_count: int, f_seconds: float,
+                 d_histogram: Dict[str, int]) -> None:
+        """
+        The constructor of the object StatificationTiming.
+        Create a StatificationTiming by setting the attribute with the given parameters
+
+        @param statification: the statification that has been crawled
+        @param s_mime: the name of the handler of the MIME type of the contents
+        @param s_stage: the stage of the crawl
+        @param i_count: the number of contents measured
+        @param f_seconds: the total number of seconds spent
+        @param d_histogram: the number of durations in each bucket
+        """
+        self.mime = s_mime
+        self.stage = s_stage
+        self.count = i_count
+        self.seconds = f_seconds
+        self.histogram = json.dumps(d_histogram)
+        self.statification = statification
+
+    @staticmethod
+    def add_to_statification(session: Session, statification, s_mime: str, s_stage: str, i_count: int,
+                             f_seconds: float, d_histogram: Dict[str, int]) -> None:
+        """
+        Create and add a new timing to the statification filled with the given parameters
+        @param session: the database session
+        @param statification: the statification that has been crawled
+        @param s_mime: the name of the handler of the MIME type of the contents
+        @param s_stage: the stage of the crawl
+        @param i_count: the number of contents measured
+        @param f_seconds: the total number of seconds spent
+        @param d_histogram: the number of durations in each bucket
+        """
+        if session and statification and s_mime and s_stage and i_count:
+            session.add(StatificationTiming(statification, s_mime, s_stage, i_count, f_seconds, d_histogram))
+            session.commit()
+        else:
+            raise ValueError("Passing value is None")
+
+    @staticmethod
+    def get_mapping(statification, s_mime: str, s_stage: str, i_count: int, f_seconds: float,
+                    d_histogram: Dict[str, int]) -> Dict[str, Any]:
+        """
+        Get the mapping of the columns of a new StatificationTiming linked to the statification, used for bulk insertion
+        :implement
+        @param statification: the statification that has been crawled
+        @param s_mime: the name of the handler of the MIME type of the contents
+        @param s_stage: the stage of the crawl
+        @param i_count: the number of contents measured
+        @param f_seconds: the total number of seconds spent
+        @param d_histogram: the number of durations in each bucket
+        @return a python dict containing the value of each column
+        """
+        if statification and s_mime and s_stage and i_count:
+            return {'mime': s_mime, 'stage': s_stage, 'count': i_count, 'seconds': f_seconds,
+                    'histogram': json.dumps(d_histogram), 'statification_id': statification.id}
+        else:
+            raise ValueError("Passing value is None")
+
+    @staticmethod
+    def delete_from_statification(session: Session, statification) -> None:
+        """
+        Delete the timings of the statification, they are replaced by the timings of the whole crawl when it's resumed
+        @param session: the database session
+        @param statification: the statification
+        """
+        session.query(StatificationTiming).filter(
+            StatificationTiming.statification_id == statification.id).delete(synchronize_session=False)
+        session.commit()
+
+    def get_dict(self) -> Dict[str, Any]:
+        """
+        Create a python dict from the source object
+        :implement
+        @return A python dict
+        """
+        return {'id': self.id, 'mime': self.mime, 'stage': self.stage, 'count': self.count, 'seconds': self.seconds,
+                'histogram': json.loads(self.histogram)}
+
+    @staticmethod
+    def get_from_statification_id(session: Session, i_statification_id: Column) -> Any:
+        """
+        Get the object linked to the statification id passed in parameter
+        :implement
+        @param session: The database session
+        @param i_statification_id: the id of the statification
+        @return the corresponding object(s) linked to the statification id
+        """
+        try:
+            results = session.query(StatificationTiming).filter(
+                StatificationTiming.statification_id == i_statification_id).order_by(StatificationTiming.mime,
+                                                                                     StatificationTiming.stage)
+            return results
+        except NoResultFound:
+            raise NoResultFound("Statification wasn't found for the given id : " + str(i_statification_id))
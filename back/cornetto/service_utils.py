@@ -17,7 +17,7 @@ You should have received a copy of the GNU General Public License
 """
 import os
 import glob
-from os.path import isfile, join
+from os.path import join
 import logging
 import errno
 import fcntl
@@ -26,7 +26,9 @@ from flask.json import dumps, loads
 from flask import current_app
 from typing import Dict, Any
 
+from cornetto.archive_utils import list_archive_shas
 from cornetto.verification_utilities import valid_sha
+from scrapy_parser.progress import read_progress
 
 logger = logging.getLogger('cornetto')
 
@@ -45,12 +47,8 @@ def validate_sha(s_sha: str, s_archive_directory: str):
     try:
         if not os.path.isdir(s_archive_directory):
             raise NotADirectoryError("The given archive directory path does'nt exist : " + s_archive_directory)
-        a_list_sha = []
-        # browse all file in the archive directory
-        for filename in os.listdir(s_archive_directory):
-            if isfile(join(s_archive_directory, filename)):
-                # remove the .tar.gz extension in the filename and add it to the list
-                a_list_sha.append(filename.strip('.tar.gz'))
+        # get the sha of all the archives of the archive directory
+        a_list_sha = list_archive_shas(s_archive_directory)
 
         # verify that the sha id is valid
         valid_sha(s_sha, a_list_sha)
@@ -152,22 +150,21 @@ def clear_status_background():
     f_status_background.close()
 
 
-def get_nb_page_crawled() -> int:
+def get_crawl_progress() -> Dict[str, Any]:
     """
-    Get the number of page crawled by the statificationProcess
-    @return the number of page crawled, 0 if nothing is crawled or the file crawlerProgressCount.txt doesn't exist
+    Get the progress of the crawl published by the statificationProcess
+    @return a python dict with the number of pages crawled, bytes downloaded, requests in queue, errors
+            and the throughput in pages per second, all set to 0 if nothing is crawled
     """
-    i_current_nb_item_crawled = 0
-    try:
-        # open the crawler page counter file in read mode
-        count_file = open(current_app.config['CRAWLER_PROGRESS_COUNTER_FILE'])
-        i_current_nb_item_crawled = int(count_file.read())
-        count_file.close()
+    return read_progress(current_app.config['CRAWLER_PROGRESS_COUNTER_FILE'])
 
-    except (FileNotFoundError, ValueError)as e:
-        current_app.logger.info('The file crawlerProgressCount.txt doesn\'t exist' + str(e))
 
-    return i_current_nb_item_crawled
+def get_nb_page_crawled() -> int:
+    """
+    Get the number of page crawled by the statificationProcess
+    @return the number of page crawled, 0 if nothing is crawled or the progress file doesn't exist
+    """
+    return get_crawl_progress()['pages']
 
 
 def get_background_status_file_content() -> Dict[str, Any]:
@@ -33,7 +33,9 @@ from cornetto.models.ScannedFile import ScannedFile
 from cornetto.models.ScrapyError import ScrapyError
 from cornetto.models.Statification import Statification
 from cornetto.models.StatificationHistoric import StatificationHistoric
-from cornetto.service_utils import service_do_clean_directory, validate_sha, clear_status_background
+from cornetto.models.StatificationTiming import StatificationTiming
+from cornetto.service_utils import service_do_clean_directory, validate_sha, clear_status_background, \
+    is_access_locked, get_crawl_progress, get_background_status_file_content
 
 logger = logging.getLogger('cornetto')
 
@@ -111,6 +113,91 @@ def service_get_last_statif_infos() -> Dict[str, Any]:
     }
 
 
+def service_get_status() -> Dict[str, Any]:
+    """
+    Get the status of the api. The following information will be returned in a python dict :
+    - isRunning         :   a boolean that indicate if a statification Process is running
+    - sha            :   a string that contain the sha of the last statification,
+                          if the last is a new and unsaved statification it will be empty
+    - designation       :   the designation of the last statification, or empty
+    - description       :   the description of the last statification, or empty
+    - status            :   the status of the last statification :  CREATED = 0
+                                                                    STATIFIED = 1
+                                                                    SAVED = 2
+                                                                    PRODUCTION = 3
+                                                                    VISUALIZED = 4
+                            Default status will be 3, if there is no statification in the database the user will still
+                            be able to create a new one, if there are ongoing statification to be push to prod it still
+                            give the hand to the user that have saved it.
+    - i_nb_item_to_crawl :  the number of item that have been crawled during the last statification, it will be used
+                            as a reference of the number of items to crawl to the next statification. If there is no
+                            statification in the database it will be set to 100 by default.
+    - progress          :   the progress of the running crawl : pages crawled, bytes downloaded, requests in queue,
+                            errors and throughput in pages per second.
+    - isPaused          :   a boolean that indicate if the statification process has been paused and can be resumed
+    @return a python dict containing all the above information :
+            **Example**:
+
+              The default status when launching the api for the first time should be this one.
+              .. code-block:: dict
+
+                    {
+                        'isRunning': false,
+                        'sha': '',
+                        'designation': '',
+                        'description': '',
+                        'currentNbItemCrawled': 0,
+                        'nbItemToCrawl': 100,
+                        'progress': {'pages': 0, 'bytes': 0, 'queue': 0, 'errors': 0, 'throughput': 0},
+                        'isPaused': false,
+                        'status': 3,
+                        'isLocked': false,
+                        'statusBackground': {}
+                    }
+    """
+    # check if process is running
+    b_is_running = current_app.statifProcess.is_running()
+
+    # initialize the progress of the crawl to 0
+    progress = {'pages': 0, 'bytes': 0, 'queue': 0, 'errors': 0, 'throughput': 0}
+
+    # get the progress of the crawl if a statificationProcess is running
+    if b_is_running:
+        progress = get_crawl_progress()
+    i_current_nb_item_crawled = progress['pages']
+
+    # get the last statification informations
+    last_statif_infos = service_get_last_statif_infos()
+
+    sha = last_statif_infos['sha']
+    designation = last_statif_infos['designation']
+    description = last_statif_infos['description']
+    status = last_statif_infos['status']
+    i_nb_item_to_crawl = last_statif_infos['i_nb_item_to_crawl']
+
+    # if i_current_nb_item_crawled is raising higher than i_nb_item_to_crawl, then raise i_nb_item_to_crawl
+    # we don't want i_nb_item_to_crawl be lower than i_current_nb_item_crawled
+    if i_current_nb_item_crawled >= i_nb_item_to_crawl:
+        i_nb_item_to_crawl = i_current_nb_item_crawled + 100
+
+    # read the status background file and extract the json from it
+    json_status_background = get_background_status_file_content()
+
+    return {
+        'isRunning': b_is_running,
+        'sha': sha,
+        'designation': designation,
+        'description': description,
+        'currentNbItemCrawled': i_current_nb_item_crawled,
+        'nbItemToCrawl': i_nb_item_to_crawl,
+        'progress': progress,
+        'isPaused': current_app.statifProcess.is_paused(),
+        'status': status,
+        'isLocked': is_access_locked(),
+        'statusBackground': json_status_background
+    }
+
+
 def service_get_statif_count() -> Dict[str, int]:
     """
     Get the number of statifications in the database.
@@ -159,7 +246,9 @@ def service_get_statif_info(s_archive_sha: str) -> Dict[str, Any]:
       -  html_errors : the list of html errors
       -  scanned_files : the list of scanned files
       -  scrapy_errors : the list of scrapy errors
-      -  statification_historics : the list of statification historics.
+      -  statification_historics : the list of statification historics
+      -  statification_timings : the time spent in each stage of the crawl for each MIME type handler, with the
+         histogram of the durations.
 
     @return a python dict containing all the information of the current statification
     """
@@ -171,6 +260,7 @@ def service_get_statif_info(s_archive_sha: str) -> Dict[str, Any]:
     a_scanned_files = None
     a_scrapy_errors = None
     a_statification_historic = None
+    a_statification_timings = None
 
     try:
         # verify that the sha is valid if not , if it is empty then
@@ -208,6 +298,10 @@ def service_get_statif_info(s_archive_sha: str) -> Dict[str, Any]:
                 a_statification_historic = statification.get_list_from_class(StatificationHistoric, current_app.session)
             except NoResultFound as e:
                 current_app.logger.info(e)
+            try:
+                a_statification_timings = statification.get_list_from_class(StatificationTiming, current_app.session)
+            except NoResultFound as e:
+                current_app.logger.info(e)
         except NoResultFound as e:
             current_app.logger.info(e)
 
@@ -219,7 +313,8 @@ def service_get_statif_info(s_archive_sha: str) -> Dict[str, Any]:
             'html_errors': a_html_errors,
             'scanned_files': a_scanned_files,
             'scrapy_errors': a_scrapy_errors,
-            'statification_historics': a_statification_historic
+            'statification_historics': a_statification_historic,
+            'statification_timings': a_statification_timings
         }
     except SyntaxError as e:
         current_app.logger.error(e)
@@ -305,6 +400,54 @@ def service_do_start_statif(s_user: str, s_designation: str, s_description: str)
         raise RuntimeError('process_running')
 
 
+def service_do_pause_statif() -> Dict[str, Any]:
+    """
+    Pause the running statification process, the crawler stops after persisting its state and the statification is
+    kept so it can be resumed later.
+    @return  if everything goes smoothly the following python dict will be returned :
+                {
+                    'success': True,
+                }
+    @raise RuntimeError
+    """
+    try:
+        current_app.statifProcess.pause()
+    except ValueError as e:
+        current_app.logger.error(str(e))
+        raise RuntimeError('process_not_running')
+
+    # on success return a success code
+    return {
+        'success': True
+    }
+
+
+def service_do_resume_statif() -> Dict[str, Any]:
+    """
+    Resume the paused statification process, the crawler continue where it stopped without crawling again the urls
+    already crawled.
+    @return  if everything goes smoothly the following python dict will be returned :
+                {
+                    'success': True,
+                }
+    @raise RuntimeError
+    """
+    try:
+        current_app.statifProcess.resume(current_app.session)
+    except (ValueError, NoResultFound) as e:
+        current_app.logger.error(str(e))
+        raise RuntimeError('process_not_paused')
+    except sh.ErrorReturnCode as e:
+        current_app.logger.error(str(e))
+        # if an error has happened when executing a subprocess command
+        raise RuntimeError('subprocess')
+
+    # on success return a success code
+    return {
+        'success': True
+    }
+
+
 def service_do_save(s_user: str) -> Dict[str, Any]:
     """
     Save the satification to a tag.gz archive
@@ -340,7 +483,14 @@ def service_do_save(s_user: str) -> Dict[str, Any]:
             current_app.config['LOGDIR'],
             current_app.config['LOCKFILE'],
             current_app.config['STATUS_BACKGROUND'],
-            current_app.config['DATABASE_URI']
+            current_app.config['DATABASE_URI'],
+            current_app.config.get('VALIDATORS_FILE', ''),
+            current_app.config.get('CRAWL_EVENTS_FILE', ''),
+            current_app.config.get('ARCHIVE_CODEC', 'gzip'),
+            current_app.config.get('ARCHIVE_COMPRESSION_LEVEL', 6),
+            current_app.config.get('ARCHIVE_THREADS', 0),
+            current_app.config.get('ARCHIVE_BACKEND', 'tar'),
+            current_app.config.get('SANITIZED_FILE', '')
         )
 
         # execute code asynchronously
@@ -403,7 +553,9 @@ def service_do_apply_prod(s_user: str, s_archive_sha: str) -> Dict[str, Any]:
             current_app.config['PUSH_TO_PROD_SCRIPT'],
             current_app.config['STATUS_BACKGROUND'],
             current_app.config['LOCKFILE'],
-            current_app.config['DATABASE_URI']
+            current_app.config['DATABASE_URI'],
+            current_app.config['ARCHIVE_REPOSITORY'],
+            current_app.config.get('PUSH_TO_PROD_DIRECTORY', '')
         )
 
         # execute code asynchronously
@@ -460,7 +612,8 @@ def service_do_visualize(s_user: str, s_archive_sha: str) -> Dict[str, Any]:
             current_app.config['VISUALIZE_REPOSITORY'],
             current_app.config['STATUS_BACKGROUND'],
             current_app.config['LOCKFILE'],
-            current_app.config['DATABASE_URI']
+            current_app.config['DATABASE_URI'],
+            current_app.config.get('VISUALIZE_POINTER_FILE', '')
         )
 
         # execute code asynchronously
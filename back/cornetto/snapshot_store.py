@@ -0,0 +1,257 @@
+# coding=utf-8
+"""
+Cornetto
+
+Copyright (C) 2018–2020 ANSSI
+Contributors:
+2018–2020 Bureau Applicatif tech-sdn-app@ssi.gouv.fr
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+"""
+# The content addressed snapshot store keep each file content once in the archive directory :
+#   objects/<2 first chars of the hash>/<hash>   the content of a file, the hash is the sha256 of the content
+#   <sha>.manifest                               the files of a statification, one JSON line per file :
+#                                                {"path": "index.html", "hash": "...", "size": 42, "mode": 420}
+#   .statcache.json                              the hash of the files of the last saved static repository
+# The sha of a statification is the sha1 of its manifest and of a random salt, so saving the same files twice gives
+# two statifications. Like the sha of an archive it is 40 characters long.
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import uuid
+from typing import Any, Dict, Iterator, List
+
+logger = logging.getLogger('cornetto')
+
+MANIFEST_EXTENSION = '.manifest'
+OBJECTS_DIRECTORY = 'objects'
+STAT_CACHE_FILE = '.statcache.json'
+
+# the size of the blocks read to hash and copy a file
+BLOCK_SIZE = 1024 * 1024
+
+# ===============================
+# Content addressed snapshot store
+# ===============================
+
+
+def get_manifest_path(s_snapshot_sha: str, s_archive_repository: str) -> str:
+    """
+    Get the path to the manifest of a snapshot
+    @param s_snapshot_sha: the sha of the snapshot
+    @param s_archive_repository: the path to the archive directory
+    @return the path to the manifest
+    """
+    return os.path.join(s_archive_repository, s_snapshot_sha + MANIFEST_EXTENSION)
+
+
+def get_object_path(s_hash: str, s_archive_repository: str) -> str:
+    """
+    Get the path to the object that store a file content
+    @param s_hash: the hash of the content
+    @param s_archive_repository: the path to the archive directory
+    @return the path to the object
+    """
+    return os.path.join(s_archive_repository, OBJECTS_DIRECTORY, s_hash[:2], s_hash)
+
+
+def is_snapshot(s_snapshot_sha: str, s_archive_repository: str) -> bool:
+    """
+    Check if the statification with the given sha is stored as a snapshot
+    @param s_snapshot_sha: the sha of the statification
+    @param s_archive_repository: the path to the archive directory
+    @return True if there is a manifest for the sha
+    """
+    return os.path.isfile(get_manifest_path(s_snapshot_sha, s_archive_repository))
+
+
+def list_snapshot_shas(s_archive_repository: str) -> List[str]:
+    """
+    Get the sha of all the snapshots of the archive directory
+    @param s_archive_repository: the path to the archive directory
+    @return the list of sha
+    """
+    return [s_filename[:-len(MANIFEST_EXTENSION)] for s_filename in os.listdir(s_archive_repository)
+            if s_filename.endswith(MANIFEST_EXTENSION)]
+
+
+def read_manifest(s_snapshot_sha: str, s_archive_repository: str) -> Iterator[Dict[str, Any]]:
+    """
+    Read the files of a snapshot
+    @param s_snapshot_sha: the sha of the snapshot
+    @param s_archive_repository: the path to the archive directory
+    @return an iterator on the entries of the manifest
+    """
+    with open(get_manifest_path(s_snapshot_sha, s_archive_repository), encoding='utf-8') as f_manifest:
+        for line in f_manifest:
+            yield json.loads(line)
+
+
+def write_manifest(a_entries: List[Dict[str, Any]], s_manifest_path: str) -> str:
+    """
+    Write a manifest, the entries are written in the given order so the same files give the same manifest
+    @param a_entries: the entries of the files
+    @param s_manifest_path: the path to the manifest
+    @return the sha1 of the manifest
+    """
+    s_manifest = ''.join(json.dumps(entry, sort_keys=True) + '\n' for entry in a_entries)
+    with open(s_manifest_path + '.tmp', 'w', encoding='utf-8') as f_manifest:
+        f_manifest.write(s_manifest)
+    os.replace(s_manifest_path + '.tmp', s_manifest_path)
+    return hashlib.sha1(s_manifest.encode('utf-8')).hexdigest()
+
+
+def hash_file(s_path: str) -> str:
+    """
+    Compute the hash of the content of a file
+    @param s_path: the path to the file
+    @return the sha256 of the content
+    """
+    sha = hashlib.sha256()
+    with open(s_path, 'rb') as f_file:
+        for block in iter(lambda: f_file.read(BLOCK_SIZE), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def store_object(s_path: str, s_archive_repository: str) -> str:
+    """
+    Store the content of a file as an object, the content is read and hashed in the same pass
+    @param s_path: the path to the file
+    @param s_archive_repository: the path to the archive directory
+    @return the hash of the content
+    """
+    s_objects_directory = os.path.join(s_archive_repository, OBJECTS_DIRECTORY)
+    i_fd, s_tmp_object = tempfile.mkstemp(prefix='.object-', suffix='.tmp', dir=s_objects_directory)
+    try:
+        sha = hashlib.sha256()
+        with open(s_path, 'rb') as f_file, os.fdopen(i_fd, 'wb') as f_object:
+            for block in iter(lambda: f_file.read(BLOCK_SIZE), b''):
+                sha.update(block)
+                f_object.write(block)
+        s_hash = sha.hexdigest()
+
+        s_object_path = get_object_path(s_hash, s_archive_repository)
+        if os.path.isfile(s_object_path):
+            # the content is already stored
+            os.remove(s_tmp_object)
+        else:
+            os.makedirs(os.path.dirname(s_object_path), exist_ok=True)
+            os.replace(s_tmp_object, s_object_path)
+        return s_hash
+    except BaseException:
+        if os.path.isfile(s_tmp_object):
+            os.remove(s_tmp_object)
+        raise
+
+
+def load_stat_cache(s_archive_repository: str, s_static_repository: str) -> Dict[str, List]:
+    """
+    Load the hash of the files of the static repository when it was last saved
+    @param s_archive_repository: the path to the archive directory
+    @param s_static_repository: the path to the static repository
+    @return a dict indexed by the path of the files, the values are [size, mtime, inode, hash]
+    """
+    try:
+        with open(os.path.join(s_archive_repository, STAT_CACHE_FILE)) as f_stat_cache:
+            stat_cache = json.load(f_stat_cache)
+        # the cache is only valid for the same static repository
+        if stat_cache.get('repository') == os.path.abspath(s_static_repository):
+            return stat_cache['files']
+    except (FileNotFoundError, ValueError, KeyError):
+        pass
+    return {}
+
+
+def save_stat_cache(s_archive_repository: str, s_static_repository: str, files: Dict[str, List]) -> None:
+    """
+    Save the hash of the files of the static repository
+    @param s_archive_repository: the path to the archive directory
+    @param s_static_repository: the path to the static repository
+    @param files: a dict indexed by the path of the files, the values are [size, mtime, inode, hash]
+    """
+    s_stat_cache = os.path.join(s_archive_repository, STAT_CACHE_FILE)
+    with open(s_stat_cache + '.tmp', 'w') as f_stat_cache:
+        json.dump({'repository': os.path.abspath(s_static_repository), 'files': files}, f_stat_cache)
+    os.replace(s_stat_cache + '.tmp', s_stat_cache)
+
+
+def create_snapshot(s_static_repository: str, s_archive_repository: str) -> str:
+    """
+    Store the files of the static repository in the snapshot store. Only the files that have been modified since
+    the last snapshot are read, and only the contents that are not already stored are written.
+    Each snapshot has its own sha, even if its files are the same as the files of a previous snapshot.
+    @param s_static_repository: the path to the directory of the statification
+    @param s_archive_repository: the path to the archive directory
+    @return the sha of the snapshot
+    """
+    logger.info('> Store the statification in the snapshot store')
+
+    os.makedirs(os.path.join(s_archive_repository, OBJECTS_DIRECTORY), exist_ok=True)
+    stat_cache = load_stat_cache(s_archive_repository, s_static_repository)
+    new_stat_cache = {}
+    a_entries = []
+    i_nb_stored = 0
+
+    for s_directory, a_directories, a_files in os.walk(s_static_repository):
+        # the manifest doesn't depend on the order of the file system
+        a_directories.sort()
+        for s_filename in sorted(a_files):
+            s_path = os.path.join(s_directory, s_filename)
+            # only the regular files are stored
+            if os.path.islink(s_path) or not os.path.isfile(s_path):
+                continue
+            s_relative_path = os.path.relpath(s_path, s_static_repository)
+            stat = os.stat(s_path)
+
+            a_stat = [stat.st_size, stat.st_mtime_ns, stat.st_ino]
+            cached = stat_cache.get(s_relative_path)
+            if cached and cached[:3] == a_stat and os.path.isfile(get_object_path(cached[3], s_archive_repository)):
+                # the file has not been modified since the last snapshot
+                s_hash = cached[3]
+            else:
+                s_hash = store_object(s_path, s_archive_repository)
+                i_nb_stored += 1
+
+            new_stat_cache[s_relative_path] = a_stat + [s_hash]
+            a_entries.append({'path': s_relative_path, 'hash': s_hash, 'size': stat.st_size,
+                              'mode': stat.st_mode & 0o777})
+
+    # the manifest is written at last, the snapshot doesn't exist until all its objects are stored
+    s_tmp_manifest = os.path.join(s_archive_repository, '.snapshot' + MANIFEST_EXTENSION)
+    s_manifest_sha = write_manifest(a_entries, s_tmp_manifest)
+    # the sha must be unique per save, the sha of a statification is unique in the database
+    s_snapshot_sha = hashlib.sha1((s_manifest_sha + uuid.uuid4().hex).encode('utf-8')).hexdigest()
+    os.replace(s_tmp_manifest, get_manifest_path(s_snapshot_sha, s_archive_repository))
+
+    save_stat_cache(s_archive_repository, s_static_repository, new_stat_cache)
+
+    logger.info('> %i files in the snapshot, %i files read' % (len(a_entries), i_nb_stored))
+    return s_snapshot_sha
+
+
+def extract_snapshot_to_directory(s_snapshot_sha: str, s_archive_repository: str,
+                                  s_destination_repository: str) -> None:
+    """
+    Restore the files of a snapshot in a directory
+    @param s_snapshot_sha: the sha of the snapshot
+    @param s_archive_repository: the path to the archive directory
+    @param s_destination_repository: the path to the directory where to restore the files
+    """
+    for entry in read_manifest(s_snapshot_sha, s_archive_repository):
+        s_destination = os.path.join(s_destination_repository, entry['path'])
+        os.makedirs(os.path.dirname(s_destination), exist_ok=True)
+        # the object is copied, a hard link would be modified with the file
+        shutil.copyfile(get_object_path(entry['hash'], s_archive_repository), s_destination)
+        os.chmod(s_destination, entry['mode'])
@@ -0,0 +1,135 @@
+# coding=utf-8
+"""
+Cornetto
+
+Copyright (C) 2018–2020 ANSSI
+Contributors:
+2018–2020 Bureau Applicatif tech-sdn-app@ssi.gouv.fr
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+"""
+import logging
+import queue
+import threading
+import time
+from typing import Iterator, Set
+
+from flask import Flask
+from flask.json import dumps
+
+from cornetto.models import db
+from cornetto.services import service_get_status
+
+logger = logging.getLogger('cornetto')
+
+
+class StatusBroadcaster:
+    """
+    Compute the status of the api in a single thread and push it to every connected client as Server-Sent Events,
+    the status is only sent when it has changed.
+    """
+
+    def __init__(self, app: Flask, i_interval: float = 2, i_keepalive: float = 15) -> None:
+        """
+        @param app: the flask application, the status is computed in its context
+        @param i_interval: the number of seconds between two computations of the status
+        @param i_keepalive: the number of seconds after which a comment is sent to keep the connection open
+        """
+        self.app = app
+        self.i_interval = i_interval
+        self.i_keepalive = i_keepalive
+        # the queue of each connected client
+        self.subscribers: Set[queue.Queue] = set()
+        self.lock = threading.Lock()
+        # the last status sent, as a JSON string
+        self.s_last_status = ''
+        self.thread = None
+
+    def subscribe(self) -> queue.Queue:
+        """
+        Register a new client, the producer thread is started if it isn't running
+        @return the queue where the status of the api will be put
+        """
+        q_client = queue.Queue()
+        with self.lock:
+            # the new client receive the last status right away
+            if self.s_last_status:
+                q_client.put(self.s_last_status)
+            self.subscribers.add(q_client)
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+        return q_client
+
+    def unsubscribe(self, q_client: queue.Queue) -> None:
+        """
+        Unregister a client
+        @param q_client: the queue of the client
+        """
+        with self.lock:
+            self.subscribers.discard(q_client)
+
+    def publish(self, s_status: str) -> None:
+        """
+        Send the status to every client if it has changed
+        @param s_status: the status as a JSON string
+        """
+        with self.lock:
+            if s_status == self.s_last_status:
+                return
+            self.s_last_status = s_status
+            for q_client in self.subscribers:
+                q_client.put(s_status)
+
+    def compute_status(self) -> str:
+        """
+        Compute the status of the api
+        @return the status as a JSON string
+        """
+        with self.app.app_context():
+            try:
+                return dumps(service_get_status())
+            finally:
+                # the session of the thread is released between two computations
+                db.session.remove()
+
+    def run(self) -> None:
+        """
+        Compute the status while there is at least one client connected
+        """
+        while True:
+            with self.lock:
+                if not self.subscribers:
+                    # the next client will start a new thread, the status may have changed in the meantime
+                    self.thread = None
+                    self.s_last_status = ''
+                    return
+            try:
+                self.publish(self.compute_status())
+            except Exception as e:
+                logger.error('Error while computing the status of the api : ' + str(e))
+            time.sleep(self.i_interval)
+
+    def stream(self, q_client: queue.Queue) -> Iterator[str]:
+        """
+        Generate the Server-Sent Events of a client until it disconnects
+        @param q_client: the queue of the client returned by subscribe
+        @return an iterator on the events
+        """
+        try:
+            while True:
+                try:
+                    yield 'data: ' + q_client.get(timeout=self.i_keepalive) + '\n\n'
+                except queue.Empty:
+                    # a comment line is ignored by the client but let it detect a lost connection
+                    yield ': keepalive\n\n'
+        finally:
+            # the generator is closed when the client disconnect
+            self.unsubscribe(q_client)
@@ -19,14 +19,13 @@ You should have received a copy of the GNU General Public License
 import functools
 
 from typing import Any, Dict
-from flask import jsonify, request, current_app
+from flask import jsonify, request, current_app, Response
 from flask.blueprints import Blueprint
 from cornetto.services import  \
-    service_get_last_statif_infos, service_get_satif_list, \
+    service_get_status, service_get_satif_list, \
     service_get_statif_info, service_do_apply_prod, service_get_statif_count, \
-    service_do_start_statif, service_do_save
-from cornetto.service_utils import is_access_locked, lock_access, unlock_access, get_nb_page_crawled,\
-    get_background_status_file_content
+    service_do_start_statif, service_do_save, service_do_pause_statif, service_do_resume_statif
+from cornetto.service_utils import is_access_locked, lock_access, unlock_access
 
 bp = Blueprint("cornetto", __name__)
 
@@ -181,6 +180,8 @@ def statification_status() -> Dict[str, Any]:
     - i_nb_item_to_crawl :  the number of item that have been crawled during the last statification, it will be used
                             as a reference of the number of items to crawl to the next statification. If there is no
                             statification in the database it will be set to 100 by default.
+    - progress          :   the progress of the running crawl : pages crawled, bytes downloaded, requests in queue,
+                            errors and throughput in pages per second.
     @return a python dict containing all the above information :
             **Example**:
 
@@ -194,49 +195,26 @@ def statification_status() -> Dict[str, Any]:
                         'description': '',
                         'currentNbItemCrawled': 0,
                         'nbItemToCrawl': 100,
+                        'progress': {'pages': 0, 'bytes': 0, 'queue': 0, 'errors': 0, 'throughput': 0},
                         'status': 3,
                         'isLocked': false,
                         'statusBackground': {}
                     }
     """
-    # check if process is running
-    b_is_running = current_app.statifProcess.is_running()
+    return service_get_status()
 
-    # initialize the nb of item crawled and the number of item to crawl to 0
-    i_current_nb_item_crawled = 0
 
-    # get the number of page crawled if a statificationProcess is running
-    if b_is_running:
-        i_current_nb_item_crawled = get_nb_page_crawled()
-
-    # get the last statification informations
-    last_statif_infos = service_get_last_statif_infos()
-
-    sha = last_statif_infos['sha']
-    designation = last_statif_infos['designation']
-    description = last_statif_infos['description']
-    status = last_statif_infos['status']
-    i_nb_item_to_crawl = last_statif_infos['i_nb_item_to_crawl']
-
-    # if i_current_nb_item_crawled is raising higher than i_nb_item_to_crawl, then raise i_nb_item_to_crawl
-    # we don't want i_nb_item_to_crawl be lower than i_current_nb_item_crawled
-    if i_current_nb_item_crawled >= i_nb_item_to_crawl:
-        i_nb_item_to_crawl = i_current_nb_item_crawled + 100
-
-    # read the status background file and extract the json from it
-    json_status_background = get_background_status_file_content()
-
-    return {
-        'isRunning': b_is_running,
-        'sha': sha,
-        'designation': designation,
-        'description': description,
-        'currentNbItemCrawled': i_current_nb_item_crawled,
-        'nbItemToCrawl': i_nb_item_to_crawl,
-        'status': status,
-        'isLocked': is_access_locked(),
-        'statusBackground': json_status_background
-    }
+@bp.route('/api/statification/events', methods=["GET"])
+def statification_events() -> Response:
+    """
+    Stream the status of the api as Server-Sent Events, an event is sent each time the status change.
+    The data of each event is the python dict returned by /api/statification/status as JSON.
+    @return a Flask Response with the text/event-stream mimetype
+    """
+    broadcaster = current_app.statusBroadcaster
+    q_client = broadcaster.subscribe()
+    return Response(broadcaster.stream(q_client), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 
 @bp.route('/api/statification/count', methods=["POST", "GET"])
@@ -389,6 +367,91 @@ def do_stop_statif() -> Dict[str, bool]:
     }
 
 
+@bp.route('/api/statification/pause', methods=["POST", "GET"])
+@build_json()
+def do_pause_statif() -> Dict[str, Any]:
+    """
+    Pause the statification process if one is running, it can be resumed with /api/statification/resume
+
+    If an error happen during the process the error will be caught and a python dict will be returned with a specific
+    error code like the following example :
+
+      -- In the case there is no statification running :
+    {
+        'success': False,
+        'error': 'process_not_running'
+    }
+
+      -- If everything goes smoothly the following dict will be returned :
+    {
+        'success': True,
+    }
+    """
+    current_app.logger.info('> Pausing statification process')
+
+    try:
+        return service_do_pause_statif()
+    except RuntimeError as e:
+        # return an ajax error code
+        return {
+            'success': False,
+            'error': str(e)
+        }
+
+
+@bp.route('/api/statification/resume', methods=["POST", "GET"])
+@build_json()
+def do_resume_statif() -> Dict[str, Any]:
+    """
+    Resume the paused statification process, the crawl continue where it stopped
+
+    If an error happen during the process the error will be caught and a python dict will be returned with a specific
+    error code like the following example :
+
+      -- In the case there is no paused statification :
+    {
+        'success': False,
+        'error': 'process_not_paused'
+    }
+
+      -- If everything goes smoothly the following dict will be returned :
+    {
+        'success': True,
+    }
+    """
+    # the route is locked by the operation in progress, the lock is only taken if there is something to resume
+    if not current_app.statifProcess.is_paused():
+        return {
+            'success': False,
+            'error': 'process_not_paused'
+        }
+
+    b_locked = False
+    try:
+        # test if the lock file is unlocked
+        if is_access_locked():
+            # the lock file was locked
+            raise RuntimeError('route_access')
+
+        # block the lock file for other users
+        lock_access()
+        b_locked = True
+
+        current_app.logger.info('> Resuming statification process')
+
+        return service_do_resume_statif()
+    except RuntimeError as e:
+        # in case of error unlock the route if it has been locked by this call
+        # if there is no error the route will be unlocked when the crawl is done
+        if b_locked:
+            unlock_access(current_app.config['LOCKFILE'])
+        # return an ajax error code
+        return {
+            'success': False,
+            'error': str(e)
+        }
+
+
 @bp.route('/api/statification/visualize', methods=["POST", "GET"])
 @build_json()
 @sha_required
@@ -0,0 +1,122 @@
+# coding=utf-8
+"""
+Cornetto
+
+Copyright (C) 2018–2020 ANSSI
+Contributors:
+2018–2020 Bureau Applicatif tech-sdn-app@ssi.gouv.fr
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+"""
+import mimetypes
+import os
+from typing import Any, Dict
+from urllib.parse import unquote
+
+from flask import Flask, Response, abort, request, send_from_directory
+
+from cornetto.archive_index import load_index, read_content
+
+# ======================
+# Visualization Utilities
+# ======================
+
+
+def write_visualize_pointer(s_visualize_pointer_file: str, s_archive_sha: str) -> None:
+    """
+    Set the statification served by the visualize application
+    @param s_visualize_pointer_file: the path to the pointer file
+    @param s_archive_sha: the sha of the statification, empty to serve the visualize directory
+    """
+    with open(s_visualize_pointer_file + '.tmp', 'w') as f_pointer:
+        f_pointer.write(s_archive_sha)
+    os.replace(s_visualize_pointer_file + '.tmp', s_visualize_pointer_file)
+
+
+def read_visualize_pointer(app: Flask) -> str:
+    """
+    Get the sha of the statification served by the visualize application, the pointer file is only read when
+    it has been modified
+    @param app: the visualize application
+    @return the sha, empty if the visualize directory should be served
+    """
+    s_pointer_file = app.config.get('VISUALIZE_POINTER_FILE', '')
+    try:
+        i_mtime = os.stat(s_pointer_file).st_mtime_ns
+    except (FileNotFoundError, ValueError):
+        return ''
+    if app.visualize_pointer[0] != i_mtime:
+        with open(s_pointer_file) as f_pointer:
+            app.visualize_pointer = (i_mtime, f_pointer.read().strip())
+    return app.visualize_pointer[1]
+
+
+def get_local_filename(s_path: str, s_query: str) -> str:
+    """
+    Get the path of the file of the statification corresponding to the url, like the crawler does
+    @param s_path: the path of the url
+    @param s_query: the query string of the url
+    @return the path of the file
+    """
+    if s_path == '' or s_path.endswith('/'):
+        s_path += 'index.html'
+    if s_query:
+        s_path += '%3F' + unquote(s_query)
+    return s_path
+
+
+def create_visualize_app(config_file_path: str = None, config_dict: Dict[str, Any] = None) -> Flask:
+    """
+    Create the application that serve the visualized statification. When the statification is indexed its files are
+    read from the archive directory, so visualizing another statification only need to change the pointer file.
+    Otherwise the files extracted in the visualize directory are served.
+    @param config_file_path python file that contain parameter(s)
+    @param config_dict a python dict that contain parameter(s)
+    """
+    app = Flask(__name__, static_folder=None)
+
+    if config_file_path:
+        # update config from file
+        app.config.from_pyfile(config_file_path)
+    elif config_dict:
+        # update config from dict
+        app.config.update(config_dict)
+
+    # the modification time of the pointer file and the sha it contain
+    app.visualize_pointer = (None, '')
+
+    @app.route('/', defaults={'s_path': ''})
+    @app.route('/<path:s_path>')
+    def visualize(s_path: str) -> Response:
+        s_filename = get_local_filename(s_path, request.query_string.decode('latin-1'))
+
+        s_archive_sha = read_visualize_pointer(app)
+        if not s_archive_sha:
+            # the statification has been extracted in the visualize directory
+            return send_from_directory(app.config['VISUALIZE_REPOSITORY'], s_filename)
+
+        index = load_index(s_archive_sha, app.config['ARCHIVE_REPOSITORY'])
+        if index is None:
+            abort(404)
+
+        content = index.get(s_filename)
+        if content is None:
+            # the url of a directory without the last /
+            content = index.get(s_filename + '/index.html')
+        if content is None:
+            abort(404)
+
+        # the query string is not part of the type of the file
+        s_mimetype = mimetypes.guess_type(s_filename.split('%3F')[0])[0] or 'application/octet-stream'
+        response = Response(read_content(*content), mimetype=s_mimetype, direct_passthrough=True)
+        response.content_length = content[2]
+        return response
+
+    return app
@@ -18,4 +18,6 @@ You should have received a copy of the GNU General Public License
 """
 from scrapy.cmdline import execute
 
-execute()
+# the module is imported again by the content worker processes, they must not start a crawl
+if __name__ == '__main__':
+    execute()
@@ -15,30 +15,102 @@ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
 GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 """
+import logging
+import math
+import os
 
-from pybloom_live import BloomFilter
+from pybloom_live import ScalableBloomFilter
 from scrapy.dupefilters import BaseDupeFilter
 from scrapy.utils.job import job_dir
 
+from scrapy_parser.url_utils import get_canonical_url
+
+statif_logger = logging.getLogger('statification')
+
+# the name of the file where the filter is stored in the job directory
+BLOOM_FILE = 'requests.bloom'
+
 
 class BLOOMDupeFilter(BaseDupeFilter):
     """
     BLOOM Duplicate Filter
     This filter is interesting to use if you crawl a lot of url, it will take less memory to filter the urls.
+    The filter grows when its capacity is reached so its false positive rate stays below BLOOM_ERROR_RATE, the urls
+    are canonicalized before being added, and the filter is stored in the job directory when the crawl is paused.
     """
-    def __init__(self, path=None):
-        self.file = None
-        self.fingerprints = BloomFilter(2000000, 0.00001)
+    def __init__(self, path=None, i_initial_capacity=2000000, f_error_rate=0.00001, stats=None,
+                 i_stats_interval=10000):
+        """
+        @param path: the job directory, None if the crawl is not persisted
+        @param i_initial_capacity: the number of urls of the first filter, the next ones are 4 times bigger
+        @param f_error_rate: the maximum false positive rate of the filter
+        @param stats: the stats collector of the crawler
+        @param i_stats_interval: the number of urls added between two updates of the stats of the filter
+        """
+        self.file = os.path.join(path, BLOOM_FILE) if path else None
+        self.stats = stats
+        self.i_stats_interval = i_stats_interval
+
+        if self.file and os.path.isfile(self.file):
+            # the crawl is resumed
+            with open(self.file, 'rb') as f_bloom_file:
+                self.fingerprints = ScalableBloomFilter.fromfile(f_bloom_file)
+            statif_logger.info('%i urls loaded in the dupe filter from %s' % (self.fingerprints.count, self.file))
+        else:
+            self.fingerprints = ScalableBloomFilter(i_initial_capacity, f_error_rate,
+                                                    ScalableBloomFilter.LARGE_SET_GROWTH)
+
+    @classmethod
+    def from_settings(cls, settings, stats=None):
+        return cls(job_dir(settings), settings.getint('BLOOM_INITIAL_CAPACITY', 2000000),
+                   settings.getfloat('BLOOM_ERROR_RATE', 0.00001), stats)
 
     @classmethod
-    def from_settings(cls, settings):
-        return cls(job_dir(settings))
+    def from_crawler(cls, crawler):
+        return cls.from_settings(crawler.settings, crawler.stats)
 
     def request_seen(self, request):
-        fp = request.url
-        if fp in self.fingerprints:
+        fp = get_canonical_url(request.url)
+        # add return True if the url was already in the filter
+        if self.fingerprints.add(fp):
             return True
-        self.fingerprints.add(fp)
+
+        if self.fingerprints.count % self.i_stats_interval == 0:
+            self.update_stats()
+        statif_logger.info('do request : ' + request.url)
+
+    def get_false_positive_rate(self):
+        """
+        Estimate the current false positive rate of the filter from the number of urls in each of its filters
+        @return the probability that a new url is considered as seen
+        """
+        f_not_false_positive = 1.0
+        for bloom_filter in self.fingerprints.filters:
+            # the probability that the bits of the k slices are set : (1 - e^(-n/m))^k
+            f_rate = (1 - math.exp(-bloom_filter.count / bloom_filter.bits_per_slice)) ** bloom_filter.num_slices
+            f_not_false_positive *= 1 - f_rate
+        return 1 - f_not_false_positive
+
+    def update_stats(self):
+        """
+        Publish the fill ratio and the estimated false positive rate of the filter in the stats of the crawl
+        """
+        if self.stats and self.fingerprints.filters:
+            self.stats.set_value('dupefilter/bloom_count', self.fingerprints.count)
+            self.stats.set_value('dupefilter/bloom_filters', len(self.fingerprints.filters))
+            self.stats.set_value('dupefilter/bloom_fill_ratio',
+                                 self.fingerprints.count / self.fingerprints.capacity)
+            self.stats.set_value('dupefilter/bloom_fp_rate', self.get_false_positive_rate())
+
+    def log(self, request, spider):
+        if self.stats:
+            self.stats.inc_value('dupefilter/filtered')
 
     def close(self, reason):
+        self.update_stats()
+        if self.file:
+            # write in a temporary file and rename it so the filter is never partially written
+            with open(self.file + '.tmp', 'wb') as f_bloom_file:
+                self.fingerprints.tofile(f_bloom_file)
+            os.replace(self.file + '.tmp', self.file)
         self.fingerprints = None
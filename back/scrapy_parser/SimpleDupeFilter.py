@@ -16,47 +16,164 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 """
 import logging
+import os
+from array import array
+from hashlib import blake2b
 
-from scrapy.dupefilters import RFPDupeFilter
+from scrapy.dupefilters import BaseDupeFilter
 from scrapy.utils.job import job_dir
 
+from scrapy_parser.url_utils import get_canonical_url
+
 statif_logger = logging.getLogger('statification')
 
+# the name of the file where the fingerprints are appended in the job directory
+FINGERPRINTS_FILE = 'requests.fingerprints'
+
+
+def get_url_fingerprint(url):
+    """
+    Get the 64 bits fingerprint of the canonical url
+    @param url: the url
+    @return the fingerprint as an integer, never 0
+    """
+    i_fp = int.from_bytes(blake2b(get_canonical_url(url).encode('utf-8'), digest_size=8).digest(), 'little')
+    # 0 mark the empty slots of the table
+    return i_fp or 1
+
 
-class SimpleDupeFilter(RFPDupeFilter):
+class FingerprintTable(object):
+    """
+    A set of 64 bits fingerprints stored in an array with open addressing (linear probing), it takes 16 bytes by
+    fingerprint at most instead of more than 100 bytes for a set of strings
+    """
+
+    def __init__(self, i_capacity=1024):
+        """
+        @param i_capacity: the number of fingerprints that can be added before the table grows
+        """
+        i_size = 1
+        while i_size < 2 * i_capacity:
+            i_size <<= 1
+        self.table = array('Q', [0]) * i_size
+        self.i_mask = i_size - 1
+        self.i_count = 0
+
+    def __len__(self):
+        return self.i_count
+
+    def __contains__(self, i_fp):
+        table = self.table
+        i_index = i_fp & self.i_mask
+        while True:
+            i_slot = table[i_index]
+            if i_slot == i_fp:
+                return True
+            if i_slot == 0:
+                return False
+            i_index = (i_index + 1) & self.i_mask
+
+    def add(self, i_fp):
+        """
+        Add a fingerprint to the table
+        @param i_fp: the fingerprint, it must not be 0
+        @return True if the fingerprint was already in the table
+        """
+        table = self.table
+        i_index = i_fp & self.i_mask
+        while True:
+            i_slot = table[i_index]
+            if i_slot == i_fp:
+                return True
+            if i_slot == 0:
+                break
+            i_index = (i_index + 1) & self.i_mask
+
+        table[i_index] = i_fp
+        self.i_count += 1
+        # the table is kept half empty so the probing sequences stay short
+        if 2 * self.i_count > len(table):
+            self.grow()
+        return False
+
+    def grow(self):
+        """
+        Double the size of the table
+        """
+        old_table = self.table
+        self.table = array('Q', [0]) * (2 * len(old_table))
+        self.i_mask = len(self.table) - 1
+        self.i_count = 0
+        for i_fp in old_table:
+            if i_fp:
+                self.add(i_fp)
+
+    def get_size_in_bytes(self):
+        """
+        @return the memory used by the fingerprints
+        """
+        return len(self.table) * self.table.itemsize
+
+
+class SimpleDupeFilter(BaseDupeFilter):
     """
     A simple Dupe Filter
+    The urls are canonicalized (a directory and its index.html are the same url) and their 64 bits fingerprints are
+    stored in a FingerprintTable. The fingerprints are appended to a file of the job directory as they are added so
+    the crawl can be resumed.
     """
-    def __init__(self, path=None):
-        RFPDupeFilter.__init__(self, path)
+    def __init__(self, path=None, stats=None):
+        """
+        @param path: the job directory, None if the crawl is not persisted
+        @param stats: the stats collector of the crawler
+        """
+        self.file = None
+        self.stats = stats
+        self.fingerprints = FingerprintTable()
+
+        if path:
+            self.file = open(os.path.join(path, FINGERPRINTS_FILE), 'ab+')
+            self.file.seek(0)
+            previous = array('Q')
+            s_content = self.file.read()
+            # the last fingerprint may have been partially written if the crawler has been killed
+            previous.frombytes(s_content[:len(s_content) - len(s_content) % previous.itemsize])
+            for i_fp in previous:
+                self.fingerprints.add(i_fp)
 
     @classmethod
-    def from_settings(cls, settings):
-        return cls(job_dir(settings))
+    def from_settings(cls, settings, stats=None):
+        return cls(job_dir(settings), stats)
 
-    def request_seen(self, request):
-        # get the request fingerprint
-        fp = self.request_fingerprint(request)
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls.from_settings(crawler.settings, crawler.stats)
 
-        # get an alternate request with index.html at the end
-        # it will stop doing twice the same request for url pointing to index.html file, considering url like :
+    def request_seen(self, request):
+        # get the fingerprint of the canonical url, it will stop doing twice the same request for url pointing to
+        # index.html file, considering url like :
         # http://mysite.mydomain/
         # http://mysite.mydomain
         # http://mysite.mydomain/index.html
-        if request.url.endswith('/'):
-            req = request.replace(url=(request.url + "index.html"))
-        else:
-            req = request.replace(url=(request.url + "/index.html"))
-        fp2 = self.request_fingerprint(req)
-
-        # if fingerprints exist then the url has been already crawled
-        if fp in self.fingerprints or fp2 in self.fingerprints:
+        i_fp = get_url_fingerprint(request.url)
+
+        # if fingerprint exist then the url has been already crawled
+        if self.fingerprints.add(i_fp):
             return True
         statif_logger.info('do request : ' + request.url)
 
-        # add both fingerprints to the list of seen url
-        self.fingerprints.add(fp)
-        self.fingerprints.add(fp2)
+        # persist the fingerprint in the job directory so a paused crawl doesn't request it again
+        if self.file:
+            self.file.write(i_fp.to_bytes(8, 'little'))
+
+    def log(self, request, spider):
+        if self.stats:
+            self.stats.inc_value('dupefilter/filtered')
 
     def close(self, reason):
+        if self.stats:
+            self.stats.set_value('dupefilter/fingerprints', len(self.fingerprints))
+            self.stats.set_value('dupefilter/fingerprints_bytes', self.fingerprints.get_size_in_bytes())
+        if self.file:
+            self.file.close()
         self.fingerprints = None
@@ -31,7 +31,52 @@ NEWSPIDER_MODULE = 'scrapy_parser.spiders'
 # Crawl responsibly by identifying yourself (and your website) on the user-agent
 # USER_AGENT = 'scrapy mirroring'
 
-ITEM_PIPELINES = {'scrapy_parser.pipelines.MirroringPipeline': 1}
+ITEM_PIPELINES = {'scrapy_parser.pipelines.PdfSanitizingPipeline': 1, 'scrapy_parser.pipelines.MirroringPipeline': 2}
+# the number of worker processes that remove the metadata of the PDF files, 0 to remove them in the crawler process,
+# -1 for the number of cores minus the one of the crawler
+PDF_WORKERS = -1
+
+# the directory where the results of the processing of the contents are cached between the statifications, empty to
+# disable the cache, and its maximum size in bytes
+PROCESSED_CACHE_DIRECTORY = ''
+PROCESSED_CACHE_MAX_SIZE = 1024 * 1024 * 1024
+# the number of threads that write the files of the items, 0 to write them in the reactor thread
+WRITE_THREADS = 8
+# the maximum number of items being written or waiting for a thread, the crawl slows down when it's reached
+WRITE_QUEUE_SIZE = 64
+
+DOWNLOADER_MIDDLEWARES = {'scrapy_parser.middlewares.IncrementalMiddleware': 950,
+                          'scrapy_parser.middlewares.MimeGateMiddleware': 960}
+# the maximum size in bytes of the responses by MIME type, bigger responses are aborted when their headers arrive
+MIME_MAX_SIZES = {
+    'text/html': 64 * 1024 * 1024,
+    'text/css': 16 * 1024 * 1024,
+    'text/xml': 64 * 1024 * 1024,
+    'application/javascript': 16 * 1024 * 1024,
+    'text/javascript': 16 * 1024 * 1024,
+}
+# the maximum size in bytes of the responses of the other MIME types, 0 for no limit
+MIME_DEFAULT_MAX_SIZE = 0
+
+EXTENSIONS = {'scrapy_parser.extensions.ProgressExtension': 500}
+# the number of seconds between two publications of the progress of the crawl
+PROGRESS_FLUSH_INTERVAL = 1.0
+
+# the successful responses of these MIME types are streamed to the disk instead of being kept in memory
+DOWNLOAD_HANDLERS = {
+    'http': 'scrapy_parser.handlers.StreamingDownloadHandler',
+    'https': 'scrapy_parser.handlers.StreamingDownloadHandler',
+}
+STREAMED_MIME_TYPES = ['application/pdf', 'video/mp4', 'video/webm', 'application/zip', 'application/x-gzip']
+
+# the other MIME types handled by the spider, or the MIME types whose handler is replaced, with the name of a default
+# handler (html, css, xml, js, img, pdf, stored, streamed) or the path to a MimeHandler object, a family of types is
+# registered with a wildcard, e.g. {'application/xhtml+xml': 'html', 'audio/*': 'streamed'}
+MIME_HANDLERS = {}
+
+# the number of worker processes that parse, rewrite and save the HTML, CSS, XML, JS and images, so the crawl uses
+# several cores, 0 to process them in the crawler process, -1 for the number of cores minus the one of the crawler
+CONTENT_WORKERS = -1
 
 HTTPERROR_ALLOW_ALL = True
 
@@ -53,5 +98,10 @@ RANDOMIZE_DOWNLOAD_DELAY = False
 METAREFRESH_ENABLED = False
 
 DNSCACHE_ENABLED = True
+# the BLOOM dupe filter needs pybloom_live (pip install cornetto[bloom])
 # DUPEFILTER_CLASS = "scrapy_parser.BLOOMDupeFilter.BLOOMDupeFilter"
 DUPEFILTER_CLASS = "scrapy_parser.SimpleDupeFilter.SimpleDupeFilter"
+# the number of urls of the first BLOOM filter, the next ones are 4 times bigger when it's full
+BLOOM_INITIAL_CAPACITY = 2000000
+# the maximum false positive rate of the BLOOM filter
+BLOOM_ERROR_RATE = 0.00001
@@ -0,0 +1,220 @@
+# coding=utf-8
+"""
+Cornetto
+
+Copyright (C) 2018–2020 ANSSI
+Contributors:
+2018–2020 Bureau Applicatif tech-sdn-app@ssi.gouv.fr
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+"""
+# The cache of the processed contents keeps the result of the processing of the contents (rewriting of the urls,
+# serialization, removal of the metadata) between the statifications :
+#   <2 first chars of the key>/<key>        the processed content, as it is written in the output
+#   <2 first chars of the key>/<key>.json   the links of the content, the path, the size and the sha256 of its file
+#                                           in the output
+# The key is the sha256 of the kind of content, the version of its processing, the hash of the rules used to rewrite
+# and classify the urls, the url of the content if its links are resolved against it, and the sha256 of the content.
+# The last modification time of an entry is updated when it's used, the least recently used entries are removed at
+# the end of each crawl when the cache is bigger than its maximum size.
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+
+statif_logger = logging.getLogger('statification')
+
+METADATA_EXTENSION = '.json'
+
+# the size of the blocks read to copy and hash a file
+BLOCK_SIZE = 1024 * 1024
+
+
+def get_rules_hash(*rules):
+    """
+    Get the hash of the rules used to process the contents
+    @param rules: the rules, they must be serializable in JSON
+    @return the sha256 of the rules
+    """
+    return hashlib.sha256(json.dumps(rules, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def write_atomic(s_path, f_write):
+    """
+    Write a file of the cache in a temporary file renamed once it's complete, so the cache can be shared by several
+    processes
+    @param s_path: the path to the file
+    @param f_write: the function that write the temporary file, called with its path
+    """
+    s_directory = os.path.dirname(s_path)
+    os.makedirs(s_directory, exist_ok=True)
+    i_fd, s_temporary = tempfile.mkstemp(prefix='.', dir=s_directory)
+    os.close(i_fd)
+    try:
+        f_write(s_temporary)
+        os.replace(s_temporary, s_path)
+    except OSError:
+        os.remove(s_temporary)
+        raise
+
+
+def hash_file(s_path):
+    """
+    @param s_path: the path to a file
+    @return the sha256 of the content of the file
+    """
+    sha = hashlib.sha256()
+    with open(s_path, 'rb') as f_file:
+        for block in iter(lambda: f_file.read(BLOCK_SIZE), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def add_to_cache(entry, s_filename):
+    """
+    Add the processed content of an item to the cache, called once its file has been written
+    @param entry: the entry prepared by ProcessedCache.prepare
+    @param s_filename: the path to the file of the item in the output
+    """
+    sha = hashlib.sha256()
+
+    def write_object(s_path):
+        # the processed content is hashed while it's copied
+        with open(s_filename, 'rb') as f_file, open(s_path, 'wb') as f_object:
+            for block in iter(lambda: f_file.read(BLOCK_SIZE), b''):
+                sha.update(block)
+                f_object.write(block)
+
+    def write_metadata(s_path):
+        with open(s_path, 'w') as f_metadata:
+            json.dump({'path': s_filename[len(entry['output']):], 'size': os.path.getsize(s_filename),
+                       'sha256': sha.hexdigest(), 'links': entry['links'], 'unknown_links': entry['unknown_links']},
+                      f_metadata)
+
+    try:
+        write_atomic(entry['object'], write_object)
+        # the metadata is written last, an entry without metadata is not used
+        write_atomic(entry['object'] + METADATA_EXTENSION, write_metadata)
+    except OSError as e:
+        statif_logger.warning('The processed content of %s has not been cached : %s' % (s_filename, e))
+
+
+class ProcessedCache(object):
+    """
+    Cache of the results of the processing of the contents, shared by the crawler and its content workers
+    """
+
+    def __init__(self, s_directory, s_rules_hash='', s_output='', s_previous_output=''):
+        """
+        @param s_directory: the directory of the cache
+        @param s_rules_hash: the hash of the rules used to process the contents, see get_rules_hash
+        @param s_output: the path to the directory where the files are stored
+        @param s_previous_output: the path to the directory of the previous statification, its files are linked
+                                  instead of the cached contents when they are identical
+        """
+        self.s_directory = s_directory
+        self.s_rules_hash = s_rules_hash
+        self.s_output = s_output
+        self.s_previous_output = s_previous_output
+
+    def get_key(self, s_kind, i_version, url, body):
+        """
+        @param s_kind: the kind of content
+        @param i_version: the version of the processing of this kind of content
+        @param url: the url of the content if its links are resolved against it, empty otherwise
+        @param body: the content
+        @return the key of the result of the processing of the content
+        """
+        key = hashlib.sha256(('%s\n%i\n%s\n%s\n' % (s_kind, i_version, self.s_rules_hash, url)).encode('utf-8'))
+        key.update(hashlib.sha256(body).digest())
+        return key.hexdigest()
+
+    def get_object_path(self, s_key):
+        """
+        @param s_key: the key of the entry
+        @return the path to the processed content
+        """
+        return os.path.join(self.s_directory, s_key[:2], s_key)
+
+    def get(self, s_key):
+        """
+        Get an entry of the cache and mark it as used
+        @param s_key: the key of the entry
+        @return the metadata of the entry with the path to its processed content ('object') and the path to the
+                identical file of the previous statification if there is one ('previous'), None if there is no entry
+        """
+        s_object = self.get_object_path(s_key)
+        try:
+            with open(s_object + METADATA_EXTENSION) as f_metadata:
+                entry = json.load(f_metadata)
+            os.utime(s_object)
+            os.utime(s_object + METADATA_EXTENSION)
+        except (OSError, ValueError):
+            return None
+
+        entry['object'] = s_object
+        entry['previous'] = None
+        if self.s_previous_output and entry.get('sha256'):
+            s_previous = self.s_previous_output + entry['path']
+            # the file at the same path in the previous statification can have another content
+            try:
+                if os.path.getsize(s_previous) == entry['size'] and hash_file(s_previous) == entry['sha256']:
+                    entry['previous'] = s_previous
+            except OSError:
+                pass
+        return entry
+
+    def prepare(self, s_key, a_links, a_unknown_links):
+        """
+        Prepare the entry of a content being processed, it's added by add_to_cache once the file has been written
+        @param s_key: the key of the entry
+        @param a_links: the absolute links of the content and a boolean set if the link is external
+        @param a_unknown_links: the links of the content that can't be crawled
+        @return the entry to give to add_to_cache
+        """
+        return {'object': self.get_object_path(s_key), 'output': self.s_output, 'links': a_links,
+                'unknown_links': a_unknown_links}
+
+    def evict(self, i_max_size):
+        """
+        Remove the least recently used entries until the size of the cache is below its maximum size
+        @param i_max_size: the maximum size of the cache in bytes
+        @return the size of the cache and the number of entries removed
+        """
+        a_entries = []
+        i_size = 0
+        for s_directory, a_directories, a_files in os.walk(self.s_directory):
+            for s_file in a_files:
+                if s_file.endswith(METADATA_EXTENSION) or s_file.startswith('.'):
+                    continue
+                s_object = os.path.join(s_directory, s_file)
+                try:
+                    stat = os.stat(s_object)
+                    i_entry_size = stat.st_size + os.path.getsize(s_object + METADATA_EXTENSION)
+                except OSError:
+                    # the metadata is being written
+                    continue
+                a_entries.append((stat.st_mtime, i_entry_size, s_object))
+                i_size += i_entry_size
+
+        i_evicted = 0
+        for f_mtime, i_entry_size, s_object in sorted(a_entries):
+            if i_size <= i_max_size:
+                break
+            for s_path in (s_object + METADATA_EXTENSION, s_object):
+                try:
+                    os.remove(s_path)
+                except FileNotFoundError:
+                    pass
+            i_size -= i_entry_size
+            i_evicted += 1
+        return i_size, i_evicted
@@ -0,0 +1,85 @@
+# coding=utf-8
+"""
+Cornetto
+
+Copyright (C) 2018–2020 ANSSI
+Contributors:
+2018–2020 Bureau Applicatif tech-sdn-app@ssi.gouv.fr
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+"""
+# The crawl events are written by the spider as JSON lines, one event per line, e.g :
+# {"type": "external_link", "url": "http://other.domain.com/", "source": "http://web.your-private-domain.com/"}
+# {"type": "http_error", "code": 404, "url": "http://web.your-private-domain.com/missing", "source": "..."}
+# {"type": "forbidden_mime", "mime": "application/octet-stream", "url": "http://web.your-private-domain.com/a.iso"}
+# {"type": "exception", "message": "Spider error processing <GET ...>\nTraceback ..."}
+# {"type": "stats", "stats": {"response_received_count": 42, ...}}
+# They are read by the API to fill the database at the end of the statification.
+
+import json
+import logging
+import threading
+
+EVENT_EXTERNAL_LINK = 'external_link'
+EVENT_HTTP_ERROR = 'http_error'
+EVENT_FORBIDDEN_MIME = 'forbidden_mime'
+EVENT_EXCEPTION = 'exception'
+EVENT_STATS = 'stats'
+
+
+class CrawlEventWriter(object):
+    """
+    Write the typed events of the crawl in a JSON lines file
+    """
+
+    def __init__(self, s_events_file):
+        """
+        @param s_events_file: the path to the events file, it is erased if it already exist
+        """
+        # the file is line buffered so each event is written as soon as it happens
+        self.file = open(s_events_file, 'w', buffering=1, encoding='utf-8')
+        # events can be written from the threads of the reactor pool
+        self.lock = threading.Lock()
+
+    def write(self, s_type, **fields):
+        """
+        Write an event in the file
+        @param s_type: the type of the event
+        @param fields: the data of the event
+        """
+        fields['type'] = s_type
+        # the stats contain datetime that are written as string
+        s_line = json.dumps(fields, default=str) + '\n'
+        with self.lock:
+            self.file.write(s_line)
+
+    def close(self):
+        self.file.close()
+
+
+class CrawlEventLogHandler(logging.Handler):
+    """
+    Logging handler that write every error logged during the crawl as an exception event
+    """
+
+    def __init__(self, writer):
+        """
+        @param writer: the writer of the crawl events
+        """
+        super(CrawlEventLogHandler, self).__init__(logging.ERROR)
+        # the message is followed by the traceback if there is one
+        self.setFormatter(logging.Formatter('%(message)s'))
+        self.writer = writer
+
+    def emit(self, record):
+        try:
+            self.writer.write(EVENT_EXCEPTION, message=self.format(record))
+        except Exception:
+            self.handleError(record)
@@ -0,0 +1,107 @@
+# coding=utf-8
+"""
+Cornetto
+
+Copyright (C) 2018–2020 ANSSI
+Contributors:
+2018–2020 Bureau Applicatif tech-sdn-app@ssi.gouv.fr
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+"""
+# Define your extensions here
+#
+# Don't forget to add your extension to the EXTENSIONS setting
+# See: https://docs.scrapy.org/en/latest/topics/extensions.html
+
+import time
+
+from scrapy import signals
+from twisted.internet import task
+
+from scrapy_parser.progress import ProgressWriter
+
+
+class ProgressExtension(object):
+    """
+    This extension publish the progress of the crawl (pages crawled, bytes downloaded, queue depth, errors and
+    throughput) from the stats of the crawler in the progress file every PROGRESS_FLUSH_INTERVAL seconds
+    """
+
+    def __init__(self, crawler, f_interval):
+        self.crawler = crawler
+        self.f_interval = f_interval
+        self.writer = None
+        self.loop = None
+        # used to compute the throughput since the last flush
+        self.i_last_pages = 0
+        self.f_last_time = 0
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        extension = cls(crawler, crawler.settings.getfloat('PROGRESS_FLUSH_INTERVAL', 1.0))
+        crawler.signals.connect(extension.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(extension.spider_closed, signal=signals.spider_closed)
+        return extension
+
+    def spider_opened(self, spider):
+        """
+        Start to publish the progress if the spider has been given a progress file
+        @param spider: the spider that has been opened
+        """
+        s_progress_file = getattr(spider, 'sCrawlerProgressCountFile', None)
+        if s_progress_file:
+            self.writer = ProgressWriter(s_progress_file)
+            # the pages crawled before a paused crawl was resumed are not counted in the throughput
+            self.i_last_pages = self.crawler.stats.get_value('custom_count', 0)
+            self.f_last_time = time.monotonic()
+            self.loop = task.LoopingCall(self.flush)
+            self.loop.start(self.f_interval, now=False)
+
+    def spider_closed(self, spider):
+        """
+        Publish the final progress
+        @param spider: the spider that has been closed
+        """
+        if self.writer:
+            if self.loop.running:
+                self.loop.stop()
+            self.flush()
+            self.writer.close()
+            self.writer = None
+
+    def flush(self):
+        """
+        Write the current stats of the crawl in the progress file
+        """
+        stats = self.crawler.stats
+        i_pages = stats.get_value('custom_count', 0)
+
+        # the errors are the exceptions logged and the HTTP errors
+        i_errors = stats.get_value('log_count/ERROR', 0)
+        for s_key, i_value in stats.get_stats().items():
+            if s_key.startswith('downloader/response_status_count/') and s_key[-3] in '45':
+                i_errors += i_value
+
+        # the number of requests waiting in the scheduler
+        i_queue = 0
+        slot = getattr(self.crawler.engine, 'slot', None)
+        if slot is not None:
+            i_queue = len(slot.scheduler)
+
+        f_now = time.monotonic()
+        f_throughput = (i_pages - self.i_last_pages) / (f_now - self.f_last_time) if f_now > self.f_last_time else 0.0
+        self.i_last_pages = i_pages
+        self.f_last_time = f_now
+
+        # the bodies streamed to the disk are not counted in the bytes of the responses
+        i_bytes = stats.get_value('downloader/response_bytes', 0) + stats.get_value('streaming/bytes', 0)
+
+        self.writer.write(pages=i_pages, bytes=i_bytes, queue=i_queue,
+                          errors=i_errors, throughput=f_throughput)
@@ -0,0 +1,229 @@
+# coding=utf-8
+"""
+Cornetto
+
+Copyright (C) 2018–2020 ANSSI
+Contributors:
+2018–2020 Bureau Applicatif tech-sdn-app@ssi.gouv.fr
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+"""
+# Define your download handlers here
+#
+# Don't forget to add your handler to the DOWNLOAD_HANDLERS setting
+# See: https://docs.scrapy.org/en/latest/topics/settings.html#download-handlers
+
+import glob
+import hashlib
+import inspect
+import logging
+import os
+import tempfile
+
+from scrapy.core.downloader.handlers.http11 import HTTP11DownloadHandler, ScrapyAgent
+
+statif_logger = logging.getLogger('statification')
+
+# the prefix and suffix of the temporary files where the bodies are streamed, in the output directory
+STREAMING_PREFIX = '.streaming-'
+STREAMING_SUFFIX = '.part'
+# the private attributes of Scrapy used by the streaming download handler, they are checked when it's created
+HANDLER_ATTRIBUTES = ('_contextFactory', '_pool', '_default_maxsize', '_default_warnsize', '_fail_on_dataloss',
+                      '_crawler')
+AGENT_PARAMETERS = ('contextFactory', 'pool', 'maxsize', 'warnsize', 'fail_on_dataloss', 'crawler')
+
+
+def remove_streaming_files(s_output):
+    """
+    Remove the temporary files of the bodies that have been streamed but not saved
+    @param s_output: the output directory of the crawl
+    """
+    for s_path in glob.glob(os.path.join(s_output, STREAMING_PREFIX + '*' + STREAMING_SUFFIX)):
+        os.remove(s_path)
+
+
+class StreamingBody(object):
+    """
+    File like object used instead of the in memory buffer of the response reader, the body is written in a temporary
+    file chunk by chunk as it is received, and hashed on the fly
+    """
+
+    def __init__(self, s_directory, i_buffer_size=65536):
+        """
+        @param s_directory: the directory of the temporary file, it must be on the same file system as the output
+        @param i_buffer_size: the size of the buffer of the temporary file
+        """
+        i_fd, self.s_path = tempfile.mkstemp(prefix=STREAMING_PREFIX, suffix=STREAMING_SUFFIX, dir=s_directory)
+        # the temporary file is created private, the saved file must have the same mode as the other files
+        i_umask = os.umask(0)
+        os.umask(i_umask)
+        os.chmod(self.s_path, 0o666 & ~i_umask)
+        self.file = os.fdopen(i_fd, 'wb', buffering=i_buffer_size)
+        self.hash = hashlib.sha256()
+        self.i_size = 0
+        # False if the body has been kept in memory by Scrapy instead of being written in the file
+        self.b_streamed = True
+
+    def write(self, data):
+        self.file.write(data)
+        self.hash.update(data)
+        self.i_size += len(data)
+
+    def truncate(self, i_size=None):
+        # called when the maximum size of download is exceeded, the download is then cancelled
+        self.file.seek(0)
+        self.file.truncate()
+        self.hash = hashlib.sha256()
+        self.i_size = 0
+
+    def getvalue(self):
+        """
+        Called when the download is finished, the body of the response is empty as it is in the temporary file
+        @return an empty body
+        """
+        self.file.close()
+        return b''
+
+    def discard(self):
+        """
+        Remove the temporary file
+        """
+        self.file.close()
+        if os.path.exists(self.s_path):
+            os.remove(self.s_path)
+
+
+class StreamingAgent(ScrapyAgent):
+    """
+    Agent that stream the body of the successful responses of some MIME types in a temporary file of the output
+    directory instead of keeping it in memory. The path of the file, its sha256 and its size are set in the meta of the
+    request ('streamed_file', 'streamed_sha256' and 'streamed_size'), the item is then saved by renaming the file.
+    The status of the response is set in the meta of the request ('download_status') before the headers_received
+    signal is sent, so its handlers know the status.
+    """
+
+    def __init__(self, *args, a_streamed_mime_types=(), **kwargs):
+        """
+        @param a_streamed_mime_types: the MIME types of the responses to stream
+        """
+        super(StreamingAgent, self).__init__(*args, **kwargs)
+        self.a_streamed_mime_types = a_streamed_mime_types
+
+    def get_streaming_directory(self, txresponse):
+        """
+        Get the directory where to stream the body of the response
+        @param txresponse: the response which headers have been received
+        @return the output directory of the spider, None if the response should not be streamed
+        """
+        s_output = getattr(self._crawler.spider, 'output', '')
+        if not s_output or not 200 <= txresponse.code < 300:
+            return None
+
+        mime = txresponse.headers.getRawHeaders(b'Content-Type', [b'text/plain'])[0].decode('latin-1')
+        mime = mime.split(';')[0].strip()
+        # the handler of the MIME type in the spider declares if its contents can be streamed
+        registry = getattr(self._crawler.spider, 'mime_registry', None)
+        if registry is not None:
+            handler = registry.get(mime)
+            if handler is None or not handler.b_stream:
+                return None
+        elif mime not in self.a_streamed_mime_types:
+            return None
+
+        os.makedirs(s_output, exist_ok=True)
+        return s_output
+
+    def _cb_bodyready(self, txresponse, request):
+        # the headers_received signal doesn't give the status of the response
+        request.meta['download_status'] = txresponse.code
+        s_directory = self.get_streaming_directory(txresponse)
+        if s_directory is None:
+            return super(StreamingAgent, self)._cb_bodyready(txresponse, request)
+
+        body = StreamingBody(s_directory)
+        deliver_body = txresponse.deliverBody
+
+        def deliver_body_to_file(reader):
+            # the reader of Scrapy write the body in its buffer, which is replaced by the temporary file
+            if hasattr(reader, '_bodybuf'):
+                reader._bodybuf = body
+            else:
+                body.b_streamed = False
+            deliver_body(reader)
+
+        txresponse.deliverBody = deliver_body_to_file
+        # the body is not kept in memory, there is no need to warn about its size
+        request.meta['download_warnsize'] = 0
+        result = super(StreamingAgent, self)._cb_bodyready(txresponse, request)
+
+        if isinstance(result, dict):
+            # the download has been stopped when the headers were received or the body is empty
+            body.discard()
+            return result
+
+        def body_done(result):
+            if result.get('failure') or not body.b_streamed:
+                # the body has been downloaded in memory if the reader of Scrapy has no buffer
+                body.discard()
+                return result
+            request.meta['streamed_file'] = body.s_path
+            request.meta['streamed_sha256'] = body.hash.hexdigest()
+            request.meta['streamed_size'] = body.i_size
+            self._crawler.stats.inc_value('streaming/file_count')
+            self._crawler.stats.inc_value('streaming/bytes', body.i_size)
+            statif_logger.debug('%i bytes of %s streamed to %s' % (body.i_size, request.url, body.s_path))
+            return result
+
+        def body_failed(failure):
+            body.discard()
+            return failure
+
+        return result.addCallbacks(body_done, body_failed)
+
+
+class StreamingDownloadHandler(HTTP11DownloadHandler):
+    """
+    HTTP download handler that stream the body of the responses in the output directory, the responses of the MIME
+    types whose handler in the spider can stream, or of the STREAMED_MIME_TYPES if the spider has no MIME registry
+    """
+
+    def __init__(self, settings, crawler=None):
+        super(StreamingDownloadHandler, self).__init__(settings, crawler)
+        self.a_streamed_mime_types = frozenset(settings.getlist('STREAMED_MIME_TYPES'))
+        self.b_streaming = self.is_supported()
+        if not self.b_streaming:
+            statif_logger.warning('The streaming download handler does not support this version of Scrapy, the '
+                                  'responses are downloaded in memory and their MIME types are checked once downloaded')
+
+    def is_supported(self):
+        """
+        Check that the private API of Scrapy used to stream the responses is available
+        @return True if the responses can be streamed, False to use the download handler of Scrapy
+        """
+        if not callable(getattr(ScrapyAgent, '_cb_bodyready', None)):
+            return False
+        if not all(hasattr(self, s_attribute) for s_attribute in HANDLER_ATTRIBUTES):
+            return False
+        return set(AGENT_PARAMETERS) <= set(inspect.signature(ScrapyAgent.__init__).parameters)
+
+    def download_request(self, request, spider):
+        """Return a deferred for the HTTP download"""
+        if not self.b_streaming:
+            return super(StreamingDownloadHandler, self).download_request(request, spider)
+        agent = StreamingAgent(
+            contextFactory=self._contextFactory,
+            pool=self._pool,
+            maxsize=getattr(spider, 'download_maxsize', self._default_maxsize),
+            warnsize=getattr(spider, 'download_warnsize', self._default_warnsize),
+            fail_on_dataloss=self._fail_on_dataloss,
+            crawler=self._crawler,
+            a_streamed_mime_types=self.a_streamed_mime_types,
+        )
+        return agent.download_request(request)
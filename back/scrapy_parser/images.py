@@ -0,0 +1,220 @@
+# coding=utf-8
+"""
+Cornetto
+
+Copyright (C) 2018–2020 ANSSI
+Contributors:
+2018–2020 Bureau Applicatif tech-sdn-app@ssi.gouv.fr
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+"""
+# The metadata of the images (EXIF, XMP, IPTC, comments, text chunks) are removed by rewriting the segments of their
+# container from the downloaded bytes, the image data is copied as it is so there is no loss of quality. The image is
+# decoded and re-encoded by Pillow only if its container can't be read.
+
+import io
+import logging
+import struct
+import time
+
+from PIL import Image
+
+statif_logger = logging.getLogger('statification')
+
+JPEG_SIGNATURE = b'\xff\xd8'
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+GIF_SIGNATURES = (b'GIF87a', b'GIF89a')
+
+# the JPEG segments that are kept : JFIF (APP0), ICC profile (APP2) and Adobe (APP14) are needed to display the image
+JPEG_KEPT_APP_SEGMENTS = frozenset([0xe0, 0xe2, 0xee])
+# the JPEG markers without length
+JPEG_STANDALONE_MARKERS = frozenset([0x01] + list(range(0xd0, 0xd8)))
+# the PNG chunks that contain metadata
+PNG_METADATA_CHUNKS = frozenset([b'tEXt', b'zTXt', b'iTXt', b'eXIf', b'tIME'])
+# the GIF application extensions that are kept, they define the animation loop
+GIF_KEPT_APPLICATIONS = frozenset([b'NETSCAPE2.0', b'ANIMEXTS1.0'])
+
+
+def strip_jpeg(data):
+    """
+    Remove the metadata segments of a JPEG image
+    @param data: the image
+    @return the image without metadata
+    @raise ValueError if the container is not valid
+    """
+    a_parts = [JPEG_SIGNATURE]
+    i_position = 2
+    while True:
+        if data[i_position] != 0xff:
+            raise ValueError('Invalid JPEG marker at %i' % i_position)
+        i_marker = data[i_position + 1]
+        if i_marker == 0xff:
+            # fill byte
+            i_position += 1
+            continue
+        if i_marker in JPEG_STANDALONE_MARKERS:
+            a_parts.append(data[i_position:i_position + 2])
+            i_position += 2
+            continue
+        if i_marker == 0xda:
+            # start of scan, the rest is the image data
+            a_parts.append(data[i_position:])
+            return b''.join(a_parts)
+
+        i_length = struct.unpack('>H', data[i_position + 2:i_position + 4])[0]
+        i_end = i_position + 2 + i_length
+        if i_length < 2 or i_end > len(data):
+            raise ValueError('Invalid JPEG segment at %i' % i_position)
+        # the APPn segments and the comments contain the metadata
+        if not ((0xe0 <= i_marker <= 0xef and i_marker not in JPEG_KEPT_APP_SEGMENTS) or i_marker == 0xfe):
+            a_parts.append(data[i_position:i_end])
+        i_position = i_end
+
+
+def strip_png(data):
+    """
+    Remove the metadata chunks of a PNG image
+    @param data: the image
+    @return the image without metadata
+    @raise ValueError if the container is not valid
+    """
+    a_parts = [PNG_SIGNATURE]
+    i_position = len(PNG_SIGNATURE)
+    while i_position < len(data):
+        i_length, s_type = struct.unpack('>I4s', data[i_position:i_position + 8])
+        # the chunk is its length, its type, its data and its CRC
+        i_end = i_position + 12 + i_length
+        if i_end > len(data):
+            raise ValueError('Invalid PNG chunk at %i' % i_position)
+        if s_type not in PNG_METADATA_CHUNKS:
+            a_parts.append(data[i_position:i_end])
+        i_position = i_end
+        if s_type == b'IEND':
+            return b''.join(a_parts)
+    raise ValueError('The PNG image has no end')
+
+
+def skip_gif_sub_blocks(data, i_position):
+    """
+    @param data: the image
+    @param i_position: the position of the first sub block
+    @return the position after the last sub block
+    """
+    while True:
+        i_size = data[i_position]
+        i_position += 1 + i_size
+        if i_size == 0:
+            return i_position
+
+
+def strip_gif(data):
+    """
+    Remove the comments and the application extensions (XMP...) of a GIF image
+    @param data: the image
+    @return the image without metadata
+    @raise ValueError if the container is not valid
+    """
+    # the header and the logical screen descriptor, followed by the global color table
+    i_position = 13
+    if data[10] & 0x80:
+        i_position += 3 * 2 ** ((data[10] & 0x07) + 1)
+    a_parts = [data[:i_position]]
+
+    while True:
+        i_block = data[i_position]
+        if i_block == 0x3b:
+            # trailer
+            a_parts.append(data[i_position:i_position + 1])
+            return b''.join(a_parts)
+        elif i_block == 0x2c:
+            # image descriptor, local color table, LZW minimum code size and image data
+            i_end = i_position + 10
+            if data[i_position + 9] & 0x80:
+                i_end += 3 * 2 ** ((data[i_position + 9] & 0x07) + 1)
+            i_end = skip_gif_sub_blocks(data, i_end + 1)
+            a_parts.append(data[i_position:i_end])
+        elif i_block == 0x21:
+            i_label = data[i_position + 1]
+            i_end = skip_gif_sub_blocks(data, i_position + 2)
+            if i_label == 0xfe:
+                # comment extension
+                pass
+            elif i_label == 0xff and data[i_position + 3:i_position + 14] not in GIF_KEPT_APPLICATIONS:
+                # application extension (XMP...)
+                pass
+            else:
+                a_parts.append(data[i_position:i_end])
+        else:
+            raise ValueError('Invalid GIF block at %i' % i_position)
+        i_position = i_end
+
+
+def reencode(data):
+    """
+    Decode and encode the image again with Pillow, only the image data is kept
+    @param data: the image
+    @return the image encoded in the same format
+    """
+    image = Image.open(io.BytesIO(data))
+    output = io.BytesIO()
+    image.save(output, format=image.format)
+    return output.getvalue()
+
+
+def get_image_format(data):
+    """
+    @param data: the image
+    @return the format of the image, 'other' for the formats without metadata container (BMP, ICO)
+    """
+    if data.startswith(JPEG_SIGNATURE):
+        return 'jpeg'
+    elif data.startswith(PNG_SIGNATURE):
+        return 'png'
+    elif data[:6] in GIF_SIGNATURES:
+        return 'gif'
+    return 'other'
+
+
+# the function that remove the metadata of each format
+STRIP_FUNCTIONS = {'jpeg': strip_jpeg, 'png': strip_png, 'gif': strip_gif}
+
+
+def sanitize_image(data, s_name=''):
+    """
+    Remove the metadata of an image
+    @param data: the image
+    @param s_name: the name of the image, for the logs
+    @return the image without metadata and the stats of the sanitization
+    """
+    f_start = time.process_time()
+    s_format = get_image_format(data)
+    stats = {}
+
+    strip = STRIP_FUNCTIONS.get(s_format)
+    if strip is not None:
+        try:
+            clean_data = strip(data)
+        except (ValueError, IndexError, struct.error) as e:
+            # the container can't be read, only the image data decoded by Pillow is kept
+            statif_logger.log(logging.INFO, "The image %s is re-encoded : %s" % (s_name, e))
+            try:
+                clean_data = reencode(data)
+                stats['images/reencoded_count'] = 1
+            except (OSError, SyntaxError, ValueError):
+                statif_logger.log(logging.INFO, "The image %s has not been cleaned, it can't be decoded" % s_name)
+                clean_data = data
+                stats['images/failed_count'] = 1
+    else:
+        clean_data = data
+
+    stats['images/%s/count' % s_format] = 1
+    stats['images/%s/bytes_removed' % s_format] = len(data) - len(clean_data)
+    stats['images/%s/seconds' % s_format] = time.process_time() - f_start
+    return clean_data, stats
@@ -17,15 +17,20 @@ You should have received a copy of the GNU General Public License
 
 """
 # Todo This file should be customized to add specific treatment when saving different type of file.
-# It can be useful to clear metadata of pdf file and image file.
+# The metadata of the PDF files are removed by the PdfSanitizingPipeline before they are saved.
 
 import logging
 import os
+import shutil
 
-from PIL import Image
 from lxml import etree
 from scrapy.item import Item, Field
 
+from scrapy_parser.cache import add_to_cache
+from scrapy_parser.images import sanitize_image
+from scrapy_parser.paths import store_file
+from scrapy_parser.timing import measure, get_timing_stats, STAGE_CLEAN, STAGE_SERIALIZE, STAGE_WRITE
+
 statif_logger = logging.getLogger('statification')
 
 
@@ -42,53 +47,131 @@ def remove_xml_element(element):
         parent.remove(element)
 
 
+def add_item_stats(stats, item_stats):
+    """
+    Add the stats of the processing of an item to the stats of the crawler
+    @param stats: the stats collector of the crawler
+    @param item_stats: the stats of the item, None if it has none
+    """
+    for s_key, value in (item_stats or {}).items():
+        stats.inc_value(s_key, value)
+
+
 class MirroringItem(Item):
     """
-    This class define how to create folders and how to save file in the default case.
+    This class define how to save file in the default case.
     """
     content = Field()
     filename = Field()
+    # the path to the same file in the previous statification, set if it has not been modified since
+    previous = Field()
+    # the path to the temporary file where the content has been streamed, set if it has not been kept in memory
+    streamed = Field()
+    # the sha256 of the content as it was downloaded, computed while it was streamed or by the PdfSanitizingPipeline
+    sha256 = Field()
+    # set if the content has already been stored by a content worker
+    stored = Field()
+    # the stats of the processing of the item (e.g. the time spent to clean it), added to the stats of the crawler
+    stats = Field()
+    # the path to the processed content in the cache, set if the same content has been processed before
+    cached = Field()
+    # the entry of the cache where to add the processed content once it has been written, see ProcessedCache.prepare
+    cache = Field()
+    # the name of the handler of the MIME type of the content, the time spent in each stage is measured for it
+    mime = Field()
 
-    def mkdir(self):
+    def add_stats(self, stats):
         """
-        Create new folder
+        Add stats to the stats of the processing of the item
+        @param stats: the stats to add
         """
-        # Create directories structure
-        path = os.path.dirname(self['filename'])
+        item_stats = self.setdefault('stats', {})
+        for s_key, value in stats.items():
+            item_stats[s_key] = item_stats.get(s_key, 0) + value
 
-        if os.path.isdir(path):
-            # the directories exist we do nothing
-            pass
-        elif os.path.exists(path):
-            # the path exist but doesn't point to a directory
-            # we will remove the file and make a new directory
-            os.remove(path)
-            os.makedirs(path)
-        else:
-            # the directory doesn't exist we create it
-            os.makedirs(path)
+    def add_timing(self, s_stage, f_seconds):
+        """
+        Add the time spent in a stage of the crawl of the content to the stats of the item
+        @param s_stage: the stage (STAGE_PARSE, STAGE_WRITE...)
+        @param f_seconds: the number of seconds spent
+        """
+        self.add_stats(get_timing_stats(self.get('mime'), s_stage, f_seconds))
+
+    def measure(self, s_stage):
+        """
+        Measure the time spent in a stage of the crawl of the content, used as a context manager
+        @param s_stage: the stage (STAGE_SERIALIZE, STAGE_WRITE...)
+        """
+        return measure(self.add_stats, self.get('mime'), s_stage)
+
+    def store_file(self, writer):
+        """
+        Write the file of the item with store_file, the time spent is measured
+        @param writer: the function called with the path where to write the file
+        """
+        with self.measure(STAGE_WRITE):
+            self['filename'] = store_file(self['filename'], writer)
 
     def save(self, content=None):
         """
-        Save the content into a file
+        Save the content into a file, the directories are created if needed
         @param content: content of a file
         @type content: str
         """
+        if content is None and self.get('streamed'):
+            # the content is already in a temporary file of the output directory, it's just renamed
+            self.store_file(lambda s_path: os.replace(self['streamed'], s_path))
+            return
+
         if content is None:
             content = self['content']
 
+        def write(s_path):
+            with open(s_path, "wb") as f:
+                f.write(content)
+
         # Save content
-        self.mkdir()
-        try:
-            f = open(self['filename'], "wb")
-            f.write(content)
-            f.close()
-        except IsADirectoryError:
-            pass
+        self.store_file(write)
+
+    def link_previous(self):
+        """
+        Reuse the file of the previous statification instead of saving the content,
+        the file is hard linked if possible, copied otherwise
+        """
+        def link(s_path):
+            try:
+                os.link(self['previous'], s_path)
+            except FileExistsError:
+                if os.path.isdir(s_path):
+                    raise IsADirectoryError(s_path)
+                os.remove(s_path)
+                os.link(self['previous'], s_path)
+            except (FileNotFoundError, NotADirectoryError):
+                raise
+            except OSError:
+                # hard links are not possible between two file systems
+                shutil.copyfile(self['previous'], s_path)
+
+        self.store_file(link)
 
     def process(self):
         self.save()
 
+    def store(self):
+        """
+        Store the file of the item, it's linked from the previous statification if it has not been modified since,
+        and copied from the cache if the same content has already been processed
+        """
+        if self.get('previous'):
+            # the file has not been modified since the previous statification
+            self.link_previous()
+        elif self.get('cached'):
+            self.store_file(lambda s_path: shutil.copyfile(self['cached'], s_path))
+        else:
+            self.process()
+            if self.get('cache'):
+                add_to_cache(self['cache'], self['filename'])
+
 
 class MirroringItemHtml(MirroringItem):
     def process(self):
@@ -96,7 +179,9 @@ class MirroringItemHtml(MirroringItem):
         Here we do the specific treatment to save HTML files
         """
         root = self['content']
-        self.save(etree.tostring(root, method="html", encoding=root.docinfo.encoding, pretty_print=True))
+        with self.measure(STAGE_SERIALIZE):
+            content = etree.tostring(root, method="html", encoding=root.docinfo.encoding, pretty_print=True)
+        self.save(content)
 
 
 class MirroringItemCss(MirroringItem):
@@ -110,20 +195,13 @@ class MirroringItemCss(MirroringItem):
 class MirroringItemPdf(MirroringItem):
     def process(self):
         """
-        Here we do the specific treatment to save PDF files
+        Here we do the specific treatment to save PDF files, their metadata have been removed by the
+        PdfSanitizingPipeline
         """
 
         # save the pdf into a file
         self.save()
 
-        # Uncomment to remove metadata of PDF file (beware it need the exiftool package to be installed)
-        # try:
-        #     # erase all metadata in the pdf file
-        #     logging.log(logging.DEBUG,
-        #                 sh.exiftool('-overwrite_original', '-all=', self['filename'], _bg=True, _tty_out=False))
-        # except sh.CommandNotFound:
-        #     logging.log(logging.ERROR, "Error command exiftool not found, is it correctly installed ?")
-
 
 class MirroringItemXml(MirroringItem):
     def process(self):
@@ -131,7 +209,9 @@ class MirroringItemXml(MirroringItem):
         Here we do the specific treatment to save XML files
         """
         root = self['content']
-        self.save(etree.tostring(root, method="xml", encoding=root.docinfo.encoding, pretty_print=True))
+        with self.measure(STAGE_SERIALIZE):
+            content = etree.tostring(root, method="xml", encoding=root.docinfo.encoding, pretty_print=True)
+        self.save(content)
 
 
 class MirroringItemJs(MirroringItem):
@@ -145,18 +225,9 @@ class MirroringItemJs(MirroringItem):
 class MirroringItemImg(MirroringItem):
     def process(self):
         """
-        Here we do the specific treatment to save Image files
+        Here we do the specific treatment to save Image files, their metadata are removed before they are written
         """
-        self.save()
-
-        # if the image exist
-        if os.path.isfile(self['filename']):
-            try:
-                # Create a new image to strip the metadata, and override initial image
-                img = Image.open(self['filename'])
-                img.save(self['filename'])
-            except SyntaxError:
-                logging.log(logging.INFO, "File " + self['filename'] + ' not cleaned error while removing metadata')
-
-        else:
-            logging.log(logging.ERROR, "Unable to found image file : " + self['filename'])
+        with self.measure(STAGE_CLEAN):
+            content, stats = sanitize_image(self['content'], self['filename'])
+        self.add_stats(stats)
+        self.save(content)
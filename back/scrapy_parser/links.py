@@ -0,0 +1,276 @@
+# coding=utf-8
+"""
+Cornetto
+
+Copyright (C) 2018–2020 ANSSI
+Contributors:
+2018–2020 Bureau Applicatif tech-sdn-app@ssi.gouv.fr
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+"""
+# The link engine find the links of a page in a single walk of its tree, rewrite them with the url replacement and
+# classify them as internal or external links. It's used by the MirroringSpider for the HTML, CSS and XML contents.
+
+import logging
+import re
+from urllib import parse
+
+statif_logger = logging.getLogger('statification')
+
+# the attributes that contain a link, for each tag
+LINK_ATTRIBUTES = {
+    'a': ('href',),
+    'applet': ('code',),
+    'area': ('href',),
+    'audio': ('src',),
+    'bgsound': ('src',),
+    'body': ('background',),
+    'embed': ('src',),
+    'fig': ('src',),
+    'form': ('action',),
+    'frame': ('src',),
+    'iframe': ('src',),
+    'img': ('src',),
+    'input': ('src',),
+    'layer': ('src',),
+    'link': ('href',),
+    'object': ('data',),
+    'overlay': ('src',),
+    'script': ('src',),
+    'source': ('src',),
+    'table': ('background',),
+    'td': ('background',),
+    'tr': ('background',),
+    'video': ('src', 'poster'),
+}
+
+# the tags that have a srcset attribute, a list of urls followed by a descriptor (e.g. "a.png 1x, b.png 2x")
+SRCSET_TAGS = frozenset(['img', 'source'])
+
+# the urls in the CSS of the style attributes, of the style elements and of the CSS files
+CSS_URL_REGEX = re.compile(r"""url\(\s*(["']?)([^)"']+)\1\s*\)""")
+CSS_URL_REGEX_BYTES = re.compile(rb"""url\s*\(\s*["']?([^)"']+)["']?\s*\)""")
+
+# the links that can be crawled
+CRAWLABLE_LINK_REGEX = re.compile('^https?:', re.I)
+# the absolute links that don't need to be joined to the base, the group is the domain of the link
+ABSOLUTE_LINK_REGEX = re.compile(r'^https?://([^/?#]*)', re.I)
+# the domain of an absolute link
+DOMAIN_REGEX = re.compile(r'^[a-z][a-z0-9+.-]*://([^/?#]*)', re.I)
+
+
+class LinkEngine(object):
+    """
+    Extract, rewrite and classify the links of the crawled contents
+    """
+
+    def __init__(self, allowed_domains, rewriter=None):
+        """
+        @param allowed_domains: the domains of the internal links
+        @param rewriter: the UrlRewriter of the urls to replace in the links, None if there is nothing to replace
+        """
+        self.allowed_domains = frozenset(allowed_domains)
+        self.rewriter = rewriter if rewriter is not None and not rewriter.is_empty() else None
+
+    def rewrite(self, link):
+        """
+        Replace the urls that match the rewrite rules in a link
+        @param link: the link
+        @return the new link
+        """
+        if self.rewriter is None:
+            return link
+        return self.rewriter.sub_text(link)
+
+    def rewrite_body(self, body):
+        """
+        Replace the urls that match the rewrite rules in a whole content
+        @param body: the content as bytes
+        @return the new content
+        """
+        if self.rewriter is None:
+            return body
+        return self.rewriter.sub(body)
+
+    def rewrite_css(self, css):
+        """
+        Replace the urls that match the rewrite rules in the url() of a CSS
+        @param css: the CSS as a string
+        @return the new CSS
+        """
+        if self.rewriter is None:
+            return css
+        return CSS_URL_REGEX.sub(
+            lambda match: 'url(' + match.group(1) + self.rewrite(match.group(2)) + match.group(1) + ')', css)
+
+    def rewrite_srcset(self, srcset):
+        """
+        Replace the urls that match the rewrite rules in a srcset attribute
+        @param srcset: the srcset
+        @return the new srcset
+        """
+        a_candidates = []
+        for s_candidate in srcset.split(','):
+            a_parts = s_candidate.strip().split(None, 1)
+            if a_parts:
+                a_parts[0] = self.rewrite(a_parts[0])
+                a_candidates.append(' '.join(a_parts))
+        return ', '.join(a_candidates)
+
+    def iter_html_links(self, root, b_rewrite=True):
+        """
+        Walk the tree of an HTML page once to find its links, the links are rewritten in the tree
+        @param root: the tree of the page
+        @param b_rewrite: False if the links have already been rewritten
+        @return an iterator on the links as they are written in the page and a boolean set if the link is the
+                <base href> of the page
+        """
+        for element in root.iter():
+            s_tag = element.tag
+            # the comments and processing instructions have no attributes
+            if not isinstance(s_tag, str):
+                continue
+
+            if s_tag == 'base':
+                s_href = element.get('href')
+                if s_href:
+                    if b_rewrite:
+                        s_href = self.rewrite(s_href)
+                        element.set('href', s_href)
+                    yield s_href, True
+                continue
+
+            for s_attribute in LINK_ATTRIBUTES.get(s_tag, ()):
+                link = element.get(s_attribute)
+                if link:
+                    if b_rewrite:
+                        link = self.rewrite(link)
+                        element.set(s_attribute, link)
+                    yield link, False
+
+            if s_tag in SRCSET_TAGS:
+                srcset = element.get('srcset')
+                if srcset:
+                    if b_rewrite:
+                        srcset = self.rewrite_srcset(srcset)
+                        element.set('srcset', srcset)
+                    for s_candidate in srcset.split(','):
+                        a_parts = s_candidate.split()
+                        if a_parts:
+                            yield a_parts[0], False
+
+            style = element.get('style')
+            if style and 'url(' in style:
+                if b_rewrite:
+                    style = self.rewrite_css(style)
+                    element.set('style', style)
+                for match in CSS_URL_REGEX.finditer(style):
+                    yield match.group(2), False
+
+            if s_tag == 'style' and element.text and 'url(' in element.text:
+                if b_rewrite:
+                    element.text = self.rewrite_css(element.text)
+                for match in CSS_URL_REGEX.finditer(element.text):
+                    yield match.group(2), False
+
+    def extract_html_links(self, root, page_url, b_rewrite=True):
+        """
+        Get the crawlable links of an HTML page, they are rewritten in the tree of the page
+        @param root: the tree of the page
+        @param page_url: the url of the page
+        @param b_rewrite: False if the links have already been rewritten
+        @return the list of the absolute links and a boolean set if the link is external
+        """
+        resolver = LinkResolver(self, page_url)
+        a_links = []
+        for link, b_base in self.iter_html_links(root, b_rewrite):
+            if b_base:
+                # the next links are relative to the base of the page
+                resolver.set_base(link)
+                continue
+            result = resolver.resolve(link)
+            if result is not None:
+                a_links.append(result)
+        return a_links
+
+    def extract_css_links(self, body, page_url):
+        """
+        Get the crawlable links of a CSS file
+        @param body: the content of the CSS file
+        @param page_url: the url of the CSS file
+        @return the list of the absolute links and a boolean set if the link is external
+        """
+        resolver = LinkResolver(self, page_url)
+        a_links = []
+        for link in CSS_URL_REGEX_BYTES.findall(body):
+            result = resolver.resolve(link.decode('utf-8'))
+            if result is not None:
+                a_links.append(result)
+        return a_links
+
+    def is_external(self, link):
+        """
+        @param link: an absolute link
+        @return True if the link is not in the allowed domains
+        """
+        match = DOMAIN_REGEX.match(link)
+        return (match.group(1) if match else '') not in self.allowed_domains
+
+
+class LinkResolver(object):
+    """
+    Resolve the links of a page against its base, the links that appear several times in the page are resolved once
+    """
+
+    def __init__(self, engine, page_url):
+        """
+        @param engine: the link engine
+        @param page_url: the url of the page, it's the base of the links if the page has no <base href>
+        """
+        self.engine = engine
+        self.page_url = page_url
+        self.base = page_url
+        self.cache = {}
+
+    def set_base(self, href):
+        """
+        @param href: the href of the <base> of the page
+        """
+        self.base = parse.urljoin(self.page_url, href)
+        self.cache = {}
+
+    def resolve(self, link):
+        """
+        Get the absolute link and if it's external
+        @param link: the link as written in the page
+        @return the absolute link and a boolean set if the link is external, None if the link can't be crawled
+        """
+        try:
+            return self.cache[link]
+        except KeyError:
+            pass
+
+        s_link = link.strip()
+        match = ABSOLUTE_LINK_REGEX.match(s_link)
+        if match:
+            # most of the links are absolute http links, there is no need to join them
+            result = (s_link, match.group(1) not in self.engine.allowed_domains)
+            self.cache[link] = result
+            return result
+
+        s_absolute = parse.urljoin(self.base, s_link)
+        if CRAWLABLE_LINK_REGEX.match(s_absolute):
+            result = (s_absolute, self.engine.is_external(s_absolute))
+        else:
+            # mailto:, javascript:, data:... links are not crawled
+            statif_logger.debug("Unknown external link format [%s] in %s" % (s_absolute, self.page_url))
+            result = None
+        self.cache[link] = result
+        return result
@@ -0,0 +1,251 @@
+# coding=utf-8
+"""
+Cornetto
+
+Copyright (C) 2018–2020 ANSSI
+Contributors:
+2018–2020 Bureau Applicatif tech-sdn-app@ssi.gouv.fr
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+"""
+# Define your downloader middlewares here
+#
+# Don't forget to add your middleware to the DOWNLOADER_MIDDLEWARES setting
+# See: https://docs.scrapy.org/en/latest/topics/downloader-middleware.html
+
+import json
+import logging
+import os
+from urllib import parse
+
+from scrapy import signals
+from scrapy.exceptions import IgnoreRequest, NotConfigured, StopDownload
+from scrapy.http import Headers
+
+from scrapy_parser.events import EVENT_FORBIDDEN_MIME
+
+statif_logger = logging.getLogger('statification')
+
+# the MIME types for which the content of the previous file is needed to continue the crawl (links extraction), when
+# the spider has no MIME registry
+MIME_TYPES_WITH_LINKS = ['text/html', 'text/css', 'text/xml']
+
+
+class IncrementalMiddleware(object):
+    """
+    This middleware make the crawl incremental.
+    It records the ETag and Last-Modified headers of each response, and when a previous statification is given
+    it sends conditional requests (If-None-Match/If-Modified-Since). When the server answers 304 Not Modified
+    the response is rebuilt from the file of the previous statification so that it can be reused instead of being
+    downloaded again.
+    """
+
+    def __init__(self, stats):
+        # the validators recorded during this crawl, indexed by url
+        self.validators = {}
+        # the validators of the previous statification, indexed by url
+        self.previous_validators = {}
+        self.previous_output = ''
+        self.validators_file = ''
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        middleware = cls(crawler.stats)
+        crawler.signals.connect(middleware.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(middleware.spider_closed, signal=signals.spider_closed)
+        return middleware
+
+    def spider_opened(self, spider):
+        """
+        Load the validators of the previous statification if the spider has been given some
+        @param spider: the spider that has been opened
+        """
+        self.previous_output = getattr(spider, 'previous_output', '')
+        self.validators_file = getattr(spider, 'validators_file', '')
+        s_previous_validators = getattr(spider, 'previous_validators', '')
+
+        if self.previous_output and s_previous_validators and os.path.isfile(s_previous_validators):
+            with open(s_previous_validators) as f_previous_validators:
+                self.previous_validators = json.load(f_previous_validators)
+            statif_logger.info('Incremental statification, %i validators loaded from %s' % (
+                len(self.previous_validators), s_previous_validators))
+
+        # the validators recorded before the crawl was paused are kept
+        if getattr(spider, 'resumed', False) and self.validators_file and os.path.isfile(self.validators_file):
+            with open(self.validators_file) as f_validators:
+                self.validators = json.load(f_validators)
+
+    def spider_closed(self, spider):
+        """
+        Write the validators recorded during the crawl in the validators file
+        @param spider: the spider that has been closed
+        """
+        if self.validators_file:
+            with open(self.validators_file, 'w') as f_validators:
+                json.dump(self.validators, f_validators)
+
+    def process_request(self, request, spider):
+        """
+        Add the conditional headers to the request if the url was crawled in the previous statification
+        """
+        validator = self.previous_validators.get(request.url)
+
+        if validator and not request.meta.get('not_conditional'):
+            if validator['etag']:
+                request.headers.setdefault('If-None-Match', validator['etag'])
+            if validator['last_modified']:
+                request.headers.setdefault('If-Modified-Since', validator['last_modified'])
+        return None
+
+    def process_response(self, request, response, spider):
+        """
+        Record the validators of the response, and rebuild a not modified response from the previous statification
+        """
+        if response.status == 304 and request.url in self.previous_validators:
+            validator = self.previous_validators[request.url]
+            s_previous_file = self.previous_output + validator['filename']
+
+            if not os.path.isfile(s_previous_file):
+                # the file of the previous statification is missing, the url is requested again without condition
+                statif_logger.debug('Previous file not found for %s, request it again' % request.url)
+                return request.replace(headers=self.remove_conditional_headers(request.headers),
+                                       meta=dict(request.meta, not_conditional=True), dont_filter=True)
+
+            body = b''
+            # only the files that contain links are read, others will just be linked from the previous statification
+            registry = getattr(spider, 'mime_registry', None)
+            if registry is not None:
+                handler = registry.get(validator['mime'])
+                b_links = handler is not None and handler.b_links
+            else:
+                b_links = validator['mime'] in MIME_TYPES_WITH_LINKS
+            if b_links:
+                with open(s_previous_file, 'rb') as f_previous_file:
+                    body = f_previous_file.read()
+
+            request.meta['previous_file'] = s_previous_file
+            self.stats.inc_value('incremental/not_modified_count')
+            self.validators[request.url] = validator
+
+            return response.replace(status=200, body=body,
+                                    headers=Headers({'Content-Type': validator['mime']}))
+
+        if 200 <= response.status < 300:
+            etag = response.headers.get('ETag', b'').decode('latin-1')
+            last_modified = response.headers.get('Last-Modified', b'').decode('latin-1')
+
+            # a response without validators can't be requested conditionally
+            if etag or last_modified:
+                self.validators[request.url] = {
+                    'etag': etag,
+                    'last_modified': last_modified,
+                    'mime': response.headers.get('Content-Type', b'text/plain').decode(
+                        'latin-1').split(';')[0].strip(),
+                    'filename': spider.get_local_filename(parse.urlparse(response.url))
+                }
+        return response
+
+    @staticmethod
+    def remove_conditional_headers(headers):
+        """
+        Get a copy of the headers without the conditional headers
+        @param headers: the headers of the request
+        @return the new headers
+        """
+        headers = headers.copy()
+        headers.pop('If-None-Match', None)
+        headers.pop('If-Modified-Since', None)
+        return headers
+
+
+class MimeGateMiddleware(object):
+    """
+    This middleware abort the download of a response as soon as its headers are received when its MIME type is not
+    handled by the spider, or when its Content-Length is greater than the maximum size allowed for its MIME type.
+    The body of the rejected responses is never downloaded, the rejection is written as a forbidden_mime event.
+    Only the successful responses are checked, their status is set in the meta of the request by the
+    StreamingDownloadHandler : the redirections are followed and the errors are reported whatever their content.
+    """
+
+    def __init__(self, stats, d_max_sizes, i_default_max_size):
+        """
+        @param stats: the stats collector of the crawler
+        @param d_max_sizes: the maximum size in bytes of the responses, indexed by MIME type
+        @param i_default_max_size: the maximum size in bytes of the responses of the other MIME types, 0 for no limit
+        """
+        self.stats = stats
+        self.d_max_sizes = d_max_sizes
+        self.i_default_max_size = i_default_max_size
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('MIME_GATE_ENABLED', True):
+            raise NotConfigured
+        middleware = cls(crawler.stats, crawler.settings.getdict('MIME_MAX_SIZES'),
+                         crawler.settings.getint('MIME_DEFAULT_MAX_SIZE'))
+        crawler.signals.connect(middleware.headers_received, signal=signals.headers_received)
+        return middleware
+
+    def get_max_size(self, mime):
+        """
+        Get the maximum size allowed for the responses of a MIME type
+        @param mime: the MIME type
+        @return the maximum size in bytes, 0 for no limit
+        """
+        return self.d_max_sizes.get(mime, self.i_default_max_size)
+
+    def headers_received(self, headers, body_length, request, spider):
+        """
+        Called by the download handler when the headers of a response are received, before its body is downloaded
+        @param headers: the headers of the response
+        @param body_length: the expected size of the body, negative if the server didn't give it
+        @param request: the request that has been sent
+        @param spider: the spider
+        @raise StopDownload if the response is rejected, so the connection is closed
+        """
+        # the body of the redirections and of the errors is not kept, they are handled by the other middlewares
+        i_status = request.meta.get('download_status')
+        if i_status is None or not 200 <= i_status < 300:
+            return
+
+        # a spider that doesn't declare its MIME types accept everything
+        allowed_mime_types = getattr(spider, 'allowed_mime_types', None)
+
+        # get Content-Type in headers, if not specified treat as text/plain like the spider
+        mime = headers.get('Content-Type', b'text/plain').decode('latin-1').split(';')[0].strip() or 'text/plain'
+        i_max_size = self.get_max_size(mime)
+
+        if allowed_mime_types is not None and mime not in allowed_mime_types:
+            statif_logger.warning('Forbidden content [%s] detected in %s, download aborted' % (mime, request.url))
+            self.stats.inc_value('mime_gate/forbidden_count')
+            s_reason = mime
+        elif i_max_size and body_length > i_max_size:
+            statif_logger.warning('Content [%s] of %i bytes greater than %i bytes in %s, download aborted' % (
+                mime, body_length, i_max_size, request.url))
+            self.stats.inc_value('mime_gate/oversized_count')
+            # the size is kept in the report to distinguish the oversized content from the forbidden one
+            s_reason = '%s (%i bytes)' % (mime, body_length)
+        else:
+            return
+
+        if body_length > 0:
+            self.stats.inc_value('mime_gate/bytes_avoided', body_length)
+        spider.emit(EVENT_FORBIDDEN_MIME, mime=s_reason, url=request.url)
+        request.meta['mime_gate_rejected'] = True
+        raise StopDownload(fail=True)
+
+    def process_exception(self, request, exception, spider):
+        """
+        Silence the failure of the aborted downloads, they have already been reported
+        """
+        if isinstance(exception, StopDownload) and request.meta.get('mime_gate_rejected'):
+            raise IgnoreRequest('Download aborted for %s' % request.url)
+        return None
@@ -0,0 +1,157 @@
+# coding=utf-8
+"""
+Cornetto
+
+Copyright (C) 2018–2020 ANSSI
+Contributors:
+2018–2020 Bureau Applicatif tech-sdn-app@ssi.gouv.fr
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+"""
+# The MIME handlers define how the responses of each MIME type are processed and stored. The registry maps the MIME
+# types to their handler, a family of types is registered with a wildcard (e.g. video/*, or */* for every type), the
+# exact types have the priority over the families. The responses of the types without handler are not downloaded.
+
+from scrapy.utils.misc import load_object
+
+from scrapy_parser.items import MirroringItem, MirroringItemPdf
+from scrapy_parser.offload import CONTENT_HTML, CONTENT_CSS, CONTENT_XML, CONTENT_JS, CONTENT_IMG, CONTENT_WITH_LINKS
+
+# the MIME types of the images that are stored
+MIME_TYPES_IMG = ["image/gif", "image/jpeg", "image/png", "image/x-ms-bmp", "image/vnd.microsoft.icon",
+                  "image/x-icon"]
+
+# the MIME types of the scripts in which the urls are replaced
+MIME_TYPES_JS = ["application/javascript", "text/javascript"]
+
+# Here are all the MIME type of files that will be downloaded and stored
+# TODO This list is an example, any other type that should be downloaded must be added here or in the MIME_HANDLERS
+#  setting
+MIME_TYPES_STORED = ["application/font-woff", "application/vnd.ms-fontobject", "text/plain", "application/x-gzip",
+                     "application/zip", "application/rtf", "video/mp4", "video/webm", "text/csv",
+                     "application/x-x509-ca-cert", "application/x-pkcs7-crl", "application/msword",
+                     "application/vnd.ms-excel", "application/epub+zip", "application/x-mobi8-ebook",
+                     "application/xml", "image/svg+xml"]
+
+# the kinds of content in which the urls are rewritten
+CONTENT_REWRITTEN = frozenset([CONTENT_HTML, CONTENT_CSS, CONTENT_XML, CONTENT_JS])
+
+
+class MimeHandler(object):
+    """
+    Define how the responses of some MIME types are processed and stored
+    """
+
+    def __init__(self, s_name, s_kind=None, c_item=MirroringItem, b_stream=False):
+        """
+        @param s_name: the name of the handler, used in the stats
+        @param s_kind: the processing of the contents (CONTENT_HTML, CONTENT_CSS...), done by a content worker if
+                       there are some, None to store the contents as they are. It defines the post-processing of the
+                       contents : the links are extracted from the HTML, CSS and XML contents, the urls are rewritten
+                       in the HTML, CSS, XML and JS contents, and the metadata of the images are removed.
+        @param c_item: the class of the item of the contents stored as they are, the metadata of the PDF files are
+                       removed by the PdfSanitizingPipeline
+        @param b_stream: True if the body can be streamed to the disk while it's downloaded, the processed contents
+                         must be kept in memory
+        @raise ValueError if a processed content is streamed
+        """
+        if s_kind is not None and b_stream:
+            raise ValueError('The contents of the handler %s are processed, they must be kept in memory' % s_name)
+        self.s_name = s_name
+        self.s_kind = s_kind
+        self.c_item = c_item
+        self.b_stream = b_stream
+        # the links of the contents are extracted and followed
+        self.b_links = s_kind in CONTENT_WITH_LINKS
+        # the urls of the contents are rewritten
+        self.b_rewrite = s_kind in CONTENT_REWRITTEN
+
+    def create_item(self, response, filename, previous_file):
+        """
+        Create the item of a content stored as it is
+        @param response: the response
+        @param filename: the path to the file where to save the content
+        @param previous_file: the path to the file in the previous statification if it has not been modified since
+        @return the item of the content
+        """
+        # the big files are streamed to the disk by the StreamingDownloadHandler, their body is empty
+        return self.c_item(filename=filename, content=response.body, previous=previous_file,
+                           streamed=response.meta.get('streamed_file'), sha256=response.meta.get('streamed_sha256'),
+                           mime=self.s_name)
+
+
+class MimeRegistry(object):
+    """
+    Map the MIME types to their handler
+    """
+
+    def __init__(self):
+        # the handlers of the MIME types, and of the families of MIME types ('*' for every type)
+        self.d_handlers = {}
+        self.d_families = {}
+
+    def register(self, s_mime, handler):
+        """
+        Register the handler of a MIME type, it replaces the previous handler of the type
+        @param s_mime: the MIME type, or a family of types (e.g. video/*, */*)
+        @param handler: the handler
+        """
+        s_family, s_separator, s_subtype = s_mime.partition('/')
+        if s_subtype == '*' or s_mime == '*':
+            self.d_families[s_family] = handler
+        else:
+            self.d_handlers[s_mime] = handler
+
+    def get(self, mime):
+        """
+        @param mime: the MIME type of a response
+        @return the handler of the MIME type, None if the type is not handled
+        """
+        handler = self.d_handlers.get(mime)
+        if handler is None:
+            handler = self.d_families.get(mime.partition('/')[0]) or self.d_families.get('*')
+        return handler
+
+    def __contains__(self, mime):
+        # used by the MimeGateMiddleware to abort the download of the forbidden content
+        return self.get(mime) is not None
+
+
+def create_mime_registry(a_streamed_mime_types=(), d_extra_handlers=None):
+    """
+    Create the registry of the MIME types handled by the spider
+    @param a_streamed_mime_types: the MIME types of the contents streamed to the disk, among the contents stored as
+                                  they are
+    @param d_extra_handlers: the other handlers, indexed by MIME type (or family), each handler is the name of a
+                             default handler (html, css, xml, js, img, pdf, stored, streamed) or the path to a
+                             MimeHandler object (e.g. myproject.handlers.JSON_HANDLER)
+    @return the registry
+    """
+    handlers = {handler.s_name: handler for handler in [
+        MimeHandler('html', CONTENT_HTML), MimeHandler('css', CONTENT_CSS), MimeHandler('xml', CONTENT_XML),
+        MimeHandler('js', CONTENT_JS), MimeHandler('img', CONTENT_IMG),
+        MimeHandler('pdf', c_item=MirroringItemPdf, b_stream='application/pdf' in a_streamed_mime_types),
+        MimeHandler('stored'), MimeHandler('streamed', b_stream=True)]}
+
+    registry = MimeRegistry()
+    registry.register('text/html', handlers['html'])
+    registry.register('text/css', handlers['css'])
+    registry.register('text/xml', handlers['xml'])
+    registry.register('application/pdf', handlers['pdf'])
+    for mime in MIME_TYPES_IMG:
+        registry.register(mime, handlers['img'])
+    for mime in MIME_TYPES_JS:
+        registry.register(mime, handlers['js'])
+    for mime in MIME_TYPES_STORED:
+        registry.register(mime, handlers['streamed' if mime in a_streamed_mime_types else 'stored'])
+
+    for s_mime, handler in (d_extra_handlers or {}).items():
+        registry.register(s_mime, handlers[handler] if handler in handlers else load_object(handler))
+    return registry
@@ -0,0 +1,364 @@
+# coding=utf-8
+"""
+Cornetto
+
+Copyright (C) 2018–2020 ANSSI
+Contributors:
+2018–2020 Bureau Applicatif tech-sdn-app@ssi.gouv.fr
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+"""
+# The contents that need CPU (parsing, url rewriting, serialization, image cleaning) are processed by a pool of worker
+# processes so the crawl is not limited to one core. The worker saves the file and returns only the links of the
+# content to the spider. The same functions are used by the spider when there is no worker.
+
+import logging
+import multiprocessing
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from lxml import etree, html
+from twisted.internet import defer, reactor
+from twisted.python.failure import Failure
+
+from scrapy_parser.items import add_item_stats, MirroringItemHtml, MirroringItemCss, MirroringItemXml, \
+    MirroringItemJs, MirroringItemImg
+from scrapy_parser.links import LinkEngine, LinkResolver
+from scrapy_parser.rewrite import UrlRewriter
+from scrapy_parser.timing import STAGE_LINKS, STAGE_PARSE, STAGE_REWRITE
+
+statif_logger = logging.getLogger('statification')
+
+# the kinds of content processed by the workers
+CONTENT_HTML = 'html'
+CONTENT_CSS = 'css'
+CONTENT_XML = 'xml'
+CONTENT_JS = 'js'
+CONTENT_IMG = 'img'
+
+# the item of each kind of content
+CONTENT_ITEMS = {CONTENT_HTML: MirroringItemHtml, CONTENT_CSS: MirroringItemCss, CONTENT_XML: MirroringItemXml,
+                 CONTENT_IMG: MirroringItemImg, CONTENT_JS: MirroringItemJs}
+
+# the version of the processing of each kind of content, it must be increased when the processing is modified so the
+# results cached by the previous statifications are not reused
+PROCESSOR_VERSIONS = {CONTENT_HTML: 1, CONTENT_CSS: 1, CONTENT_XML: 1, CONTENT_JS: 1, CONTENT_IMG: 1}
+
+# the kinds of content whose links are resolved against their url, their url is a part of the key of the cache
+CONTENT_WITH_LINKS = frozenset([CONTENT_HTML, CONTENT_CSS, CONTENT_XML])
+
+# the state of a worker process, set by init_worker
+worker = {}
+
+
+def create_html_parser():
+    """
+    @return the parser of the HTML contents
+    """
+    return html.HTMLParser(encoding="utf-8", remove_comments=False)
+
+
+def parse_xml(engine, body, url):
+    """
+    Parse a RSS content and get its links
+    @param engine: the link engine
+    @param body: the content, its urls have already been rewritten
+    @param url: the url of the content
+    @return the tree of the content, the absolute links with a boolean set if the link is external and the links that
+            can't be crawled
+    """
+    root = etree.fromstring(body, parser=etree.XMLParser(strip_cdata=False, resolve_entities=False),
+                            base_url=url).getroottree()
+
+    # Parse XML to find every declared namespaces
+    namespaces = {}
+    for event, elem in etree.iterwalk(root, ('start', 'start-ns')):
+        if event == 'start-ns':
+            namespaces[elem[0]] = elem[1]
+        elif event == 'start':
+            break
+
+    # Search for links
+    xpath = "/rss/channel/link | /rss/channel/item/link | /rss/channel/item/comments"
+    if 'atom' in namespaces:
+        xpath += " | /rss/channel/atom:link[@href]"
+    if 'wfw' in namespaces:
+        xpath += " | /rss/channel/item/wfw:commentRss"
+    resolver = LinkResolver(engine, url)
+    a_links = []
+    a_unknown_links = []
+    for elem in root.xpath(xpath, namespaces=namespaces):
+        if elem.tag == '{' + namespaces.get('atom', '') + '}link':
+            link = elem.get('href')
+        else:
+            link = elem.text
+
+        result = resolver.resolve(link or '')
+        if result is None:
+            a_unknown_links.append(link)
+        else:
+            a_links.append(result)
+    return root, a_links, a_unknown_links
+
+
+def process_content(engine, html_parser, s_kind, body, url, filename, previous_file, s_handler=''):
+    """
+    Parse the content, rewrite its urls and create its item, the time spent in each stage is added to its stats
+    @param engine: the link engine
+    @param html_parser: the parser of the HTML contents
+    @param s_kind: the kind of content (CONTENT_HTML, CONTENT_CSS...)
+    @param body: the body of the response
+    @param url: the url of the response
+    @param filename: the path to the file where to save the content
+    @param previous_file: the path to the file in the previous statification if the content has not been modified
+                          since, its urls have already been rewritten
+    @param s_handler: the name of the handler of the MIME type of the content
+    @return the item, the absolute links with a boolean set if the link is external and the links that can't be
+            crawled
+    """
+    b_rewrite = not previous_file
+    a_links = []
+    a_unknown_links = []
+    # the number of seconds spent in each stage
+    timings = {}
+    f_start = time.monotonic()
+
+    def lap(s_stage):
+        # add the time spent since the previous lap to the stage
+        nonlocal f_start
+        f_now = time.monotonic()
+        timings[s_stage] = timings.get(s_stage, 0) + f_now - f_start
+        f_start = f_now
+
+    if s_kind == CONTENT_HTML:
+        root = etree.fromstring(body, parser=html_parser, base_url=url).getroottree()
+        lap(STAGE_PARSE)
+        # Search for links in a single walk of the tree, the urls that match the rewrite rules are replaced
+        # in the links
+        a_links = engine.extract_html_links(root, url, b_rewrite)
+        lap(STAGE_LINKS)
+        c_item = MirroringItemHtml
+        content = root
+
+    elif s_kind == CONTENT_CSS:
+        # replace all url that match the rewrite rules
+        if b_rewrite:
+            body = engine.rewrite_body(body)
+            lap(STAGE_REWRITE)
+        a_links = engine.extract_css_links(body, url)
+        lap(STAGE_LINKS)
+        c_item = MirroringItemCss
+        content = body
+
+    elif s_kind == CONTENT_XML:
+        if b_rewrite:
+            body = engine.rewrite_body(body)
+            lap(STAGE_REWRITE)
+        # the links are searched in the tree once it's parsed
+        content, a_links, a_unknown_links = parse_xml(engine, body, url)
+        lap(STAGE_PARSE)
+        c_item = MirroringItemXml
+
+    elif s_kind == CONTENT_JS:
+        if b_rewrite:
+            body = engine.rewrite_body(body)
+            lap(STAGE_REWRITE)
+        c_item = MirroringItemJs
+        content = body
+
+    elif s_kind == CONTENT_IMG:
+        c_item = MirroringItemImg
+        content = body
+
+    else:
+        raise ValueError('Unknown kind of content : ' + s_kind)
+
+    item = c_item(filename=filename, content=content, previous=previous_file, mime=s_handler)
+    for s_stage, f_seconds in timings.items():
+        item.add_timing(s_stage, f_seconds)
+    return item, a_links, a_unknown_links
+
+
+def process_cached(cache, engine, html_parser, s_kind, body, url, filename, previous_file, s_handler=''):
+    """
+    Process a content like process_content, the result is taken from the cache if the content has already been
+    processed, otherwise the item adds its processed content to the cache once it's stored
+    @param cache: the cache of the processed contents, None to always process the content
+    @param engine: the link engine
+    @param html_parser: the parser of the HTML contents
+    @param s_kind: the kind of content (CONTENT_HTML, CONTENT_CSS...)
+    @param body: the body of the response
+    @param url: the url of the response
+    @param filename: the path to the file where to save the content
+    @param previous_file: the path to the file in the previous statification if the content has not been modified
+                          since
+    @param s_handler: the name of the handler of the MIME type of the content
+    @return the item, the absolute links with a boolean set if the link is external and the links that can't be
+            crawled
+    """
+    # the file of a content not modified since the previous statification is already linked without processing
+    if cache is None or previous_file:
+        return process_content(engine, html_parser, s_kind, body, url, filename, previous_file, s_handler)
+
+    s_key = cache.get_key(s_kind, PROCESSOR_VERSIONS[s_kind], url if s_kind in CONTENT_WITH_LINKS else '', body)
+    entry = cache.get(s_key)
+    if entry is not None:
+        # the identical file of the previous statification is linked, the cached content is copied otherwise
+        item = CONTENT_ITEMS[s_kind](filename=filename, content=None, previous=entry['previous'],
+                                     cached=entry['object'], mime=s_handler,
+                                     stats={'cache/hit_count': 1, 'cache/hit_bytes': entry['size']})
+        return item, entry['links'], entry['unknown_links']
+
+    item, a_links, a_unknown_links = process_content(engine, html_parser, s_kind, body, url, filename, previous_file,
+                                                     s_handler)
+    item['cache'] = cache.prepare(s_key, a_links, a_unknown_links)
+    item.add_stats({'cache/miss_count': 1})
+    return item, a_links, a_unknown_links
+
+
+def init_worker(allowed_domains, url_regex, url_replacement, a_rewrite_rules, cache=None):
+    """
+    Initialize a worker process
+    @param allowed_domains: the domains of the internal links
+    @param url_regex: the regex of the urls to replace
+    @param url_replacement: the url that will replace the matched url_regex
+    @param a_rewrite_rules: the other rules used to replace the urls
+    @param cache: the cache of the processed contents, None to disable it
+    """
+    # the crawler is paused with SIGINT, the worker must finish the contents it's processing
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    worker['engine'] = LinkEngine(allowed_domains,
+                                  UrlRewriter.from_url_regex(url_regex, url_replacement, a_rewrite_rules))
+    worker['html_parser'] = create_html_parser()
+    worker['cache'] = cache
+
+
+def run_content(s_kind, body, url, filename, previous_file, s_handler=''):
+    """
+    Process a content in a worker process and store its file
+    @param s_kind: the kind of content (CONTENT_HTML, CONTENT_CSS...)
+    @param body: the body of the response
+    @param url: the url of the response
+    @param filename: the path to the file where to save the content
+    @param previous_file: the path to the file in the previous statification if it has not been modified since
+    @param s_handler: the name of the handler of the MIME type of the content, the time spent is added to its stats
+                      and to the timing stats of its stages
+    @return the absolute links with a boolean set if the link is external, the links that can't be crawled, the
+            number of seconds spent by the worker and the stats of the processing of the item
+    """
+    f_start = time.process_time()
+    item, a_links, a_unknown_links = process_cached(worker.get('cache'), worker['engine'], worker['html_parser'],
+                                                    s_kind, body, url, filename, previous_file, s_handler)
+    item.store()
+    f_duration = time.process_time() - f_start
+    if s_handler:
+        item.add_stats({'mime/%s/seconds' % s_handler: f_duration})
+    return a_links, a_unknown_links, f_duration, item.get('stats')
+
+
+def create_executor(i_workers, initializer, initargs=()):
+    """
+    Create a pool of worker processes
+    @param i_workers: the number of worker processes
+    @param initializer: the function called in each worker when it starts
+    @param initargs: the arguments of the initializer
+    @return the executor of the pool
+    """
+    # the workers are forked from a server process started before the threads of the crawler
+    s_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+    return ProcessPoolExecutor(i_workers, mp_context=multiprocessing.get_context(s_method), initializer=initializer,
+                               initargs=initargs)
+
+
+def defer_future(future):
+    """
+    Get a deferred fired in the reactor with the result of a future of an executor
+    @param future: the future
+    @return the deferred
+    """
+    d_result = defer.Deferred()
+
+    def fire(future):
+        try:
+            result = future.result()
+        except Exception:
+            d_result.errback(Failure())
+        else:
+            d_result.callback(result)
+
+    # the callback is called in a thread of the executor, the deferred must be fired in the reactor
+    future.add_done_callback(lambda future: reactor.callFromThread(fire, future))
+    return d_result
+
+
+class ContentOffloader(object):
+    """
+    Send the contents to a pool of worker processes, the results are returned as deferreds fired in the reactor
+    """
+
+    def __init__(self, i_workers, stats, allowed_domains, url_regex='', url_replacement='', a_rewrite_rules=(),
+                 cache=None):
+        """
+        @param i_workers: the number of worker processes
+        @param stats: the stats collector of the crawler
+        @param allowed_domains: the domains of the internal links
+        @param url_regex: the regex of the urls to replace
+        @param url_replacement: the url that will replace the matched url_regex
+        @param a_rewrite_rules: the other rules used to replace the urls
+        @param cache: the cache of the processed contents, None to disable it
+        """
+        self.stats = stats
+        self.executor = create_executor(i_workers, init_worker, (list(allowed_domains), url_regex, url_replacement,
+                                                                 list(a_rewrite_rules), cache))
+
+    def process(self, s_kind, body, url, filename, previous_file, s_handler=''):
+        """
+        Process a content in a worker process and store its file
+        @param s_kind: the kind of content (CONTENT_HTML, CONTENT_CSS...)
+        @param body: the body of the response
+        @param url: the url of the response
+        @param filename: the path to the file where to save the content
+        @param previous_file: the path to the file in the previous statification if it has not been modified since
+        @param s_handler: the name of the handler of the MIME type of the content, for the stats
+        @return a deferred fired with the links of the content and the links that can't be crawled
+        """
+        d_result = defer.Deferred()
+        future = self.executor.submit(run_content, s_kind, body, url, filename, previous_file, s_handler)
+        self.stats.inc_value('offload/content_count')
+        self.stats.inc_value('offload/bytes', len(body))
+        # the callback is called in a thread of the executor, the deferred must be fired in the reactor
+        future.add_done_callback(lambda future: reactor.callFromThread(self.fire, d_result, future))
+        return d_result
+
+    def fire(self, d_result, future):
+        """
+        Fire the deferred of a content with the result of the worker
+        @param d_result: the deferred
+        @param future: the finished future of the worker
+        """
+        try:
+            a_links, a_unknown_links, f_duration, item_stats = future.result()
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool):
+                self.stats.inc_value('offload/broken_count')
+            d_result.errback(Failure())
+            return
+        self.stats.inc_value('offload/seconds', f_duration)
+        add_item_stats(self.stats, item_stats)
+        d_result.callback((a_links, a_unknown_links))
+
+    def close(self, b_wait=True):
+        """
+        Stop the worker processes once they have finished the contents they are processing
+        @param b_wait: False to return without waiting for the worker processes, when the pool is broken
+        """
+        self.executor.shutdown(wait=b_wait)
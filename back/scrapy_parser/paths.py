@@ -0,0 +1,182 @@
+# coding=utf-8
+"""
+Cornetto
+
+Copyright (C) 2018–2020 ANSSI
+Contributors:
+2018–2020 Bureau Applicatif tech-sdn-app@ssi.gouv.fr
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+"""
+# The urls of a website can use the same path as a file and as a directory (e.g. /news and /news/2020.html), the file
+# is then stored as the index of the directory (/news/index.html). The PathIndex resolves these collisions in memory
+# for the files of the crawl, and store_file resolves them on the disk when the files are written in any order by the
+# threads of the pipeline or the content workers, so no file already mirrored is ever removed. The writers can move the
+# same file at the same time, a writer whose directory has been moved by another one retries.
+
+import logging
+import os
+import threading
+
+statif_logger = logging.getLogger('statification')
+
+# the file of a path used as a directory
+DEFAULT_INDEX = 'index.html'
+
+# the number of times the creation of a file is retried after its directories have been fixed
+MAX_ATTEMPTS = 5
+
+# the maximum number of files moved to the index of a directory to create a directory, the files can be written again
+# by the other writers while they are moved
+MAX_MOVES = 100
+
+# the key of the trie nodes that marks a file, a component of a path is never empty
+FILE_MARK = ''
+
+
+class PathIndex(object):
+    """
+    Trie of the paths of the files written during the crawl, each node is a dict of its children
+    """
+
+    def __init__(self):
+        self.root = {}
+        self.i_files = 0
+        # the number of files moved to the index of a directory
+        self.i_moved = 0
+
+    def add_file(self, s_path):
+        """
+        Add the path of a file, if the path is already a directory the file is its index, if a parent directory is
+        already a file this file is moved to the index of the directory
+        @param s_path: the path of the file relative to the output, starting with /
+        @return the path where the file must be written and the path of the file moved to an index, None if no file
+                has been moved
+        """
+        node = self.root
+        s_moved = None
+        a_components = [s_component for s_component in s_path.split('/') if s_component]
+        for i, s_component in enumerate(a_components[:-1]):
+            node = node.setdefault(s_component, {})
+            if FILE_MARK in node:
+                # the file becomes the index of the directory
+                del node[FILE_MARK]
+                node.setdefault(DEFAULT_INDEX, {})[FILE_MARK] = True
+                s_moved = '/' + '/'.join(a_components[:i + 1])
+                self.i_moved += 1
+
+        s_name = a_components[-1] if a_components else DEFAULT_INDEX
+        leaf = node.setdefault(s_name, {})
+        if any(s_key != FILE_MARK for s_key in leaf):
+            # the path is already a directory
+            leaf = leaf.setdefault(DEFAULT_INDEX, {})
+            s_path = s_path.rstrip('/') + '/' + DEFAULT_INDEX
+        if FILE_MARK not in leaf:
+            leaf[FILE_MARK] = True
+            self.i_files += 1
+        return s_path, s_moved
+
+    def is_directory(self, s_path):
+        """
+        @param s_path: a path relative to the output, starting with /
+        @return True if files have been written in the directory
+        """
+        node = self.root
+        for s_component in s_path.split('/'):
+            if s_component:
+                node = node.get(s_component)
+                if node is None:
+                    return False
+        return any(s_key != FILE_MARK for s_key in node)
+
+
+def move_to_index(s_path):
+    """
+    Replace a file by a directory, the file becomes the index of the directory. Several writers can move the same
+    file at the same time, only one of them moves it and the others return without doing anything.
+    @param s_path: the path of the file
+    """
+    # the temporary name is private to the writer
+    s_temporary = '%s.moving-%i-%i' % (s_path, os.getpid(), threading.get_ident())
+    try:
+        # a directory can't be hard linked, a directory created by another writer is never moved
+        os.link(s_path, s_temporary)
+    except FileNotFoundError:
+        # the file has already been moved by another writer
+        return
+    except OSError:
+        if os.path.isdir(s_path):
+            return
+        # the file system doesn't support hard links
+        try:
+            os.rename(s_path, s_temporary)
+        except FileNotFoundError:
+            return
+    else:
+        try:
+            os.remove(s_path)
+        except OSError:
+            # the file has been removed or replaced by a directory by another writer
+            os.remove(s_temporary)
+            return
+
+    try:
+        os.makedirs(s_path, exist_ok=True)
+    except FileExistsError:
+        # the file has been written again meanwhile, it's the same page, it will be moved instead
+        os.remove(s_temporary)
+        return
+    s_index = os.path.join(s_path, DEFAULT_INDEX)
+    if os.path.exists(s_index):
+        # the index of the directory has been crawled too, it's the same page
+        os.remove(s_temporary)
+    else:
+        os.rename(s_temporary, s_index)
+    statif_logger.debug('The file %s has been moved to %s' % (s_path, s_index))
+
+
+def make_directories(s_directory):
+    """
+    Create a directory and its parents, a parent that is a file is moved to the index of the directory
+    @param s_directory: the path of the directory
+    """
+    for i in range(MAX_MOVES):
+        try:
+            os.makedirs(s_directory, exist_ok=True)
+            return
+        except (FileExistsError, NotADirectoryError, FileNotFoundError):
+            # search the parent that is a file, it may have been moved by another writer meanwhile
+            s_parent = s_directory
+            while not os.path.isfile(s_parent) and s_parent != os.path.dirname(s_parent):
+                s_parent = os.path.dirname(s_parent)
+            if os.path.isfile(s_parent):
+                move_to_index(s_parent)
+    os.makedirs(s_directory, exist_ok=True)
+
+
+def store_file(s_filename, f_create):
+    """
+    Create a file, its directories are created only if they don't exist yet
+    @param s_filename: the path of the file
+    @param f_create: the function that create the file from its path
+    @return the path of the file, the index of the directory if the path is a directory
+    """
+    for i in range(MAX_ATTEMPTS):
+        try:
+            f_create(s_filename)
+            return s_filename
+        except (FileNotFoundError, NotADirectoryError):
+            # the directory may be being moved by another writer, the creation is retried once it's a directory,
+            # if the source of the file doesn't exist the last attempt raises the error
+            make_directories(os.path.dirname(s_filename))
+        except IsADirectoryError:
+            s_filename = os.path.join(s_filename, DEFAULT_INDEX)
+    f_create(s_filename)
+    return s_filename
@@ -0,0 +1,266 @@
+# coding=utf-8
+"""
+Cornetto
+
+Copyright (C) 2018–2020 ANSSI
+Contributors:
+2018–2020 Bureau Applicatif tech-sdn-app@ssi.gouv.fr
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+"""
+# The metadata of the PDF files (the document information dictionary and the XMP streams) are removed in a pool of
+# worker processes. The file is rewritten by pikepdf if it's installed : only the objects of the last revision are
+# written, so the metadata of the previous revisions added by incremental updates are also removed. Without pikepdf
+# the metadata of every revision are overwritten with spaces, the offsets of the objects are kept so the file is
+# still valid, but the metadata in compressed object streams can't be removed. The streamed files are sanitized
+# from their path, they are never read entirely in memory.
+
+import io
+import logging
+import mmap
+import os
+import re
+import shutil
+import signal
+import tempfile
+import time
+
+try:
+    import pikepdf
+except ImportError:
+    pikepdf = None
+
+from scrapy_parser.handlers import STREAMING_PREFIX, STREAMING_SUFFIX
+
+statif_logger = logging.getLogger('statification')
+
+# the references to the document information dictionary in the trailers and the cross-reference streams
+INFO_REFERENCE_REGEX = re.compile(rb'/Info\s+(\d+)\s+(\d+)\s+R')
+# the keys of the document information dictionary and the start of their value
+INFO_REGEX = re.compile(rb'/(?:Title|Author|Subject|Keywords|Creator|Producer|CreationDate|ModDate|Trapped)\s*([(<])')
+# the XMP packets, the root element can be missing
+XMP_REGEX = re.compile(rb'<x:xmpmeta\b.*?</x:xmpmeta\s*>|<rdf:RDF\b.*?</rdf:RDF\s*>', re.S)
+
+
+def get_string_end(data, i_position):
+    """
+    Get the end of a literal string, the parentheses can be nested
+    @param data: the PDF file
+    @param i_position: the position of the opening parenthesis
+    @return the position of the closing parenthesis
+    @raise ValueError if the string is not closed
+    """
+    i_depth = 0
+    i_length = len(data)
+    while i_position < i_length:
+        i_char = data[i_position]
+        if i_char == 0x5c:
+            # backslash, the next character is escaped
+            i_position += 1
+        elif i_char == 0x28:
+            i_depth += 1
+        elif i_char == 0x29:
+            i_depth -= 1
+            if i_depth == 0:
+                return i_position
+        i_position += 1
+    raise ValueError('The string at %i is not closed' % i_position)
+
+
+def blank(data, i_start, i_end):
+    """
+    Overwrite a part of the file with spaces, the line breaks are kept
+    @param data: the PDF file
+    @param i_start: the position of the first byte
+    @param i_end: the position after the last byte
+    """
+    data[i_start:i_end] = bytes(i_char if i_char in b'\r\n' else 0x20 for i_char in data[i_start:i_end])
+
+
+def scrub_buffer(data):
+    """
+    Overwrite the values of the document information dictionaries and the XMP packets of every revision with spaces
+    @param data: the PDF file in a writable buffer, a bytearray or a memory mapped file, it's modified in place
+    @raise ValueError if the file is not a PDF file
+    """
+    if data[:5] != b'%PDF-':
+        raise ValueError('The file is not a PDF file')
+
+    # every revision has its own trailer, they can reference different objects
+    for s_number, s_generation in set(INFO_REFERENCE_REGEX.findall(data)):
+        object_regex = re.compile(rb'(?<!\d)%s\s+%s\s+obj\b.*?endobj' % (s_number, s_generation), re.S)
+        for object_match in object_regex.finditer(data):
+            # only the values of the information dictionary are removed, the same keys are used by the bookmarks
+            for match in INFO_REGEX.finditer(data, object_match.start(), object_match.end()):
+                i_start = match.start(1)
+                if data[i_start] == 0x28:
+                    i_end = get_string_end(data, i_start)
+                else:
+                    i_end = data.find(b'>', i_start)
+                    if i_end < 0:
+                        raise ValueError('The string at %i is not closed' % i_start)
+                # the delimiters are kept, the value is only spaces
+                blank(data, i_start + 1, i_end)
+
+    for match in XMP_REGEX.finditer(data):
+        blank(data, match.start(), match.end())
+
+
+def scrub_pdf(data):
+    """
+    Overwrite the values of the document information dictionaries and the XMP packets of every revision with spaces
+    @param data: the PDF file
+    @return the PDF file without metadata, it has the same length
+    @raise ValueError if the file is not a PDF file
+    """
+    data = bytearray(data)
+    scrub_buffer(data)
+    return bytes(data)
+
+
+def scrub_pdf_file(s_path, s_clean_path):
+    """
+    Copy a PDF file without its metadata, the copy is memory mapped so the file is never read entirely in memory
+    @param s_path: the path to the PDF file
+    @param s_clean_path: the path where to write the file without metadata
+    @raise ValueError if the file is not a PDF file
+    """
+    shutil.copyfile(s_path, s_clean_path)
+    with open(s_clean_path, 'r+b') as f_clean:
+        if f_clean.read(5) != b'%PDF-':
+            raise ValueError('The file is not a PDF file')
+        with mmap.mmap(f_clean.fileno(), 0) as data:
+            scrub_buffer(data)
+            data.flush()
+
+
+def clean_pdf(pdf):
+    """
+    Remove the document information dictionary and the XMP streams of a PDF file opened by pikepdf
+    @param pdf: the PDF file
+    """
+    if '/Info' in pdf.trailer:
+        del pdf.trailer['/Info']
+    # the XMP streams of the document, of the pages and of the images
+    for obj in pdf.objects:
+        if isinstance(obj, (pikepdf.Dictionary, pikepdf.Stream)) and '/Metadata' in obj:
+            del obj['/Metadata']
+
+
+def rewrite_pdf(data):
+    """
+    Rewrite the PDF file without its document information dictionary and its XMP streams with pikepdf
+    @param data: the PDF file
+    @return the PDF file without metadata, only the last revision is written
+    @raise ValueError if the file can't be read
+    """
+    try:
+        with pikepdf.open(io.BytesIO(data)) as pdf:
+            clean_pdf(pdf)
+            output = io.BytesIO()
+            # the id of the file is computed from its content, so the same file is always rewritten the same way
+            pdf.save(output, deterministic_id=True)
+            return output.getvalue()
+    except pikepdf.PdfError as e:
+        raise ValueError(str(e))
+
+
+def rewrite_pdf_file(s_path, s_clean_path):
+    """
+    Rewrite a PDF file without its metadata with pikepdf, the objects are read from the file when they are written
+    @param s_path: the path to the PDF file
+    @param s_clean_path: the path where to write the file without metadata
+    @raise ValueError if the file can't be read
+    """
+    try:
+        with pikepdf.open(s_path) as pdf:
+            clean_pdf(pdf)
+            pdf.save(s_clean_path, deterministic_id=True)
+    except pikepdf.PdfError as e:
+        raise ValueError(str(e))
+
+
+def sanitize_pdf(data, b_rewrite=True):
+    """
+    Remove the metadata of a PDF file
+    @param data: the PDF file
+    @param b_rewrite: False to scrub the metadata even if pikepdf is installed
+    @return the PDF file without metadata
+    @raise ValueError if the file can't be read
+    """
+    if b_rewrite and pikepdf is not None:
+        return rewrite_pdf(data)
+    return scrub_pdf(data)
+
+
+def sanitize_pdf_file(s_path, s_clean_path, b_rewrite=True):
+    """
+    Copy a PDF file without its metadata, the file is not read entirely in memory
+    @param s_path: the path to the PDF file
+    @param s_clean_path: the path where to write the file without metadata
+    @param b_rewrite: False to scrub the metadata even if pikepdf is installed
+    @raise ValueError if the file can't be read
+    """
+    if b_rewrite and pikepdf is not None:
+        rewrite_pdf_file(s_path, s_clean_path)
+    else:
+        scrub_pdf_file(s_path, s_clean_path)
+
+
+def init_worker():
+    """
+    Initialize a worker process
+    """
+    # the crawler is paused with SIGINT, the worker must finish the files it's processing
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def run_sanitize(content, s_streamed, s_name=''):
+    """
+    Remove the metadata of the PDF file of an item, in a worker process
+    @param content: the content of the file, empty if it has been streamed
+    @param s_streamed: the path to the temporary file where the content has been streamed, None if it's in memory,
+                       the streamed file is sanitized from its path so it's never read entirely in memory
+    @param s_name: the name of the file, for the logs
+    @return the content without metadata (None if it has been streamed, the temporary file is replaced) and the
+            stats of the sanitization
+    """
+    f_start = time.process_time()
+    i_size = os.path.getsize(s_streamed) if s_streamed else len(content)
+
+    stats = {'pdf/count': 1, 'pdf/bytes': i_size}
+    try:
+        if s_streamed:
+            # the temporary file is replaced, it's then renamed to the file of the item
+            i_fd, s_path = tempfile.mkstemp(prefix=STREAMING_PREFIX, suffix=STREAMING_SUFFIX,
+                                            dir=os.path.dirname(s_streamed))
+            os.close(i_fd)
+            try:
+                sanitize_pdf_file(s_streamed, s_path)
+            except BaseException:
+                os.remove(s_path)
+                raise
+            os.chmod(s_path, os.stat(s_streamed).st_mode)
+            os.replace(s_path, s_streamed)
+            clean_content = None
+            i_clean_size = os.path.getsize(s_streamed)
+        else:
+            clean_content = sanitize_pdf(content)
+            i_clean_size = len(clean_content)
+    except ValueError as e:
+        statif_logger.log(logging.INFO, "The PDF file %s has not been cleaned : %s" % (s_name, e))
+        stats['pdf/failed_count'] = 1
+        clean_content = None if s_streamed else content
+    else:
+        stats['pdf/sanitized_count'] = 1
+        stats['pdf/bytes_removed'] = i_size - i_clean_size
+
+    stats['pdf/seconds'] = time.process_time() - f_start
+    return clean_content, stats
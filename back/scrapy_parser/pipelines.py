@@ -20,19 +20,282 @@ You should have received a copy of the GNU General Public License
 # Don't forget to add your pipeline to the ITEM_PIPELINES setting
 # See: http://doc.scrapy.org/en/latest/topics/item-pipeline.html
 
+import hashlib
+import json
+import logging
+import os
+import time
+from concurrent.futures.process import BrokenProcessPool
+
+from scrapy import signals
+from twisted.internet import defer, reactor, threads
+from twisted.python.failure import Failure
+from twisted.python.threadpool import ThreadPool
+
 from scrapy_parser.spiders.MirroringSpider import MirroringSpider
 
-from scrapy_parser.items import MirroringItem
+from scrapy_parser.items import MirroringItem, MirroringItemPdf, add_item_stats
+from scrapy_parser.offload import create_executor, defer_future
+from scrapy_parser.pdf import init_worker, run_sanitize
+from scrapy_parser.timing import STAGE_CLEAN
+
+statif_logger = logging.getLogger('statification')
 
 
 class MirroringPipeline(object):
+    """
+    Pipeline that store the files of the MirroringItem. The files are written by a pool of WRITE_THREADS threads so
+    the reactor is not blocked by the disk, at most WRITE_QUEUE_SIZE items are written or waiting for a thread, the
+    next items wait before being queued which slow down the crawl.
+    """
+
+    def __init__(self, stats, i_threads, i_queue_size):
+        """
+        @param stats: the stats collector of the crawler
+        @param i_threads: the number of threads that write the files, 0 to write them in the reactor thread
+        @param i_queue_size: the maximum number of items being written or waiting for a thread
+        """
+        self.stats = stats
+        self.i_threads = i_threads
+        self.threadpool = None
+        self.semaphore = defer.DeferredSemaphore(max(i_queue_size, 1))
+        # the number of items being written or waiting for a thread
+        self.i_queue_depth = 0
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler.stats, crawler.settings.getint('WRITE_THREADS', 0),
+                   crawler.settings.getint('WRITE_QUEUE_SIZE', 64))
+
+    def open_spider(self, spider):
+        if self.i_threads > 0:
+            self.threadpool = ThreadPool(1, self.i_threads, 'MirroringPipeline')
+            self.threadpool.start()
+
+    def close_spider(self, spider):
+        # every item has been written, the spider is closed when the items have been processed
+        if self.threadpool is not None:
+            self.threadpool.stop()
+            self.threadpool = None
+
     def process_item(self, item, spider):
         """
         Pipeline that link a MirroringSpider to the MirroringItem
         @type item: Object
         @type spider: MirroringSpider
+        @return the item, or a deferred fired with the item once its file has been written
+        """
+        # the items processed by a content worker have already been stored
+        if not (isinstance(spider, MirroringSpider) and isinstance(item, MirroringItem)) or item.get('stored'):
+            return item
+
+        if self.threadpool is None:
+            self.update_stats(self.store(item), item)
+            return item
+
+        self.i_queue_depth += 1
+        self.stats.set_value('pipeline/queue_depth', self.i_queue_depth)
+        self.stats.max_value('pipeline/queue_max_depth', self.i_queue_depth)
+        # wait for a place in the queue, the deferred of the item is not fired before
+        d_item = self.semaphore.run(threads.deferToThreadPool, reactor, self.threadpool, self.store, item)
+        d_item.addBoth(self.item_stored, item)
+        return d_item
+
+    def item_stored(self, result, item):
+        """
+        Called in the reactor thread when the file of an item has been written
+        @param result: the number of seconds spent to write the file or the failure of the writing
+        @param item: the item
+        @return the item or the failure
+        """
+        self.i_queue_depth -= 1
+        self.stats.set_value('pipeline/queue_depth', self.i_queue_depth)
+        if isinstance(result, Failure):
+            return result
+        # the stats collector is not thread safe, it's updated in the reactor thread
+        self.update_stats(result, item)
+        return item
+
+    @staticmethod
+    def store(item):
+        """
+        Write the file of an item, called in a thread of the pool
+        @param item: the item
+        @return the number of seconds spent to write the file
+        """
+        f_start = time.monotonic()
+        item.store()
+        return time.monotonic() - f_start
+
+    def update_stats(self, f_duration, item):
+        """
+        Update the write latency stats and add the stats of the processing of the item
+        @param f_duration: the number of seconds spent to write a file
+        @param item: the item
+        """
+        add_item_stats(self.stats, item.get('stats'))
+        self.stats.inc_value('pipeline/write_count')
+        self.stats.inc_value('pipeline/write_seconds', f_duration)
+        self.stats.max_value('pipeline/write_max_seconds', f_duration)
+
+
+class PdfSanitizingPipeline(object):
+    """
+    Pipeline that remove the metadata of the PDF files before they are stored by the MirroringPipeline, the files are
+    sanitized by a pool of PDF_WORKERS processes. The sha256 of the downloaded files that have been sanitized are
+    written in the sanitized file of the spider, when a file has the same sha256 as a file sanitized by the previous
+    statification the sanitized file of the previous statification is reused.
+    """
+
+    def __init__(self, stats, i_workers):
+        """
+        @param stats: the stats collector of the crawler
+        @param i_workers: the number of worker processes, 0 to sanitize the files in the reactor thread
+        """
+        self.stats = stats
+        self.i_workers = i_workers
+        self.executor = None
+        # at most two files by worker are sent to the pool, so the temporary files are not kept too long
+        self.semaphore = defer.DeferredSemaphore(max(2 * i_workers, 1))
+        # the path to the sanitized file of the previous statification, indexed by the sha256 of the downloaded file
+        self.previous_files = {}
+        # the path to the sanitized file in the output, indexed by the sha256 of the downloaded file
+        self.files = {}
+        self.s_output = ''
+        self.s_sanitized_file = ''
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        i_workers = crawler.settings.getint('PDF_WORKERS', 0)
+        if i_workers < 0:
+            i_workers = (os.cpu_count() or 1) - 1
+        pipeline = cls(crawler.stats, i_workers)
+        # the spider state is loaded on spider_opened, the pipeline is opened before
+        crawler.signals.connect(pipeline.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(pipeline.item_scraped, signal=signals.item_scraped)
+        return pipeline
+
+    def spider_opened(self, spider):
+        """
+        Load the sha256 of the files sanitized by the previous statification, and by this crawl if it's resumed
+        @param spider: the spider that has been opened
+        """
+        self.s_output = getattr(spider, 'output', '')
+        self.s_sanitized_file = getattr(spider, 'sanitized_file', '')
+        s_previous_output = getattr(spider, 'previous_output', '')
+        s_previous_sanitized = getattr(spider, 'previous_sanitized', '')
+
+        if s_previous_output and s_previous_sanitized and os.path.isfile(s_previous_sanitized):
+            with open(s_previous_sanitized) as f_previous_sanitized:
+                self.previous_files = {s_sha256: s_previous_output + s_filename
+                                       for s_sha256, s_filename in json.load(f_previous_sanitized).items()}
+            statif_logger.info('%i sanitized PDF files loaded from %s' % (len(self.previous_files),
+                                                                          s_previous_sanitized))
+
+        if getattr(spider, 'resumed', False) and self.s_sanitized_file and os.path.isfile(self.s_sanitized_file):
+            with open(self.s_sanitized_file) as f_sanitized:
+                self.files = {s_sha256: self.s_output + s_filename
+                              for s_sha256, s_filename in json.load(f_sanitized).items()}
+
+    def open_spider(self, spider):
+        if self.i_workers > 0:
+            self.executor = create_executor(self.i_workers, init_worker)
+
+    def close_spider(self, spider):
+        """
+        Write the sha256 of the sanitized files and the throughput of the sanitization
+        @param spider: the spider that has been closed
+        """
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+        if self.s_sanitized_file:
+            with open(self.s_sanitized_file, 'w') as f_sanitized:
+                json.dump({s_sha256: s_path[len(self.s_output):] for s_sha256, s_path in self.files.items()},
+                          f_sanitized)
+
+        i_count = self.stats.get_value('pdf/count', 0)
+        if i_count:
+            self.stats.set_value('pdf/skip_rate', self.stats.get_value('pdf/skipped_count', 0) / i_count)
+        f_seconds = self.stats.get_value('pdf/seconds', 0)
+        if f_seconds:
+            self.stats.set_value('pdf/bytes_per_second', self.stats.get_value('pdf/bytes', 0) / f_seconds)
+
+    def process_item(self, item, spider):
+        """
+        Remove the metadata of the PDF file of an item
+        @type item: Object
+        @type spider: MirroringSpider
+        @return the item, or a deferred fired with the item once its file has been sanitized
         """
-        if isinstance(spider, MirroringSpider) and isinstance(item, MirroringItem):
-            item.process()
+        # the files not modified since the previous statification have already been sanitized
+        if not isinstance(item, MirroringItemPdf) or item.get('previous'):
+            return item
 
+        if not item.get('sha256'):
+            item['sha256'] = hashlib.sha256(item['content']).hexdigest()
+
+        s_previous_file = self.previous_files.get(item['sha256'])
+        if s_previous_file and os.path.isfile(s_previous_file):
+            # the same file has been sanitized by the previous statification, it's linked
+            item['previous'] = s_previous_file
+            if item.get('streamed'):
+                os.remove(item['streamed'])
+            item.add_stats({'pdf/count': 1, 'pdf/skipped_count': 1})
+            return item
+
+        if self.executor is None:
+            return self.item_sanitized(run_sanitize(item['content'], item.get('streamed'), item['filename']), item)
+
+        # wait for a place in the pool, the deferred of the item is not fired before
+        d_item = self.semaphore.run(self.sanitize, item)
+        d_item.addCallbacks(self.item_sanitized, self.sanitize_failed, callbackArgs=(item,), errbackArgs=(item,))
+        return d_item
+
+    def sanitize(self, item):
+        """
+        Send the file of an item to a worker process
+        @param item: the item
+        @return a deferred fired with the result of run_sanitize
+        """
+        return defer_future(self.executor.submit(run_sanitize, item['content'], item.get('streamed'),
+                                                 item['filename']))
+
+    def item_sanitized(self, result, item):
+        """
+        Called in the reactor thread when the file of an item has been sanitized
+        @param result: the content without metadata (None if it has been streamed) and the stats of the sanitization
+        @param item: the item
+        @return the item
+        """
+        content, stats = result
+        item.add_stats(stats)
+        # the time spent by the worker to remove the metadata
+        if 'pdf/seconds' in stats:
+            item.add_timing(STAGE_CLEAN, stats['pdf/seconds'])
+        if content is not None:
+            item['content'] = content
         return item
+
+    def sanitize_failed(self, failure, item):
+        """
+        Called when a worker has failed, the file is sanitized in the reactor thread
+        @param failure: the failure of the worker
+        @param item: the item
+        @return the item
+        """
+        if failure.check(BrokenProcessPool):
+            self.stats.inc_value('pdf/broken_count')
+        statif_logger.warning('The PDF file %s is sanitized by the crawler : %s' % (item['filename'],
+                                                                                    failure.getErrorMessage()))
+        return self.item_sanitized(run_sanitize(item['content'], item.get('streamed'), item['filename']), item)
+
+    def item_scraped(self, item, response, spider):
+        """
+        Record the sha256 of the PDF files that have been stored without metadata
+        @param item: the item that has been stored
+        """
+        if isinstance(item, MirroringItemPdf) and item.get('sha256') and \
+                'pdf/failed_count' not in (item.get('stats') or {}):
+            self.files[item['sha256']] = item['filename']
@@ -0,0 +1,84 @@
+# coding=utf-8
+"""
+Cornetto
+
+Copyright (C) 2018–2020 ANSSI
+Contributors:
+2018–2020 Bureau Applicatif tech-sdn-app@ssi.gouv.fr
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+"""
+# The progress of the crawl is published by the crawler in a small file mapped in memory, with a fixed layout :
+# sequence, pages crawled, bytes downloaded, queue depth, errors (unsigned 64 bits integers) and throughput in pages
+# per second (double). The sequence is odd while the block is being written, so a reader that see an odd sequence or
+# a sequence that changed during its read knows that the values are not consistent and read them again.
+
+import mmap
+import os
+import struct
+
+PROGRESS_FORMAT = struct.Struct('<QQQQQd')
+PROGRESS_FIELDS = ('pages', 'bytes', 'queue', 'errors', 'throughput')
+
+# the number of attempts to get consistent values before giving up
+MAX_READ_ATTEMPTS = 100
+
+
+class ProgressWriter(object):
+    """
+    Publish the progress of the crawl in the progress file
+    """
+
+    def __init__(self, s_progress_file):
+        """
+        @param s_progress_file: the path to the progress file, it is erased if it already exist
+        """
+        self.i_sequence = 0
+        with open(s_progress_file, 'wb') as f_progress_file:
+            f_progress_file.write(bytes(PROGRESS_FORMAT.size))
+        self.file = open(s_progress_file, 'r+b')
+        self.map = mmap.mmap(self.file.fileno(), PROGRESS_FORMAT.size)
+
+    def write(self, pages=0, bytes=0, queue=0, errors=0, throughput=0.0):
+        """
+        Write the progress values in the block
+        """
+        # mark the block as being written
+        self.i_sequence += 1
+        self.map[0:8] = self.i_sequence.to_bytes(8, 'little')
+        self.i_sequence += 1
+        self.map[0:PROGRESS_FORMAT.size] = PROGRESS_FORMAT.pack(self.i_sequence, pages, bytes, queue, errors,
+                                                                throughput)
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+
+def read_progress(s_progress_file):
+    """
+    Read the progress of the crawl published in the progress file
+    @param s_progress_file: the path to the progress file
+    @return a dict with the progress values, all set to 0 if the file is empty or doesn't exist
+    """
+    progress = dict.fromkeys(PROGRESS_FIELDS, 0)
+    try:
+        with open(s_progress_file, 'rb') as f_progress_file:
+            if os.fstat(f_progress_file.fileno()).st_size < PROGRESS_FORMAT.size:
+                return progress
+            with mmap.mmap(f_progress_file.fileno(), PROGRESS_FORMAT.size, access=mmap.ACCESS_READ) as m_progress:
+                for _ in range(MAX_READ_ATTEMPTS):
+                    values = PROGRESS_FORMAT.unpack(m_progress[0:PROGRESS_FORMAT.size])
+                    # the block is consistent if it isn't being written and hasn't changed during the read
+                    if values[0] % 2 == 0 and m_progress[0:8] == values[0].to_bytes(8, 'little'):
+                        return dict(zip(PROGRESS_FIELDS, values[1:]))
+    except FileNotFoundError:
+        pass
+    return progress
@@ -0,0 +1,344 @@
+# coding=utf-8
+"""
+Cornetto
+
+Copyright (C) 2018–2020 ANSSI
+Contributors:
+2018–2020 Bureau Applicatif tech-sdn-app@ssi.gouv.fr
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+"""
+# The url rewriter replace the urls of the crawled contents with a table of rules, e.g. :
+# [{"literal": "http://www.web.com", "replacement": ""},
+#  {"regex": "https?://old\\.web\\.com/news/(\\d+)", "replacement": "/archives/\\1"}]
+# The literal rules are searched with an Aho-Corasick automaton and the regex rules with a single combined regex,
+# so each body is scanned once by each matcher whatever the number of rules. The rules are case insensitive, when
+# several rules match at the same position the longest match is replaced.
+# In the combined regex, the global flags at the start of a rule (e.g. (?i)) are scoped to the rule and its groups are
+# not capturing, the replacement is expanded with the regex of the rule alone. The references to a group inside a
+# rule (\1, (?P=name)) are not supported.
+
+import json
+import re
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+try:
+    from re import _parser as sre_parse
+except ImportError:
+    # before python 3.11
+    import sre_parse
+
+# the prefix of the named group of each rule in the combined regex
+GROUP_PREFIX = 'rule'
+
+# the global flags at the start of a regex
+GLOBAL_FLAGS = re.compile(rb'^\(\?([aiLmsux]+)\)')
+
+# the operators of the references to a group
+GROUP_REFERENCES = (sre_parse.GROUPREF, sre_parse.GROUPREF_EXISTS)
+
+
+def get_first_bytes(items):
+    """
+    Get the bytes that can start a match of a parsed regex
+    @param items: the items of the regex parsed by sre_parse
+    @return the set of the first bytes, None if they can't be determined or if the regex can match an empty string
+    """
+    a_first = set()
+    for op, av in items:
+        if op is sre_parse.LITERAL:
+            a_first.add(av)
+            return a_first
+        elif op is sre_parse.IN:
+            for op_in, av_in in av:
+                if op_in is sre_parse.LITERAL:
+                    a_first.add(av_in)
+                elif op_in is sre_parse.RANGE:
+                    a_first.update(range(av_in[0], av_in[1] + 1))
+                else:
+                    # the negated sets and categories (\d, \w...) are not analysed
+                    return None
+            return a_first
+        elif op is sre_parse.SUBPATTERN:
+            a_sub_first = get_first_bytes(av[-1])
+        elif op is sre_parse.BRANCH:
+            a_sub_first = set()
+            for branch in av[1]:
+                a_branch_first = get_first_bytes(branch)
+                if a_branch_first is None:
+                    # the branch can be empty or its first bytes are unknown
+                    return None
+                a_sub_first |= a_branch_first
+        elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT):
+            a_sub_first = get_first_bytes(av[2])
+            if a_sub_first is not None and av[0] == 0:
+                # the repeated item is optional, the next item can start the match
+                a_first |= a_sub_first
+                continue
+        elif op is sre_parse.AT:
+            # ^, $, \b... don't consume anything
+            continue
+        else:
+            return None
+
+        if a_sub_first is None:
+            return None
+        a_first |= a_sub_first
+        return a_first
+
+    # every item is optional
+    return None
+
+
+def has_group_reference(parsed):
+    """
+    @param parsed: a regex parsed by sre_parse, or a part of it
+    @return True if the regex references one of its groups
+    """
+    if isinstance(parsed, sre_parse.SubPattern):
+        for op, av in parsed:
+            if op in GROUP_REFERENCES or has_group_reference(av):
+                return True
+    elif isinstance(parsed, (list, tuple)):
+        return any(has_group_reference(item) for item in parsed)
+    return False
+
+
+def remove_capturing_groups(pattern):
+    """
+    Replace the capturing groups of a regex by non capturing groups
+    @param pattern: the regex as bytes
+    @return the regex without capturing group
+    """
+    a_parts = []
+    i = 0
+    b_in_set = False
+    while i < len(pattern):
+        c = pattern[i:i + 1]
+        if c == b'\\':
+            # an escaped character
+            a_parts.append(pattern[i:i + 2])
+            i += 2
+            continue
+        if b_in_set:
+            # a ] just after the [ or [^ is a character of the set
+            if c == b']' and pattern[i - 1:i] != b'[' and pattern[i - 2:i] != b'[^':
+                b_in_set = False
+        elif c == b'[':
+            b_in_set = True
+        elif c == b'(' and pattern[i + 1:i + 4] == b'?P<':
+            # a named group
+            a_parts.append(b'(?:')
+            i = pattern.index(b'>', i) + 1
+            continue
+        elif c == b'(' and pattern[i + 1:i + 2] != b'?':
+            a_parts.append(b'(?:')
+            i += 1
+            continue
+        a_parts.append(c)
+        i += 1
+    return b''.join(a_parts)
+
+
+def get_rule_pattern(pattern, s_regex):
+    """
+    Get the pattern of a regex rule in the combined regex : its leading global flags are scoped to the rule and its
+    groups are not capturing, so the rules don't interfere with each other
+    @param pattern: the regex of the rule as bytes
+    @param s_regex: the regex of the rule, for the errors
+    @return the pattern to put in the combined regex
+    @raise ValueError if the regex references one of its groups
+    """
+    if has_group_reference(sre_parse.parse(pattern, re.I)):
+        raise ValueError('The url rewrite regex ' + s_regex + ' references one of its groups, it is not supported')
+    pattern = remove_capturing_groups(pattern)
+    flags = b''
+    match = GLOBAL_FLAGS.match(pattern)
+    while match:
+        flags += match.group(1)
+        pattern = pattern[match.end():]
+        match = GLOBAL_FLAGS.match(pattern)
+    if flags:
+        pattern = b'(?' + flags + b':' + pattern + b')'
+    return pattern
+
+
+def get_prefilter(pattern):
+    """
+    Get a lookahead that let the regex engine skip quickly the positions where no rule can match
+    @param pattern: the combined regex, case insensitive
+    @return the lookahead, empty if the first bytes of the regex can't be determined
+    """
+    try:
+        a_first = get_first_bytes(sre_parse.parse(pattern, re.I))
+    except Exception:
+        return b''
+    if not a_first:
+        return b''
+    # the regex is case insensitive
+    a_first |= set(bytes(a_first).lower() + bytes(a_first).upper())
+    return b'(?=[' + b''.join(re.escape(bytes([i])) for i in sorted(a_first)) + b'])'
+
+
+def load_rules(s_rules):
+    """
+    Load the rules given to the spider as a JSON list
+    @param s_rules: the rules as JSON
+    @return the list of rules
+    @raise ValueError if the rules are not a JSON list
+    """
+    a_rules = json.loads(s_rules) if s_rules else []
+    if not isinstance(a_rules, list):
+        raise ValueError('The url rewrite rules must be a list : ' + s_rules)
+    return a_rules
+
+
+class UrlRewriter(object):
+    """
+    Replace the urls that match a table of literal and regex rules in the bodies and links of the crawl
+    """
+
+    def __init__(self, a_rules, b_automaton=True):
+        """
+        @param a_rules: the rules, each rule is a dict with a 'literal' or a 'regex' and a 'replacement', the
+                        replacement of a regex can reference its groups (e.g. \\1)
+        @param b_automaton: False to search the literals with the combined regex even if pyahocorasick is installed
+        @raise ValueError if a rule is not valid
+        """
+        # the literals (lower case) and their replacement
+        self.d_literals = {}
+        # the regex and the replacement of each named group of the combined regex, the regex is None for a literal
+        self.d_groups = {}
+        a_patterns = []
+
+        for i, rule in enumerate(a_rules):
+            if not isinstance(rule, dict) or ('literal' in rule) == ('regex' in rule):
+                raise ValueError('An url rewrite rule must have either a literal or a regex : ' + repr(rule))
+            replacement = rule.get('replacement', '').encode('utf-8')
+
+            if 'literal' in rule:
+                literal = rule['literal'].encode('utf-8').lower()
+                # an empty pattern would match everywhere, the first rule of a literal is kept
+                if literal and literal not in self.d_literals:
+                    self.d_literals[literal] = replacement
+            elif rule['regex']:
+                pattern = rule['regex'].encode('utf-8')
+                try:
+                    regex = re.compile(pattern, re.I)
+                except re.error as e:
+                    raise ValueError('Invalid url rewrite regex ' + rule['regex'] + ' : ' + str(e))
+                # the replacement is expanded only if it references the groups of the regex
+                self.d_groups[GROUP_PREFIX + str(i)] = (regex if b'\\' in replacement else None, replacement)
+                rule_pattern = b'(?P<%s%i>%s)' % (GROUP_PREFIX.encode('ascii'), i,
+                                                  get_rule_pattern(pattern, rule['regex']))
+                try:
+                    re.compile(rule_pattern, re.I)
+                except re.error as e:
+                    raise ValueError('The url rewrite regex ' + rule['regex'] + ' can not be combined : ' + str(e))
+                a_patterns.append(rule_pattern)
+
+        self.automaton = None
+        if self.d_literals and b_automaton and ahocorasick is not None:
+            self.automaton = ahocorasick.Automaton()
+            for literal, replacement in self.d_literals.items():
+                # the automaton works on str, the bytes are decoded as latin-1 to keep their positions
+                self.automaton.add_word(literal.decode('latin-1'), (len(literal), replacement))
+            self.automaton.make_automaton()
+        else:
+            # without the automaton the literals are alternatives of the combined regex, the longest first
+            for i, literal in enumerate(sorted(self.d_literals, key=len, reverse=True)):
+                s_group = GROUP_PREFIX + 'literal' + str(i)
+                self.d_groups[s_group] = (None, self.d_literals[literal])
+                a_patterns.insert(i, b'(?P<%s>%s)' % (s_group.encode('ascii'), re.escape(literal)))
+
+        self.regex = None
+        if a_patterns:
+            pattern = b'|'.join(a_patterns)
+            # without the lookahead every rule would be tried at every position of the body
+            try:
+                self.regex = re.compile(get_prefilter(pattern) + b'(?:' + pattern + b')', re.I)
+            except re.error as e:
+                raise ValueError('The url rewrite rules can not be combined : ' + str(e))
+
+    @classmethod
+    def from_url_regex(cls, url_regex, url_replacement, a_rules=()):
+        """
+        Create the rewriter of the spider, the url regex is the first rule of the table
+        @param url_regex: the regex of the urls to replace, empty if there is none
+        @param url_replacement: the url that will replace the matched url_regex
+        @param a_rules: the other rules
+        @return the rewriter
+        """
+        a_all_rules = [{'regex': url_regex, 'replacement': url_replacement}] if url_regex else []
+        return cls(a_all_rules + list(a_rules))
+
+    def is_empty(self):
+        """
+        @return True if there is no rule, nothing is ever replaced
+        """
+        return self.automaton is None and self.regex is None
+
+    def get_replacement(self, match):
+        """
+        @param match: a match of the combined regex
+        @return the replacement of the match
+        """
+        regex, replacement = self.d_groups[match.lastgroup]
+        if regex is None:
+            return replacement
+        # the regex of the rule matches the same text as its group and expands the references to its groups
+        return regex.match(match.string, match.start()).expand(replacement)
+
+    def sub(self, body):
+        """
+        Replace the urls that match the rules in a body
+        @param body: the body as bytes
+        @return the new body
+        """
+        if self.automaton is None:
+            return self.regex.sub(self.get_replacement, body) if self.regex is not None else body
+
+        # the start, end and replacement of the matches of both matchers
+        a_matches = []
+        for i_end, (i_length, replacement) in self.automaton.iter_long(body.lower().decode('latin-1')):
+            a_matches.append((i_end + 1 - i_length, i_end + 1, replacement))
+        if self.regex is not None:
+            a_matches.extend((match.start(), match.end(), self.get_replacement(match))
+                             for match in self.regex.finditer(body))
+            # the first match at a position is the longest
+            a_matches.sort(key=lambda match: (match[0], -match[1]))
+        if not a_matches:
+            return body
+
+        a_parts = []
+        i_position = 0
+        for i_start, i_end, replacement in a_matches:
+            # the matches that overlap a replaced match are ignored
+            if i_start < i_position:
+                continue
+            a_parts.append(body[i_position:i_start])
+            a_parts.append(replacement)
+            i_position = i_end
+        a_parts.append(body[i_position:])
+        return b''.join(a_parts)
+
+    def sub_text(self, text):
+        """
+        Replace the urls that match the rules in a text
+        @param text: the text as str
+        @return the new text
+        """
+        if self.is_empty():
+            return text
+        return self.sub(text.encode('utf-8', 'surrogateescape')).decode('utf-8', 'surrogateescape')
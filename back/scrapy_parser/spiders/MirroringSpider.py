@@ -19,20 +19,39 @@ along with this program. If not, see http://www.gnu.org/licenses/.
 
 # TODO you should customize this spider to adapt it's behavior to your needs.
 
-import re
+import json
+import time
+from concurrent.futures.process import BrokenProcessPool
 from urllib import parse
-from lxml import html
-from lxml import etree
+from scrapy import signals
 from scrapy.http import Request
 from scrapy.spiders import Spider
+from scrapy_parser.handlers import remove_streaming_files
+from scrapy_parser.links import LinkEngine
+from scrapy_parser.paths import PathIndex
+from scrapy_parser.cache import ProcessedCache, get_rules_hash
+from scrapy_parser.mime import create_mime_registry
+from scrapy_parser.offload import ContentOffloader, create_html_parser, process_cached, CONTENT_ITEMS
+from scrapy_parser.rewrite import UrlRewriter, load_rules
+from scrapy_parser.timing import get_timing_stats, STAGE_DOWNLOAD, TIMING_PREFIX
+from scrapy_parser.events import CrawlEventWriter, CrawlEventLogHandler, EVENT_EXTERNAL_LINK, EVENT_HTTP_ERROR, \
+    EVENT_FORBIDDEN_MIME, EVENT_STATS
 from scrapy_parser.items import *
 
+# the name of the file where the state of the spider is stored in the job directory when the crawl is stopped, the
+# statification process checks it has been written to know that the crawl can be resumed
+STATE_FILE = 'mirroring.state.json'
+
+# the stats that are accumulated over the successive runs of a paused crawl
+RESUMED_STATS = ['custom_count', 'response_received_count', 'item_scraped_count']
+
 
 class MirroringSpider(Spider):
     name = "mirroring"
 
     def __init__(self, crawler, output="", urls="", domains="", url_regex="", url_replacement='/',
-                 crawler_count_file=None, *args, **kwargs):
+                 crawler_count_file=None, previous_output='', previous_validators='', validators_file='',
+                 events_file='', url_rewrite_rules='', previous_sanitized='', sanitized_file='', *args, **kwargs):
         """
         Constructor of the spider, here we set different parameters into the attributes of the spiders
         @param crawler the crawler to bound to the spider
@@ -41,7 +60,15 @@ class MirroringSpider(Spider):
         @param domains: the allowed domains , separated by comma
         @param url_regex: the regex to be match for url replacement
         @param url_replacement: the url that will replace the matched urlRegex
-        @param crawler_count_file: the path to the file that  will be use to store the count of crawled urls
+        @param url_rewrite_rules: the other rules used to replace the urls as a JSON list, see UrlRewriter
+        @param crawler_count_file: the path to the file where the progress of the crawl is published
+        @param previous_output: the path to the directory of the previous statification, used for incremental crawl
+        @param previous_validators: the path to the file containing the validators of the previous statification
+        @param validators_file: the path to the file where to store the validators (ETag, Last-Modified) of the crawl
+        @param previous_sanitized: the path to the file containing the sha256 of the PDF files sanitized by the
+                                   previous statification
+        @param sanitized_file: the path to the file where to store the sha256 of the PDF files sanitized by the crawl
+        @param events_file: the path to the file where to write the events of the crawl (errors, external links...)
         @param args: list of other args
         @param kwargs: dictionary of other args
         """
@@ -54,13 +81,62 @@ class MirroringSpider(Spider):
         self.visitedURLs = set() # list of urls crawled
         self.outURLS = set() # list of external urls found during the crawl
         self.cachedResourcePath = set()
+        # the paths of the files written in the output
+        self.paths = PathIndex()
         self.sCrawlerProgressCountFile = crawler_count_file
-
-        # set two regex that are used in the parser
-        self.urlRegex = re.compile(url_regex.strip('\"').encode('utf-8'), re.I)
-        self.urlReplacement = url_replacement.strip('\"').encode('utf-8')
+        # used by the IncrementalMiddleware
+        self.previous_output = previous_output
+        self.previous_validators = previous_validators
+        self.validators_file = validators_file
+        # used by the PdfSanitizingPipeline
+        self.previous_sanitized = previous_sanitized
+        self.sanitized_file = sanitized_file
+
+        # the events of the crawl are written in a machine readable file used to fill the database
+        self.events = None
+        self.events_log_handler = None
+        if events_file:
+            self.events = CrawlEventWriter(events_file)
+            # every error logged during the crawl is an exception event
+            self.events_log_handler = CrawlEventLogHandler(self.events)
+            logging.getLogger().addHandler(self.events_log_handler)
+
+        # the url regex and the table of rules used to replace the urls, compiled in a single matcher
+        a_rewrite_rules = load_rules(url_rewrite_rules)
+        self.rewriter = UrlRewriter.from_url_regex(url_regex.strip('\"'), url_replacement.strip('\"'),
+                                                   a_rewrite_rules)
+        # find, rewrite and classify the links of the contents
+        self.links = LinkEngine(self.allowed_domains, self.rewriter)
+        # the parser is reused for every page
+        self.html_parser = create_html_parser()
         self.crawler = crawler
 
+        # the handler of each MIME type, the MimeGateMiddleware abort the download of the types without handler
+        self.mime_registry = create_mime_registry(crawler.settings.getlist('STREAMED_MIME_TYPES'),
+                                                  crawler.settings.getdict('MIME_HANDLERS'))
+        self.allowed_mime_types = self.mime_registry
+
+        # the results of the processing of the contents are reused by the next statifications
+        self.cache = None
+        s_cache_directory = crawler.settings.get('PROCESSED_CACHE_DIRECTORY', '')
+        if s_cache_directory:
+            self.cache = ProcessedCache(s_cache_directory, get_rules_hash(self.allowed_domains, url_regex.strip('\"'),
+                                                                          url_replacement.strip('\"'),
+                                                                          a_rewrite_rules),
+                                        self.output, self.previous_output)
+
+        # the contents that need CPU are processed by a pool of worker processes
+        self.offloader = None
+        i_workers = crawler.settings.getint('CONTENT_WORKERS', 0)
+        if i_workers < 0:
+            i_workers = (os.cpu_count() or 1) - 1
+        if i_workers > 0:
+            self.offloader = ContentOffloader(i_workers, crawler.stats, self.allowed_domains,
+                                              url_regex.strip('\"'), url_replacement.strip('\"'), a_rewrite_rules,
+                                              self.cache)
+        # set to True by load_state if the crawl continue a paused crawl
+        self.resumed = False
+
     @classmethod
     def from_crawler(cls, crawler, output="", urls="", domains="", *args, **kwargs):
         """
@@ -73,7 +149,59 @@ class MirroringSpider(Spider):
         @param args: list of other args
         @param kwargs: dictionary of other args
         """
-        return cls(crawler, output, urls, domains, *args, **kwargs)
+        spider = cls(crawler, output, urls, domains, *args, **kwargs)
+        crawler.signals.connect(spider.closed, signal=signals.spider_closed)
+        spider.load_state()
+        return spider
+
+    def get_state_file(self):
+        """
+        Get the path to the file that store the state of the spider
+        @return the path to the file in the job directory, None if the crawl is not persisted (no JOBDIR)
+        """
+        s_job_directory = self.crawler.settings.get('JOBDIR')
+        if not s_job_directory:
+            return None
+        return os.path.join(s_job_directory, STATE_FILE)
+
+    def load_state(self):
+        """
+        Restore the state of the spider when a paused crawl is resumed : the urls crawled and found, and the stats
+        that are accumulated. The requests to crawl and the fingerprints of the requests seen are restored by Scrapy.
+        """
+        s_state_file = self.get_state_file()
+        self.resumed = bool(s_state_file) and os.path.isfile(s_state_file)
+        if not self.resumed:
+            return
+
+        with open(s_state_file) as f_state_file:
+            state = json.load(f_state_file)
+        self.visitedURLs.update(state['visitedURLs'])
+        self.outURLS.update(state['outURLS'])
+        for s_key, i_value in state['stats'].items():
+            self.crawler.stats.set_value(s_key, i_value)
+        statif_logger.info('The crawl is resumed, %i pages have already been crawled' % state['stats'].get(
+            'custom_count', 0))
+
+    def save_state(self):
+        """
+        Store the state of the spider in the job directory so the crawl can be resumed
+        """
+        s_state_file = self.get_state_file()
+        if not s_state_file:
+            return
+
+        state = {
+            'visitedURLs': list(self.visitedURLs),
+            'outURLS': list(self.outURLS),
+            # the timing stats are accumulated too, so they cover the whole statification
+            'stats': {s_key: value for s_key, value in self.crawler.stats.get_stats().items()
+                      if s_key in RESUMED_STATS or s_key.startswith(TIMING_PREFIX)}
+        }
+        # write in a temporary file and rename it so the state is never partially written
+        with open(s_state_file + '.tmp', 'w') as f_state_file:
+            json.dump(state, f_state_file)
+        os.replace(s_state_file + '.tmp', s_state_file)
 
     def get_local_filename(self, url, default_index="index.html"):
         """
@@ -87,14 +215,75 @@ class MirroringSpider(Spider):
         filename = "/" + parse.unquote(url.path) if (url.path == "") or (url.path[0] != "/") else parse.unquote(
             url.path)
 
-        # if the filename is a directory then the file is index.html
-        if os.path.isdir(filename) or os.path.basename(filename) == "":
+        # if the filename is a directory then the file is index.html, the files that are also directories are resolved
+        # by the PathIndex
+        if os.path.basename(filename) == "":
             filename += default_index
 
         if url.query:
             filename += "%3F" + parse.unquote(url.query)
         return filename
 
+    def get_local_path(self, url):
+        """
+        Get the path to the local file of an url, it's the index of a directory if the path is used by other files
+        @param url: the url of the file that has been downloaded
+        @return the path to the local file, relative to the output
+        """
+        s_path, s_moved = self.paths.add_file(self.get_local_filename(url))
+        if s_moved:
+            # the file is moved when the new file is written
+            statif_logger.log(logging.DEBUG, "The file %s becomes the index of a directory for %s" % (s_moved, s_path))
+            self.crawler.stats.inc_value('paths/moved_count')
+        return s_path
+
+    def emit(self, s_type, **fields):
+        """
+        Write an event of the crawl in the events file if there is one
+        @param s_type: the type of the event
+        @param fields: the data of the event
+        """
+        if self.events:
+            self.events.write(s_type, **fields)
+
+    def closed(self, reason):
+        """
+        Called when the spider is closed, write the stats of the crawl and close the events file
+        @param reason: the reason why the spider has been closed
+        """
+        self.save_state()
+
+        if self.offloader is not None:
+            self.offloader.close()
+
+        if self.cache is not None:
+            # the least recently used results are removed once the results of the crawl have been added
+            i_size, i_evicted = self.cache.evict(self.crawler.settings.getint('PROCESSED_CACHE_MAX_SIZE'))
+            self.crawler.stats.set_value('cache/size', i_size)
+            self.crawler.stats.set_value('cache/evicted_count', i_evicted)
+
+        if self.events:
+            self.emit(EVENT_STATS, stats=self.crawler.stats.get_stats())
+            logging.getLogger().removeHandler(self.events_log_handler)
+            self.events.close()
+        if self.output and os.path.isdir(self.output):
+            # the streamed files that have not been saved are removed from the output
+            remove_streaming_files(self.output)
+
+    def follow_links(self, a_links, response):
+        """
+        Request the links found in a content, the external links are reported once
+        @param a_links: the absolute links and a boolean set if the link is external
+        @param response: the response of the content
+        @return an iterator on the requests
+        """
+        for link, b_external in a_links:
+            if b_external and link not in self.outURLS:
+                self.outURLS.add(link)
+                statif_logger.log(logging.INFO, "External link detected [%s] in %s" % (link, response.url))
+                self.emit(EVENT_EXTERNAL_LINK, url=link, source=response.url)
+            yield Request(link)
+
     def start_requests(self):
         """
         This will be call to start the first requests
@@ -105,22 +294,25 @@ class MirroringSpider(Spider):
     def parse(self, response):
         """
         The method that will manage how to parse any web content
+        @return the requests of the links and the item of the content, or a deferred fired with them if the content
+                is processed by a content worker
         """
-        url_regex = self.urlRegex
-
+        # the count is published in the progress file by the ProgressExtension
         self.crawler.stats.inc_value('custom_count')
-        file = open(self.sCrawlerProgressCountFile, 'w')
-        file.write(str(self.crawler.stats.get_value('custom_count')))
-        file.close()
 
         # catch error HTTP
         if not (200 <= response.status < 400):
+            s_referer = response.request.headers.get('Referer', b'').decode('utf-8')
             statif_logger.log(logging.WARNING, "HTTP error [%i] for %s from %s" % (
-                response.status, response.url, response.request.headers.get('Referer', b'').decode('utf-8')))
-            return
+                response.status, response.url, s_referer))
+            self.emit(EVENT_HTTP_ERROR, code=response.status, url=response.url, source=s_referer)
+            return []
 
         current_url = parse.urlparse(response.url)
-        current_filename = self.get_local_filename(current_url)
+        filename = self.output + self.get_local_path(current_url)
+
+        # the path of the file in the previous statification if the content has not been modified since
+        previous_file = response.meta.get('previous_file')
 
         # get Content-Type in headers, if not specified treat as text/plain
         if 'Content-Type' in response.headers:
@@ -128,109 +320,95 @@ class MirroringSpider(Spider):
         else:
             mime = 'text/plain'
 
-        if mime == "text/html":
-            # replace all url that match the regex by urlReplacement
-            body = url_regex.sub(self.urlReplacement, response.body)
-
-            root = etree.fromstring(body, parser=html.HTMLParser(encoding="utf-8", remove_comments=False),
-                                    base_url=response.url).getroottree()
-
-            # Search for links
-            for link in root.xpath(
-                    '//a/@href | //applet/@code | //area/@href | //bgsound/@src | //body/@background | //embed/@src | //fig/@src | //form/@action | //frame/@src | //iframe/@src | //img/@src | //input/@src | //layer/@src | //link/@href | //object/@data | //overlay/@src | //script/@src | //table/@background | //td/@background | //tr/@background | //video/@src | //video/@poster | //audio/@src | //source/@src | //div/@style | //section/@style | //article/@style | //a/@style'):
-
-                link = parse.urljoin(response.url, link)
-
-                if not re.match('^https?:|data:', link):
-                    statif_logger.log(logging.DEBUG, "Unknown external link format [%s]" % link)
-                    continue
-
-                if (parse.urlparse(link).netloc not in self.allowed_domains) and (link not in self.outURLS):
-                    self.outURLS.add(link)
-                    statif_logger.log(logging.INFO, "External link detected [%s] in %s" % (link, response.url))
-                yield Request(link)
-
-            yield MirroringItemHtml(filename=self.output + current_filename, content=root)
-
-        elif mime == "text/css":
-            # replace all url that match the regex by urlReplacement
-            body = url_regex.sub(self.urlReplacement, response.body)
-
-            # Search for links
-            for url in re.findall(b"url\s*\(\s*[\"']?([^)\"']+)[\"']?\s*\)", body):
-                link = parse.urljoin(response.url, url.decode('utf-8'))
-                if not re.match('^https?:|data:', link):
-                    statif_logger.log(logging.DEBUG, "Unknown external link format [%s] in %s" % (link, response.url))
-                    continue
-
-                if (parse.urlparse(link).netloc not in self.allowed_domains) and (link not in self.outURLS):
-                    self.outURLS.add(link)
-                    statif_logger.log(logging.INFO, "External link detected [%s] in %s" % (link, response.url))
-                yield Request(link)
-
-            yield MirroringItemCss(filename=self.output + current_filename, content=body)
-
-        elif mime == "application/pdf":
-            yield MirroringItemPdf(filename=self.output + current_filename, content=response.body)
-
-        elif mime == "text/xml":
-            # get the body content and encode it as utf-8
-            body = url_regex.sub(self.urlReplacement, response.body)
-
-            root = etree.fromstring(body, parser=etree.XMLParser(strip_cdata=False, resolve_entities=False),
-                                    base_url=response.url).getroottree()
-
-            # Parse XML to find every declared namespaces
-            namespaces = {}
-            for event, elem in etree.iterwalk(root, ('start', 'start-ns')):
-                if event == 'start-ns':
-                    namespaces[elem[0]] = elem[1]
-                elif event == 'start':
-                    break
-
-            # Search for links
-            xpath = "/rss/channel/link | /rss/channel/item/link | /rss/channel/item/comments"
-            if 'atom' in namespaces:
-                xpath += " | /rss/channel/atom:link[@href]"
-            if 'wfw' in namespaces:
-                xpath += " | /rss/channel/item/wfw:commentRss"
-            for elem in root.xpath(xpath, namespaces=namespaces):
-                if elem.tag == '{' + namespaces['atom'] + '}link':
-                    link = elem.get('href')
-                else:
-                    link = elem.text
-
-                link = parse.urljoin(response.url, link)
-
-                if not re.match('^https?:|data:', link):
-                    statif_logger.log(logging.WARNING, "Unknown external link format [%s]" % link)
-                    continue
-
-                if (parse.urlparse(link).netloc not in self.allowed_domains) and (link not in self.outURLS):
-                    self.outURLS.add(link)
-                    statif_logger.log(logging.INFO, "External link detected [%s] in %s" % (link, response.url))
-                yield Request(link)
-
-            yield MirroringItemXml(filename=self.output + current_filename, content=root)
-
-        elif mime in ["image/gif", "image/jpeg", "image/png", "image/x-ms-bmp", "image/vnd.microsoft.icon",
-                      "image/x-icon"]:
-            yield MirroringItemImg(filename=self.output + current_filename, content=response.body)
-
-        elif mime in ["application/javascript", "text/javascript"]:
-            # get the body content and encode it as utf-8
-            body = url_regex.sub(self.urlReplacement, response.body)
-
-            yield MirroringItemJs(filename=self.output + current_filename, content=body)
-
-        # Here are all the MIME type of files that will be downloaded and stored
-        # TODO This list is an example, any other type that should be downloaded must be added here
-        elif mime in ["application/font-woff", "application/vnd.ms-fontobject", "text/plain", "application/x-gzip",
-                      "application/zip", "application/rtf", "video/mp4", "video/webm", "text/csv",
-                      "application/x-x509-ca-cert", "application/x-pkcs7-crl", "application/msword",
-                      "application/vnd.ms-excel", "application/epub+zip", "application/x-mobi8-ebook",
-                      "application/xml", "image/svg+xml"]:
-            yield MirroringItem(filename=self.output + current_filename, content=response.body)
-
-        else:  # Content not allowed
+        handler = self.mime_registry.get(mime)
+        if handler is None:
+            # Content not allowed, usually already aborted by the MimeGateMiddleware when the headers arrived
             statif_logger.log(logging.WARNING, "Forbidden content [%s] detected in %s" % (mime, response.url))
+            self.emit(EVENT_FORBIDDEN_MIME, mime=mime, url=response.url)
+            return []
+
+        self.crawler.stats.inc_value('mime/%s/count' % handler.s_name)
+        self.crawler.stats.inc_value('mime/%s/bytes' % handler.s_name,
+                                     response.meta.get('streamed_size', len(response.body)))
+        if 'download_latency' in response.meta:
+            # the time between the sending of the request and the reception of the headers of the response
+            add_item_stats(self.crawler.stats, get_timing_stats(handler.s_name, STAGE_DOWNLOAD,
+                                                                response.meta['download_latency']))
+
+        if handler.s_kind is None:
+            # the content is stored as it is
+            return [handler.create_item(response, filename, previous_file)]
+
+        if self.offloader is None:
+            return self.parse_content(response, handler, filename, previous_file)
+
+        # the content is parsed, rewritten and saved by a worker process
+        d_result = self.offloader.process(handler.s_kind, response.body, response.url, filename, previous_file,
+                                          handler.s_name)
+        d_result.addCallbacks(self.content_processed, self.content_failed,
+                              callbackArgs=(response, handler, filename, previous_file),
+                              errbackArgs=(response, handler, filename, previous_file))
+        return d_result
+
+    def parse_content(self, response, handler, filename, previous_file):
+        """
+        Parse, rewrite and save a content in the crawler process
+        @param response: the response
+        @param handler: the handler of the MIME type of the content
+        @param filename: the path to the file where to save the content
+        @param previous_file: the path to the file in the previous statification if it has not been modified since
+        @return the requests of the links and the item of the content
+        """
+        f_start = time.process_time()
+        item, a_links, a_unknown_links = process_cached(self.cache, self.links, self.html_parser, handler.s_kind,
+                                                        response.body, response.url, filename, previous_file,
+                                                        handler.s_name)
+        self.crawler.stats.inc_value('mime/%s/seconds' % handler.s_name, time.process_time() - f_start)
+        return self.get_content_results(response, a_links, a_unknown_links) + [item]
+
+    def content_processed(self, result, response, handler, filename, previous_file):
+        """
+        Called when a content worker has processed a content
+        @param result: the links of the content and the links that can't be crawled
+        @param response: the response
+        @param handler: the handler of the MIME type of the content
+        @param filename: the path to the file where the content has been saved
+        @param previous_file: the path to the file in the previous statification if it has not been modified since
+        @return the requests of the links and the item of the content
+        """
+        a_links, a_unknown_links = result
+        # the item is not processed by the pipeline, its file has already been stored by the worker
+        item = CONTENT_ITEMS[handler.s_kind](filename=filename, content=None, previous=previous_file, stored=True)
+        return self.get_content_results(response, a_links, a_unknown_links) + [item]
+
+    def content_failed(self, failure, response, handler, filename, previous_file):
+        """
+        Called when a content worker has failed to process a content
+        @param failure: the failure
+        @param response: the response
+        @param handler: the handler of the MIME type of the content
+        @param filename: the path to the file where to save the content
+        @param previous_file: the path to the file in the previous statification if it has not been modified since
+        @return the requests of the links and the item of the content if it can be processed in the crawler process
+        """
+        if not failure.check(BrokenProcessPool):
+            # the error is logged by scrapy as the errors of the parse method
+            return failure
+        if self.offloader is not None:
+            statif_logger.log(logging.ERROR, "A content worker has died, the contents are now processed by the "
+                                             "crawler process")
+            # the remaining workers and the thread that manages them are stopped, the reactor doesn't wait for them
+            self.offloader.close(b_wait=False)
+            self.offloader = None
+        return self.parse_content(response, handler, filename, previous_file)
+
+    def get_content_results(self, response, a_links, a_unknown_links):
+        """
+        @param response: the response
+        @param a_links: the absolute links of the content and a boolean set if the link is external
+        @param a_unknown_links: the links of the content that can't be crawled
+        @return the requests of the links
+        """
+        for link in a_unknown_links:
+            statif_logger.log(logging.WARNING, "Unknown external link format [%s]" % link)
+        return list(self.follow_links(a_links, response))
@@ -0,0 +1,109 @@
+# coding=utf-8
+"""
+Cornetto
+
+Copyright (C) 2018–2020 ANSSI
+Contributors:
+2018–2020 Bureau Applicatif tech-sdn-app@ssi.gouv.fr
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+
+"""
+# The time spent in each stage of the crawl of a content is measured with a monotonic clock and aggregated in the stats
+# of the crawler, per handler of MIME type, as a count, a total and a histogram of the durations :
+#   timing/<handler>/<stage>/count, timing/<handler>/<stage>/seconds and timing/<handler>/<stage>/<bucket>
+
+import time
+from contextlib import contextmanager
+
+# the stages of the crawl of a content
+STAGE_DOWNLOAD = 'download'
+STAGE_PARSE = 'parse'
+STAGE_LINKS = 'links'
+STAGE_REWRITE = 'rewrite'
+STAGE_SERIALIZE = 'serialize'
+STAGE_CLEAN = 'clean'
+STAGE_WRITE = 'write'
+
+STAGES = (STAGE_DOWNLOAD, STAGE_PARSE, STAGE_LINKS, STAGE_REWRITE, STAGE_SERIALIZE, STAGE_CLEAN, STAGE_WRITE)
+
+# the upper bound in seconds of each bucket of the histograms, and its name
+BUCKETS = ((0.001, 'le_1ms'), (0.01, 'le_10ms'), (0.1, 'le_100ms'), (1, 'le_1s'), (10, 'le_10s'))
+# the name of the bucket of the longer durations
+BUCKET_OVER = 'gt_10s'
+
+BUCKET_NAMES = tuple(s_bucket for f_bound, s_bucket in BUCKETS) + (BUCKET_OVER,)
+
+# the prefix of the timing stats
+TIMING_PREFIX = 'timing/'
+
+# the handler of the contents whose MIME type is unknown
+UNKNOWN_HANDLER = 'unknown'
+
+
+def get_bucket(f_seconds):
+    """
+    @param f_seconds: a duration in seconds
+    @return the name of the bucket of the histograms that contains the duration
+    """
+    for f_bound, s_bucket in BUCKETS:
+        if f_seconds <= f_bound:
+            return s_bucket
+    return BUCKET_OVER
+
+
+def get_timing_stats(s_handler, s_stage, f_seconds):
+    """
+    Get the stats of one measure of the time spent in a stage
+    @param s_handler: the name of the handler of the MIME type of the content
+    @param s_stage: the stage (STAGE_PARSE, STAGE_WRITE...)
+    @param f_seconds: the number of seconds spent
+    @return the stats to add to the stats of the crawler
+    """
+    s_prefix = '%s%s/%s/' % (TIMING_PREFIX, s_handler or UNKNOWN_HANDLER, s_stage)
+    return {s_prefix + 'count': 1, s_prefix + 'seconds': f_seconds, s_prefix + get_bucket(f_seconds): 1}
+
+
+@contextmanager
+def measure(add_stats, s_handler, s_stage):
+    """
+    Measure the time spent in the block with a monotonic clock
+    @param add_stats: the function called with the stats of the measure, e.g. MirroringItem.add_stats
+    @param s_handler: the name of the handler of the MIME type of the content
+    @param s_stage: the stage (STAGE_PARSE, STAGE_WRITE...)
+    """
+    f_start = time.monotonic()
+    try:
+        yield
+    finally:
+        add_stats(get_timing_stats(s_handler, s_stage, time.monotonic() - f_start))
+
+
+def parse_timing_stats(stats):
+    """
+    Group the timing stats of a crawl by handler and stage
+    @param stats: the stats of the crawler
+    @return a python dict that give for each (handler, stage) its count, its number of seconds and its histogram
+    """
+    timings = {}
+    for s_key, value in stats.items():
+        if not s_key.startswith(TIMING_PREFIX):
+            continue
+        a_parts = s_key[len(TIMING_PREFIX):].rsplit('/', 2)
+        if len(a_parts) != 3:
+            continue
+        s_handler, s_stage, s_field = a_parts
+        timing = timings.setdefault((s_handler, s_stage), {'count': 0, 'seconds': 0,
+                                                           'histogram': dict.fromkeys(BUCKET_NAMES, 0)})
+        if s_field in ('count', 'seconds'):
+            timing[s_field] = value
+        elif s_field in timing['histogram']:
+            timing['histogram'][s_field] = value
+    return timings
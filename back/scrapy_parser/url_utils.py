@@ -0,0 +1,41 @@
+# coding=utf-8
+"""
+Cornetto
+
+Copyright (C) 2018–2020 ANSSI
+Contributors:
+2018–2020 Bureau Applicatif tech-sdn-app@ssi.gouv.fr
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+"""
+from urllib import parse
+
+from w3lib.url import canonicalize_url
+
+# the file served by the web server when the url point to a directory
+DEFAULT_INDEX = 'index.html'
+
+
+def get_canonical_url(url):
+    """
+    Get the canonical form of an url used to filter the duplicate requests : the url is canonicalized (query arguments
+    sorted, fragment removed, percent encoding normalized) and the urls of a directory and of its index are
+    considered equal, e.g. http://mysite.mydomain, http://mysite.mydomain/ and http://mysite.mydomain/index.html
+    @param url: the url
+    @return the canonical url
+    """
+    scheme, netloc, path, query, fragment = parse.urlsplit(canonicalize_url(url))
+
+    # remove the index and the trailing slash of the directories
+    if path.endswith('/' + DEFAULT_INDEX):
+        path = path[:-len(DEFAULT_INDEX)]
+    path = path.rstrip('/')
+
+    return parse.urlunsplit((scheme, netloc, path, query, ''))
@@ -33,16 +33,27 @@ setup(
         ]
     },
     python_requires=">=3.4",
-    py_modules=['wsgi', 'scrapy_cmd'],
+    py_modules=['wsgi', 'visualize_wsgi', 'scrapy_cmd'],
     install_requires=[
         'Flask',
         'Flask-SQLAlchemy',
         'Pillow',
         'SQLAlchemy',
-        'Scrapy',
+        # the streaming download handler use the private API of Scrapy, it's tested with these versions
+        'Scrapy>=2.5,<2.6',
         'lxml',
         'requests',
         'sh',
         'typing',
-    ]
+    ],
+    extras_require={
+        # needed to compress the archives with zstd
+        'zstd': ['zstandard'],
+        # needed by the BLOOM dupe filter
+        'bloom': ['pybloom_live'],
+        # needed to search the literal url rewrite rules with an Aho-Corasick automaton
+        'rewrite': ['pyahocorasick'],
+        # needed to rewrite the PDF files without their metadata, they are only scrubbed without it
+        'pdf': ['pikepdf']
+    }
 )
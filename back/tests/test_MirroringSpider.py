@@ -0,0 +1,75 @@
+# coding=utf-8
+"""
+Cornetto
+
+Copyright (C) 2018–2020 ANSSI
+Contributors:
+2018–2020 Bureau Applicatif tech-sdn-app@ssi.gouv.fr
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+"""
+import os
+from concurrent.futures.process import BrokenProcessPool
+
+from scrapy.utils.test import get_crawler
+from twisted.python.failure import Failure
+
+from scrapy_parser.spiders.MirroringSpider import MirroringSpider, RESUMED_STATS
+
+
+def create_spider(s_job_directory):
+    crawler = get_crawler(MirroringSpider, {'CONTENT_WORKERS': 0, 'JOBDIR': s_job_directory})
+    return MirroringSpider.from_crawler(crawler, output='', urls='http://web.com/', domains='web.com')
+
+
+def test_save_load_state(tmp_path):
+    s_job_directory = str(tmp_path / 'job')
+    os.makedirs(s_job_directory)
+
+    spider = create_spider(s_job_directory)
+    assert not spider.resumed
+    spider.visitedURLs.add('http://web.com/')
+    spider.outURLS.add('http://other.com/')
+    for i, s_key in enumerate(RESUMED_STATS):
+        spider.crawler.stats.set_value(s_key, i + 1)
+    spider.crawler.stats.set_value('timing/html/parse/count', 4)
+    # the other stats are not accumulated over the runs
+    spider.crawler.stats.set_value('downloader/request_count', 42)
+    spider.save_state()
+
+    # the next run of the crawl continue with the state of the previous run
+    spider = create_spider(s_job_directory)
+    assert spider.resumed
+    assert spider.visitedURLs == {'http://web.com/'}
+    assert spider.outURLS == {'http://other.com/'}
+    for i, s_key in enumerate(RESUMED_STATS):
+        assert spider.crawler.stats.get_value(s_key) == i + 1
+    assert spider.crawler.stats.get_value('timing/html/parse/count') == 4
+    assert spider.crawler.stats.get_value('downloader/request_count') is None
+
+
+class BrokenOffloader(object):
+    def __init__(self):
+        self.a_closed = []
+
+    def close(self, b_wait=True):
+        self.a_closed.append(b_wait)
+
+
+def test_content_failed(tmp_path, monkeypatch):
+    spider = create_spider(str(tmp_path / 'job'))
+    offloader = BrokenOffloader()
+    spider.offloader = offloader
+    monkeypatch.setattr(spider, 'parse_content', lambda response, handler, filename, previous_file: ['parsed'])
+
+    # the content is processed by the crawler, the broken pool is stopped without waiting for its workers
+    assert spider.content_failed(Failure(BrokenProcessPool()), None, None, '', None) == ['parsed']
+    assert spider.offloader is None
+    assert offloader.a_closed == [False]
@@ -14,4 +14,177 @@ but WITHOUT ANY WARRANTY; without even the implied warranty of
 MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
 GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
-"""
\ No newline at end of file
+"""
+import os
+import threading
+from datetime import datetime
+
+import pytest
+from sqlalchemy.orm.exc import NoResultFound
+
+from cornetto import StatificationProcess as statification_process
+from cornetto.StatificationProcess import StatificationProcess, PAUSE_MARKER, SPIDER_STATE_FILE
+from cornetto.models import open_session_db, Base, Status
+from cornetto.models.Statification import Statification
+
+
+@pytest.fixture()
+def process(tmp_path):
+    s_database_uri = 'sqlite:///' + str(tmp_path / 'cornetto.db')
+    session = open_session_db(s_database_uri)
+    Base.metadata.create_all(session.get_bind())
+    session.close()
+    os.makedirs(str(tmp_path / 'job'))
+    return StatificationProcess('test', str(tmp_path / 'static'), '', 'http://web.com/', 'web.com',
+                                str(tmp_path / 'statif.log'), str(tmp_path), s_database_uri,
+                                str(tmp_path / 'pid'), str(tmp_path / 'lock'), str(tmp_path / 'count'),
+                                s_events_file=str(tmp_path / 'statif.events.jsonl'),
+                                s_job_directory=str(tmp_path / 'job'))
+
+
+def add_current_statification(process):
+    session = open_session_db(process.s_database_uri)
+    session.add(Statification('', 'designation', 'description', datetime.utcnow(), datetime.utcnow(),
+                              Status.CREATED))
+    session.commit()
+    session.close()
+
+
+def has_current_statification(process):
+    session = open_session_db(process.s_database_uri)
+    try:
+        Statification.get_statification(session, '')
+        return True
+    except NoResultFound:
+        return False
+    finally:
+        session.close()
+
+
+def test_done_paused(process):
+    add_current_statification(process)
+    process.mark_paused()
+    # the spider persists its state when it's closed after the pause
+    open(os.path.join(process.s_job_directory, SPIDER_STATE_FILE), 'w').close()
+
+    process.done('', True, 0)
+
+    # the statification and the state of the crawl are kept for the resume
+    assert process.is_paused()
+    assert has_current_statification(process)
+    assert os.path.isdir(process.s_job_directory)
+    with open(process.s_pid_file) as f_pid_file:
+        assert f_pid_file.read() == ''
+
+
+def test_done_crawler_died(process):
+    add_current_statification(process)
+    # the state of the spider of a previous pause is not the state of this crawl
+    open(os.path.join(process.s_job_directory, SPIDER_STATE_FILE), 'w').close()
+
+    process.done('', False, 1)
+
+    # the requests to crawl have not been persisted, the crawl can't be resumed
+    assert not process.is_paused()
+    assert not has_current_statification(process)
+    assert not os.path.isdir(process.s_job_directory)
+
+
+def test_done_crawler_died_while_pausing(process):
+    add_current_statification(process)
+    process.mark_paused()
+
+    process.done('', False, 1)
+
+    # the crawler has been killed before persisting its state, the crawl can't be resumed
+    assert not process.is_paused()
+    assert not has_current_statification(process)
+    assert not os.path.isdir(process.s_job_directory)
+
+
+def test_done_crawler_stopped(process):
+    # the statification has been stopped by the user, the crawl can't be resumed
+    process.done('', False, 1)
+
+    assert not process.is_paused()
+    assert not os.path.isdir(process.s_job_directory)
+
+
+def test_resume(process, monkeypatch):
+    a_extract = []
+    a_launched = []
+    monkeypatch.setattr(StatificationProcess, 'extract_and_launch_crawler', a_extract.append)
+    monkeypatch.setattr(process, 'get_previous_statification_sha', lambda session: 'previous')
+    monkeypatch.setattr(process, 'get_incremental_args', lambda s_previous_sha: ['-a', 'previous_output=p'])
+    monkeypatch.setattr(process, 'launch_crawler', a_launched.append)
+    session = open_session_db(process.s_database_uri)
+
+    # there is no paused statification
+    with pytest.raises(ValueError):
+        process.resume(session)
+
+    add_current_statification(process)
+    process.mark_paused()
+    with open(process.s_events_file, 'w') as f_events_file:
+        f_events_file.write('{"type": "stats"}\n')
+
+    process.resume(session)
+    session.close()
+
+    assert not process.is_paused()
+    assert not os.path.isfile(os.path.join(process.s_job_directory, PAUSE_MARKER))
+    # the previous statification is not extracted again and the events already registered are erased
+    assert a_extract == []
+    assert a_launched == [['-a', 'previous_output=p']]
+    assert os.path.getsize(process.s_events_file) == 0
+
+
+def test_start_incremental(process, monkeypatch):
+    process.b_incremental = True
+    process.s_previous_repository = os.path.join(process.s_project_directory, 'previous')
+    process.s_archive_repository = os.path.join(process.s_project_directory, 'archive')
+    process.s_log_dir = process.s_project_directory
+    process.s_validators_file = os.path.join(process.s_project_directory, 'validators.json')
+    os.makedirs(process.s_repository_path)
+    os.makedirs(process.s_previous_repository)
+    open(os.path.join(process.s_log_dir, 'previous.validators.json'), 'w').close()
+    session = open_session_db(process.s_database_uri)
+    session.add(Statification('previous', 'designation', 'description', datetime.utcnow(), datetime.utcnow(),
+                              Status.SAVED))
+    session.commit()
+
+    extracting = threading.Event()
+    extracted = threading.Event()
+    a_launched = []
+
+    def extract_archive_to_directory(s_archive_sha, s_archive_repository, s_destination):
+        extracting.set()
+        assert extracted.wait(10)
+    monkeypatch.setattr(statification_process, 'extract_archive_to_directory', extract_archive_to_directory)
+    monkeypatch.setattr(process, 'launch_crawler', a_launched.append)
+
+    # the request that start the statification doesn't wait for the extraction of the previous statification
+    process.start(session, 'designation', 'description', 'user')
+    assert extracting.wait(10)
+    assert process.is_running() and a_launched == []
+    with pytest.raises(ValueError):
+        process.pause()
+
+    # the crawler is launched once the previous statification has been extracted
+    extracted.set()
+    process.preparation.join(10)
+    assert not process.is_running()
+    assert a_launched == [['-a', 'previous_output=' + process.s_previous_repository,
+                           '-a', 'previous_validators=' + os.path.join(process.s_log_dir, 'previous.validators.json')]]
+
+    # the crawler is not launched if the statification has been stopped during the extraction
+    extracted.clear()
+    extracting.clear()
+    a_launched.clear()
+    process.start(session, 'designation', 'description', 'user')
+    assert extracting.wait(10)
+    process.stop(session)
+    extracted.set()
+    process.preparation.join(10)
+    assert a_launched == []
+    session.close()
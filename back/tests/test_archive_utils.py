@@ -18,6 +18,7 @@ You should have received a copy of the GNU General Public License
 import os
 import logging
 import shutil
+import hashlib
 
 from cornetto import archive_utils
 
@@ -121,3 +122,33 @@ def test_extract_archive_to_directory():
     shutil.rmtree(s_static_repository)
     shutil.rmtree(s_destination_repository)
     shutil.rmtree(s_archive_repository)
+
+
+def test_create_archive_with_codec(tmp_path):
+    """
+    Test that the sha of the archive is the sha of the compressed file and that it can be extracted
+    """
+    s_static_repository = str(tmp_path / 'static')
+    s_archive_repository = str(tmp_path / 'archive')
+    s_destination_repository = str(tmp_path / 'destination')
+    for s_directory in (s_static_repository, s_archive_repository, s_destination_repository):
+        os.makedirs(s_directory)
+
+    with open(os.path.join(s_static_repository, 'test_file.html'), 'w') as file:
+        file.write('<html><body>test content<body></html>' * 100)
+
+    for s_codec, s_extension in (('gzip', '.tar.gz'), ('xz', '.tar.xz'), ('none', '.tar')):
+        sha = archive_utils.create_archive_and_rename_to_sha(s_static_repository, s_archive_repository, s_codec)
+
+        s_archive_path = archive_utils.get_archive_path(sha, s_archive_repository)
+        assert s_archive_path == os.path.join(s_archive_repository, sha + s_extension)
+        with open(s_archive_path, 'rb') as f_archive:
+            assert hashlib.sha1(f_archive.read()).hexdigest() == sha
+
+        archive_utils.extract_archive_to_directory(sha, s_archive_repository, s_destination_repository)
+        assert os.path.isfile(os.path.join(s_destination_repository, 'test_file.html'))
+
+    # only the archives are listed, without their extension
+    assert len(archive_utils.list_archive_shas(s_archive_repository)) == 3
+    # no temporary file is left
+    assert not [s_filename for s_filename in os.listdir(s_archive_repository) if s_filename.endswith('.tmp')]
@@ -0,0 +1,117 @@
+# coding=utf-8
+"""
+Cornetto
+
+Copyright (C) 2018–2020 ANSSI
+Contributors:
+2018–2020 Bureau Applicatif tech-sdn-app@ssi.gouv.fr
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+"""
+import json
+import os
+from datetime import datetime
+
+from cornetto import bg_services, manifest_utils, snapshot_store
+from cornetto.models import open_session_db, Base, Status
+from cornetto.models.Statification import Statification
+
+
+def test_save_same_tree_twice(tmp_path):
+    s_static_repository = str(tmp_path / 'static')
+    s_archive_repository = str(tmp_path / 'archive')
+    s_log_dir = str(tmp_path / 'logs')
+    s_status_file = str(tmp_path / 'status.json')
+    s_database_uri = 'sqlite:///' + str(tmp_path / 'cornetto.db')
+    for s_directory in (s_static_repository, s_archive_repository, s_log_dir):
+        os.makedirs(s_directory)
+    with open(os.path.join(s_static_repository, 'index.html'), 'w') as f_file:
+        f_file.write('<html>home</html>')
+
+    session = open_session_db(s_database_uri)
+    Base.metadata.create_all(session.get_bind())
+
+    a_shas = []
+    for i_save in range(2):
+        # a new statification of the same site is crawled and saved
+        session.add(Statification('', 'designation', 'description', datetime.utcnow(), datetime.utcnow(),
+                                  Status.STATIFIED))
+        session.commit()
+        s_log_file = os.path.join(s_log_dir, 'statif.log')
+        with open(s_log_file, 'w') as f_log_file:
+            f_log_file.write('crawl %i' % i_save)
+
+        bg_services.bg_save_to_archive('user', s_archive_repository, s_static_repository, s_log_file, s_log_dir,
+                                       str(tmp_path / 'lock'), s_status_file, s_database_uri,
+                                       s_archive_backend='cas')
+        with open(s_status_file) as f_status_file:
+            status = json.load(f_status_file)
+        assert status['success'] is True
+        a_shas.append(status['sha'])
+
+    # each save has its own sha, the log of the first statification is kept
+    assert a_shas[0] != a_shas[1]
+    with open(os.path.join(s_log_dir, a_shas[0] + '.log')) as f_log_file:
+        assert f_log_file.read() == 'crawl 0'
+    session.expire_all()
+    assert [Statification.get_statification(session, s_sha).status for s_sha in a_shas] == [Status.SAVED] * 2
+    session.close()
+
+
+def test_push_to_prod_directory(tmp_path):
+    s_static_repository = str(tmp_path / 'static')
+    s_archive_repository = str(tmp_path / 'archive')
+    s_prod_directory = str(tmp_path / 'prod')
+    s_status_file = str(tmp_path / 'status.json')
+    s_database_uri = 'sqlite:///' + str(tmp_path / 'cornetto.db')
+    for s_directory in (s_static_repository, s_archive_repository, s_prod_directory):
+        os.makedirs(s_directory)
+
+    session = open_session_db(s_database_uri)
+    Base.metadata.create_all(session.get_bind())
+
+    a_shas = []
+    for s_content in ('first', 'second'):
+        with open(os.path.join(s_static_repository, 'index.html'), 'w') as f_file:
+            f_file.write(s_content)
+        s_sha = snapshot_store.create_snapshot(s_static_repository, s_archive_repository)
+        session.add(Statification(s_sha, 'designation', 'description', datetime.utcnow(), datetime.utcnow(),
+                                  Status.SAVED))
+        session.commit()
+        a_shas.append(s_sha)
+
+    def push_to_prod(s_sha):
+        bg_services.bg_extract_archive_to_prod(s_sha, 'user', '', s_status_file, str(tmp_path / 'lock'),
+                                               s_database_uri, s_archive_repository, s_prod_directory)
+        with open(s_status_file) as f_status_file:
+            assert json.load(f_status_file)['success'] is True
+        assert manifest_utils.read_directory_sha(s_prod_directory) == s_sha
+
+    # the directory doesn't hold the statification in production, its content is replaced
+    with open(os.path.join(s_prod_directory, 'stale.html'), 'w') as f_file:
+        f_file.write('stale')
+    push_to_prod(a_shas[0])
+    assert sorted(os.listdir(s_prod_directory)) == [manifest_utils.DIRECTORY_SHA_NAME, 'index.html']
+
+    # the directory hold the statification in production, only the delta is applied
+    push_to_prod(a_shas[1])
+    with open(os.path.join(s_prod_directory, 'index.html')) as f_file:
+        assert f_file.read() == 'second'
+
+    # the directory has been modified by something else, the statification is pushed again entirely
+    os.remove(os.path.join(s_prod_directory, 'index.html'))
+    os.remove(os.path.join(s_prod_directory, manifest_utils.DIRECTORY_SHA_NAME))
+    with open(os.path.join(s_prod_directory, 'stale.html'), 'w') as f_file:
+        f_file.write('stale')
+    push_to_prod(a_shas[0])
+    assert sorted(os.listdir(s_prod_directory)) == [manifest_utils.DIRECTORY_SHA_NAME, 'index.html']
+    with open(os.path.join(s_prod_directory, 'index.html')) as f_file:
+        assert f_file.read() == 'first'
+    session.close()
@@ -0,0 +1,107 @@
+# coding=utf-8
+"""
+Cornetto
+
+Copyright (C) 2018–2020 ANSSI
+Contributors:
+2018–2020 Bureau Applicatif tech-sdn-app@ssi.gouv.fr
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+"""
+import os
+
+from scrapy_parser.cache import ProcessedCache, get_rules_hash
+from scrapy_parser.links import LinkEngine
+from scrapy_parser.offload import create_html_parser, process_cached, CONTENT_HTML, CONTENT_JS
+from scrapy_parser.rewrite import UrlRewriter
+
+HTML = b'<html><body><a href="http://web.com/a.html">a</a><a href="http://other.com/">o</a></body></html>'
+
+
+def test_process_cached(tmp_path):
+    s_output = str(tmp_path / 'output')
+    engine = LinkEngine(['web.com', 'static.com'], UrlRewriter.from_url_regex('https?://web.com', 'http://static.com'))
+    html_parser = create_html_parser()
+    cache = ProcessedCache(str(tmp_path / 'cache'), get_rules_hash(['web.com', 'static.com'], 'https?://web.com'),
+                           s_output)
+
+    # the processed content is added to the cache when the item is stored
+    item, a_links, a_unknown_links = process_cached(cache, engine, html_parser, CONTENT_HTML, HTML, 'http://web.com/',
+                                                    s_output + '/index.html', None)
+    assert item['stats']['cache/miss_count'] == 1
+    item.store()
+    with open(s_output + '/index.html', 'rb') as f_file:
+        content = f_file.read()
+    assert b'http://static.com/a.html' in content
+
+    # the same content at the same url is not processed again
+    item, a_cached_links, a_unknown_links = process_cached(cache, engine, html_parser, CONTENT_HTML, HTML,
+                                                           'http://web.com/', s_output + '/copy.html', None)
+    assert item['content'] is None
+    assert item['stats']['cache/hit_count'] == 1
+    assert [tuple(link) for link in a_cached_links] == a_links
+    item.store()
+    with open(s_output + '/copy.html', 'rb') as f_file:
+        assert f_file.read() == content
+
+    # the links of a page depend on its url
+    item, a_links, a_unknown_links = process_cached(cache, engine, html_parser, CONTENT_HTML, HTML,
+                                                    'http://web.com/other/', s_output + '/other.html', None)
+    assert 'cache/miss_count' in item['stats']
+
+    # the identical file of the previous statification is linked
+    os.rename(s_output, str(tmp_path / 'previous'))
+    cache = ProcessedCache(cache.s_directory, cache.s_rules_hash, s_output, str(tmp_path / 'previous'))
+    item, a_links, a_unknown_links = process_cached(cache, engine, html_parser, CONTENT_HTML, HTML, 'http://web.com/',
+                                                    s_output + '/index.html', None)
+    assert item['previous'] == str(tmp_path / 'previous') + '/index.html'
+
+    # a file of the same size but with another content at the same path is not linked
+    with open(str(tmp_path / 'previous') + '/index.html', 'rb+') as f_file:
+        f_file.write(b'X')
+    item, a_links, a_unknown_links = process_cached(cache, engine, html_parser, CONTENT_HTML, HTML, 'http://web.com/',
+                                                    s_output + '/index.html', None)
+    assert item['previous'] is None
+    item.store()
+    with open(s_output + '/index.html', 'rb') as f_file:
+        assert f_file.read() == content
+
+    # another rules hash doesn't use the results of the other rules
+    cache = ProcessedCache(cache.s_directory, get_rules_hash(['web.com']), s_output)
+    item, a_links, a_unknown_links = process_cached(cache, engine, html_parser, CONTENT_HTML, HTML, 'http://web.com/',
+                                                    s_output + '/index.html', None)
+    assert 'cache/miss_count' in item['stats']
+
+
+def test_evict(tmp_path):
+    s_output = str(tmp_path / 'output')
+    engine = LinkEngine(['web.com'], UrlRewriter.from_url_regex('', ''))
+    cache = ProcessedCache(str(tmp_path / 'cache'), '', s_output)
+
+    # the url of a script is not a part of the key
+    for i in range(3):
+        item = process_cached(cache, engine, None, CONTENT_JS, b'var a = %i;' % i, 'http://web.com/%i.js' % i,
+                              s_output + '/%i.js' % i, None)[0]
+        item.store()
+        os.utime(item['cache']['object'], (i, i))
+    assert 'cache/hit_count' in process_cached(cache, engine, None, CONTENT_JS, b'var a = 0;', 'http://web.com/a.js',
+                                               s_output + '/a.js', None)[0]['stats']
+
+    i_size, i_evicted = cache.evict(1000)
+    assert i_evicted == 0
+    i_entry_size = i_size // 3
+
+    # the least recently used entry is removed, the entry 0 has just been used
+    i_size, i_evicted = cache.evict(2 * i_entry_size + 1)
+    assert i_evicted == 1
+    assert 'cache/miss_count' in process_cached(cache, engine, None, CONTENT_JS, b'var a = 1;', 'http://web.com/1.js',
+                                                s_output + '/1.js', None)[0]['stats']
+    assert 'cache/hit_count' in process_cached(cache, engine, None, CONTENT_JS, b'var a = 0;', 'http://web.com/0.js',
+                                               s_output + '/0.js', None)[0]['stats']
@@ -0,0 +1,188 @@
+# coding=utf-8
+"""
+Cornetto
+
+Copyright (C) 2018–2020 ANSSI
+Contributors:
+2018–2020 Bureau Applicatif tech-sdn-app@ssi.gouv.fr
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+"""
+import logging
+import os
+from datetime import datetime
+
+import pytest
+
+from cornetto import crawl_events
+from cornetto.models import open_session_db, Base, Status
+from cornetto.models.ErrorTypeMIME import ErrorTypeMIME
+from cornetto.models.ExternalLink import ExternalLink
+from cornetto.models.HtmlError import HtmlError
+from cornetto.models.ScrapyError import ScrapyError
+from cornetto.models.Statification import Statification
+from cornetto.models.StatificationTiming import StatificationTiming
+from scrapy_parser.events import CrawlEventWriter, CrawlEventLogHandler, EVENT_EXTERNAL_LINK, EVENT_HTTP_ERROR, \
+    EVENT_FORBIDDEN_MIME, EVENT_STATS
+
+
+@pytest.fixture()
+def session():
+    session = open_session_db('sqlite:///:memory:')
+    Base.metadata.create_all(session.get_bind())
+    yield session
+    session.close()
+
+
+def test_read_crawl_events(tmp_path):
+    s_events_file = str(tmp_path / 'statif.events.jsonl')
+
+    writer = CrawlEventWriter(s_events_file)
+    writer.write(EVENT_EXTERNAL_LINK, url='http://other.com/a] from b', source='http://web.com/')
+    writer.write(EVENT_STATS, stats={'response_received_count': 42, 'start_time': datetime.utcnow()})
+
+    # every error logged is written as an exception event
+    test_logger = logging.getLogger('test_read_crawl_events')
+    handler = CrawlEventLogHandler(writer)
+    test_logger.addHandler(handler)
+    try:
+        raise RuntimeError('test error')
+    except RuntimeError:
+        test_logger.exception('Spider error processing')
+    test_logger.removeHandler(handler)
+    writer.close()
+
+    # an incomplete line is ignored
+    with open(s_events_file, 'a') as f_events_file:
+        f_events_file.write('{"type": "external_li')
+
+    events = list(crawl_events.read_crawl_events(s_events_file))
+
+    assert len(events) == 3
+    assert events[0] == {'type': EVENT_EXTERNAL_LINK, 'url': 'http://other.com/a] from b', 'source': 'http://web.com/'}
+    assert events[1]['stats']['response_received_count'] == 42
+    assert events[2]['message'].startswith('Spider error processing\nTraceback')
+    assert 'RuntimeError: test error' in events[2]['message']
+
+
+@pytest.fixture()
+def statification(session):
+    statification = Statification('', 'designation', 'description', datetime.utcnow(), datetime.utcnow(),
+                                  Status.CREATED)
+    session.add(statification)
+    session.commit()
+    return statification
+
+
+def test_register_crawl_events(session, statification):
+    crawl_events.register_crawl_events(session, statification, [
+        {'type': EVENT_EXTERNAL_LINK, 'url': 'http://other.com/', 'source': 'http://web.com/'},
+        {'type': EVENT_HTTP_ERROR, 'code': 404, 'url': 'http://web.com/missing', 'source': 'http://web.com/'},
+        # an event without source is not registered
+        {'type': EVENT_HTTP_ERROR, 'code': 404, 'url': 'http://web.com/missing', 'source': ''},
+        {'type': EVENT_FORBIDDEN_MIME, 'mime': 'application/octet-stream', 'url': 'http://web.com/a.iso'},
+        {'type': 'exception', 'message': 'Error downloading'},
+        {'type': EVENT_STATS, 'stats': {'response_received_count': 42, 'timing/html/parse/count': 2,
+                                        'timing/html/parse/seconds': 0.5, 'timing/html/parse/le_1ms': 1,
+                                        'timing/html/parse/le_1s': 1}},
+        # an event with a missing field is not registered
+        {'type': EVENT_EXTERNAL_LINK, 'url': 'http://other.com/'}
+    ])
+
+    assert statification.get_list_from_class(ExternalLink, session) == [
+        {'id': 1, 'source': 'http://web.com/', 'url': 'http://other.com/'}]
+    assert statification.get_list_from_class(HtmlError, session) == [
+        {'id': 1, 'error_code': '404', 'url': 'http://web.com/missing', 'source': 'http://web.com/'}]
+    assert len(statification.get_list_from_class(ErrorTypeMIME, session)) == 1
+    assert len(statification.get_list_from_class(ScrapyError, session)) == 1
+    assert statification.nb_item == 42
+    assert statification.get_list_from_class(StatificationTiming, session) == [
+        {'id': 1, 'mime': 'html', 'stage': 'parse', 'count': 2, 'seconds': 0.5,
+         'histogram': {'le_1ms': 1, 'le_10ms': 0, 'le_100ms': 0, 'le_1s': 1, 'le_10s': 0, 'gt_10s': 0}}]
+
+    # the stats of a resumed crawl replace the timings of the previous run
+    crawl_events.register_crawl_events(session, statification, [
+        {'type': EVENT_STATS, 'stats': {'response_received_count': 50, 'timing/html/parse/count': 3,
+                                        'timing/html/parse/seconds': 0.6, 'timing/html/write/count': 3,
+                                        'timing/html/write/seconds': 0.1, 'timing/html/write/le_100ms': 3}}])
+    a_timings = statification.get_list_from_class(StatificationTiming, session)
+    assert [(timing['stage'], timing['count']) for timing in a_timings] == [('parse', 3), ('write', 3)]
+
+
+def test_add_list_of_objects_to_statification(session, statification):
+    a_records = [('http://web.com/', 'http://other.com/' + str(i)) for i in range(25)]
+    # a record with an empty value is ignored
+    a_records.insert(10, ('', 'http://other.com/'))
+
+    assert statification.add_list_of_objects_to_statification(ExternalLink, session, a_records, 10) == 25
+
+    a_external_links = statification.get_list_from_class(ExternalLink, session)
+    assert len(a_external_links) == 25
+    assert a_external_links[24] == {'id': 25, 'source': 'http://web.com/', 'url': 'http://other.com/24'}
+
+    # the batch size is also respected when registering crawl events
+    crawl_events.register_crawl_events(session, statification, [
+        {'type': EVENT_HTTP_ERROR, 'code': 500, 'url': 'http://web.com/' + str(i), 'source': 'http://web.com/'}
+        for i in range(7)], 3)
+    assert len(statification.get_list_from_class(HtmlError, session)) == 7
+
+
+def test_follow_crawl_events(tmp_path, session, statification):
+    s_events_file = str(tmp_path / 'statif.events.jsonl')
+    crawl_events.reset_crawl_events(s_events_file)
+
+    writer = CrawlEventWriter(s_events_file)
+    writer.write(EVENT_EXTERNAL_LINK, url='http://other.com/1', source='http://web.com/')
+    # an event that is being written is registered next time
+    writer.file.write('{"type": "external_link", "url": "http://other.com/2", ')
+
+    assert crawl_events.follow_crawl_events(session, statification, s_events_file) > 0
+    assert len(statification.get_list_from_class(ExternalLink, session)) == 1
+
+    # nothing new has been written
+    assert crawl_events.follow_crawl_events(session, statification, s_events_file) == 0
+
+    writer.file.write('"source": "http://web.com/"}\n')
+    writer.write(EVENT_FORBIDDEN_MIME, mime='application/octet-stream', url='http://web.com/a.iso')
+    writer.close()
+
+    crawl_events.follow_crawl_events(session, statification, s_events_file)
+    assert [link['url'] for link in statification.get_list_from_class(ExternalLink, session)] == [
+        'http://other.com/1', 'http://other.com/2']
+    assert len(statification.get_list_from_class(ErrorTypeMIME, session)) == 1
+    assert crawl_events.get_events_offset(s_events_file) == os.path.getsize(s_events_file)
+
+
+def test_follow_crawl_events_failure(tmp_path, session, statification, monkeypatch):
+    s_events_file = str(tmp_path / 'statif.events.jsonl')
+    crawl_events.reset_crawl_events(s_events_file)
+
+    writer = CrawlEventWriter(s_events_file)
+    for i in range(3):
+        writer.write(EVENT_EXTERNAL_LINK, url='http://other.com/' + str(i), source='http://web.com/')
+    for i in range(3):
+        writer.write(EVENT_FORBIDDEN_MIME, mime='application/octet-stream', url='http://web.com/' + str(i))
+    writer.close()
+
+    # the insertion of the second batch fails
+    get_mapping = ErrorTypeMIME.get_mapping
+
+    def fail_get_mapping(statification, *args):
+        raise RuntimeError('database error')
+    monkeypatch.setattr(ErrorTypeMIME, 'get_mapping', staticmethod(fail_get_mapping))
+    with pytest.raises(RuntimeError):
+        crawl_events.follow_crawl_events(session, statification, s_events_file, 2)
+    assert len(statification.get_list_from_class(ExternalLink, session)) == 2
+
+    # the events of the first batch are not registered again
+    monkeypatch.setattr(ErrorTypeMIME, 'get_mapping', staticmethod(get_mapping))
+    crawl_events.follow_crawl_events(session, statification, s_events_file, 2)
+    assert len(statification.get_list_from_class(ExternalLink, session)) == 3
+    assert len(statification.get_list_from_class(ErrorTypeMIME, session)) == 3
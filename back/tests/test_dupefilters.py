@@ -0,0 +1,91 @@
+# coding=utf-8
+"""
+Cornetto
+
+Copyright (C) 2018–2020 ANSSI
+Contributors:
+2018–2020 Bureau Applicatif tech-sdn-app@ssi.gouv.fr
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+"""
+import tempfile
+
+import pytest
+from scrapy.http import Request
+from scrapy.statscollectors import MemoryStatsCollector
+from scrapy.utils.test import get_crawler
+
+from scrapy_parser.SimpleDupeFilter import FingerprintTable, SimpleDupeFilter
+from scrapy_parser.url_utils import get_canonical_url
+
+
+def test_get_canonical_url():
+    # a directory and its index are the same url
+    assert get_canonical_url('http://web.com') == 'http://web.com'
+    assert get_canonical_url('http://web.com/') == 'http://web.com'
+    assert get_canonical_url('http://web.com/index.html') == 'http://web.com'
+    assert get_canonical_url('http://web.com/a/') == get_canonical_url('http://web.com/a/index.html')
+    # the query is sorted and the fragment removed
+    assert get_canonical_url('http://web.com/a?b=2&a=1#top') == 'http://web.com/a?a=1&b=2'
+    assert get_canonical_url('http://web.com/a.html') != get_canonical_url('http://web.com/a.html/b')
+
+
+def test_bloom_dupe_filter():
+    BLOOMDupeFilter = pytest.importorskip('scrapy_parser.BLOOMDupeFilter').BLOOMDupeFilter
+    s_job_directory = tempfile.mkdtemp()
+    stats = MemoryStatsCollector(get_crawler())
+
+    dupe_filter = BLOOMDupeFilter(s_job_directory, 100, 0.00001, stats)
+    # the filter grows over its initial capacity without false negative
+    for i in range(1000):
+        assert not dupe_filter.request_seen(Request('http://web.com/page%i.html' % i))
+    assert dupe_filter.request_seen(Request('http://web.com/page999.html#top'))
+    assert not dupe_filter.request_seen(Request('http://web.com/'))
+    assert dupe_filter.request_seen(Request('http://web.com/index.html'))
+    dupe_filter.close('shutdown')
+
+    assert stats.get_value('dupefilter/bloom_count') == 1001
+    assert stats.get_value('dupefilter/bloom_filters') > 1
+    assert stats.get_value('dupefilter/bloom_fp_rate') < 0.0001
+
+    # the filter is reloaded from the job directory
+    dupe_filter = BLOOMDupeFilter(s_job_directory, 100, 0.00001, stats)
+    assert dupe_filter.request_seen(Request('http://web.com/page42.html'))
+    assert dupe_filter.request_seen(Request('http://web.com/index.html'))
+
+
+def test_fingerprint_table():
+    table = FingerprintTable(4)
+    for i_fp in range(1, 1001):
+        assert not table.add(i_fp * 7919)
+    # the table has grown and all the fingerprints are still found
+    assert len(table) == 1000
+    assert table.get_size_in_bytes() == 2048 * 8
+    assert all(i_fp * 7919 in table for i_fp in range(1, 1001))
+    assert table.add(7919)
+    assert 1 not in table
+
+
+def test_simple_dupe_filter():
+    s_job_directory = tempfile.mkdtemp()
+    stats = MemoryStatsCollector(get_crawler())
+
+    dupe_filter = SimpleDupeFilter(s_job_directory, stats)
+    assert not dupe_filter.request_seen(Request('http://web.com'))
+    assert dupe_filter.request_seen(Request('http://web.com/index.html'))
+    assert not dupe_filter.request_seen(Request('http://web.com/a/b.html'))
+    dupe_filter.close('shutdown')
+    assert stats.get_value('dupefilter/fingerprints') == 2
+
+    # the fingerprints are reloaded from the job directory
+    dupe_filter = SimpleDupeFilter(s_job_directory, stats)
+    assert dupe_filter.request_seen(Request('http://web.com/'))
+    assert dupe_filter.request_seen(Request('http://web.com/a/b.html#top'))
+    assert not dupe_filter.request_seen(Request('http://web.com/a/'))
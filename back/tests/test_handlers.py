@@ -0,0 +1,61 @@
+# coding=utf-8
+"""
+Cornetto
+
+Copyright (C) 2018–2020 ANSSI
+Contributors:
+2018–2020 Bureau Applicatif tech-sdn-app@ssi.gouv.fr
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+"""
+import hashlib
+import os
+import tempfile
+
+from scrapy import Spider
+from scrapy.core.downloader.handlers.http11 import ScrapyAgent
+from scrapy.utils.test import get_crawler
+
+from scrapy_parser.handlers import StreamingBody, StreamingDownloadHandler, remove_streaming_files
+from scrapy_parser.items import MirroringItem
+
+
+def test_streaming_body():
+    s_output = tempfile.mkdtemp()
+
+    body = StreamingBody(s_output)
+    for i in range(10):
+        body.write(b'chunk %i' % i)
+    # the body of the response is empty, the content is in the temporary file
+    assert body.getvalue() == b''
+    assert body.hash.hexdigest() == hashlib.sha256(b''.join(b'chunk %i' % i for i in range(10))).hexdigest()
+
+    # the item is saved by renaming the temporary file
+    item = MirroringItem(filename=s_output + '/videos/video.mp4', content=b'', streamed=body.s_path)
+    item.process()
+    with open(s_output + '/videos/video.mp4', 'rb') as f_file:
+        assert f_file.read() == b'chunk 0chunk 1chunk 2chunk 3chunk 4chunk 5chunk 6chunk 7chunk 8chunk 9'
+    assert not os.path.exists(body.s_path)
+
+    # the temporary files that have not been saved are removed at the end of the crawl
+    StreamingBody(s_output).getvalue()
+    remove_streaming_files(s_output)
+    assert os.listdir(s_output) == ['videos']
+
+
+def test_streaming_download_handler(monkeypatch):
+    crawler = get_crawler(Spider)
+    handler = StreamingDownloadHandler(crawler.settings, crawler)
+    assert handler.b_streaming
+
+    # the download handler of Scrapy is used when its private API has changed
+    monkeypatch.delattr(ScrapyAgent, '_cb_bodyready')
+    handler = StreamingDownloadHandler(crawler.settings, crawler)
+    assert not handler.b_streaming
@@ -0,0 +1,95 @@
+# coding=utf-8
+"""
+Cornetto
+
+Copyright (C) 2018–2020 ANSSI
+Contributors:
+2018–2020 Bureau Applicatif tech-sdn-app@ssi.gouv.fr
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+"""
+import io
+
+from PIL import Image
+
+from scrapy_parser.images import sanitize_image
+
+
+def create_image(s_format, **kwargs):
+    image = Image.new('P' if s_format == 'GIF' else 'RGB', (16, 16), 1)
+    for i in range(16):
+        image.putpixel((i, i), 2 if s_format == 'GIF' else (255, 0, 0))
+    output = io.BytesIO()
+    image.save(output, format=s_format, **kwargs)
+    return output.getvalue()
+
+
+def get_pixels(data):
+    return Image.open(io.BytesIO(data)).convert('RGB').tobytes()
+
+
+def test_sanitize_jpeg():
+    exif = Image.Exif()
+    # the make and the model of the camera
+    exif[0x010f] = 'secret maker'
+    exif[0x0110] = 'secret model'
+    data = create_image('JPEG', exif=exif.tobytes(), comment=b'secret comment')
+
+    clean_data, stats = sanitize_image(data)
+
+    assert b'secret' not in clean_data
+    # the image data is not re-encoded
+    assert data.endswith(clean_data[clean_data.index(b'\xff\xda'):])
+    assert get_pixels(clean_data) == get_pixels(data)
+    assert stats['images/jpeg/count'] == 1
+    assert stats['images/jpeg/bytes_removed'] == len(data) - len(clean_data)
+
+
+def test_sanitize_png():
+    from PIL.PngImagePlugin import PngInfo
+    info = PngInfo()
+    info.add_text('Author', 'secret author')
+    info.add_itxt('Comment', 'secret comment', zip=True)
+    data = create_image('PNG', pnginfo=info)
+
+    clean_data, stats = sanitize_image(data)
+
+    assert b'secret' not in clean_data and b'tEXt' not in clean_data and b'iTXt' not in clean_data
+    assert get_pixels(clean_data) == get_pixels(data)
+    assert stats['images/png/bytes_removed'] > 0
+
+
+def test_sanitize_gif():
+    data = create_image('GIF', comment=b'secret comment')
+    assert b'secret' in data
+
+    clean_data, stats = sanitize_image(data)
+
+    assert b'secret' not in clean_data
+    assert get_pixels(clean_data) == get_pixels(data)
+    assert stats['images/gif/count'] == 1
+
+
+def test_sanitize_invalid_image():
+    data = create_image('PNG')
+    # the PNG image has no end, it's decoded and re-encoded
+    truncated_data = data[:data.index(b'IEND') - 4]
+    clean_data, stats = sanitize_image(truncated_data)
+    assert stats['images/reencoded_count'] == 1
+    assert get_pixels(clean_data) == get_pixels(data)
+
+    # a truncated jpeg can't be read
+    clean_data, stats = sanitize_image(b'\xff\xd8\xff\xe1\x00')
+    assert clean_data == b'\xff\xd8\xff\xe1\x00'
+    assert stats['images/failed_count'] == 1
+
+    # the formats without metadata are not modified
+    data = create_image('BMP')
+    assert sanitize_image(data)[0] == data
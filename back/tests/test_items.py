@@ -0,0 +1,72 @@
+# coding=utf-8
+"""
+Cornetto
+
+Copyright (C) 2018–2020 ANSSI
+Contributors:
+2018–2020 Bureau Applicatif tech-sdn-app@ssi.gouv.fr
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+"""
+import errno
+import os
+
+import pytest
+
+from scrapy_parser.items import MirroringItem
+
+
+def write_file(s_path, content):
+    os.makedirs(os.path.dirname(s_path), exist_ok=True)
+    with open(s_path, 'wb') as f_file:
+        f_file.write(content)
+
+
+def read_file(s_path):
+    with open(s_path, 'rb') as f_file:
+        return f_file.read()
+
+
+def test_link_previous(tmp_path):
+    s_previous = str(tmp_path / 'previous' / 'index.html')
+    write_file(s_previous, b'previous')
+
+    # the file of the previous statification is hard linked
+    s_filename = str(tmp_path / 'output' / 'index.html')
+    item = MirroringItem(filename=s_filename, content=None, previous=s_previous)
+    item.store()
+    assert read_file(s_filename) == b'previous'
+    assert os.path.samefile(s_filename, s_previous)
+
+    # an existing file is replaced
+    s_filename = str(tmp_path / 'output' / 'other.html')
+    write_file(s_filename, b'old')
+    MirroringItem(filename=s_filename, content=None, previous=s_previous).link_previous()
+    assert os.path.samefile(s_filename, s_previous)
+
+    # the previous file must exist
+    with pytest.raises(FileNotFoundError):
+        MirroringItem(filename=str(tmp_path / 'output' / 'missing.html'), content=None,
+                      previous=str(tmp_path / 'previous' / 'missing.html')).link_previous()
+
+
+def test_link_previous_other_file_system(tmp_path, monkeypatch):
+    s_previous = str(tmp_path / 'previous' / 'a.png')
+    write_file(s_previous, b'PNG')
+
+    def link(s_source, s_destination):
+        raise OSError(errno.EXDEV, 'Invalid cross-device link')
+
+    # hard links are not possible between two file systems, the file is copied
+    monkeypatch.setattr(os, 'link', link)
+    s_filename = str(tmp_path / 'output' / 'a.png')
+    MirroringItem(filename=s_filename, content=None, previous=s_previous).link_previous()
+    assert read_file(s_filename) == b'PNG'
+    assert not os.path.samefile(s_filename, s_previous)
@@ -0,0 +1,87 @@
+# coding=utf-8
+"""
+Cornetto
+
+Copyright (C) 2018–2020 ANSSI
+Contributors:
+2018–2020 Bureau Applicatif tech-sdn-app@ssi.gouv.fr
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+"""
+from lxml import etree, html
+
+from scrapy_parser.links import LinkEngine, LinkResolver
+from scrapy_parser.rewrite import UrlRewriter
+
+PAGE = b'''<html><head><base href="http://web.com/sub/">
+<style>body { background: url("http://web.com/bg.png") }</style></head>
+<body><a href="page.html">page</a><a href="http://other.com/">other</a><a href="mailto:a@b.c">mail</a>
+<img src="data:image/png;base64,AAAA" srcset="http://web.com/a.png 1x, /b.png 2x">
+<div style="background-image: url('http://web.com/c.png')">http://web.com/text</div>
+<a href="page.html">again</a></body></html>'''
+
+
+def parse_page(body):
+    return etree.fromstring(body, parser=html.HTMLParser(encoding='utf-8'), base_url='http://web.com/').getroottree()
+
+
+def test_extract_html_links():
+    engine = LinkEngine(['web.com'])
+    a_links = engine.extract_html_links(parse_page(PAGE), 'http://web.com/index.html')
+
+    # the links are relative to the base of the page, the mailto: and data: links are not crawled
+    assert a_links == [('http://web.com/bg.png', False),
+                       ('http://web.com/sub/page.html', False),
+                       ('http://other.com/', True),
+                       ('http://web.com/a.png', False),
+                       ('http://web.com/b.png', False),
+                       ('http://web.com/c.png', False),
+                       ('http://web.com/sub/page.html', False)]
+
+
+def test_rewrite_html_links():
+    rewriter = UrlRewriter([{'regex': 'https?://web.com', 'replacement': 'http://static.com'}])
+    engine = LinkEngine(['web.com', 'static.com'], rewriter)
+    root = parse_page(PAGE)
+    a_links = engine.extract_html_links(root, 'http://web.com/index.html')
+
+    assert ('http://static.com/a.png', False) in a_links
+    # the base is rewritten too, the relative links follow it
+    assert ('http://static.com/sub/page.html', False) in a_links
+
+    s_page = etree.tostring(root).decode('utf-8')
+    assert 'srcset="http://static.com/a.png 1x, /b.png 2x"' in s_page
+    assert "url('http://static.com/c.png')" in s_page
+    assert 'url("http://static.com/bg.png")' in s_page
+    # only the links are rewritten, not the text of the page
+    assert '>http://web.com/text<' in s_page
+
+    # the links of a content already rewritten are not rewritten again
+    root = parse_page(PAGE)
+    assert ('http://web.com/a.png', False) in engine.extract_html_links(root, 'http://web.com/', False)
+
+
+def test_extract_css_links():
+    engine = LinkEngine(['web.com'])
+    body = b'a { background: url( "../img/a.png" ) } b { background: url(http://other.com/b.png) }'
+
+    assert engine.extract_css_links(body, 'http://web.com/css/style.css') == [
+        ('http://web.com/img/a.png', False), ('http://other.com/b.png', True)]
+
+
+def test_link_resolver():
+    resolver = LinkResolver(LinkEngine(['web.com']), 'http://web.com/a/')
+
+    assert resolver.resolve(' b.html ') == ('http://web.com/a/b.html', False)
+    assert resolver.resolve('javascript:void(0)') is None
+    # the absolute links are kept as they are
+    assert resolver.resolve('HTTP://other.com/x') == ('HTTP://other.com/x', True)
+    resolver.set_base('/c/')
+    assert resolver.resolve('b.html') == ('http://web.com/c/b.html', False)
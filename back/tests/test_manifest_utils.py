@@ -0,0 +1,114 @@
+# coding=utf-8
+"""
+Cornetto
+
+Copyright (C) 2018–2020 ANSSI
+Contributors:
+2018–2020 Bureau Applicatif tech-sdn-app@ssi.gouv.fr
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+"""
+import os
+import shutil
+import tarfile
+import tempfile
+
+import pytest
+
+from cornetto import archive_utils, manifest_utils, snapshot_store
+
+
+@pytest.fixture()
+def repositories():
+    # the tests of the views clean /tmp/ so the pytest temporary directory can't be used
+    s_tmp_directory = tempfile.mkdtemp()
+    repositories = {s_name: os.path.join(s_tmp_directory, s_name) for s_name in ('static', 'archive', 'prod')}
+    for s_directory in repositories.values():
+        os.makedirs(s_directory)
+    yield repositories
+    shutil.rmtree(s_tmp_directory)
+
+
+def write_files(s_directory, files):
+    for s_path, s_content in files.items():
+        os.makedirs(os.path.dirname(os.path.join(s_directory, s_path)), exist_ok=True)
+        with open(os.path.join(s_directory, s_path), 'w') as file:
+            file.write(s_content)
+
+
+def read_files(s_directory):
+    files = {}
+    for s_root, _, a_files in os.walk(s_directory):
+        for s_name in a_files:
+            with open(os.path.join(s_root, s_name)) as file:
+                files[os.path.relpath(os.path.join(s_root, s_name), s_directory)] = file.read()
+    return files
+
+
+def test_delta(repositories):
+    old_files = {'index.html': 'home', 'old/page.html': 'old page', 'css/style.css': 'body {}'}
+    write_files(repositories['static'], old_files)
+    s_old_sha = archive_utils.create_archive_and_rename_to_sha(repositories['static'], repositories['archive'])
+
+    # the manifest is created when it doesn't exist
+    os.remove(archive_utils.get_files_manifest_path(s_old_sha, repositories['archive']))
+    old_manifest = manifest_utils.get_file_manifest(s_old_sha, repositories['archive'])
+    assert sorted(old_manifest) == ['css/style.css', 'index.html', 'old/page.html']
+
+    shutil.rmtree(repositories['static'])
+    new_files = {'index.html': 'new home', 'new/page.html': 'new page', 'css/style.css': 'body {}'}
+    write_files(repositories['static'], new_files)
+    s_new_sha = snapshot_store.create_snapshot(repositories['static'], repositories['archive'])
+    new_manifest = manifest_utils.get_file_manifest(s_new_sha, repositories['archive'])
+
+    delta = manifest_utils.compute_delta(new_manifest, old_manifest)
+    assert delta == {'added': ['new/page.html'], 'changed': ['index.html'], 'removed': ['old/page.html']}
+
+    # the delta is applied to a copy of the production
+    write_files(repositories['prod'], old_files)
+    manifest_utils.apply_delta_to_directory(s_new_sha, repositories['archive'], delta, repositories['prod'])
+    assert read_files(repositories['prod']) == new_files
+    assert not os.path.exists(os.path.join(repositories['prod'], 'old'))
+
+    # the delta given to the script contain only the added and changed files
+    s_delta_directory = tempfile.mkdtemp(dir=repositories['archive'])
+    s_delta_archive, s_removed_files = manifest_utils.write_delta(s_old_sha, repositories['archive'], old_manifest,
+                                                                  manifest_utils.compute_delta(old_manifest,
+                                                                                               new_manifest),
+                                                                  s_delta_directory)
+    with tarfile.open(s_delta_archive) as f_tar:
+        assert sorted(f_tar.getnames()) == ['index.html', 'old/page.html']
+        assert f_tar.extractfile('index.html').read() == b'home'
+    with open(s_removed_files) as file:
+        assert file.read() == 'new/page.html\n'
+
+
+def test_delta_file_and_directory(repositories):
+    old_files = {'foo': 'foo page', 'bar/index.html': 'bar page', 'bar/style.css': 'body {}'}
+    write_files(repositories['static'], old_files)
+    s_old_sha = snapshot_store.create_snapshot(repositories['static'], repositories['archive'])
+
+    # the file foo is moved to an index of a directory, the directory bar is replaced by a file
+    shutil.rmtree(repositories['static'])
+    new_files = {'foo/index.html': 'foo page', 'foo/a.html': 'a page', 'bar': 'bar file'}
+    write_files(repositories['static'], new_files)
+    s_new_sha = snapshot_store.create_snapshot(repositories['static'], repositories['archive'])
+
+    write_files(repositories['prod'], old_files)
+    delta = manifest_utils.compute_delta(manifest_utils.get_file_manifest(s_new_sha, repositories['archive']),
+                                         manifest_utils.get_file_manifest(s_old_sha, repositories['archive']))
+    manifest_utils.apply_delta_to_directory(s_new_sha, repositories['archive'], delta, repositories['prod'])
+    assert read_files(repositories['prod']) == new_files
+
+    # the reverse transitions
+    delta = manifest_utils.compute_delta(manifest_utils.get_file_manifest(s_old_sha, repositories['archive']),
+                                         manifest_utils.get_file_manifest(s_new_sha, repositories['archive']))
+    manifest_utils.apply_delta_to_directory(s_old_sha, repositories['archive'], delta, repositories['prod'])
+    assert read_files(repositories['prod']) == old_files
@@ -0,0 +1,161 @@
+# coding=utf-8
+"""
+Cornetto
+
+Copyright (C) 2018–2020 ANSSI
+Contributors:
+2018–2020 Bureau Applicatif tech-sdn-app@ssi.gouv.fr
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+"""
+import json
+import os
+from urllib import parse
+
+import pytest
+from scrapy.exceptions import IgnoreRequest, StopDownload
+from scrapy.http import Headers, HtmlResponse, Request, Response
+from scrapy.statscollectors import MemoryStatsCollector
+from scrapy.utils.test import get_crawler
+
+from scrapy_parser.events import EVENT_FORBIDDEN_MIME
+from scrapy_parser.middlewares import IncrementalMiddleware, MimeGateMiddleware
+from scrapy_parser.spiders.MirroringSpider import MirroringSpider
+
+
+class EventsSpider(MirroringSpider):
+    """
+    Spider that keep the events in memory
+    """
+
+    def __init__(self, crawler, *args, **kwargs):
+        super(EventsSpider, self).__init__(crawler, *args, **kwargs)
+        self.emitted = []
+
+    def emit(self, s_type, **fields):
+        self.emitted.append(dict(fields, type=s_type))
+
+
+def test_mime_gate_middleware():
+    crawler = get_crawler(EventsSpider)
+    spider = EventsSpider(crawler, urls='http://web.com/', domains='web.com')
+    stats = MemoryStatsCollector(crawler)
+    middleware = MimeGateMiddleware(stats, {'text/html': 1000}, 0)
+
+    # the allowed content is downloaded whatever its size when there is no limit for its type
+    request = Request('http://web.com/video.mp4', meta={'download_status': 200})
+    middleware.headers_received(Headers({'Content-Type': 'video/mp4'}), 10 ** 9, request, spider)
+    middleware.headers_received(Headers({'Content-Type': 'text/html; charset=utf-8'}), 1000, request, spider)
+    # without Content-Type the response is treated as text/plain
+    middleware.headers_received(Headers({}), -1, request, spider)
+    assert spider.emitted == []
+
+    # the redirections and the errors are not checked
+    for i_status in (301, 404, 500):
+        middleware.headers_received(Headers({'Content-Type': 'application/octet-stream'}), 2 * 10 ** 9,
+                                    Request('http://web.com/a.iso', meta={'download_status': i_status}), spider)
+    assert spider.emitted == []
+
+    # the forbidden content is aborted
+    request = Request('http://web.com/a.iso', meta={'download_status': 200})
+    with pytest.raises(StopDownload):
+        middleware.headers_received(Headers({'Content-Type': 'application/octet-stream'}), 2 * 10 ** 9,
+                                    request, spider)
+    # the failure of the download is silenced
+    with pytest.raises(IgnoreRequest):
+        middleware.process_exception(request, StopDownload(fail=True), spider)
+
+    # the oversized content is aborted
+    with pytest.raises(StopDownload):
+        middleware.headers_received(Headers({'Content-Type': 'text/html'}), 1001,
+                                    Request('http://web.com/big', meta={'download_status': 200}), spider)
+
+    assert spider.emitted == [
+        {'type': EVENT_FORBIDDEN_MIME, 'mime': 'application/octet-stream', 'url': 'http://web.com/a.iso'},
+        {'type': EVENT_FORBIDDEN_MIME, 'mime': 'text/html (1001 bytes)', 'url': 'http://web.com/big'}]
+    assert stats.get_value('mime_gate/forbidden_count') == 1
+    assert stats.get_value('mime_gate/oversized_count') == 1
+    assert stats.get_value('mime_gate/bytes_avoided') == 2 * 10 ** 9 + 1001
+
+    # the other download errors are not silenced
+    assert middleware.process_exception(Request('http://web.com/'), StopDownload(fail=True), spider) is None
+
+
+def test_incremental_middleware(tmp_path):
+    s_previous_output = str(tmp_path / 'previous')
+    os.makedirs(s_previous_output + '/img')
+    with open(s_previous_output + '/index.html', 'wb') as f_file:
+        f_file.write(b'<html>previous</html>')
+    with open(s_previous_output + '/img/a.png', 'wb') as f_file:
+        f_file.write(b'PNG')
+    s_previous_validators = str(tmp_path / 'previous.validators.json')
+    with open(s_previous_validators, 'w') as f_file:
+        json.dump({
+            'http://web.com/': {'etag': '"1"', 'last_modified': '', 'mime': 'text/html', 'filename': '/index.html'},
+            'http://web.com/img/a.png': {'etag': '', 'last_modified': 'Mon, 01 Jan 2018 00:00:00 GMT',
+                                         'mime': 'image/png', 'filename': '/img/a.png'},
+            'http://web.com/missing': {'etag': '"2"', 'last_modified': '', 'mime': 'text/html',
+                                       'filename': '/missing.html'}}, f_file)
+    s_validators_file = str(tmp_path / 'statif.validators.json')
+
+    crawler = get_crawler(EventsSpider)
+    spider = EventsSpider(crawler, urls='http://web.com/', domains='web.com', output=str(tmp_path / 'output'),
+                          previous_output=s_previous_output, previous_validators=s_previous_validators,
+                          validators_file=s_validators_file)
+    middleware = IncrementalMiddleware(MemoryStatsCollector(crawler))
+    middleware.spider_opened(spider)
+
+    # the urls of the previous statification are requested with their validators
+    request = Request('http://web.com/')
+    middleware.process_request(request, spider)
+    assert request.headers['If-None-Match'] == b'"1"'
+    image_request = Request('http://web.com/img/a.png')
+    middleware.process_request(image_request, spider)
+    assert image_request.headers['If-Modified-Since'] == b'Mon, 01 Jan 2018 00:00:00 GMT'
+    new_request = Request('http://web.com/new')
+    middleware.process_request(new_request, spider)
+    assert 'If-None-Match' not in new_request.headers
+
+    # a not modified page is rebuilt from the previous file to find its links
+    response = middleware.process_response(request, Response('http://web.com/', status=304), spider)
+    assert response.status == 200
+    assert response.body == b'<html>previous</html>'
+    assert response.headers['Content-Type'] == b'text/html'
+    assert request.meta['previous_file'] == s_previous_output + '/index.html'
+
+    # a not modified image is not read, its file is linked
+    response = middleware.process_response(image_request, Response('http://web.com/img/a.png', status=304), spider)
+    assert response.body == b''
+    assert image_request.meta['previous_file'] == s_previous_output + '/img/a.png'
+
+    # the url is requested again without condition when the previous file is missing
+    missing_request = Request('http://web.com/missing')
+    middleware.process_request(missing_request, spider)
+    result = middleware.process_response(missing_request, Response('http://web.com/missing', status=304), spider)
+    assert isinstance(result, Request)
+    assert 'If-None-Match' not in result.headers
+    middleware.process_request(result, spider)
+    assert 'If-None-Match' not in result.headers
+
+    # the validators of the modified responses are recorded
+    middleware.process_response(new_request, HtmlResponse('http://web.com/new', body=b'<html></html>', headers={
+        'ETag': '"3"', 'Content-Type': 'text/html; charset=utf-8'}), spider)
+    # a response without validators can't be requested conditionally
+    middleware.process_response(Request('http://web.com/other'), HtmlResponse('http://web.com/other', body=b''),
+                                spider)
+
+    middleware.spider_closed(spider)
+    with open(s_validators_file) as f_file:
+        validators = json.load(f_file)
+    assert sorted(validators) == ['http://web.com/', 'http://web.com/img/a.png', 'http://web.com/new']
+    assert validators['http://web.com/new'] == {
+        'etag': '"3"', 'last_modified': '', 'mime': 'text/html',
+        'filename': spider.get_local_filename(parse.urlparse('http://web.com/new'))}
+    assert middleware.stats.get_value('incremental/not_modified_count') == 2
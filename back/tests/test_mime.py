@@ -0,0 +1,90 @@
+# coding=utf-8
+"""
+Cornetto
+
+Copyright (C) 2018–2020 ANSSI
+Contributors:
+2018–2020 Bureau Applicatif tech-sdn-app@ssi.gouv.fr
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+"""
+import pytest
+from scrapy.http import HtmlResponse, Request
+from scrapy.utils.test import get_crawler
+
+from scrapy_parser.items import MirroringItem, MirroringItemHtml, MirroringItemPdf
+from scrapy_parser.mime import MimeHandler, MimeRegistry, create_mime_registry
+from scrapy_parser.offload import CONTENT_HTML
+from scrapy_parser.spiders.MirroringSpider import MirroringSpider
+
+# a handler loaded from its path by create_mime_registry
+JSON_HANDLER = MimeHandler('json', b_stream=True)
+
+
+def test_mime_registry():
+    registry = MimeRegistry()
+    html = MimeHandler('html', CONTENT_HTML)
+    video = MimeHandler('video', b_stream=True)
+    other = MimeHandler('other')
+    registry.register('text/html', html)
+    registry.register('video/*', video)
+
+    assert registry.get('text/html') is html
+    assert registry.get('video/mp4') is video
+    assert 'text/plain' not in registry
+
+    # the exact types have the priority over the families
+    registry.register('*/*', other)
+    registry.register('video/x-flv', other)
+    assert registry.get('text/plain') is other
+    assert registry.get('video/x-flv') is other
+    assert registry.get('video/webm') is video
+
+    # a processed content can't be streamed
+    with pytest.raises(ValueError):
+        MimeHandler('html', CONTENT_HTML, b_stream=True)
+
+
+def test_create_mime_registry():
+    registry = create_mime_registry(['application/pdf', 'video/mp4'], {
+        'application/xhtml+xml': 'html', 'application/json': 'tests.test_mime.JSON_HANDLER', 'text/css': 'stored'})
+
+    assert registry.get('text/html').b_links and registry.get('application/javascript').b_rewrite
+    assert not registry.get('application/javascript').b_links
+    assert registry.get('application/xhtml+xml') is registry.get('text/html')
+    assert registry.get('application/json').s_name == 'json'
+    assert registry.get('text/css').s_kind is None
+    assert registry.get('application/pdf').b_stream and registry.get('video/mp4').b_stream
+    assert not registry.get('video/webm').b_stream
+    assert registry.get('application/pdf').c_item is MirroringItemPdf
+    assert 'application/octet-stream' not in registry
+
+
+def test_parse_with_handlers():
+    crawler = get_crawler(MirroringSpider, {'CONTENT_WORKERS': 0, 'MIME_HANDLERS': {'application/json': 'stored'}})
+    spider = MirroringSpider(crawler, output='/tmp/output', urls='http://web.com/', domains='web.com')
+
+    response = HtmlResponse('http://web.com/data.json', body=b'{}', request=Request('http://web.com/data.json'),
+                            headers={'Content-Type': 'application/json'})
+    a_results = spider.parse(response)
+    assert type(a_results[0]) is MirroringItem
+    assert crawler.stats.get_value('mime/stored/count') == 1
+
+    response = HtmlResponse('http://web.com/', body=b'<a href="/a.html">a</a>', request=Request('http://web.com/'),
+                            headers={'Content-Type': 'text/html; charset=utf-8'})
+    a_results = spider.parse(response)
+    assert isinstance(a_results[-1], MirroringItemHtml)
+    assert a_results[0].url == 'http://web.com/a.html'
+    assert crawler.stats.get_value('mime/html/seconds') >= 0
+
+    # the types without handler are forbidden
+    response = HtmlResponse('http://web.com/a.iso', body=b'', request=Request('http://web.com/a.iso'),
+                            headers={'Content-Type': 'application/octet-stream'})
+    assert spider.parse(response) == []
@@ -0,0 +1,85 @@
+# coding=utf-8
+"""
+Cornetto
+
+Copyright (C) 2018–2020 ANSSI
+Contributors:
+2018–2020 Bureau Applicatif tech-sdn-app@ssi.gouv.fr
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+"""
+import os
+import tempfile
+
+from scrapy.statscollectors import MemoryStatsCollector
+from scrapy.utils.test import get_crawler
+from twisted.internet import defer
+
+from scrapy_parser.items import MirroringItemHtml, MirroringItemXml
+from scrapy_parser.links import LinkEngine
+from scrapy_parser.offload import ContentOffloader, create_html_parser, process_content, run_content, \
+    CONTENT_CSS, CONTENT_HTML, CONTENT_XML
+from scrapy_parser.rewrite import UrlRewriter
+
+HTML = b'<html><body><a href="http://web.com/a.html">a</a><a href="http://other.com/">o</a></body></html>'
+
+RSS = b'''<?xml version="1.0"?><rss xmlns:wfw="http://wellformedweb.org/CommentAPI/"><channel>
+<link>http://web.com/</link><item><link>http://web.com/news/1</link><wfw:commentRss>mailto:a@b.c</wfw:commentRss>
+</item></channel></rss>'''
+
+
+def test_process_content():
+    engine = LinkEngine(['web.com', 'static.com'], UrlRewriter.from_url_regex('https?://web.com', 'http://static.com'))
+    html_parser = create_html_parser()
+
+    item, a_links, a_unknown_links = process_content(engine, html_parser, CONTENT_HTML, HTML, 'http://web.com/',
+                                                     '/tmp/index.html', None)
+    assert isinstance(item, MirroringItemHtml)
+    assert a_links == [('http://static.com/a.html', False), ('http://other.com/', True)]
+
+    # the content of the previous statification is not rewritten again
+    item, a_links, a_unknown_links = process_content(engine, html_parser, CONTENT_CSS, b'a { b: url(/c.png) }',
+                                                     'http://web.com/s.css', '/tmp/s.css', '/previous/s.css')
+    assert item['previous'] == '/previous/s.css'
+    assert a_links == [('http://web.com/c.png', False)]
+
+    # a RSS without atom namespace
+    item, a_links, a_unknown_links = process_content(engine, html_parser, CONTENT_XML, RSS, 'http://web.com/rss.xml',
+                                                     '/tmp/rss.xml', None)
+    assert isinstance(item, MirroringItemXml)
+    assert a_links == [('http://static.com/', False), ('http://static.com/news/1', False)]
+    assert a_unknown_links == ['mailto:a@b.c']
+
+
+def test_content_offloader():
+    s_output = tempfile.mkdtemp()
+    stats = MemoryStatsCollector(get_crawler())
+    offloader = ContentOffloader(2, stats, ['web.com'], 'https?://web.com', '')
+    try:
+        # the content is processed and saved by a worker process
+        future = offloader.executor.submit(run_content, CONTENT_HTML, HTML, 'http://web.com/',
+                                           s_output + '/dir/index.html', None)
+        d_result = defer.Deferred()
+        offloader.fire(d_result, future)
+        assert d_result.result == ([('http://web.com/a.html', False), ('http://other.com/', True)], [])
+        with open(s_output + '/dir/index.html', 'rb') as f_file:
+            assert b'<a href="/a.html">a</a>' in f_file.read()
+
+        # the errors of the worker are returned as failures
+        future = offloader.executor.submit(run_content, 'unknown', b'', 'http://web.com/', s_output + '/a', None)
+        d_result = defer.Deferred()
+        offloader.fire(d_result, future)
+        assert d_result.result.check(ValueError)
+        d_result.addErrback(lambda failure: None)
+    finally:
+        offloader.close()
+
+    assert stats.get_value('offload/seconds') > 0
+    assert not os.path.exists(s_output + '/a')
@@ -0,0 +1,103 @@
+# coding=utf-8
+"""
+Cornetto
+
+Copyright (C) 2018–2020 ANSSI
+Contributors:
+2018–2020 Bureau Applicatif tech-sdn-app@ssi.gouv.fr
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+"""
+import os
+import tempfile
+import threading
+
+from scrapy_parser.items import MirroringItem
+from scrapy_parser.paths import PathIndex, store_file
+
+
+def test_path_index():
+    paths = PathIndex()
+
+    assert paths.add_file('/news') == ('/news', None)
+    # the file becomes the index of the directory
+    assert paths.add_file('/news/2020.html') == ('/news/2020.html', '/news')
+    assert paths.is_directory('/news')
+    # the path is now a directory
+    assert paths.add_file('/news') == ('/news/index.html', None)
+    assert paths.add_file('/news/') == ('/news/index.html', None)
+    assert paths.add_file('/a/b/c.html') == ('/a/b/c.html', None)
+
+    assert paths.i_files == 3
+    assert paths.i_moved == 1
+    assert not paths.is_directory('/a/b/c.html')
+
+
+def read(s_path):
+    with open(s_path, 'rb') as f_file:
+        return f_file.read()
+
+
+def test_store_file():
+    s_output = tempfile.mkdtemp()
+
+    # a file written where a directory is needed becomes its index
+    MirroringItem(filename=s_output + '/news', content=b'news').store()
+    MirroringItem(filename=s_output + '/news/2020/a.html', content=b'a').store()
+    assert read(s_output + '/news/index.html') == b'news'
+    assert read(s_output + '/news/2020/a.html') == b'a'
+
+    # a file written where there is a directory is its index, whatever the order of the writes
+    item = MirroringItem(filename=s_output + '/news/2020', content=b'2020')
+    item.store()
+    assert item['filename'] == s_output + '/news/2020/index.html'
+    assert read(s_output + '/news/2020/index.html') == b'2020'
+
+    # the previous file is linked in the same way
+    MirroringItem(filename=s_output + '/previous', content=b'previous').store()
+    MirroringItem(filename=s_output + '/news/2020', previous=s_output + '/previous').store()
+    assert read(s_output + '/news/2020/index.html') == b'previous'
+
+    # the errors that are not due to the directories are raised
+    try:
+        store_file(s_output + '/b', lambda s_path: os.replace(s_output + '/missing', s_path))
+        assert False
+    except FileNotFoundError:
+        pass
+
+
+def test_store_file_concurrent(tmp_path):
+    for i_run in range(50):
+        s_output = str(tmp_path / str(i_run))
+        os.makedirs(s_output)
+        # the file news is written before or while the other writers need it as a directory
+        a_items = [MirroringItem(filename=s_output + '/news/p%i.html' % i, content=b'p%i' % i) for i in range(7)]
+        news = MirroringItem(filename=s_output + '/news', content=b'news')
+        if i_run % 2:
+            news.store()
+        else:
+            a_items.append(news)
+        barrier = threading.Barrier(len(a_items))
+
+        def store(item):
+            barrier.wait()
+            item.store()
+
+        a_threads = [threading.Thread(target=store, args=(item,)) for item in a_items]
+        for thread in a_threads:
+            thread.start()
+        for thread in a_threads:
+            thread.join()
+
+        # no file is lost
+        assert read(s_output + '/news/index.html') == b'news'
+        for i in range(7):
+            assert read(s_output + '/news/p%i.html' % i) == b'p%i' % i
+        assert sorted(os.listdir(s_output + '/news')) == ['index.html'] + ['p%i.html' % i for i in range(7)]
@@ -0,0 +1,160 @@
+# coding=utf-8
+"""
+Cornetto
+
+Copyright (C) 2018–2020 ANSSI
+Contributors:
+2018–2020 Bureau Applicatif tech-sdn-app@ssi.gouv.fr
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+"""
+import hashlib
+import io
+import json
+import os
+import re
+
+import pikepdf
+from scrapy.statscollectors import MemoryStatsCollector
+from scrapy.utils.test import get_crawler
+
+from scrapy_parser.items import MirroringItemPdf
+from scrapy_parser.pdf import sanitize_pdf, sanitize_pdf_file, run_sanitize
+from scrapy_parser.pipelines import PdfSanitizingPipeline, MirroringPipeline
+from scrapy_parser.spiders.MirroringSpider import MirroringSpider
+
+
+def create_pdf():
+    """
+    @return a PDF file with metadata and a bookmark, its metadata have been updated by an incremental update
+    """
+    pdf = pikepdf.new()
+    pdf.add_blank_page()
+    pdf.docinfo['/Author'] = 'first secret'
+    pdf.docinfo['/Title'] = 'report'
+    with pdf.open_metadata(set_pikepdf_as_editor=False) as metadata:
+        metadata['dc:creator'] = ['secret creator']
+    with pdf.open_outline() as outline:
+        outline.root.append(pikepdf.OutlineItem('Chapter', 0))
+    output = io.BytesIO()
+    pdf.save(output, object_stream_mode=pikepdf.ObjectStreamMode.disable, compress_streams=False)
+    data = output.getvalue()
+
+    # the incremental update add a new information dictionary, the previous one is still in the file
+    i_previous_xref = int(re.findall(rb'startxref\s+(\d+)', data)[-1])
+    update = b'99 0 obj\n<< /Author (second \\( (nested) secret) /Producer <736563726574> >>\nendobj\n'
+    i_xref = len(data) + len(update)
+    return data + update + b'xref\n99 1\n%010d 00000 n \ntrailer\n<< /Size 100 /Root %i 0 R /Info 99 0 R /Prev %i ' \
+                           b'>>\nstartxref\n%i\n%%%%EOF\n' % (len(data), pdf.Root.objgen[0], i_previous_xref, i_xref)
+
+
+def test_sanitize_pdf():
+    data = create_pdf()
+    assert data.count(b'secret') == 3 and b'<736563726574>' in data
+
+    # the file is rewritten, only the last revision is kept
+    clean_data = sanitize_pdf(data)
+    assert b'secret' not in clean_data and b'report' not in clean_data
+    with pikepdf.open(io.BytesIO(clean_data)) as pdf:
+        assert len(pdf.pages) == 1
+        assert '/Metadata' not in pdf.Root
+        assert pdf.open_outline().root[0].title == 'Chapter'
+
+    # the metadata of every revision are overwritten, the bookmarks are kept
+    clean_data = sanitize_pdf(data, b_rewrite=False)
+    assert len(clean_data) == len(data)
+    assert b'secret' not in clean_data and b'report' not in clean_data and b'<736563726574>' not in clean_data
+    with pikepdf.open(io.BytesIO(clean_data)) as pdf:
+        assert str(pdf.docinfo['/Author']).strip() == ''
+        assert pdf.open_outline().root[0].title == 'Chapter'
+
+
+def test_run_sanitize(tmp_path):
+    s_streamed = str(tmp_path / '.streaming-a.part')
+    with open(s_streamed, 'wb') as f_streamed:
+        f_streamed.write(create_pdf())
+
+    # the temporary file of a streamed content is replaced
+    content, stats = run_sanitize(b'', s_streamed)
+    assert content is None
+    with open(s_streamed, 'rb') as f_streamed:
+        assert b'secret' not in f_streamed.read()
+    assert stats['pdf/sanitized_count'] == 1 and stats['pdf/bytes_removed'] > 0
+
+    # an invalid file is kept as it is
+    content, stats = run_sanitize(b'not a pdf', None)
+    assert content == b'not a pdf'
+    assert stats['pdf/failed_count'] == 1
+
+    # an invalid streamed file is kept as it is, the temporary file of the sanitized file is removed
+    with open(s_streamed, 'wb') as f_streamed:
+        f_streamed.write(b'not a pdf')
+    content, stats = run_sanitize(b'', s_streamed)
+    assert content is None and stats['pdf/failed_count'] == 1
+    assert os.listdir(str(tmp_path)) == ['.streaming-a.part']
+    with open(s_streamed, 'rb') as f_streamed:
+        assert f_streamed.read() == b'not a pdf'
+
+
+def test_sanitize_pdf_file(tmp_path):
+    data = create_pdf()
+    with open(str(tmp_path / 'a.pdf'), 'wb') as f_file:
+        f_file.write(data)
+
+    # the file is read from its path, the metadata are overwritten in the copy
+    sanitize_pdf_file(str(tmp_path / 'a.pdf'), str(tmp_path / 'clean.pdf'), b_rewrite=False)
+    with open(str(tmp_path / 'clean.pdf'), 'rb') as f_file:
+        assert f_file.read() == sanitize_pdf(data, b_rewrite=False)
+
+    sanitize_pdf_file(str(tmp_path / 'a.pdf'), str(tmp_path / 'clean.pdf'))
+    with open(str(tmp_path / 'clean.pdf'), 'rb') as f_file:
+        assert f_file.read() == sanitize_pdf(data)
+
+
+def test_pdf_sanitizing_pipeline(tmp_path):
+    s_output = str(tmp_path / 'output')
+    s_previous_output = str(tmp_path / 'previous')
+    crawler = get_crawler(MirroringSpider)
+    spider = MirroringSpider(crawler, output=s_output, urls='http://web.com/', domains='web.com',
+                             previous_output=s_previous_output, previous_sanitized=str(tmp_path / 'previous.json'),
+                             sanitized_file=str(tmp_path / 'sanitized.json'))
+    stats = MemoryStatsCollector(crawler)
+    pipeline = PdfSanitizingPipeline(stats, 0)
+    mirroring_pipeline = MirroringPipeline(stats, 0, 64)
+
+    # a file sanitized by the previous statification
+    os.makedirs(s_previous_output)
+    with open(s_previous_output + '/old.pdf', 'wb') as f_previous:
+        f_previous.write(b'sanitized')
+    with open(str(tmp_path / 'previous.json'), 'w') as f_previous_sanitized:
+        json.dump({'0' * 64: '/old.pdf'}, f_previous_sanitized)
+
+    pipeline.spider_opened(spider)
+    pipeline.open_spider(spider)
+
+    item = MirroringItemPdf(filename=s_output + '/a.pdf', content=create_pdf())
+    item = mirroring_pipeline.process_item(pipeline.process_item(item, spider), spider)
+    pipeline.item_scraped(item, None, spider)
+    with open(s_output + '/a.pdf', 'rb') as f_file:
+        assert b'secret' not in f_file.read()
+
+    # the same content is not sanitized again
+    item = MirroringItemPdf(filename=s_output + '/new.pdf', content=b'downloaded', sha256='0' * 64)
+    item = mirroring_pipeline.process_item(pipeline.process_item(item, spider), spider)
+    pipeline.item_scraped(item, None, spider)
+    with open(s_output + '/new.pdf', 'rb') as f_file:
+        assert f_file.read() == b'sanitized'
+
+    pipeline.close_spider(spider)
+    assert stats.get_value('pdf/count') == 2
+    assert stats.get_value('pdf/sanitized_count') == 1
+    assert stats.get_value('pdf/skip_rate') == 0.5
+    with open(str(tmp_path / 'sanitized.json')) as f_sanitized:
+        assert json.load(f_sanitized) == {'0' * 64: '/new.pdf', hashlib.sha256(create_pdf()).hexdigest(): '/a.pdf'}
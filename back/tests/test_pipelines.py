@@ -0,0 +1,70 @@
+# coding=utf-8
+"""
+Cornetto
+
+Copyright (C) 2018–2020 ANSSI
+Contributors:
+2018–2020 Bureau Applicatif tech-sdn-app@ssi.gouv.fr
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+"""
+import os
+import tempfile
+
+from scrapy.statscollectors import MemoryStatsCollector
+from scrapy.utils.test import get_crawler
+from twisted.python.failure import Failure
+
+from scrapy_parser.items import MirroringItem
+from scrapy_parser.pipelines import MirroringPipeline
+from scrapy_parser.spiders.MirroringSpider import MirroringSpider
+
+
+def test_mirroring_pipeline():
+    s_output = tempfile.mkdtemp()
+    crawler = get_crawler(MirroringSpider)
+    spider = MirroringSpider(crawler, output=s_output, urls='http://web.com/', domains='web.com')
+    stats = MemoryStatsCollector(crawler)
+
+    # without thread the file is written in the reactor thread
+    pipeline = MirroringPipeline(stats, 0, 64)
+    pipeline.open_spider(spider)
+    item = MirroringItem(filename=s_output + '/a/b.html', content=b'b')
+    assert pipeline.process_item(item, spider) is item
+    with open(s_output + '/a/b.html', 'rb') as f_file:
+        assert f_file.read() == b'b'
+    assert stats.get_value('pipeline/write_count') == 1
+
+    # the items already stored by a content worker are not written again
+    item = MirroringItem(filename=s_output + '/c.html', content=b'c', stored=True)
+    assert pipeline.process_item(item, spider) is item
+    assert not os.path.exists(s_output + '/c.html')
+    pipeline.close_spider(spider)
+
+
+def test_mirroring_pipeline_item_stored():
+    stats = MemoryStatsCollector(get_crawler())
+    pipeline = MirroringPipeline(stats, 2, 64)
+    item = MirroringItem(filename='/tmp/a', content=b'a')
+
+    # the stats are updated in the reactor thread when the file has been written by a thread
+    pipeline.i_queue_depth = 2
+    assert pipeline.item_stored(0.5, item) is item
+    assert stats.get_value('pipeline/write_max_seconds') == 0.5
+    assert stats.get_value('pipeline/queue_depth') == 1
+
+    # the errors of writing are returned as failures
+    try:
+        raise IsADirectoryError('/tmp/a')
+    except IsADirectoryError:
+        failure = Failure()
+    assert pipeline.item_stored(failure, item) is failure
+    assert stats.get_value('pipeline/write_count') == 1
+    assert stats.get_value('pipeline/queue_depth') == 0
@@ -0,0 +1,38 @@
+# coding=utf-8
+"""
+Cornetto
+
+Copyright (C) 2018–2020 ANSSI
+Contributors:
+2018–2020 Bureau Applicatif tech-sdn-app@ssi.gouv.fr
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+"""
+from scrapy_parser.progress import ProgressWriter, read_progress
+
+
+def test_read_progress(tmp_path):
+    s_progress_file = str(tmp_path / 'progress')
+
+    # nothing is published yet
+    assert read_progress(s_progress_file) == {'pages': 0, 'bytes': 0, 'queue': 0, 'errors': 0, 'throughput': 0}
+
+    writer = ProgressWriter(s_progress_file)
+    writer.write(pages=42, bytes=1024, queue=7, errors=2, throughput=3.5)
+    assert read_progress(s_progress_file) == {'pages': 42, 'bytes': 1024, 'queue': 7, 'errors': 2,
+                                              'throughput': 3.5}
+
+    writer.write(pages=43, bytes=2048, queue=6, errors=2, throughput=1.0)
+    assert read_progress(s_progress_file)['pages'] == 43
+    writer.close()
+
+    # the progress file is erased at the end of the statification
+    open(s_progress_file, 'w').close()
+    assert read_progress(s_progress_file)['pages'] == 0
@@ -0,0 +1,88 @@
+# coding=utf-8
+"""
+Cornetto
+
+Copyright (C) 2018–2020 ANSSI
+Contributors:
+2018–2020 Bureau Applicatif tech-sdn-app@ssi.gouv.fr
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+"""
+import pytest
+
+from scrapy_parser import rewrite
+from scrapy_parser.rewrite import UrlRewriter, load_rules
+
+RULES = [
+    {'literal': 'http://www.web.com', 'replacement': ''},
+    {'literal': 'http://www.web.com/old', 'replacement': '/new'},
+    {'literal': 'HTTPS://CDN.WEB.COM', 'replacement': '/static'},
+    {'regex': 'https?://news\\.web\\.com/([0-9]+)', 'replacement': '/archives/\\1'},
+    {'regex': 'https?://(www\\.)?web\\.com', 'replacement': '/regex'},
+]
+
+BODY = b'<a href="http://www.web.com/a">a</a> <a href="http://www.web.com/old/b">b</a> ' \
+       b'<img src="https://cdn.web.com/i.png"> <a href="http://NEWS.web.com/42">news</a> ' \
+       b'<a href="https://web.com/c">c</a> <a href="http://other.com/">other</a>'
+
+EXPECTED = b'<a href="/a">a</a> <a href="/new/b">b</a> ' \
+           b'<img src="/static/i.png"> <a href="/archives/42">news</a> ' \
+           b'<a href="/regex/c">c</a> <a href="http://other.com/">other</a>'
+
+
+@pytest.mark.parametrize('b_automaton', [True, False])
+def test_rewrite_body(b_automaton):
+    if b_automaton and rewrite.ahocorasick is None:
+        pytest.skip('pyahocorasick is not installed')
+    rewriter = UrlRewriter(RULES, b_automaton)
+
+    assert (rewriter.automaton is not None) == b_automaton
+    # the longest match is replaced, the literal and the regex match at the same position for www.web.com
+    assert rewriter.sub(BODY) == EXPECTED
+    assert rewriter.sub_text('see http://www.web.com/é') == 'see /é'
+    assert rewriter.sub(b'nothing to replace') == b'nothing to replace'
+
+
+def test_rewriter_from_url_regex():
+    rewriter = UrlRewriter.from_url_regex('(https?://)?web(.your-private-domain.com/?)?', '',
+                                          load_rules('[{"literal": "http://alias.com/", "replacement": "/"}]'))
+    assert rewriter.sub(b'http://web.your-private-domain.com/a http://alias.com/b') == b'a /b'
+
+    # without url regex nor rules nothing is replaced
+    rewriter = UrlRewriter.from_url_regex('', '/')
+    assert rewriter.is_empty()
+    assert rewriter.sub(b'http://web.com/') == b'http://web.com/'
+
+
+def test_invalid_rules():
+    with pytest.raises(ValueError):
+        UrlRewriter([{'literal': 'a', 'regex': 'b'}])
+    with pytest.raises(ValueError):
+        UrlRewriter([{'regex': '(', 'replacement': ''}])
+    with pytest.raises(ValueError):
+        load_rules('{"literal": "a"}')
+
+
+def test_combined_regex_rules():
+    # the global flags of a rule are scoped to the rule
+    rewriter = UrlRewriter.from_url_regex('(?i)web', 'static', [{'regex': '(?s)a.b', 'replacement': 'c'}])
+    assert rewriter.sub(b'http://WEB.com/a\nb') == b'http://static.com/c'
+
+    # the groups of the rules don't interfere, even with the same name
+    rewriter = UrlRewriter([{'regex': 'https?://(?P<page>[a-z]+)\\.web\\.com', 'replacement': '/\\g<page>'},
+                            {'regex': 'https?://old\\.com/(?P<page>[0-9]+)/([a-z]+)', 'replacement': '/\\2/\\1'},
+                            {'regex': '[(]([a-z]+)[)]', 'replacement': '\\1'}])
+    assert rewriter.sub(b'http://news.web.com/ http://old.com/42/a (b)') == b'/news/ /a/42 b'
+
+    # the references to a group inside a rule are rejected with the rule
+    with pytest.raises(ValueError, match='url rewrite regex'):
+        UrlRewriter([{'regex': '(a)\\1', 'replacement': ''}])
+    with pytest.raises(ValueError, match='url rewrite regex'):
+        UrlRewriter([{'regex': '(?P<x>a)(?P=x)', 'replacement': ''}])
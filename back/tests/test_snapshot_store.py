@@ -0,0 +1,70 @@
+# coding=utf-8
+"""
+Cornetto
+
+Copyright (C) 2018–2020 ANSSI
+Contributors:
+2018–2020 Bureau Applicatif tech-sdn-app@ssi.gouv.fr
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+"""
+import os
+
+from cornetto import archive_utils, snapshot_store
+
+
+def write_file(s_path, s_content):
+    os.makedirs(os.path.dirname(s_path), exist_ok=True)
+    with open(s_path, 'w') as file:
+        file.write(s_content)
+
+
+def count_objects(s_archive_repository):
+    return sum(len(a_files) for _, _, a_files in os.walk(os.path.join(s_archive_repository, 'objects')))
+
+
+def test_create_snapshot(tmp_path):
+    s_static_repository = str(tmp_path / 'static')
+    s_archive_repository = str(tmp_path / 'archive')
+    s_destination_repository = str(tmp_path / 'destination')
+    os.makedirs(s_archive_repository)
+    os.makedirs(s_destination_repository)
+
+    write_file(os.path.join(s_static_repository, 'index.html'), '<html>home</html>')
+    write_file(os.path.join(s_static_repository, 'css', 'style.css'), 'body {}')
+    # the same content is stored once
+    write_file(os.path.join(s_static_repository, 'css', 'copy.css'), 'body {}')
+
+    s_first_sha = snapshot_store.create_snapshot(s_static_repository, s_archive_repository)
+    assert len(s_first_sha) == 40
+    assert count_objects(s_archive_repository) == 2
+    assert [entry['path'] for entry in snapshot_store.read_manifest(s_first_sha, s_archive_repository)] == [
+        'index.html', 'css/copy.css', 'css/style.css']
+
+    # the same files saved twice give another snapshot, but no new object
+    s_same_sha = snapshot_store.create_snapshot(s_static_repository, s_archive_repository)
+    assert s_same_sha != s_first_sha
+    assert count_objects(s_archive_repository) == 2
+    assert list(snapshot_store.read_manifest(s_same_sha, s_archive_repository)) == list(
+        snapshot_store.read_manifest(s_first_sha, s_archive_repository))
+
+    # only the modified content is added
+    write_file(os.path.join(s_static_repository, 'index.html'), '<html>new home</html>')
+    s_second_sha = snapshot_store.create_snapshot(s_static_repository, s_archive_repository)
+    assert s_second_sha != s_first_sha
+    assert count_objects(s_archive_repository) == 3
+    assert sorted(archive_utils.list_archive_shas(s_archive_repository)) == sorted([s_first_sha, s_same_sha,
+                                                                                    s_second_sha])
+
+    # the snapshots are extracted like archives
+    archive_utils.extract_archive_to_directory(s_first_sha, s_archive_repository, s_destination_repository)
+    with open(os.path.join(s_destination_repository, 'index.html')) as file:
+        assert file.read() == '<html>home</html>'
+    assert os.path.isfile(os.path.join(s_destination_repository, 'css', 'copy.css'))
@@ -0,0 +1,65 @@
+# coding=utf-8
+"""
+Cornetto
+
+Copyright (C) 2018–2020 ANSSI
+Contributors:
+2018–2020 Bureau Applicatif tech-sdn-app@ssi.gouv.fr
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+"""
+from scrapy_parser.items import MirroringItemHtml
+from scrapy_parser.links import LinkEngine
+from scrapy_parser.offload import create_html_parser, process_content, CONTENT_CSS, CONTENT_HTML
+from scrapy_parser.rewrite import UrlRewriter
+from scrapy_parser.timing import get_timing_stats, parse_timing_stats, STAGE_LINKS, STAGE_PARSE, STAGE_REWRITE, \
+    STAGE_SERIALIZE, STAGE_WRITE
+
+
+def test_get_timing_stats():
+    assert get_timing_stats('html', STAGE_PARSE, 0.05) == {
+        'timing/html/parse/count': 1, 'timing/html/parse/seconds': 0.05, 'timing/html/parse/le_100ms': 1}
+    assert get_timing_stats('', STAGE_WRITE, 12)['timing/unknown/write/gt_10s'] == 1
+    assert 'timing/css/links/le_1ms' in get_timing_stats('css', STAGE_LINKS, 0.001)
+
+
+def test_parse_timing_stats():
+    stats = {'response_received_count': 3}
+    for f_seconds in (0.0005, 0.002, 3):
+        for s_key, value in get_timing_stats('img', STAGE_WRITE, f_seconds).items():
+            stats[s_key] = stats.get(s_key, 0) + value
+
+    timings = parse_timing_stats(stats)
+    assert list(timings) == [('img', STAGE_WRITE)]
+    assert timings[('img', STAGE_WRITE)]['count'] == 3
+    assert timings[('img', STAGE_WRITE)]['seconds'] == 3.0025
+    assert timings[('img', STAGE_WRITE)]['histogram'] == {'le_1ms': 1, 'le_10ms': 1, 'le_100ms': 0, 'le_1s': 0,
+                                                          'le_10s': 1, 'gt_10s': 0}
+
+
+def test_process_content_timings(tmp_path):
+    engine = LinkEngine(['web.com'], UrlRewriter.from_url_regex('https?://web.com', 'http://static.com'))
+    s_filename = str(tmp_path / 'index.html')
+
+    # the stages of each content are measured for its MIME type handler
+    item, a_links, a_unknown_links = process_content(engine, create_html_parser(), CONTENT_HTML,
+                                                     b'<html><body><a href="/a.html">a</a></body></html>',
+                                                     'http://web.com/', s_filename, None, 'html')
+    assert item['mime'] == 'html'
+    item.store()
+    for s_stage in (STAGE_PARSE, STAGE_LINKS, STAGE_SERIALIZE, STAGE_WRITE):
+        assert item['stats']['timing/html/%s/count' % s_stage] == 1
+    assert isinstance(item, MirroringItemHtml)
+
+    item, a_links, a_unknown_links = process_content(engine, None, CONTENT_CSS, b'a { background: url(/b.png) }',
+                                                     'http://web.com/a.css', str(tmp_path / 'a.css'), None, 'css')
+    assert item['stats']['timing/css/%s/count' % STAGE_REWRITE] == 1
+    assert item['stats']['timing/css/%s/count' % STAGE_LINKS] == 1
+    assert 'timing/css/%s/count' % STAGE_PARSE not in item['stats']
@@ -63,14 +63,22 @@ def setup_fonction():
     test_file = open('/tmp/test.sh', 'w')
     test_file.write('echo "test"')
     test_file.close()
+    # each test starts unlocked and without process, whatever the previous tests left (tmp_path can't be used, the
+    # statification directory /tmp/ is cleaned by the routes)
+    for s_path in (config['LOCKFILE'], config['PIDFILE']):
+        open(s_path, 'w').close()
     app = create_app(None, config)
     yield {
         'client': app.test_client(),
+        'lock_file': config['LOCKFILE'],
         'designation': 'Statification Test',
         'description': 'A test statification for unit test',
         'x_forwarded_user': 'Username',
         'content_type': 'application/json'
     }
+    for s_path in (config['LOCKFILE'], config['PIDFILE']):
+        if os.path.exists(s_path):
+            os.remove(s_path)
 
 
 def test_statification_status(setup_module, setup_fonction):
@@ -86,12 +94,36 @@ def test_statification_status(setup_module, setup_fonction):
     assert data['designation'] == ''
     assert not data['isLocked']
     assert not data['isRunning']
+    assert not data['isPaused']
     assert data['nbItemToCrawl'] == 100
     assert data['status'] == 3
     assert data['statusBackground'] == {}
     assert data['status_code'] == 200
 
 
+def test_pause_resume_statif(setup_module, setup_fonction):
+    client = setup_fonction['client']
+    s_lock_file = setup_fonction['lock_file']
+
+    # there is no running statification to pause
+    data = json.loads(client.post('/api/statification/pause').get_data())
+    assert not data['success']
+    assert data['error'] == 'process_not_running'
+
+    # there is no paused statification to resume
+    data = json.loads(client.post('/api/statification/resume').get_data())
+    assert not data['success']
+    assert data['error'] == 'process_not_paused'
+
+    # the lock taken by another operation is not released
+    with open(s_lock_file, 'w') as f_lock_file:
+        f_lock_file.write('locked')
+    data = json.loads(client.post('/api/statification/resume').get_data())
+    assert data['error'] == 'process_not_paused'
+    with open(s_lock_file) as f_lock_file:
+        assert f_lock_file.read() == 'locked'
+
+
 def test_do_start_statif(setup_module, setup_fonction):
     """
     TODO write a full test for do_start_statif
@@ -112,3 +144,18 @@ def test_do_start_statif(setup_module, setup_fonction):
 
     data = json.loads(r.get_data())
     assert data['status_code'] == 200
+
+
+def test_statification_events(setup_module, setup_fonction):
+    response = setup_fonction['client'].get('/api/statification/events', buffered=False)
+    assert response.mimetype == 'text/event-stream'
+
+    # the first event is the current status
+    s_event = next(response.response)
+    if isinstance(s_event, bytes):
+        s_event = s_event.decode('utf-8')
+    assert s_event.startswith('data: ') and s_event.endswith('\n\n')
+    data = json.loads(s_event[len('data: '):])
+    assert data['status'] == 3
+    assert data['isRunning'] is False
+    response.close()
@@ -0,0 +1,85 @@
+# coding=utf-8
+"""
+Cornetto
+
+Copyright (C) 2018–2020 ANSSI
+Contributors:
+2018–2020 Bureau Applicatif tech-sdn-app@ssi.gouv.fr
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+"""
+import os
+import shutil
+import tempfile
+
+import pytest
+
+from cornetto import archive_utils, snapshot_store
+from cornetto.archive_index import is_indexed
+from cornetto.visualize import create_visualize_app, write_visualize_pointer
+
+
+@pytest.fixture()
+def repositories():
+    # the tests of the views clean /tmp/ so the pytest temporary directory can't be used
+    s_tmp_directory = tempfile.mkdtemp()
+    repositories = {s_name: os.path.join(s_tmp_directory, s_name) for s_name in ('static', 'archive', 'visualize')}
+    for s_directory in repositories.values():
+        os.makedirs(s_directory)
+    os.makedirs(os.path.join(repositories['static'], 'css'))
+    with open(os.path.join(repositories['static'], 'index.html'), 'w') as file:
+        file.write('<html>home</html>')
+    with open(os.path.join(repositories['static'], 'css', 'style.css'), 'w') as file:
+        file.write('body {}')
+    with open(os.path.join(repositories['static'], 'page.php%3Fid=1'), 'w') as file:
+        file.write('<html>page 1</html>')
+    repositories['pointer'] = os.path.join(s_tmp_directory, 'visualized')
+    yield repositories
+    shutil.rmtree(s_tmp_directory)
+
+
+def test_visualize_from_archive(repositories):
+    app = create_visualize_app(config_dict={
+        'ARCHIVE_REPOSITORY': repositories['archive'],
+        'VISUALIZE_REPOSITORY': repositories['visualize'],
+        'VISUALIZE_POINTER_FILE': repositories['pointer']
+    })
+    client = app.test_client()
+
+    s_tar_sha = archive_utils.create_archive_and_rename_to_sha(repositories['static'], repositories['archive'], 'none')
+    s_snapshot_sha = snapshot_store.create_snapshot(repositories['static'], repositories['archive'])
+    s_gzip_sha = archive_utils.create_archive_and_rename_to_sha(repositories['static'], repositories['archive'])
+    assert is_indexed(s_tar_sha, repositories['archive'])
+    assert is_indexed(s_snapshot_sha, repositories['archive'])
+    # a compressed archive need to be extracted
+    assert not is_indexed(s_gzip_sha, repositories['archive'])
+
+    for s_archive_sha in (s_tar_sha, s_snapshot_sha):
+        write_visualize_pointer(repositories['pointer'], s_archive_sha)
+        # the pointer is read when it is modified
+        os.utime(repositories['pointer'], ns=(0, len(s_archive_sha) + ord(s_archive_sha[0])))
+
+        r = client.get('/')
+        assert r.status_code == 200
+        assert r.get_data() == b'<html>home</html>'
+        assert r.mimetype == 'text/html'
+
+        r = client.get('/css/style.css')
+        assert r.get_data() == b'body {}'
+        assert r.mimetype == 'text/css'
+
+        assert client.get('/page.php?id=1').get_data() == b'<html>page 1</html>'
+        assert client.get('/missing.html').status_code == 404
+
+    # without pointer the visualize directory is served
+    write_visualize_pointer(repositories['pointer'], '')
+    with open(os.path.join(repositories['visualize'], 'index.html'), 'w') as file:
+        file.write('<html>extracted</html>')
+    assert client.get('/').get_data() == b'<html>extracted</html>'
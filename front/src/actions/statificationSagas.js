@@ -31,12 +31,14 @@ export const statificationsSubmitForm = data => ({
  * Call the saga SAGA_STATIFICATION_CHECK_STATUS with the needed parameters
  * @param  {[type]} step the step that is currently set in the application
  * @param  {[type]} waitForServer if client is waiting for the server
+ * @param  {[type]} status the status pushed by the server, if undefined the status is requested to the server
  */
-export const statificationsCheckStatus = (step, waitForServer) => {
+export const statificationsCheckStatus = (step, waitForServer, status) => {
   return ({
     type: 'SAGA_STATIFICATION_CHECK_STATUS',
     step,
-    waitForServer
+    waitForServer,
+    status
   })
 }
 
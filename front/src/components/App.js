@@ -51,8 +51,26 @@ class App extends React.PureComponent {
   componentDidMount () {
     // check status on mount
     this.props.checkStatus(this.props.activeStep, this.props.waitForServer)
-    // we set a first interval that will check the status of api every 3 sec
-    setInterval(this.props.checkStatus, 6000, this.props.activeState, this.props.waitForServer)
+
+    if (window.EventSource) {
+      // the server push the status of api each time it changes
+      this.eventSource = new window.EventSource('/api/statification/events')
+      this.eventSource.onmessage = (event) => {
+        if (!this.props.clearInterval) {
+          this.props.checkStatus(this.props.activeStep, this.props.waitForServer, JSON.parse(event.data))
+        }
+      }
+    } else {
+      // we set a first interval that will check the status of api every 6 sec
+      setInterval(this.props.checkStatus, 6000, this.props.activeState, this.props.waitForServer)
+    }
+  }
+
+  componentWillUnmount () {
+    // stop to receive the status of api
+    if (this.eventSource) {
+      this.eventSource.close()
+    }
   }
 
   componentWillUpdate (nextProps, nextState) {
@@ -60,12 +78,15 @@ class App extends React.PureComponent {
       this.props.setIsBeingStopped(false)
     }
 
-    // clear all the interval that have been set
-    clearAllSetInterval()
+    // the status is pushed by the server, there is no interval to set
+    if (!this.eventSource) {
+      // clear all the interval that have been set
+      clearAllSetInterval()
 
-    if (!nextProps.clearInterval) {
-      // start a new interval to check for the status of api
-      setInterval(this.props.checkStatus, 6000, nextProps.activeStep, nextProps.waitForServer)
+      if (!nextProps.clearInterval) {
+        // start a new interval to check for the status of api
+        setInterval(this.props.checkStatus, 6000, nextProps.activeStep, nextProps.waitForServer)
+      }
     }
 
     // if something is loading change the cursor to wait
@@ -85,8 +85,8 @@ const mapDispatchToProps = (dispatch, props) => ({
     }
   },
   // this method call the saga to check the status of the statification process
-  checkStatus: (step, loading) => {
-    dispatch(statificationsCheckStatus(step, loading))
+  checkStatus: (step, loading, status) => {
+    dispatch(statificationsCheckStatus(step, loading, status))
   },
   showDialog: (isOpen) => {
     dispatch(setDialogOpen(isOpen))
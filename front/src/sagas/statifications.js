@@ -187,16 +187,21 @@ async function checkStatusAPI () {
  * @param  {Object}    action the action object that triggered the Saga
  *                            It should contain the following attributes:
  *                             - {boolean} waitForServer : a boolean to know if we are waiting for the server to finish a long action (like save, visualize...).
+ *                             - {Object} status : the status pushed by the server, if undefined the status is requested to the server
  */
 function * checkStatusAPISaga (action) {
   try {
-    // send the submit request to the server
-    const { result, timeout } = yield race({
-      result: call(checkStatusAPI),
-      timeout: delay(8000)
-    })
-    if (timeout) {
-      throw new Error('timeout')
+    let result = action.status
+    if (result === undefined) {
+      // send the submit request to the server
+      const response = yield race({
+        result: call(checkStatusAPI),
+        timeout: delay(8000)
+      })
+      if (response.timeout) {
+        throw new Error('timeout')
+      }
+      result = response.result
     }
 
     // open a popup and send user to create page if status is not 3 (published) or 2 (saved) or visualized